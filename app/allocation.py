@@ -0,0 +1,259 @@
+from sqlalchemy import (
+    and_,
+    column,
+    func,
+    literal,
+    not_,
+    select,
+    text,
+    tuple_,
+    update,
+    values,
+    BigInteger,
+    Integer,
+)
+
+from app.config.exceptions import NotFound
+from app.models.aisles import Aisle
+from app.models.ladders import Ladder
+from app.models.modules import Module
+from app.models.non_tray_items import NonTrayItem
+from app.models.shelf_position_numbers import ShelfPositionNumber
+from app.models.shelf_positions import ShelfPosition
+from app.models.shelf_types import ShelfType
+from app.models.shelves import Shelf
+from app.models.sides import Side
+from app.models.trays import Tray
+
+"""
+Set-based shelf position allocation.
+
+Shelving job creation used to run two anti-join scans per
+(size_class, owner) group and commit once per group. Everything here
+is done as a single ranked pass: containers and free positions are each
+numbered within their (size_class, owner) group and joined on that rank.
+"""
+
+# namespace for pg_advisory_xact_lock, paired with the building id
+SHELF_ALLOCATION_LOCK = 1001
+
+
+def get_location_scope_conditions(building_id, module_id, aisle_id, side_id, ladder_id):
+    """
+    Returns the filter for the most constrained location given.
+    Callers must join Shelf -> Ladder -> Side -> Aisle -> Module.
+    """
+    if ladder_id:
+        return Shelf.ladder_id == ladder_id
+    if side_id:
+        return Ladder.side_id == side_id
+    if aisle_id:
+        return Side.aisle_id == aisle_id
+    if module_id:
+        return Aisle.module_id == module_id
+    return Module.building_id == building_id
+
+
+def free_shelf_position_condition():
+    """
+    A shelf position is free when no tray or non tray item is
+    shelved on it or proposed for it.
+
+    The occupied / reserved flags are kept in step by statement level
+    triggers on trays and non_tray_items, and this predicate matches the
+    partial index idx_shelf_positions_free.
+    """
+    return and_(not_(ShelfPosition.occupied), not_(ShelfPosition.reserved))
+
+
+def _container_demand(tray_ids, non_tray_item_ids):
+    """
+    Containers to place, ranked within their (size_class, owner) group.
+    Trays are placed ahead of non tray items, each in id order.
+    """
+    selects = []
+    if tray_ids:
+        selects.append(
+            select(
+                literal("Tray").label("container_type"),
+                literal(0).label("type_order"),
+                Tray.id.label("container_id"),
+                Tray.size_class_id.label("size_class_id"),
+                Tray.owner_id.label("owner_id"),
+            ).where(Tray.id.in_(tray_ids))
+        )
+    if non_tray_item_ids:
+        selects.append(
+            select(
+                literal("Non-Tray").label("container_type"),
+                literal(1).label("type_order"),
+                NonTrayItem.id.label("container_id"),
+                NonTrayItem.size_class_id.label("size_class_id"),
+                NonTrayItem.owner_id.label("owner_id"),
+            ).where(NonTrayItem.id.in_(non_tray_item_ids))
+        )
+
+    containers = selects[0].union_all(*selects[1:]).subquery("containers")
+
+    return select(
+        containers.c.container_type,
+        containers.c.container_id,
+        containers.c.size_class_id,
+        containers.c.owner_id,
+        func.row_number()
+        .over(
+            partition_by=(containers.c.size_class_id, containers.c.owner_id),
+            order_by=(containers.c.type_order, containers.c.container_id),
+        )
+        .label("rank"),
+    ).cte("demand")
+
+
+def _position_supply(demand, scope_condition):
+    """
+    Free shelf positions in scope, ranked within their (size_class, owner)
+    group. Shelves fill in location order, positions from the highest
+    number down, matching the order operators walk a shelf.
+    """
+    groups = select(demand.c.size_class_id, demand.c.owner_id).distinct()
+
+    return (
+        select(
+            ShelfPosition.id.label("shelf_position_id"),
+            ShelfType.size_class_id.label("size_class_id"),
+            Shelf.owner_id.label("owner_id"),
+            func.row_number()
+            .over(
+                partition_by=(ShelfType.size_class_id, Shelf.owner_id),
+                order_by=(
+                    Shelf.location,
+                    ShelfPositionNumber.number.desc(),
+                    ShelfPosition.id,
+                ),
+            )
+            .label("rank"),
+        )
+        .join(
+            ShelfPositionNumber,
+            ShelfPositionNumber.id == ShelfPosition.shelf_position_number_id,
+        )
+        .join(Shelf, Shelf.id == ShelfPosition.shelf_id)
+        .join(ShelfType, ShelfType.id == Shelf.shelf_type_id)
+        .join(Ladder, Ladder.id == Shelf.ladder_id)
+        .join(Side, Side.id == Ladder.side_id)
+        .join(Aisle, Aisle.id == Side.aisle_id)
+        .join(Module, Module.id == Aisle.module_id)
+        .where(scope_condition)
+        .where(tuple_(ShelfType.size_class_id, Shelf.owner_id).in_(groups))
+        .where(free_shelf_position_condition())
+        .cte("supply")
+    )
+
+
+def _assign(session, model, shelving_job_id, assignments):
+    if not assignments:
+        return 0
+
+    assignment_values = values(
+        column("container_id", BigInteger),
+        column("shelf_position_id", Integer),
+        name="assignment",
+    ).data(assignments)
+
+    result = session.execute(
+        update(model)
+        .where(model.id == assignment_values.c.container_id)
+        .values(
+            shelf_position_proposed_id=assignment_values.c.shelf_position_id,
+            shelving_job_id=shelving_job_id,
+        ),
+        execution_options={"synchronize_session": False},
+    )
+    return result.rowcount
+
+
+def allocate_shelf_positions(
+    session,
+    shelving_job_id,
+    building_id,
+    module_id=None,
+    aisle_id=None,
+    side_id=None,
+    ladder_id=None,
+    tray_ids=(),
+    non_tray_item_ids=(),
+):
+    """
+    Assigns a proposed shelf position and the shelving job to every
+    given tray and non tray item in one set-based pass.
+
+    Allocation is serialized per building with a transaction scoped
+    advisory lock, so concurrent shelving jobs can't be proposed the
+    same position. The lock is released on commit or rollback.
+
+    params:
+        - session is db session yielded in path operation
+        - tray_ids / non_tray_item_ids are the containers to place
+        - location id's narrow the search, most constrained wins
+
+    returns:
+        - Number of containers assigned
+        - Does not commit. Caller owns the transaction.
+
+    raises:
+        - NotFound if any (size_class, owner) group cannot be fully placed.
+          Nothing is assigned in that case.
+    """
+    tray_ids = list(tray_ids)
+    non_tray_item_ids = list(non_tray_item_ids)
+    if not tray_ids and not non_tray_item_ids:
+        return 0
+
+    session.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, :building_id)"),
+        {"namespace": SHELF_ALLOCATION_LOCK, "building_id": building_id},
+    )
+
+    demand = _container_demand(tray_ids, non_tray_item_ids)
+    supply = _position_supply(
+        demand,
+        get_location_scope_conditions(
+            building_id, module_id, aisle_id, side_id, ladder_id
+        ),
+    )
+
+    allocation_query = select(
+        demand.c.container_type,
+        demand.c.container_id,
+        supply.c.shelf_position_id,
+    ).join(
+        supply,
+        and_(
+            supply.c.size_class_id == demand.c.size_class_id,
+            supply.c.owner_id == demand.c.owner_id,
+            supply.c.rank == demand.c.rank,
+        ),
+    )
+
+    allocations = session.execute(allocation_query).all()
+
+    if len(allocations) < len(tray_ids) + len(non_tray_item_ids):
+        raise NotFound(
+            detail="Not enough empty shelf positions for containers with "
+            "size class and owner."
+        )
+
+    tray_assignments = [
+        (row.container_id, row.shelf_position_id)
+        for row in allocations
+        if row.container_type == "Tray"
+    ]
+    non_tray_assignments = [
+        (row.container_id, row.shelf_position_id)
+        for row in allocations
+        if row.container_type == "Non-Tray"
+    ]
+
+    return _assign(session, Tray, shelving_job_id, tray_assignments) + _assign(
+        session, NonTrayItem, shelving_job_id, non_tray_assignments
+    )
@@ -0,0 +1,258 @@
+import threading
+import time
+
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from sqlalchemy import String, any_, case, cast, event, func, inspect, literal
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session, aliased, object_session
+from sqlmodel import select
+
+from app.models.barcodes import Barcode
+from app.models.items import Item
+from app.models.non_tray_items import NonTrayItem
+from app.models.trays import Tray
+
+"""
+Resolves scanned barcode values to the container they identify.
+
+Scan paths used to look up the Barcode by value and then probe Item,
+NonTrayItem and Tray by barcode_id in turn. resolve_barcodes does all
+of it in one query, along with the status, tray and shelving state the
+scan checks need.
+
+Callers that only need what a barcode is, not its current state, can
+pass cached=True to be served from an in-process cache. Only trays and
+non tray items are cached. Items are always read, since their tray and
+its barcode are moved by bulk and raw SQL updates the cache can't see.
+
+Entries are dropped when a transaction that changed a barcode, tray or
+non tray item through the ORM in this process commits, including bulk
+query updates and deletes. Until then the changing session reads from
+the database and doesn't store what it loads. Other workers and raw
+SQL can't be seen, so entries also expire after BARCODE_CACHE_TTL
+seconds.
+"""
+
+BARCODE_CACHE_SIZE = 20000
+BARCODE_CACHE_TTL = 5
+# Entity types whose entries are stored in the cache
+CACHED_ENTITY_TYPES = ("Tray", "NonTrayItem")
+
+# session.info key of the barcode ids a session changed since its last
+# commit, ALL_BARCODES after a bulk update or delete
+PENDING_BARCODE_CHANGES = "barcode_resolution_changes"
+ALL_BARCODES = "*"
+
+
+class ResolvedBarcode(NamedTuple):
+    """
+    What a barcode value identifies. Items report their tray's
+    shelving, non tray items and trays their own.
+    """
+
+    value: str
+    barcode_id: object
+    withdrawn: bool
+    entity_type: Optional[str]
+    entity_id: Optional[int]
+    status: Optional[str]
+    tray_id: Optional[int]
+    tray_barcode_value: Optional[str]
+    shelf_position_id: Optional[int]
+    scanned_for_shelving: Optional[bool]
+    scanned_for_refile_queue: Optional[bool]
+
+
+def _resolution_query(barcode_values):
+    ItemTray = aliased(Tray)
+    ItemTrayBarcode = aliased(Barcode)
+    return (
+        select(
+            Barcode.value,
+            Barcode.id,
+            Barcode.withdrawn,
+            case(
+                (Item.id.isnot(None), "Item"),
+                (NonTrayItem.id.isnot(None), "NonTrayItem"),
+                (Tray.id.isnot(None), "Tray"),
+            ),
+            func.coalesce(Item.id, NonTrayItem.id, Tray.id),
+            func.coalesce(cast(Item.status, String), cast(NonTrayItem.status, String)),
+            func.coalesce(Item.tray_id, Tray.id),
+            ItemTrayBarcode.value,
+            func.coalesce(
+                ItemTray.shelf_position_id,
+                NonTrayItem.shelf_position_id,
+                Tray.shelf_position_id,
+            ),
+            func.coalesce(
+                ItemTray.scanned_for_shelving,
+                NonTrayItem.scanned_for_shelving,
+                Tray.scanned_for_shelving,
+            ),
+            func.coalesce(
+                Item.scanned_for_refile_queue, NonTrayItem.scanned_for_refile_queue
+            ),
+        )
+        .select_from(Barcode)
+        .outerjoin(Item, Item.barcode_id == Barcode.id)
+        .outerjoin(ItemTray, ItemTray.id == Item.tray_id)
+        .outerjoin(ItemTrayBarcode, ItemTrayBarcode.id == ItemTray.barcode_id)
+        .outerjoin(NonTrayItem, NonTrayItem.barcode_id == Barcode.id)
+        .outerjoin(Tray, Tray.barcode_id == Barcode.id)
+        .where(Barcode.value == any_(literal(list(barcode_values), ARRAY(String))))
+    )
+
+
+class BarcodeResolutionCache:
+    """
+    Thread safe LRU of barcode value -> ResolvedBarcode with a TTL.
+    Items, unknown and unassigned barcodes aren't cached.
+    """
+
+    def __init__(self, maxsize=BARCODE_CACHE_SIZE, ttl=BARCODE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._values = {}
+        self._lock = threading.Lock()
+        # bumped on invalidation, so loads that raced one aren't stored
+        self._generation = 0
+
+    def get_many(self, barcode_values, now):
+        found = {}
+        with self._lock:
+            for value in barcode_values:
+                entry = self._entries.get(value)
+                if entry and entry[0] > now:
+                    self._entries.move_to_end(value)
+                    found[value] = entry[1]
+            return found, self._generation
+
+    def put_many(self, resolved, now, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            expires = now + self.ttl
+            for value, barcode in resolved.items():
+                if barcode.entity_type not in CACHED_ENTITY_TYPES:
+                    continue
+                self._entries[value] = (expires, barcode)
+                self._entries.move_to_end(value)
+                self._values[barcode.barcode_id] = value
+            while len(self._entries) > self.maxsize:
+                _, (_, barcode) = self._entries.popitem(last=False)
+                self._values.pop(barcode.barcode_id, None)
+
+    def invalidate(self, barcode_id):
+        with self._lock:
+            self._generation += 1
+            value = self._values.pop(barcode_id, None)
+            if value is not None:
+                self._entries.pop(value, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._values.clear()
+
+
+barcode_resolution_cache = BarcodeResolutionCache()
+
+
+def resolve_barcodes(session, barcode_values, cached=False) -> dict:
+    """
+    params:
+        - session is db session yielded in path operation
+        - barcode_values to resolve
+        - cached serves entries from barcode_resolution_cache
+
+    returns:
+        - dict of barcode value -> ResolvedBarcode. Unknown values are left out.
+    """
+    barcode_values = set(barcode_values)
+    now = time.monotonic()
+    # this session's uncommitted barcode changes aren't cached, and cached
+    # entries may be out of date for this session
+    cached = cached and not session.info.get(PENDING_BARCODE_CHANGES)
+    found, generation = {}, None
+    if cached:
+        found, generation = barcode_resolution_cache.get_many(barcode_values, now)
+
+    missing = barcode_values - found.keys()
+    if not missing:
+        return found
+
+    loaded = {
+        row[0]: ResolvedBarcode(*row)
+        for row in session.execute(_resolution_query(missing))
+    }
+    found.update(loaded)
+    if cached:
+        barcode_resolution_cache.put_many(loaded, now, generation)
+
+    return found
+
+
+def resolve_barcode(session, barcode_value, cached=False) -> Optional[ResolvedBarcode]:
+    return resolve_barcodes(session, [barcode_value], cached).get(barcode_value)
+
+
+def _pending_changes(session):
+    return session.info.setdefault(PENDING_BARCODE_CHANGES, set())
+
+
+def _invalidate_barcode(mapper, connection, target):
+    _pending_changes(object_session(target)).add(target.id)
+
+
+def _invalidate_container_barcodes(mapper, connection, target):
+    # covers the barcode a container was moved off as well as its current one
+    state = inspect(target)
+    pending = _pending_changes(object_session(target))
+    for column in ("barcode_id", "withdrawn_barcode_id"):
+        for barcode_id in state.attrs[column].history.sum():
+            if barcode_id is not None:
+                pending.add(barcode_id)
+
+
+def _invalidate_bulk_changes(orm_execute_state):
+    # query.update and delete skip the mapper events and don't say which
+    # rows they touched
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if any(
+        mapper.class_ in (Barcode, NonTrayItem, Tray)
+        for mapper in orm_execute_state.all_mappers
+    ):
+        _pending_changes(orm_execute_state.session).add(ALL_BARCODES)
+
+
+def _apply_barcode_changes(session):
+    pending = session.info.pop(PENDING_BARCODE_CHANGES, None)
+    if not pending:
+        return
+    if ALL_BARCODES in pending:
+        barcode_resolution_cache.clear()
+        return
+    for barcode_id in pending:
+        barcode_resolution_cache.invalidate(barcode_id)
+
+
+def _discard_barcode_changes(session):
+    session.info.pop(PENDING_BARCODE_CHANGES, None)
+
+
+event.listen(Barcode, "after_update", _invalidate_barcode)
+event.listen(Barcode, "after_delete", _invalidate_barcode)
+
+for container_model in (Item, NonTrayItem, Tray):
+    event.listen(container_model, "after_insert", _invalidate_container_barcodes)
+    event.listen(container_model, "after_update", _invalidate_container_barcodes)
+    event.listen(container_model, "after_delete", _invalidate_container_barcodes)
+
+event.listen(Session, "do_orm_execute", _invalidate_bulk_changes)
+event.listen(Session, "after_commit", _apply_barcode_changes)
+event.listen(Session, "after_rollback", _discard_barcode_changes)
@@ -0,0 +1,475 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import String, cast, func, or_
+from sqlmodel import select
+
+from app.barcode_resolution import resolve_barcodes
+from app.models.barcodes import Barcode
+from app.models.item_withdrawals import ItemWithdrawal
+from app.models.items import Item
+from app.models.non_tray_Item_withdrawal import NonTrayItemWithdrawal
+from app.models.non_tray_items import NonTrayItem
+from app.models.pick_lists import PickList
+from app.models.refile_items import RefileItem
+from app.models.refile_jobs import RefileJob
+from app.models.refile_non_tray_items import RefileNonTrayItem
+from app.models.requests import Request
+from app.models.tray_withdrawal import TrayWithdrawal
+from app.models.verification_changes import VerificationChange
+from app.models.withdraw_jobs import WithdrawJob
+from app.utilities import INVALID_STATUSES
+
+"""
+Batch scans for withdraw, refile and verification jobs.
+
+The single scan endpoints take one barcode value and check existing
+jobs one container at a time. Handheld scanners send bursts, so these
+variants take a list of barcode values, resolve them all with one
+query, run each job check once for the whole list, and write with one
+statement per table. Each returns a result per barcode value rather
+than failing the batch on the first bad scan.
+"""
+
+ADDED = "Added"
+ERROR = "Error"
+
+
+def _ids(scanned, entity_type):
+    return [
+        barcode.entity_id
+        for barcode in scanned.values()
+        if barcode.entity_type == entity_type
+    ]
+
+
+def _unique(barcode_values):
+    return list(dict.fromkeys(barcode_values))
+
+
+def _added(detail=None, errors=None):
+    return {"status": ADDED, "detail": detail, "errors": errors}
+
+
+def _error(detail):
+    return {"status": ERROR, "detail": detail, "errors": None}
+
+
+def _touch(session, model, ids, values):
+    if ids:
+        session.query(model).filter(model.id.in_(ids)).update(
+            values, synchronize_session=False
+        )
+
+
+def batch_add_to_withdraw_job(session, withdraw_job, barcode_values):
+    """
+    Adds scanned items, non tray items and trays to a withdraw job, the
+    batch form of withdraw_jobs.add_items_to_withdraw_job. A tray brings
+    in each of its items that can be withdrawn. Doesn't commit.
+
+    returns:
+        - {barcode value: result}
+    """
+    update_dt = datetime.now(timezone.utc)
+    job_id = withdraw_job.id
+    barcode_values = _unique(barcode_values)
+    scanned = resolve_barcodes(session, barcode_values)
+
+    def in_open_job(withdrawal_model, column, container_id):
+        return (
+            select(withdrawal_model.id)
+            .join(WithdrawJob, WithdrawJob.id == withdrawal_model.withdraw_job_id)
+            .where(
+                column == container_id,
+                or_(WithdrawJob.id == job_id, WithdrawJob.status != "Completed"),
+            )
+            .exists()
+        )
+
+    open_items = set()
+    item_ids = _ids(scanned, "Item")
+    if item_ids:
+        open_items = set(
+            session.execute(
+                select(Item.id).where(
+                    Item.id.in_(item_ids),
+                    in_open_job(ItemWithdrawal, ItemWithdrawal.item_id, Item.id),
+                )
+            ).scalars()
+        )
+    open_non_tray_items = set()
+    non_tray_item_ids = _ids(scanned, "NonTrayItem")
+    if non_tray_item_ids:
+        open_non_tray_items = set(
+            session.execute(
+                select(NonTrayItem.id).where(
+                    NonTrayItem.id.in_(non_tray_item_ids),
+                    in_open_job(
+                        NonTrayItemWithdrawal,
+                        NonTrayItemWithdrawal.non_tray_item_id,
+                        NonTrayItem.id,
+                    ),
+                )
+            ).scalars()
+        )
+    tray_items = defaultdict(list)
+    scanned_tray_ids = _ids(scanned, "Tray")
+    if scanned_tray_ids:
+        for tray_id, item_id, status, value, in_job in session.execute(
+            select(
+                Item.tray_id,
+                Item.id,
+                cast(Item.status, String),
+                Barcode.value,
+                in_open_job(ItemWithdrawal, ItemWithdrawal.item_id, Item.id),
+            )
+            .join(Barcode, Barcode.id == Item.barcode_id)
+            .where(Item.tray_id.in_(scanned_tray_ids))
+            .order_by(Item.id)
+        ).all():
+            tray_items[tray_id].append((item_id, status, value, in_job))
+
+    results = {}
+    withdraw_item_ids = []
+    withdraw_non_tray_item_ids = []
+    withdraw_tray_ids = set()
+    for value in barcode_values:
+        barcode = scanned.get(value)
+        shelved = bool(
+            barcode and barcode.shelf_position_id and barcode.scanned_for_shelving
+        )
+        if not barcode:
+            results[value] = _error(f"Barcode {value} not found")
+        elif barcode.entity_type == "Item":
+            if barcode.status in INVALID_STATUSES:
+                results[value] = _error("Item must have status of ['In', 'Out']")
+            elif not shelved:
+                results[value] = _error("Item is not shelved")
+            elif barcode.entity_id in open_items:
+                results[value] = _error("Item is in existing withdraw job")
+            else:
+                withdraw_item_ids.append(barcode.entity_id)
+                withdraw_tray_ids.add(barcode.tray_id)
+                results[value] = _added()
+        elif barcode.entity_type == "NonTrayItem":
+            if not shelved:
+                results[value] = _error("Non Tray Item is not shelved")
+            elif barcode.status in INVALID_STATUSES:
+                results[value] = _error(
+                    "Non Tray Item must have status of ['In', 'Out']"
+                )
+            elif barcode.entity_id in open_non_tray_items:
+                results[value] = _error("Non Tray Item is in existing withdraw job")
+            else:
+                withdraw_non_tray_item_ids.append(barcode.entity_id)
+                results[value] = _added()
+        elif barcode.entity_type == "Tray":
+            items = tray_items.get(barcode.entity_id)
+            if not items:
+                results[value] = _error("Tray is empty")
+                continue
+            if not shelved:
+                results[value] = _error("Tray is not shelved")
+                continue
+            item_errors = []
+            added = 0
+            for item_id, status, item_value, in_job in items:
+                if status in INVALID_STATUSES:
+                    item_errors.append(
+                        {
+                            "barcode": item_value,
+                            "error": "Item must have status of ['In', 'Out']",
+                        }
+                    )
+                elif in_job:
+                    item_errors.append(
+                        {"barcode": item_value, "error": "Item is in existing withdraw job"}
+                    )
+                else:
+                    withdraw_item_ids.append(item_id)
+                    added += 1
+            if added:
+                withdraw_tray_ids.add(barcode.entity_id)
+                results[value] = _added(errors=item_errors or None)
+            else:
+                results[value] = {
+                    "status": ERROR,
+                    "detail": "No items in tray can be withdrawn",
+                    "errors": item_errors,
+                }
+        else:
+            results[value] = _error(
+                f"No Items or Tray Items with Barcode value {value} found"
+            )
+
+    # an item scanned alone and through its tray is only added once
+    withdraw_item_ids = _unique(withdraw_item_ids)
+    withdraw_tray_ids.discard(None)
+    if withdraw_tray_ids:
+        withdraw_tray_ids -= set(
+            session.execute(
+                select(TrayWithdrawal.tray_id).where(
+                    TrayWithdrawal.withdraw_job_id == job_id,
+                    TrayWithdrawal.tray_id.in_(list(withdraw_tray_ids)),
+                )
+            ).scalars()
+        )
+
+    session.bulk_save_objects(
+        [TrayWithdrawal(tray_id=tray_id, withdraw_job_id=job_id) for tray_id in withdraw_tray_ids]
+        + [
+            ItemWithdrawal(item_id=item_id, withdraw_job_id=job_id)
+            for item_id in withdraw_item_ids
+        ]
+        + [
+            NonTrayItemWithdrawal(non_tray_item_id=non_tray_item_id, withdraw_job_id=job_id)
+            for non_tray_item_id in withdraw_non_tray_item_ids
+        ]
+    )
+    _touch(session, Item, withdraw_item_ids, {"update_dt": update_dt})
+    _touch(session, NonTrayItem, withdraw_non_tray_item_ids, {"update_dt": update_dt})
+
+    return results
+
+
+def _open_refile_jobs(session, refile_model, column, ids):
+    """{container id: id of an uncompleted refile job holding it}"""
+    if not ids:
+        return {}
+    return dict(
+        session.execute(
+            select(column, func.min(RefileJob.id))
+            .join(RefileJob, RefileJob.id == refile_model.refile_job_id)
+            .where(column.in_(ids), RefileJob.status != "Completed")
+            .group_by(column)
+        ).all()
+    )
+
+
+def _open_pick_lists(session, column, ids):
+    """{container id: ids of uncompleted pick lists requesting it}"""
+    if not ids:
+        return {}
+    return dict(
+        session.execute(
+            select(column, func.array_agg(PickList.id.distinct()))
+            .join(PickList, PickList.id == Request.pick_list_id)
+            .where(column.in_(ids), PickList.status != "Completed")
+            .group_by(column)
+        ).all()
+    )
+
+
+def batch_add_to_refile_queue(session, barcode_values):
+    """
+    Queues scanned items and non tray items for refile, the batch form of
+    refile_queue.add_to_refile_queue. Doesn't commit.
+
+    returns:
+        - {barcode value: result}
+    """
+    update_dt = datetime.now(timezone.utc)
+    barcode_values = _unique(barcode_values)
+    scanned = resolve_barcodes(session, barcode_values)
+
+    item_ids = _ids(scanned, "Item")
+    non_tray_item_ids = _ids(scanned, "NonTrayItem")
+    refile_jobs = {
+        "Item": _open_refile_jobs(session, RefileItem, RefileItem.item_id, item_ids),
+        "NonTrayItem": _open_refile_jobs(
+            session,
+            RefileNonTrayItem,
+            RefileNonTrayItem.non_tray_item_id,
+            non_tray_item_ids,
+        ),
+    }
+    pick_lists = {
+        "Item": _open_pick_lists(session, Request.item_id, item_ids),
+        "NonTrayItem": _open_pick_lists(
+            session, Request.non_tray_item_id, non_tray_item_ids
+        ),
+    }
+
+    results = {}
+    queued = {"Item": [], "NonTrayItem": []}
+    for value in barcode_values:
+        barcode = scanned.get(value)
+        if not barcode:
+            results[value] = _error(f"Barcode value {value} not found")
+            continue
+        if barcode.withdrawn:
+            results[value] = _error("Item has already been withdrawn")
+            continue
+        if barcode.entity_type not in queued:
+            results[value] = _error(
+                f"No Items or Non Tray Items with Barcode value {value} found"
+            )
+            continue
+
+        label = "Item" if barcode.entity_type == "Item" else "Non Tray Item"
+        refile_job_id = refile_jobs[barcode.entity_type].get(barcode.entity_id)
+        pick_list_ids = pick_lists[barcode.entity_type].get(barcode.entity_id)
+        if barcode.status != "Out":
+            results[value] = _error("Item must be in 'Out' status")
+        elif barcode.scanned_for_refile_queue:
+            results[value] = _error("Item is already in the refile queue")
+        elif refile_job_id:
+            results[value] = _error(
+                f"{label} already exists in an uncompleted refile Job ID: "
+                f"{refile_job_id}"
+            )
+        elif pick_list_ids:
+            results[value] = _error(
+                f"{label} already exists in a uncompleted Pick List Job "
+                f"{sorted(pick_list_ids)}"
+            )
+        else:
+            queued[barcode.entity_type].append(barcode.entity_id)
+            results[value] = _added()
+
+    values = {
+        "scanned_for_refile_queue": True,
+        "scanned_for_refile_queue_dt": update_dt,
+        "scanned_for_refile": False,
+        "update_dt": update_dt,
+    }
+    _touch(session, Item, queued["Item"], values)
+    _touch(session, NonTrayItem, queued["NonTrayItem"], values)
+
+    return results
+
+
+def batch_add_to_refile_job(session, refile_job, barcode_values):
+    """
+    Adds scanned items and non tray items to a refile job, taking them off
+    the refile queue. Items already in an uncompleted refile job are
+    reported. Doesn't commit.
+
+    returns:
+        - {barcode value: result}
+    """
+    update_dt = datetime.now(timezone.utc)
+    barcode_values = _unique(barcode_values)
+    scanned = resolve_barcodes(session, barcode_values)
+
+    refile_jobs = {
+        "Item": _open_refile_jobs(
+            session, RefileItem, RefileItem.item_id, _ids(scanned, "Item")
+        ),
+        "NonTrayItem": _open_refile_jobs(
+            session,
+            RefileNonTrayItem,
+            RefileNonTrayItem.non_tray_item_id,
+            _ids(scanned, "NonTrayItem"),
+        ),
+    }
+
+    results = {}
+    added = {"Item": [], "NonTrayItem": []}
+    for value in barcode_values:
+        barcode = scanned.get(value)
+        if not barcode:
+            results[value] = _error(f"Barcode value {value} not found")
+        elif barcode.entity_type not in added:
+            results[value] = _error(
+                f"No Items or Non Tray Items with Barcode value {value} found"
+            )
+        elif barcode.entity_id in refile_jobs[barcode.entity_type]:
+            results[value] = _error(
+                "Already exists in an uncompleted refile Job ID: "
+                f"{refile_jobs[barcode.entity_type][barcode.entity_id]}"
+            )
+        else:
+            added[barcode.entity_type].append(barcode.entity_id)
+            results[value] = _added()
+
+    session.bulk_save_objects(
+        [
+            RefileItem(refile_job_id=refile_job.id, item_id=item_id)
+            for item_id in added["Item"]
+        ]
+        + [
+            RefileNonTrayItem(
+                refile_job_id=refile_job.id, non_tray_item_id=non_tray_item_id
+            )
+            for non_tray_item_id in added["NonTrayItem"]
+        ]
+    )
+    values = {
+        "scanned_for_refile_queue": False,
+        "scanned_for_refile_queue_dt": None,
+        "scanned_for_refile": False,
+        "scanned_for_refile_dt": None,
+        "update_dt": update_dt,
+    }
+    _touch(session, Item, added["Item"], values)
+    _touch(session, NonTrayItem, added["NonTrayItem"], values)
+
+    return results
+
+
+def batch_add_to_verification_job(session, verification_job, barcode_values):
+    """
+    Records an "Added" verification change for each scanned item and non
+    tray item, and for every item in each scanned tray, the batch form of
+    verification_jobs.add_item_to_verification_job. Doesn't commit.
+
+    returns:
+        - {barcode value: result}
+    """
+    barcode_values = _unique(barcode_values)
+    scanned = resolve_barcodes(session, barcode_values, cached=True)
+
+    tray_item_barcodes = defaultdict(list)
+    tray_ids = _ids(scanned, "Tray")
+    if tray_ids:
+        for tray_id, value in session.execute(
+            select(Item.tray_id, Barcode.value)
+            .join(Barcode, Barcode.id == Item.barcode_id)
+            .where(Item.tray_id.in_(tray_ids))
+            .order_by(Item.id)
+        ).all():
+            tray_item_barcodes[tray_id].append(value)
+
+    def change(tray_barcode_value, item_barcode_value):
+        return VerificationChange(
+            workflow_id=verification_job.workflow_id,
+            tray_barcode_value=tray_barcode_value,
+            item_barcode_value=item_barcode_value,
+            change_type="Added",
+            completed_by_id=verification_job.user_id,
+        )
+
+    results = {}
+    changes = []
+    for value in barcode_values:
+        barcode = scanned.get(value)
+        if not barcode:
+            results[value] = _error(f"Barcode with value {value} Not Found")
+        elif barcode.entity_type == "Tray":
+            changes.extend(
+                change(value, item_value)
+                for item_value in tray_item_barcodes.get(barcode.entity_id, [])
+            )
+            results[value] = _added()
+        elif barcode.entity_type == "Item":
+            changes.append(change(barcode.tray_barcode_value, value))
+            results[value] = _added()
+        elif barcode.entity_type == "NonTrayItem":
+            changes.append(change(None, value))
+            results[value] = _added()
+        else:
+            results[value] = _error(f"Item with barcode value {value} Not Found")
+
+    session.bulk_save_objects(changes)
+
+    return results
+
+
+def batch_scan_output(results):
+    return {
+        "results": results,
+        "added": sum(result["status"] == ADDED for result in results.values()),
+        "errored": sum(result["status"] == ERROR for result in results.values()),
+    }
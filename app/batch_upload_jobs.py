@@ -0,0 +1,583 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from typing import List
+
+import pandas as pd
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import update
+
+from app.config.config import get_settings
+from app.database.session import session_manager
+from app.location_import import import_location_management
+from app.logger import inventory_logger
+from app.models.barcodes import Barcode
+from app.models.batch_upload import BatchUpload, BatchUploadStatus
+from app.models.withdraw_jobs import WithdrawJob
+from app.schemas.batch_upload import LocationManagementSpreadSheetInput
+from app.utilities import (
+    validate_request_data,
+    process_request_data,
+    process_withdraw_job_data,
+)
+
+"""
+Batch upload jobs.
+
+Upload routes used to parse the spreadsheet and run every validation
+and write inside the async request handler, blocking the worker's
+event loop for the whole upload. Routes now persist a BatchUpload and
+hand the file to a small thread pool. The processors below update the
+upload's status, progress counters and row errors as they go, which
+clients poll on GET /batch-upload/{id}.
+
+Queued files only live in the worker process that received them. Each
+process touches the uploads it holds every heartbeat. Uploads still New
+or Processing that no process has touched within the stale timeout
+lost their worker to a crash or restart. They are marked Failed, on
+startup and on every heartbeat, and the file has to be uploaded again.
+"""
+
+INTERRUPTED_ERROR = (
+    "Upload was interrupted before it finished processing, "
+    "please upload the file again"
+)
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+REQUEST_DTYPES = {
+    "Item Barcode": str,
+    "External Request ID": str,
+    "Requestor Name": str,
+    "Request Type": str,
+    "Priority": str,
+    "Delivery Location": str,
+}
+
+WITHDRAW_DTYPES = {"Item Barcode": str, "Tray Barcode": str}
+
+LOCATION_MANAGEMENT_DTYPES = {
+    "Ladder Number": int,
+    "Ladder Sort Priority": int,
+    "Shelf Number": int,
+    "Shelf Sort Priority": int,
+    "Owner": str,
+    "Size Class": str,
+    "Container Type": str,
+    "Shelf Type": str,
+    "Width": float,
+    "Height": float,
+    "Depth": float,
+    "Shelf Barcode": str,
+}
+
+# csv columns may be blank, which int can't hold
+LOCATION_MANAGEMENT_CSV_DTYPES = {
+    **LOCATION_MANAGEMENT_DTYPES,
+    "Ladder Sort Priority": "Int64",
+    "Shelf Number": "Int64",
+    "Shelf Sort Priority": "Int64",
+}
+
+LOCATION_MANAGEMENT_COLUMNS = {
+    "Ladder Number": "ladder_number",
+    "Ladder Sort Priority": "ladder_sort_priority",
+    "Shelf Number": "shelf_number",
+    "Shelf Sort Priority": "shelf_sort_priority",
+    "Owner": "owner",
+    "Size Class": "size_class",
+    "Container Type": "container_type",
+    "Shelf Type": "shelf_type",
+    "Width": "width",
+    "Height": "height",
+    "Depth": "depth",
+    "Shelf Barcode": "shelf_barcode",
+}
+
+
+class BatchUploadFailed(Exception):
+    """Fails an upload, errors are recorded on its BatchUpload"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors if errors else [{"line": None, "error": message}]
+
+
+def upload_file_format(file_name, content_type):
+    """
+    returns:
+        - "xlsx", "csv", or None when the upload is neither
+    """
+    if file_name.endswith(".xlsx") or content_type == XLSX_CONTENT_TYPE:
+        return "xlsx"
+    if file_name.endswith(".csv") or content_type == "text/csv":
+        return "csv"
+    return None
+
+
+def read_upload(contents, file_format, dtype, csv_dtype=None):
+    if file_format == "xlsx":
+        return pd.read_excel(contents, dtype=dtype)
+    return pd.read_csv(StringIO(contents.decode("utf-8")), dtype=csv_dtype or dtype)
+
+
+def _write_batch_upload(batch_upload_id, session_factory=session_manager, **values):
+    """
+    Writes to the upload on its own transaction, so pollers see progress
+    while the processor's own work is still uncommitted.
+    """
+    with session_factory() as session:
+        session.execute(
+            update(BatchUpload)
+            .where(BatchUpload.id == batch_upload_id)
+            .values(update_dt=datetime.now(timezone.utc), **values)
+        )
+        session.commit()
+
+
+class BatchUploadProgress:
+    """Row counters for one upload, written every report_every rows"""
+
+    def __init__(self, batch_upload_id, report_every, session_factory=session_manager):
+        self.batch_upload_id = batch_upload_id
+        self.report_every = report_every
+        self.session_factory = session_factory
+        self.total = 0
+        self.processed = 0
+        self._reported = 0
+
+    def start(self, total_rows):
+        self.total = total_rows
+        _write_batch_upload(
+            self.batch_upload_id, self.session_factory, total_rows=total_rows
+        )
+
+    def advance(self, rows=1):
+        self.processed += rows
+        if (
+            self.processed - self._reported >= self.report_every
+            or self.processed >= self.total
+        ):
+            self._reported = self.processed
+            _write_batch_upload(
+                self.batch_upload_id,
+                self.session_factory,
+                processed_rows=self.processed,
+            )
+
+
+def process_request_upload(session, batch_upload, contents, file_format, progress):
+    """
+    Validates a request spreadsheet and creates its requests. Any row
+    error fails the whole upload.
+
+    returns:
+        - row errors
+    """
+    df = read_upload(contents, file_format, REQUEST_DTYPES)
+
+    if "Item Barcode" not in df.columns:
+        raise BatchUploadFailed("Excel file must contain a 'Item Barcode' column.")
+
+    df = df.dropna(subset=["Item Barcode"])
+    df.fillna(
+        {
+            "External Request ID": "",
+            "Priority": "",
+            "Requestor Name": "",
+            "Request Type": "",
+            "Delivery Location": "",
+        },
+        inplace=True,
+    )
+    df["Item Barcode"] = df["Item Barcode"].astype(str)
+    progress.start(len(df))
+
+    validated_df, errored_df, errors = validate_request_data(session, df)
+    progress.advance(len(df))
+
+    if errors.get("errors"):
+        raise BatchUploadFailed(
+            f"Unable to process Request batch upload ID: {batch_upload.id}",
+            errors.get("errors"),
+        )
+    if validated_df.empty:
+        raise BatchUploadFailed(
+            f"Unable to process Request batch upload ID: {batch_upload.id}"
+        )
+
+    request_df, request_instances = process_request_data(
+        session, validated_df, batch_upload.id, batch_upload.user_id
+    )
+    session.bulk_save_objects(request_instances)
+    session.commit()
+
+    return []
+
+
+def process_withdraw_upload(session, batch_upload, contents, file_format, progress):
+    """
+    Adds the spreadsheet's items, non tray items and trays to the upload's
+    withdraw job. Rows that can't be withdrawn are reported without
+    failing the rest.
+
+    returns:
+        - row errors
+    """
+    df = read_upload(contents, file_format, WITHDRAW_DTYPES)
+
+    if "Item Barcode" not in df.columns and "Tray Barcode" not in df.columns:
+        raise BatchUploadFailed(
+            "Batch file must contain a 'Item Barcode' or 'Tray Barcode' columns."
+        )
+
+    # Remove rows with NaN values in 'Item Barcode' and 'Tray Barcode'
+    df = df.dropna(
+        subset=[
+            column for column in ("Item Barcode", "Tray Barcode") if column in df.columns
+        ],
+        how="all",
+    )
+    progress.start(len(df))
+
+    withdraw_job = session.get(WithdrawJob, batch_upload.withdraw_job_id)
+    if not withdraw_job:
+        raise BatchUploadFailed(
+            f"Withdraw job id {batch_upload.withdraw_job_id} not found"
+        )
+
+    # Drop NaN and empty string values
+    item_df = df["Item Barcode"].replace("", pd.NA).dropna()
+    item_df.reset_index(drop=True, inplace=True)
+    item_df = pd.DataFrame(item_df)
+    item_df.rename(columns={"Item Barcode": "Barcode"}, inplace=True)
+
+    lookup_barcode_values = []
+    if not item_df["Barcode"].empty:
+        lookup_barcode_values.extend(item_df["Barcode"].astype(str).tolist())
+
+    invalid_message = (
+        "All barcodes are invalid to process bulk withdraw upload. "
+        "Please check your barcodes and try again."
+    )
+    if not lookup_barcode_values:
+        raise BatchUploadFailed(invalid_message)
+
+    lookup_barcode_values = list(set(lookup_barcode_values))
+    barcodes = (
+        session.query(Barcode).filter(Barcode.value.in_(lookup_barcode_values)).all()
+    )
+
+    found_barcodes = set(barcode.value for barcode in barcodes)
+    missing_barcodes = set(lookup_barcode_values) - found_barcodes
+
+    errors = []
+    for barcode in missing_barcodes:
+        index = item_df.index[item_df["Barcode"] == barcode].tolist()
+        if index:
+            errors.append(
+                {"line": index[0] + 1, "error": f"Barcode value {barcode} not found"}
+            )
+
+    if not barcodes:
+        raise BatchUploadFailed(invalid_message, errors)
+
+    (
+        withdraw_items,
+        withdraw_non_tray_items,
+        withdraw_trays,
+        errored_barcodes_from_processing,
+    ) = process_withdraw_job_data(session, withdraw_job.id, barcodes, df)
+    errors.extend(errored_barcodes_from_processing.get("errors", []))
+    progress.advance(len(df))
+
+    if not withdraw_items and not withdraw_non_tray_items and not withdraw_trays:
+        raise BatchUploadFailed(invalid_message, errors)
+
+    if withdraw_trays:
+        session.bulk_save_objects(withdraw_trays)
+    if withdraw_items:
+        session.bulk_save_objects(withdraw_items)
+    if withdraw_non_tray_items:
+        session.bulk_save_objects(withdraw_non_tray_items)
+    session.commit()
+
+    return errors
+
+
+def process_location_management_upload(
+    session, batch_upload, contents, file_format, progress, side_id
+):
+    """
+    Creates the spreadsheet's ladders, shelves and shelf positions on a
+    side. Any row error fails the whole upload.
+
+    returns:
+        - row errors
+    """
+    df = read_upload(
+        contents,
+        file_format,
+        LOCATION_MANAGEMENT_DTYPES,
+        csv_dtype=LOCATION_MANAGEMENT_CSV_DTYPES,
+    )
+    df.rename(columns=LOCATION_MANAGEMENT_COLUMNS, inplace=True)
+    progress.start(len(df))
+
+    # Validate the data from dataframe using pydantic TypeAdapter
+    try:
+        location_hierarchy_adapter = TypeAdapter(
+            List[LocationManagementSpreadSheetInput]
+        )
+        location_hierarchy_adapter.validate_json(df.to_json(orient="records"))
+    except ValidationError as e:
+        raise BatchUploadFailed(
+            "Spreadsheet failed validation",
+            [
+                {
+                    "line": int(err["loc"][0]) + 1,
+                    "error": f"{'.'.join(str(loc) for loc in err['loc'][1:])}: "
+                    f"{err['msg']}",
+                }
+                for err in e.errors()
+            ],
+        )
+
+    errors = import_location_management(session, df, side_id)
+    progress.advance(len(df))
+    if errors:
+        raise BatchUploadFailed("Spreadsheet rows failed validation", errors)
+
+    session.commit()
+
+    return []
+
+
+def fail_interrupted_uploads(stale_seconds, session_factory=session_manager):
+    """
+    Fails New and Processing uploads no worker has touched in stale_seconds,
+    their worker stopped before finishing them.
+
+    returns:
+        - number of uploads failed
+    """
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=stale_seconds)
+    with session_factory() as session:
+        result = session.execute(
+            update(BatchUpload)
+            .where(
+                BatchUpload.status.in_(
+                    [BatchUploadStatus.New, BatchUploadStatus.Processing]
+                ),
+                BatchUpload.update_dt < stale_before,
+            )
+            .values(
+                status=BatchUploadStatus.Failed,
+                errors=[{"line": None, "error": INTERRUPTED_ERROR}],
+                update_dt=datetime.now(timezone.utc),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+
+    if result.rowcount:
+        inventory_logger.warning(
+            f"Failed {result.rowcount} batch uploads interrupted by a worker restart"
+        )
+    return result.rowcount
+
+
+class BatchUploadJobs:
+    """
+    Thread pool running upload processors. Queue depth and outcomes are
+    surfaced on /status/batch-uploads. session_factory opens the sessions
+    processors and status writes run on.
+
+    Once started, a heartbeat thread touches the uploads this process has
+    queued or running and fails those interrupted in other processes.
+    """
+
+    def __init__(
+        self,
+        workers,
+        report_every,
+        session_factory=session_manager,
+        heartbeat_seconds=0,
+        stale_seconds=0,
+    ):
+        self.workers = workers
+        self.report_every = report_every
+        self.session_factory = session_factory
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._executor = None
+        self._stopping = False
+        self._stopped = threading.Event()
+        self._heartbeat_thread = None
+        # ids of the uploads queued or running in this process
+        self._held = set()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def submit(self, batch_upload_id, processor, contents, file_format, **params):
+        """Queues processor for an upload already committed with status New"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="batch_upload"
+                )
+            self.queued += 1
+            self._held.add(batch_upload_id)
+            self._executor.submit(
+                self._run, batch_upload_id, processor, contents, file_format, params
+            )
+
+    def _run(self, batch_upload_id, processor, contents, file_format, params):
+        try:
+            self._process(batch_upload_id, processor, contents, file_format, params)
+        finally:
+            with self._lock:
+                self._held.discard(batch_upload_id)
+
+    def _process(self, batch_upload_id, processor, contents, file_format, params):
+        with self._lock:
+            self.queued -= 1
+            if self._stopping:
+                self.cancelled += 1
+            else:
+                self.running += 1
+        if self._stopping:
+            _write_batch_upload(
+                batch_upload_id,
+                self.session_factory,
+                status=BatchUploadStatus.Cancelled,
+            )
+            return
+
+        progress = BatchUploadProgress(
+            batch_upload_id, self.report_every, self.session_factory
+        )
+        status = BatchUploadStatus.Completed
+        try:
+            _write_batch_upload(
+                batch_upload_id,
+                self.session_factory,
+                status=BatchUploadStatus.Processing,
+            )
+            with self.session_factory() as session:
+                batch_upload = session.get(BatchUpload, batch_upload_id)
+                errors = processor(
+                    session, batch_upload, contents, file_format, progress, **params
+                )
+        except BatchUploadFailed as e:
+            status = BatchUploadStatus.Failed
+            errors = e.errors
+        except Exception as e:
+            inventory_logger.error(f"Batch Upload {batch_upload_id} Error: {e}")
+            status = BatchUploadStatus.Failed
+            errors = [{"line": None, "error": f"Internal Server Error: {e}"}]
+
+        errored_lines = {
+            error.get("line") for error in errors if error.get("line") is not None
+        }
+        try:
+            _write_batch_upload(
+                batch_upload_id,
+                self.session_factory,
+                status=status,
+                processed_rows=progress.processed,
+                errored_rows=len(errored_lines),
+                errors=errors or None,
+            )
+        except Exception as e:
+            inventory_logger.error(
+                f"Batch Upload {batch_upload_id} status update failed: {e}"
+            )
+
+        with self._lock:
+            self.running -= 1
+            if status == BatchUploadStatus.Completed:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def start(self):
+        """
+        Fails uploads interrupted before this process started, then keeps
+        doing so every heartbeat while touching the uploads held here.
+        """
+        if not self.heartbeat_seconds or (
+            self._heartbeat_thread and self._heartbeat_thread.is_alive()
+        ):
+            return
+        self._stopped.clear()
+        self._heartbeat_thread = threading.Thread(
+            target=self._run_heartbeat, name="batch_upload_heartbeat", daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    def _run_heartbeat(self):
+        while True:
+            try:
+                self.heartbeat()
+            except Exception as e:
+                inventory_logger.error(f"Batch upload heartbeat failed: {e}")
+            if self._stopped.wait(self.heartbeat_seconds):
+                return
+
+    def heartbeat(self):
+        """Touches the uploads held here, then fails stale ones"""
+        with self._lock:
+            held = list(self._held)
+        if held:
+            with self.session_factory() as session:
+                session.execute(
+                    update(BatchUpload)
+                    .where(
+                        BatchUpload.id.in_(held),
+                        BatchUpload.status.in_(
+                            [BatchUploadStatus.New, BatchUploadStatus.Processing]
+                        ),
+                    )
+                    .values(update_dt=datetime.now(timezone.utc))
+                    .execution_options(synchronize_session=False)
+                )
+                session.commit()
+        if not self.stale_seconds:
+            return 0
+        return fail_interrupted_uploads(self.stale_seconds, self.session_factory)
+
+    def shutdown(self):
+        """Cancels queued uploads and waits for running ones, used on shutdown"""
+        self._stopped.set()
+        with self._lock:
+            self._stopping = True
+            executor = self._executor
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+            }
+
+
+batch_upload_jobs = BatchUploadJobs(
+    get_settings().BATCH_UPLOAD_WORKERS,
+    get_settings().BATCH_UPLOAD_PROGRESS_ROWS,
+    heartbeat_seconds=get_settings().BATCH_UPLOAD_HEARTBEAT_SECONDS,
+    stale_seconds=get_settings().BATCH_UPLOAD_STALE_SECONDS,
+)
@@ -0,0 +1,65 @@
+from typing import AsyncGenerator
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config.config import get_settings
+
+"""
+Async database path for hot read endpoints.
+
+Sync routes run in the AnyIO threadpool, so their throughput is capped by
+its thread count. Routes depending on get_async_session run on the event
+loop through asyncpg instead. This sits alongside the sync engine, with
+its own, smaller pool sized by DB_ASYNC_POOL_SIZE and DB_ASYNC_MAX_OVERFLOW
+that counts towards each worker's connections on top of the sync pool.
+"""
+
+
+def _async_database_url():
+    return make_url(get_settings().DATABASE_URL).set(drivername="postgresql+asyncpg")
+
+
+def _async_engine_connect_args():
+    if not get_settings().DB_STATEMENT_TIMEOUT:
+        return {}
+    return {
+        "server_settings": {
+            "statement_timeout": str(get_settings().DB_STATEMENT_TIMEOUT)
+        }
+    }
+
+
+async_engine = create_async_engine(
+    _async_database_url(),
+    echo=get_settings().ENABLE_ORM_SQL_LOGGING,
+    pool_size=get_settings().DB_ASYNC_POOL_SIZE,
+    max_overflow=get_settings().DB_ASYNC_MAX_OVERFLOW,
+    pool_timeout=get_settings().DB_POOL_TIMEOUT,
+    pool_recycle=get_settings().DB_POOL_RECYCLE,
+    pool_pre_ping=get_settings().DB_POOL_PRE_PING,
+    connect_args=_async_engine_connect_args(),
+)
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(
+        async_engine, autoflush=False, expire_on_commit=False
+    ) as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def to_response(session: AsyncSession, response_model, instance):
+    """
+    Validates instance against its response model on the session's sync
+    side, so relationships the schema nests are lazy loaded as they would
+    be on the sync path instead of raising under asyncio.
+    """
+    return await session.run_sync(
+        lambda _: response_model.model_validate(instance, from_attributes=True)
+    )
@@ -1,13 +1,91 @@
+import threading
+import time
+
 from sqlmodel import create_engine, Session
+from sqlalchemy.exc import TimeoutError as SATimeoutError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlmodel import text
 from fastapi import Request
 
 from contextlib import contextmanager
 from app.config.config import get_settings
 
+class PoolMetrics:
+    """
+    Checkout wait times for the request engine's pool.
+    Surfaced with the pool's own counters on /status/pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+
+    def record(self, wait, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+
+    def snapshot(self, pool):
+        with self._lock:
+            return {
+                "pool_size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "in_use": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "checkout_wait_avg_ms": (
+                    self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0
+                ),
+                "checkout_wait_max_ms": self.wait_max * 1000,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except SATimeoutError:
+            pool_metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record(time.perf_counter() - start)
+        return connection
+
+
+def _request_engine_connect_args():
+    if not get_settings().DB_STATEMENT_TIMEOUT:
+        return {}
+    return {"options": f"-c statement_timeout={get_settings().DB_STATEMENT_TIMEOUT}"}
+
+
 engine = create_engine(
-    get_settings().DATABASE_URL, echo=get_settings().ENABLE_ORM_SQL_LOGGING
+    get_settings().DATABASE_URL,
+    echo=get_settings().ENABLE_ORM_SQL_LOGGING,
+    poolclass=InstrumentedQueuePool,
+    pool_size=get_settings().DB_POOL_SIZE,
+    max_overflow=get_settings().DB_MAX_OVERFLOW,
+    pool_timeout=get_settings().DB_POOL_TIMEOUT,
+    pool_recycle=get_settings().DB_POOL_RECYCLE,
+    pool_pre_ping=get_settings().DB_POOL_PRE_PING,
+    connect_args=_request_engine_connect_args(),
 )
 
 data_migration_engine = create_engine(
@@ -0,0 +1,59 @@
+import csv
+
+from io import StringIO
+from fastapi.responses import StreamingResponse
+
+"""
+Streaming csv exports.
+
+Rows are read through a server side cursor (yield_per) and written out a
+chunk at a time, so an export holds one chunk in memory no matter how
+many rows it has. Queries should select plain columns, not entities, so
+nothing is lazy loaded per row.
+"""
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def stream_csv(session, query, header=None, row_values=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yields csv text for query, one chunk of rows at a time.
+
+    params:
+        - session is db session yielded in path operation
+        - query is a column select
+        - header defaults to the query's column names
+        - row_values maps a result row to the values written, defaults to the row
+
+    returns:
+        - generator of csv strings
+    """
+    output = StringIO()
+    writer = csv.writer(output)
+
+    result = session.execute(query, execution_options={"yield_per": chunk_size})
+    try:
+        writer.writerow(header or list(result.keys()))
+        for rows in result.partitions(chunk_size):
+            if row_values:
+                writer.writerows(row_values(row) for row in rows)
+            else:
+                writer.writerows(rows)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+
+        # header only exports
+        if output.tell():
+            yield output.getvalue()
+    finally:
+        result.close()
+
+
+def csv_response(session, query, filename, header=None, row_values=None):
+    """StreamingResponse of stream_csv as a file attachment."""
+    return StreamingResponse(
+        stream_csv(session, query, header=header, row_values=row_values),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -0,0 +1,243 @@
+import threading
+import time
+
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from sqlmodel import select
+
+from app.models.aisle_numbers import AisleNumber
+from app.models.aisles import Aisle
+from app.models.buildings import Building
+from app.models.ladder_numbers import LadderNumber
+from app.models.ladders import Ladder
+from app.models.modules import Module
+from app.models.shelf_numbers import ShelfNumber
+from app.models.shelves import Shelf
+from app.models.side_orientations import SideOrientation
+from app.models.sides import Side
+
+"""
+In-process cache of the location hierarchy above each shelf.
+
+Walking shelf -> ladder -> side -> aisle -> module -> building costs a
+query or lazy load per level. Entries here hold the ids, numbers and
+sort priorities of every level keyed by shelf id, so resolving a
+container's building or walk order key is one lookup.
+
+Entries are dropped when a transaction that updated or deleted a
+location through the ORM in this process commits. Until then the
+session that made the change reads those shelves from the database and
+doesn't store what it loads, so uncommitted or rolled back locations are
+never cached. Other workers can't see any of this, so entries also
+expire after LOCATION_CACHE_TTL seconds.
+"""
+
+LOCATION_CACHE_SIZE = 20000
+LOCATION_CACHE_TTL = 300
+
+# session.info key of the shelf ids a session changed since its last
+# commit, ALL_SHELVES when any other location level changed
+PENDING_LOCATION_CHANGES = "location_hierarchy_changes"
+ALL_SHELVES = "*"
+
+
+class LocationHierarchy(NamedTuple):
+    building_id: int
+    building_name: Optional[str]
+    module_id: int
+    module_number: str
+    aisle_id: int
+    aisle_number: int
+    aisle_sort_priority: Optional[int]
+    side_id: int
+    side_orientation: str
+    ladder_id: int
+    ladder_number: int
+    ladder_sort_priority: Optional[int]
+    shelf_id: int
+    shelf_number: int
+    shelf_sort_priority: Optional[int]
+
+    @property
+    def sort_key(self):
+        """(aisle, ladder, shelf) priority, falling back to location numbers."""
+        return (
+            self.aisle_sort_priority or self.aisle_number,
+            self.ladder_sort_priority or self.ladder_number,
+            self.shelf_sort_priority or self.shelf_number,
+        )
+
+
+def _hierarchy_query(shelf_ids):
+    return (
+        select(
+            Building.id,
+            Building.name,
+            Module.id,
+            Module.module_number,
+            Aisle.id,
+            AisleNumber.number,
+            Aisle.sort_priority,
+            Side.id,
+            SideOrientation.name,
+            Ladder.id,
+            LadderNumber.number,
+            Ladder.sort_priority,
+            Shelf.id,
+            ShelfNumber.number,
+            Shelf.sort_priority,
+        )
+        .join(ShelfNumber, ShelfNumber.id == Shelf.shelf_number_id)
+        .join(Ladder, Ladder.id == Shelf.ladder_id)
+        .join(LadderNumber, LadderNumber.id == Ladder.ladder_number_id)
+        .join(Side, Side.id == Ladder.side_id)
+        .join(SideOrientation, SideOrientation.id == Side.side_orientation_id)
+        .join(Aisle, Aisle.id == Side.aisle_id)
+        .join(AisleNumber, AisleNumber.id == Aisle.aisle_number_id)
+        .join(Module, Module.id == Aisle.module_id)
+        .join(Building, Building.id == Module.building_id)
+        .where(Shelf.id.in_(shelf_ids))
+    )
+
+
+class LocationHierarchyCache:
+    """
+    Thread safe LRU of shelf id -> LocationHierarchy with a TTL.
+    Misses are loaded together in one query.
+    """
+
+    def __init__(self, maxsize=LOCATION_CACHE_SIZE, ttl=LOCATION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped on clear, so loads that raced an invalidation aren't stored
+        self._generation = 0
+
+    def get(self, session, shelf_id) -> Optional[LocationHierarchy]:
+        return self.get_many(session, [shelf_id]).get(shelf_id)
+
+    def get_many(self, session, shelf_ids) -> dict:
+        """
+        params:
+            - session is db session yielded in path operation
+            - shelf_ids to resolve
+
+        returns:
+            - dict of shelf id -> LocationHierarchy. Unknown shelves are left out.
+        """
+        now = time.monotonic()
+        found = {}
+        missing = []
+        # this session's uncommitted location changes aren't cached, and
+        # cached entries for them are out of date for this session
+        pending = session.info.get(PENDING_LOCATION_CHANGES)
+
+        with self._lock:
+            generation = self._generation
+            for shelf_id in set(shelf_ids):
+                entry = self._entries.get(shelf_id)
+                if pending and (ALL_SHELVES in pending or shelf_id in pending):
+                    missing.append(shelf_id)
+                elif entry and entry[0] > now:
+                    self._entries.move_to_end(shelf_id)
+                    found[shelf_id] = entry[1]
+                else:
+                    missing.append(shelf_id)
+
+        if not missing:
+            return found
+
+        loaded = {}
+        for row in session.execute(_hierarchy_query(missing)):
+            hierarchy = LocationHierarchy(*row)
+            loaded[hierarchy.shelf_id] = hierarchy
+        found.update(loaded)
+
+        with self._lock:
+            if not pending and generation == self._generation:
+                expires = now + self.ttl
+                for shelf_id, hierarchy in loaded.items():
+                    self._entries[shelf_id] = (expires, hierarchy)
+                    self._entries.move_to_end(shelf_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return found
+
+    def invalidate(self, shelf_id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(shelf_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+location_hierarchy_cache = LocationHierarchyCache()
+
+
+# Columns of a shelf that feed its hierarchy entry. Other shelf updates,
+# e.g. available_space, leave the cache alone.
+SHELF_HIERARCHY_COLUMNS = ("ladder_id", "shelf_number_id", "sort_priority")
+
+
+def _pending_changes(target):
+    return object_session(target).info.setdefault(PENDING_LOCATION_CHANGES, set())
+
+
+def _clear_location_hierarchy(mapper, connection, target):
+    _pending_changes(target).add(ALL_SHELVES)
+
+
+def _invalidate_shelf_hierarchy(mapper, connection, target):
+    state = inspect(target)
+    if any(
+        state.attrs[column].history.has_changes()
+        for column in SHELF_HIERARCHY_COLUMNS
+    ):
+        _pending_changes(target).add(target.id)
+
+
+def _drop_shelf_hierarchy(mapper, connection, target):
+    _pending_changes(target).add(target.id)
+
+
+def _apply_location_changes(session):
+    pending = session.info.pop(PENDING_LOCATION_CHANGES, None)
+    if not pending:
+        return
+    if ALL_SHELVES in pending:
+        location_hierarchy_cache.clear()
+        return
+    for shelf_id in pending:
+        location_hierarchy_cache.invalidate(shelf_id)
+
+
+def _discard_location_changes(session):
+    session.info.pop(PENDING_LOCATION_CHANGES, None)
+
+
+for location_model in (
+    Building,
+    Module,
+    Aisle,
+    AisleNumber,
+    Side,
+    SideOrientation,
+    Ladder,
+    LadderNumber,
+    ShelfNumber,
+):
+    event.listen(location_model, "after_update", _clear_location_hierarchy)
+    event.listen(location_model, "after_delete", _clear_location_hierarchy)
+
+event.listen(Shelf, "after_update", _invalidate_shelf_hierarchy)
+event.listen(Shelf, "after_delete", _drop_shelf_hierarchy)
+
+event.listen(Session, "after_commit", _apply_location_changes)
+event.listen(Session, "after_rollback", _discard_location_changes)
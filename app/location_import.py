@@ -0,0 +1,405 @@
+import re
+
+import pandas as pd
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.aisle_numbers import AisleNumber
+from app.models.aisles import Aisle
+from app.models.barcode_types import BarcodeType
+from app.models.barcodes import Barcode
+from app.models.buildings import Building
+from app.models.container_types import ContainerType
+from app.models.ladder_numbers import LadderNumber
+from app.models.ladders import Ladder
+from app.models.modules import Module
+from app.models.owners import Owner
+from app.models.shelf_numbers import ShelfNumber
+from app.models.shelf_position_numbers import ShelfPositionNumber
+from app.models.shelf_positions import ShelfPosition
+from app.models.shelf_types import ShelfType
+from app.models.shelves import Shelf
+from app.models.side_orientations import SideOrientation
+from app.models.sides import Side
+from app.models.size_class import SizeClass
+from app.utilities import start_session_with_audit_info
+
+"""
+Set-based location management spreadsheet import.
+
+The import used to query every lookup table per row, commit each new
+ladder and number on its own, select a position number per position
+per shelf, and let the Shelf and ShelfPosition after_insert listeners
+re-read the hierarchy to build each location string.
+
+Here lookups are read into dicts once, every row is validated in
+memory, and nothing is written unless the whole sheet is valid. Numbers
+and ladders are upserted with ON CONFLICT. Shelf and position ids are
+drawn from their sequences up front, so location and internal_location
+are built in Python and each table is written with multi-row INSERTs.
+Positions fill available_space through the shelf_positions triggers.
+"""
+
+# rows per INSERT statement
+LOCATION_IMPORT_CHUNK_SIZE = 5000
+
+SYSTEM_AUDIT_INFO = {"name": "System", "id": "0"}
+
+
+def _value(value):
+    """Spreadsheet cell as a plain python value, blanks as None"""
+    if value is None or pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _int(value):
+    """Whole number cell as an int, columns with blanks load as floats"""
+    return None if value is None else int(value)
+
+
+def _chunks(rows):
+    for start in range(0, len(rows), LOCATION_IMPORT_CHUNK_SIZE):
+        yield rows[start:start + LOCATION_IMPORT_CHUNK_SIZE]
+
+
+def _side_address(session, side_id):
+    return session.execute(
+        select(
+            Building.id.label("building_id"),
+            Building.name.label("building_name"),
+            Module.id.label("module_id"),
+            Module.module_number,
+            Aisle.id.label("aisle_id"),
+            AisleNumber.number.label("aisle_number"),
+            SideOrientation.name.label("side_orientation"),
+        )
+        .select_from(Side)
+        .join(SideOrientation, SideOrientation.id == Side.side_orientation_id)
+        .join(Aisle, Aisle.id == Side.aisle_id)
+        .join(AisleNumber, AisleNumber.id == Aisle.aisle_number_id)
+        .join(Module, Module.id == Aisle.module_id)
+        .join(Building, Building.id == Module.building_id)
+        .where(Side.id == side_id)
+    ).one_or_none()
+
+
+def _lookup(session, key_column, value_column, keys):
+    if not keys:
+        return {}
+    return dict(
+        session.execute(
+            select(key_column, value_column).where(key_column.in_(list(keys)))
+        ).all()
+    )
+
+
+def _upsert_numbers(session, model, numbers):
+    """
+    Inserts any of numbers missing from a ladder, shelf or shelf position
+    number table.
+
+    returns:
+        - {number: id} for every number
+    """
+    if not numbers:
+        return {}
+    session.execute(
+        pg_insert(model)
+        .values([{"number": number} for number in sorted(numbers)])
+        .on_conflict_do_nothing(index_elements=["number"])
+    )
+    return _lookup(session, model.number, model.id, numbers)
+
+
+def _next_ids(session, table_name, count):
+    """Draws count ids from a table's id sequence"""
+    if not count:
+        return []
+    return session.execute(
+        select(func.nextval(func.pg_get_serial_sequence(table_name, "id")))
+        .select_from(func.generate_series(1, count))
+    ).scalars().all()
+
+
+def import_location_management(session, df, side_id):
+    """
+    Creates the ladders, shelves, shelf barcodes and shelf positions of a
+    location management sheet on a side. df has the snake_case column
+    names of LocationManagementSpreadSheetInput. Writes nothing if any
+    row is invalid, and doesn't commit.
+
+    returns:
+        - row errors
+    """
+    address = _side_address(session, side_id)
+    if not address:
+        return [{"line": None, "error": f"Side ID {side_id} not found"}]
+
+    rows = [
+        (int(index) + 1, {key: _value(value) for key, value in record.items()})
+        for index, record in zip(df.index, df.to_dict("records"))
+    ]
+    shelf_rows = [row for line, row in rows if row.get("shelf_number") is not None]
+
+    owners = _lookup(
+        session, Owner.name, Owner.id, {row.get("owner") for row in shelf_rows}
+    )
+    container_types = _lookup(
+        session,
+        ContainerType.type,
+        ContainerType.id,
+        {row.get("container_type") for row in shelf_rows},
+    )
+    size_class_names = {row.get("size_class") for row in shelf_rows}
+    size_classes = _lookup(session, SizeClass.name, SizeClass.id, size_class_names)
+    shelf_types = {}
+    if size_class_names:
+        shelf_types = {
+            (size_class, shelf_type): (shelf_type_id, max_capacity)
+            for shelf_type_id, shelf_type, max_capacity, size_class in session.execute(
+                select(
+                    ShelfType.id, ShelfType.type, ShelfType.max_capacity, SizeClass.name
+                )
+                .join(SizeClass, SizeClass.id == ShelfType.size_class_id)
+                .where(SizeClass.name.in_(list(size_class_names)))
+            ).all()
+        }
+    existing_shelves = set(
+        session.execute(
+            select(LadderNumber.number, ShelfNumber.number)
+            .select_from(Shelf)
+            .join(Ladder, Ladder.id == Shelf.ladder_id)
+            .join(LadderNumber, LadderNumber.id == Ladder.ladder_number_id)
+            .join(ShelfNumber, ShelfNumber.id == Shelf.shelf_number_id)
+            .where(Ladder.side_id == side_id)
+        ).all()
+    )
+    barcode_values = {
+        row["shelf_barcode"] for row in shelf_rows if row.get("shelf_barcode")
+    }
+    existing_barcodes = set(
+        _lookup(session, Barcode.value, Barcode.id, barcode_values)
+    )
+    shelf_barcode_type = None
+    if barcode_values:
+        shelf_barcode_type = session.execute(
+            select(BarcodeType.id, BarcodeType.allowed_pattern).where(
+                BarcodeType.name == "Shelf"
+            )
+        ).one_or_none()
+
+    errors = []
+    ladders = {}
+    shelves = []
+    for line, row in rows:
+        ladder_number = _int(row.get("ladder_number"))
+        if not ladder_number:
+            errors.append({"line": line, "error": "Ladder Number is required"})
+            continue
+        # the first row of a ladder sets its sort priority
+        ladders.setdefault(ladder_number, _int(row.get("ladder_sort_priority")))
+
+        shelf_number = _int(row.get("shelf_number"))
+        if shelf_number is None:
+            continue
+
+        if row.get("owner") not in owners:
+            errors.append({"line": line, "error": f"Owner {row.get('owner')} not found"})
+            continue
+        if row.get("container_type") not in container_types:
+            errors.append(
+                {
+                    "line": line,
+                    "error": f"Container Type {row.get('container_type')} not found",
+                }
+            )
+            continue
+        if row.get("size_class") not in size_classes:
+            errors.append(
+                {"line": line, "error": f"Size Class {row.get('size_class')} not found"}
+            )
+            continue
+        shelf_type = shelf_types.get((row.get("size_class"), row.get("shelf_type")))
+        if not shelf_type:
+            errors.append(
+                {
+                    "line": line,
+                    "error": f"Shelf Type {row.get('shelf_type')} with Size Class "
+                    f"{row.get('size_class')} not found",
+                }
+            )
+            continue
+        if (ladder_number, shelf_number) in existing_shelves:
+            errors.append(
+                {
+                    "line": line,
+                    "error": f"Shelf number {shelf_number} at ladder number "
+                    f"{ladder_number} already exists",
+                }
+            )
+            continue
+
+        shelf_barcode = row.get("shelf_barcode")
+        if shelf_barcode:
+            if shelf_barcode in existing_barcodes:
+                errors.append(
+                    {
+                        "line": line,
+                        "error": f"Shelf Barcode value {shelf_barcode} already exists",
+                    }
+                )
+                continue
+            if not shelf_barcode_type or not re.fullmatch(
+                shelf_barcode_type.allowed_pattern, shelf_barcode
+            ):
+                errors.append(
+                    {
+                        "line": line,
+                        "error": f"Shelf Barcode value: {shelf_barcode} is invalid "
+                        "for barcode rules",
+                    }
+                )
+                continue
+            existing_barcodes.add(shelf_barcode)
+
+        # later rows for the same shelf are reported as existing
+        existing_shelves.add((ladder_number, shelf_number))
+        shelves.append(
+            {
+                "ladder_number": ladder_number,
+                "shelf_number": shelf_number,
+                "shelf_barcode": shelf_barcode,
+                "shelf_type_id": shelf_type[0],
+                "max_capacity": shelf_type[1],
+                "owner_id": owners[row["owner"]],
+                "container_type_id": container_types[row["container_type"]],
+                "height": row.get("height"),
+                "width": row.get("width"),
+                "depth": row.get("depth"),
+                "sort_priority": _int(row.get("shelf_sort_priority")),
+            }
+        )
+
+    if errors or not ladders:
+        return errors
+
+    start_session_with_audit_info(
+        getattr(session, "audit_info", SYSTEM_AUDIT_INFO), session
+    )
+
+    ladder_number_ids = _upsert_numbers(session, LadderNumber, set(ladders))
+    session.execute(
+        pg_insert(Ladder)
+        .values(
+            [
+                {
+                    "ladder_number_id": ladder_number_ids[number],
+                    "side_id": side_id,
+                    "sort_priority": sort_priority,
+                }
+                for number, sort_priority in ladders.items()
+            ]
+        )
+        .on_conflict_do_nothing(constraint="uq_side_id_ladder_number_id")
+    )
+    ladder_ids = dict(
+        session.execute(
+            select(Ladder.ladder_number_id, Ladder.id).where(
+                Ladder.side_id == side_id,
+                Ladder.ladder_number_id.in_(list(ladder_number_ids.values())),
+            )
+        ).all()
+    )
+
+    if not shelves:
+        return []
+
+    shelf_number_ids = _upsert_numbers(
+        session, ShelfNumber, {shelf["shelf_number"] for shelf in shelves}
+    )
+    position_number_ids = _upsert_numbers(
+        session,
+        ShelfPositionNumber,
+        set(range(1, max(shelf["max_capacity"] for shelf in shelves) + 1)),
+    )
+    barcode_ids = {}
+    new_barcodes = [
+        {
+            "value": shelf["shelf_barcode"],
+            "type_id": shelf_barcode_type.id,
+            "withdrawn": False,
+        }
+        for shelf in shelves
+        if shelf["shelf_barcode"]
+    ]
+    for chunk in _chunks(new_barcodes):
+        barcode_ids.update(
+            session.execute(
+                insert(Barcode).values(chunk).returning(Barcode.value, Barcode.id)
+            ).all()
+        )
+
+    shelf_ids = _next_ids(session, Shelf.__tablename__, len(shelves))
+    position_ids = iter(
+        _next_ids(
+            session,
+            ShelfPosition.__tablename__,
+            sum(shelf["max_capacity"] for shelf in shelves),
+        )
+    )
+    side_address = (
+        f"{address.building_name}-{address.module_number}-{address.aisle_number}-"
+        f"{address.side_orientation[0]}"
+    )
+    side_internal_address = (
+        f"{address.building_id}-{address.module_id}-{address.aisle_id}-{side_id}"
+    )
+
+    shelf_values = []
+    position_values = []
+    for shelf_id, shelf in zip(shelf_ids, shelves):
+        ladder_id = ladder_ids[ladder_number_ids[shelf["ladder_number"]]]
+        location = f"{side_address}-{shelf['ladder_number']}-{shelf['shelf_number']}"
+        internal_location = f"{side_internal_address}-{ladder_id}-{shelf_id}"
+        shelf_values.append(
+            {
+                "id": shelf_id,
+                "ladder_id": ladder_id,
+                "shelf_number_id": shelf_number_ids[shelf["shelf_number"]],
+                "shelf_type_id": shelf["shelf_type_id"],
+                "owner_id": shelf["owner_id"],
+                "container_type_id": shelf["container_type_id"],
+                "barcode_id": barcode_ids.get(shelf["shelf_barcode"]),
+                "height": shelf["height"],
+                "width": shelf["width"],
+                "depth": shelf["depth"],
+                "sort_priority": shelf["sort_priority"],
+                # filled in by the shelf_positions insert trigger
+                "available_space": 0,
+                "location": location,
+                "internal_location": internal_location,
+            }
+        )
+        for number in range(1, shelf["max_capacity"] + 1):
+            position_id = next(position_ids)
+            position_values.append(
+                {
+                    "id": position_id,
+                    "shelf_id": shelf_id,
+                    "shelf_position_number_id": position_number_ids[number],
+                    "location": f"{location}-{number}",
+                    "internal_location": f"{internal_location}-{position_id}",
+                }
+            )
+
+    # core inserts, the per row after_insert address listeners don't fire
+    for chunk in _chunks(shelf_values):
+        session.execute(insert(Shelf).values(chunk))
+    for chunk in _chunks(position_values):
+        session.execute(insert(ShelfPosition).values(chunk))
+
+    return []
@@ -18,6 +18,9 @@ from alembic.config import Config
 from alembic import command
 
 from app.config.config import get_settings
+from app.database.async_session import async_engine
+from app.batch_upload_jobs import batch_upload_jobs
+from app.shelf_space import shelf_space_queue, shelf_space_reconciler
 from sqlalchemy.exc import DBAPIError
 from app.config.exceptions import (
     BadRequest,
@@ -146,7 +149,16 @@ async def lifespan(app: FastAPI):
             StaticFiles(directory="/code/schema-docs", html=True),
             name="schema-docs",
         )
+    shelf_space_reconciler.start()
+    # fails uploads left New or Processing by a worker that didn't exit cleanly
+    batch_upload_jobs.start()
     yield
+    shelf_space_reconciler.stop()
+    # recount shelves still waiting out the debounce window
+    shelf_space_queue.close()
+    # uploads not yet started are marked Cancelled
+    batch_upload_jobs.shutdown()
+    await async_engine.dispose()
     print("Shutting down...")
 
 
@@ -3,8 +3,10 @@ import time, jwt#, sqltap
 from datetime import datetime, timezone, timedelta
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, QueryParams
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import update
+from starlette.concurrency import run_in_threadpool
 from app.logger import inventory_logger, data_activity_logger, security_log_route_filter
 from app.config.config import get_settings
 from app.database.session import get_session, session_manager
@@ -14,107 +16,222 @@ from app.profiling import profiler, USE_PROFILER
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Sliding expiration window granted on each authenticated request
+AUTH_EXPIRATION_WINDOW = timedelta(minutes=15)
+# How long a cached user is trusted before it is read again
+AUTH_CACHE_TTL = timedelta(minutes=1)
+# Expiration refreshes are written back at most this often per user
+AUTH_EXPIRATION_WRITE_INTERVAL = timedelta(minutes=1)
+# The health check is public, the pool and queue diagnostics need a token
+PUBLIC_STATUS_PATHS = ("/status", "/status/")
 
-class JWTMiddleware(BaseHTTPMiddleware):
+
+def _load_user_auth(email):
+    with session_manager() as session:
+        user_object = session.query(User).filter(User.email == email).first()
+        if not user_object:
+            return None
+        return {
+            "audit_info": {
+                "name": f"{user_object.first_name} {user_object.last_name}",
+                "id": user_object.id,
+            },
+            "expiration": user_object.fetch_auth_expiration,
+        }
+
+
+def _write_user_expiration(user_id, expiration):
+    with session_manager() as session:
+        session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(fetch_auth_expiration=expiration)
+        )
+        session.commit()
+
+
+class UserAuthCache:
+    """
+    In-process cache of audit info and auth expiration per user email.
+
+    Authenticated reads are served from memory. The sliding expiration is
+    extended in memory on every request and written to the users table at
+    most once per write interval, so read traffic doesn't touch the table.
+    Entries are re-read after the ttl, and before rejecting an expired
+    user, in case another worker or a new login moved the expiration.
+    """
+
+    def __init__(
+        self,
+        ttl=AUTH_CACHE_TTL,
+        write_interval=AUTH_EXPIRATION_WRITE_INTERVAL,
+        window=AUTH_EXPIRATION_WINDOW,
+    ):
+        self.ttl = ttl
+        self.write_interval = write_interval
+        self.window = window
+        self._entries = {}
+
+    async def _load(self, email, now):
+        loaded = await run_in_threadpool(_load_user_auth, email)
+        if not loaded:
+            self._entries.pop(email, None)
+            return None
+
+        entry = self._entries.get(email)
+        if entry and entry["expiration"] and (
+            not loaded["expiration"] or loaded["expiration"] < entry["expiration"]
+        ):
+            # keep refreshes not yet written back
+            loaded["expiration"] = entry["expiration"]
+        loaded["loaded_at"] = now
+        loaded["written_at"] = entry["written_at"] if entry else now
+        self._entries[email] = loaded
+        return loaded
+
+    async def authenticate(self, email):
+        """
+        returns:
+            - (audit_info, expired), or (None, True) for unknown users.
+            - Extends the expiration of users that aren't expired.
+        """
+        now = datetime.now(timezone.utc)
+        entry = self._entries.get(email)
+        if (
+            not entry
+            or now - entry["loaded_at"] >= self.ttl
+            or not entry["expiration"]
+            or entry["expiration"] < now
+        ):
+            entry = await self._load(email, now)
+        if not entry:
+            return None, True
+
+        if not entry["expiration"] or entry["expiration"] < now:
+            return entry["audit_info"], True
+
+        entry["expiration"] = now + self.window
+        if now - entry["written_at"] >= self.write_interval:
+            entry["written_at"] = now
+            await run_in_threadpool(
+                _write_user_expiration, entry["audit_info"]["id"], entry["expiration"]
+            )
+
+        return entry["audit_info"], False
+
+    def invalidate(self, email):
+        """Drops a user changed or deleted in this process"""
+        self._entries.pop(email, None)
+
+
+user_auth_cache = UserAuthCache()
+
+
+class JWTMiddleware:
     """
     This middleware is responsible for enforcing Auth token checks.
     This middleware is responsible for capturing logs
+
+    Plain ASGI rather than BaseHTTPMiddleware, so responses (e.g. csv
+    downloads) stream straight through without an extra task and memory
+    stream per request.
     """
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         start = time.time()
         # Something explicitly disables logger in middleware
         inventory_logger.disabled = False
         data_activity_logger.disabled = False
-        # Ensure as accurate as possible IP
-        x_forwarded_for = request.headers.get('X-forwarded-For')
-        if x_forwarded_for:
-            client_ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            # health check doesn't have scope['client'] for client context
-            client_ip = request.client.host if request.client else "unknown"
-            # client_ip = request.client.host
 
-        process_time = time.time() - start
+        headers = Headers(scope=scope)
+        path = scope["path"]
+        response_status = None
+
+        async def send_with_status(message):
+            nonlocal response_status
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+            await send(message)
 
         # Get token from Authorization header
         token = None
         decoded_token = None
         fetch_user = 'unknown'
-        auth_header = request.headers.get("authorization")
+        auth_header = headers.get("authorization")
         if auth_header:
             token = auth_header.split("Bearer ")[1]
             decoded_token = jwt.decode(token, 'your-secret-key', algorithms=['HS256'])
             fetch_user = decoded_token.get('email')
 
         # Exclude /auth endpoints from token validation
-        if request.url.path.startswith("/auth"):
-            response = await call_next(request)
-        elif request.url.path.startswith("/status"):
-            response = await call_next(request)
+        if path.startswith("/auth") or path in PUBLIC_STATUS_PATHS:
+            await self.app(scope, receive, send_with_status)
         elif not token:
             if get_settings().APP_ENVIRONMENT not in ["debug", "local", "develop", "test"]:
                 response = JSONResponse(status_code=401, content={"detail": "Not Authorized"})
+                await response(scope, receive, send_with_status)
             else:
-                response = await call_next(request)
+                await self.app(scope, receive, send_with_status)
         else:
-            # Check if token is expired
-            # token_exp = decoded_token.get('exp')
-            # token_exp_datetime = datetime.utcfromtimestamp(token_exp)
-            # from user table
-            # with get_session() as session:
-            with session_manager() as session:
-                user_object = session.query(User).filter(User.email == fetch_user).first()
-                audit_info = {
-                    "name": f"{user_object.first_name} {user_object.last_name}",
-                    "id": user_object.id,
-                }
-                token_exp_datetime = user_object.fetch_auth_expiration
-                if token_exp_datetime < datetime.now(timezone.utc):
-                    if get_settings().APP_ENVIRONMENT not in ["debug", "local", "test"]:
-                        response = JSONResponse(status_code=401, content={"detail": "Token Expired"})
-                    else:
-                        # request = set_session_to_request(request, fetch_user)
-                        request = await set_session_to_request(request, session, audit_info)
-                        response = await call_next(request)
-                else:
-                    # Everything's good
-                    # refresh exp and pass through
-                    user_object.fetch_auth_expiration = datetime.now(timezone.utc) + timedelta(minutes=15)
-                    session.add(user_object)
-                    # session.commit(user_object)
-                    session.commit()
-                    session.refresh(user_object)
-                    request = await set_session_to_request(request, session, audit_info)
-                    # request = set_session_to_request(request, fetch_user)
-                    response = await call_next(request)
-        request_log_dict = {
-            'url': request.url.path,
-            'method': request.method,
-            'response_status': response.status_code,
-            'process_time': process_time
-        }
-        security_log_dict = {
-            'ip': client_ip,
-            'user': fetch_user,
-            'user-agent': request.headers.get("user-agent", "unknown"),
-            'referer': request.headers.get("referer", "unknown"),
-            'headers': dict(request.headers),
-            'query-params': dict(request.query_params),
-            'url': request.url.path,
-            'method': request.method,
-            'response_status': response.status_code,
-            'process_time': process_time
-        }
+            audit_info, expired = await user_auth_cache.authenticate(fetch_user)
+            if not audit_info:
+                response = JSONResponse(status_code=401, content={"detail": "Not Authorized"})
+                await response(scope, receive, send_with_status)
+            elif expired and get_settings().APP_ENVIRONMENT not in ["debug", "local", "test"]:
+                response = JSONResponse(status_code=401, content={"detail": "Token Expired"})
+                await response(scope, receive, send_with_status)
+            elif scope["method"] == "GET":
+                # reads need no session or audit info
+                await self.app(scope, receive, send_with_status)
+            else:
+                with session_manager() as session:
+                    await set_session_to_request(Request(scope), session, audit_info)
+                    await self.app(scope, receive, send_with_status)
 
-        if response.status_code == (401 or 403):
-            # always log 401 & 403 regardless of route
-            data_activity_logger.warning(security_log_dict)
+        # always log 401 & 403 regardless of route, else log on routes in filter
+        if response_status in (401, 403):
+            log = data_activity_logger.warning
+        elif any(path.startswith(route) for route in security_log_route_filter):
+            log = data_activity_logger.info
         else:
-            # else log on routes in filter
-            if any(request.url.path.startswith(route) for route in security_log_route_filter):
-                data_activity_logger.info(security_log_dict)
+            return
+
+        log(
+            _security_log_dict(
+                scope, headers, fetch_user, response_status, time.time() - start
+            )
+        )
+
+
+def _security_log_dict(scope, headers, fetch_user, response_status, process_time):
+    """Only built when a log line is emitted."""
+    # Ensure as accurate as possible IP
+    x_forwarded_for = headers.get('X-forwarded-For')
+    if x_forwarded_for:
+        client_ip = x_forwarded_for.split(',')[0].strip()
+    else:
+        # health check doesn't have scope['client'] for client context
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
 
-        return response
+    return {
+        'ip': client_ip,
+        'user': fetch_user,
+        'user-agent': headers.get("user-agent", "unknown"),
+        'referer': headers.get("referer", "unknown"),
+        'headers': dict(headers),
+        'query-params': dict(QueryParams(scope.get("query_string", b""))),
+        'url': scope["path"],
+        'method': scope["method"],
+        'response_status': response_status,
+        'process_time': process_time
+    }
 
 
 # # Middleware query profiling
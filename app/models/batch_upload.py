@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 
 import sqlalchemy as sa
 
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import SQLModel, Field, Relationship
 
 
@@ -41,6 +42,19 @@ class BatchUpload(SQLModel, table=True):
     file_name: str = Field(sa_column=sa.Column(sa.VARCHAR, nullable=False))
     file_size: int = Field(sa_column=sa.Column(sa.BigInteger, nullable=True, default=None))
     file_type: str = Field(sa_column=sa.Column(sa.VARCHAR, nullable=True, default=None))
+    # progress of the upload's job, updated as the worker goes
+    total_rows: int = Field(
+        sa_column=sa.Column(sa.Integer, nullable=False, server_default="0"), default=0
+    )
+    processed_rows: int = Field(
+        sa_column=sa.Column(sa.Integer, nullable=False, server_default="0"), default=0
+    )
+    errored_rows: int = Field(
+        sa_column=sa.Column(sa.Integer, nullable=False, server_default="0"), default=0
+    )
+    errors: Optional[list] = Field(
+        sa_column=sa.Column(JSONB, nullable=True), default=None
+    )
     create_dt: datetime = Field(
         sa_column=sa.Column(sa.TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     )
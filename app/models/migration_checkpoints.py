@@ -0,0 +1,36 @@
+from typing import Optional
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import SQLModel, Field
+
+
+class MigrationCheckpoint(SQLModel, table=True):
+    """
+    Model represents the migration_checkpoints table.
+
+    One row per legacy snapshot chunk a migration loader has committed,
+    written in the same transaction as the chunk's records. A rerun of
+    the loader skips the chunks recorded here.
+    """
+
+    __tablename__ = "migration_checkpoints"
+
+    loader: str = Field(sa_column=sa.Column(sa.VARCHAR(50), primary_key=True))
+    chunk_index: int = Field(sa_column=sa.Column(sa.Integer, primary_key=True))
+    chunk_size: int = Field(sa_column=sa.Column(sa.Integer, nullable=False))
+    byte_offset: int = Field(sa_column=sa.Column(sa.BigInteger, nullable=False))
+    first_row: int = Field(sa_column=sa.Column(sa.Integer, nullable=False))
+    row_count: int = Field(sa_column=sa.Column(sa.Integer, nullable=False))
+    checksum: str = Field(sa_column=sa.Column(sa.VARCHAR(64), nullable=False))
+    successful_rows: int = Field(sa_column=sa.Column(sa.Integer, nullable=False))
+    failed_rows: int = Field(sa_column=sa.Column(sa.Integer, nullable=False))
+    skipped_rows: int = Field(sa_column=sa.Column(sa.Integer, nullable=False))
+    results: Optional[dict] = Field(
+        sa_column=sa.Column(JSONB, nullable=True), default=None
+    )
+    create_dt: datetime = Field(
+        sa_column=sa.Column(sa.TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    )
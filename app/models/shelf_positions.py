@@ -40,6 +40,17 @@ class ShelfPosition(SQLModel, table=True):
         foreign_key="shelf_position_numbers.id", nullable=False
     )
     shelf_id: int = Field(foreign_key="shelves.id", nullable=False)
+    # Maintained by triggers on trays and non_tray_items
+    occupied: bool = Field(
+        sa_column=sa.Column(
+            sa.Boolean, default=False, server_default=sa.false(), nullable=False
+        )
+    )
+    reserved: bool = Field(
+        sa_column=sa.Column(
+            sa.Boolean, default=False, server_default=sa.false(), nullable=False
+        )
+    )
     create_dt: datetime = Field(
         sa_column=sa.Column(sa.TIMESTAMP(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     )
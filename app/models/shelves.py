@@ -88,20 +88,12 @@ class Shelf(SQLModel, table=True):
             return self._calculate_space(session, ShelfPosition)
 
     def _calculate_space(self, session, ShelfPosition):
-        total_positions = session.execute(
-            select(func.count(ShelfPosition.id)).where(ShelfPosition.shelf_id == self.id)
-        ).scalar() or 0  
-
-        occupied_positions = session.execute(
-            select(func.count(ShelfPosition.id))
-            .where(ShelfPosition.shelf_id == self.id)
-            .where(
-                sa.or_(
-                    ShelfPosition.tray != None,
-                    ShelfPosition.non_tray_item != None
-                )
-            )
-        ).scalar() or 0  
+        total_positions, occupied_positions = session.execute(
+            select(
+                func.count(ShelfPosition.id),
+                func.count(ShelfPosition.id).filter(ShelfPosition.occupied),
+            ).where(ShelfPosition.shelf_id == self.id)
+        ).one()
 
         self.available_space = total_positions - occupied_positions
         return self.available_space
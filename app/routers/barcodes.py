@@ -7,6 +7,7 @@ from fastapi_pagination import Page
 from fastapi_pagination.ext.sqlmodel import paginate
 from sqlalchemy.exc import IntegrityError
 
+from app.database.async_session import AsyncSession, get_async_session, to_response
 from app.database.session import get_session
 from app.filter_params import SortParams
 from app.logger import inventory_logger
@@ -85,7 +86,9 @@ def get_barcode_detail(id: uuid.UUID, session: Session = Depends(get_session)):
 
 
 @router.get("/value/{value}", response_model=BarcodeDetailReadOutput)
-def get_barcode_by_value(value: str, session: Session = Depends(get_session)):
+async def get_barcode_by_value(
+    value: str, session: AsyncSession = Depends(get_async_session)
+):
     """
     Retrieve barcode details by its value
 
@@ -98,10 +101,12 @@ def get_barcode_by_value(value: str, session: Session = Depends(get_session)):
     **Raises:**
     - HTTPException: If the barcode is not found.
     """
-    barcode = session.query(Barcode).filter(Barcode.value == value).first()
+    barcode = (
+        await session.exec(select(Barcode).where(Barcode.value == value))
+    ).first()
     if not barcode:
         raise NotFound(detail=f"Barcode with value {value} not found")
-    return barcode
+    return await to_response(session, BarcodeDetailReadOutput, barcode)
 
 
 @router.post("/", response_model=BarcodeDetailWriteOutput, status_code=201)
@@ -1,7 +1,3 @@
-import csv
-from io import StringIO
-
-import pandas as pd
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from fastapi_pagination import Page
 from fastapi_pagination.ext.sqlmodel import paginate
@@ -10,7 +6,9 @@ from datetime import datetime, timezone
 
 from starlette.responses import StreamingResponse
 
+from app.database.async_session import AsyncSession, get_async_session, to_response
 from app.database.session import get_session, commit_record
+from app.exports import csv_response
 from app.events import update_shelf_space_after_tray
 from app.filter_params import SortParams, ItemFilterParams
 from app.logger import inventory_logger
@@ -180,20 +178,7 @@ def download_items(
     if params.to_dt:
         item_queryset = item_queryset.where(Item.accession_dt <= params.to_dt)
 
-    def generate_csv():
-        output = StringIO()
-        result = session.execute(item_queryset)
-        df = pd.DataFrame(result.fetchall(), columns=result.keys())
-        df.to_csv(output, index=False)
-        output.seek(0)
-        yield output.read()
-
-    return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; "
-                                        "filename=items_advance_search.csv"},
-    )
+    return csv_response(session, item_queryset, "items_advance_search.csv")
 
 
 @router.get("/{id}", response_model=ItemDetailReadOutput)
@@ -218,7 +203,9 @@ def get_item_detail(id: int, session: Session = Depends(get_session)):
 
 
 @router.get("/barcode/{value}", response_model=ItemDetailReadOutput)
-def get_item_by_barcode_value(value: str, session: Session = Depends(get_session)):
+async def get_item_by_barcode_value(
+    value: str, session: AsyncSession = Depends(get_async_session)
+):
     """
     Retrieve a item using a barcode value
 
@@ -228,14 +215,15 @@ def get_item_by_barcode_value(value: str, session: Session = Depends(get_session
     if not value:
         raise ValidationException(detail="Item barcode value is required")
     item = (
-        session.query(Item)
-        .join(Barcode, Item.barcode_id == Barcode.id)
-        .filter(Barcode.value == value)
-        .first()
-    )
+        await session.exec(
+            select(Item)
+            .join(Barcode, Item.barcode_id == Barcode.id)
+            .where(Barcode.value == value)
+        )
+    ).first()
     if not item:
         raise NotFound(detail=f"Item with barcode value {value} not found")
-    return item
+    return await to_response(session, ItemDetailReadOutput, item)
 
 
 @router.post("/", response_model=ItemDetailWriteOutput, status_code=201)
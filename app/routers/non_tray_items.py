@@ -1,6 +1,4 @@
-from io import StringIO
 
-import pandas as pd
 from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from fastapi_pagination import Page
 from fastapi_pagination.ext.sqlmodel import paginate
@@ -9,7 +7,9 @@ from datetime import datetime, timezone
 
 from starlette.responses import StreamingResponse
 
+from app.database.async_session import AsyncSession, get_async_session, to_response
 from app.database.session import get_session, commit_record
+from app.exports import csv_response
 from app.events import update_shelf_space_after_non_tray
 from app.filter_params import SortParams
 from app.logger import inventory_logger
@@ -166,22 +166,8 @@ def download_non_tray_items(
     if params.to_dt:
         query = query.where(NonTrayItem.accession_dt <= params.to_dt)
 
-    def generate_csv():
-        output = StringIO()
-        result = session.execute(query)
-        df = pd.DataFrame(result.fetchall(), columns=result.keys())
-        df.to_csv(output, index=False)
-        output.seek(0)
-        yield output.read()
-
-    return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": "attachment; "
-                                   "filename=items_advance_search.csv"
-        },
-    )
+    return csv_response(session, query, "items_advance_search.csv")
+
 
 @router.get("/{id}", response_model=NonTrayItemDetailReadOutput)
 def get_non_tray_item_detail(id: int, session: Session = Depends(get_session)):
@@ -197,7 +183,9 @@ def get_non_tray_item_detail(id: int, session: Session = Depends(get_session)):
 
 
 @router.get("/barcode/{value}", response_model=NonTrayItemDetailReadOutput)
-def get_non_tray_by_barcode_value(value: str, session: Session = Depends(get_session)):
+async def get_non_tray_by_barcode_value(
+    value: str, session: AsyncSession = Depends(get_async_session)
+):
     """
     Retrieve a non-tray using a barcode value
 
@@ -208,14 +196,15 @@ def get_non_tray_by_barcode_value(value: str, session: Session = Depends(get_ses
         raise ValidationException(detail="Non Tray Item barcode value is required")
 
     non_tray = (
-        session.query(NonTrayItem)
-        .join(Barcode, NonTrayItem.barcode_id == Barcode.id)
-        .filter(Barcode.value == value)
-        .first()
-    )
+        await session.exec(
+            select(NonTrayItem)
+            .join(Barcode, NonTrayItem.barcode_id == Barcode.id)
+            .where(Barcode.value == value)
+        )
+    ).first()
     if not non_tray:
         raise NotFound(detail=f"Non Tray Item barcode value {value} Not Found")
-    return non_tray
+    return await to_response(session, NonTrayItemDetailReadOutput, non_tray)
 
 
 @router.post("/", response_model=NonTrayItemDetailWriteOutput, status_code=201)
@@ -37,7 +37,7 @@ from app.config.exceptions import (
     InternalServerError,
 )
 from app.sorting import PickListSorter
-from app.utilities import get_location, manage_transition
+from app.utilities import get_location_sort_keys, manage_transition
 
 router = APIRouter(
     prefix="/pick-lists",
@@ -46,81 +46,56 @@ router = APIRouter(
 
 
 def sort_order_priority(session, pick_list, requests):
-    request_data = []
-    sorted_requests = set()
-
-    if requests:
-        for request in requests:
-            if request.item_id:
-                item = session.get(Item, request.item_id)
-                tray = session.get(Tray, item.tray_id)
-
-                if not tray:
-                    continue
-
-                if not tray.shelf_position:
-                    continue
-
-                shelf_position = tray.shelf_position
-
-            elif request.non_tray_item_id:
-                non_try_item = session.get(NonTrayItem, request.non_tray_item_id)
-
-                if not non_try_item:
-                    raise NotFound(
-                        detail=f"Non Tray Item ID {request.non_tray_item_id} Not "
-                        f"Found"
-                    )
-
-                if not non_try_item.shelf_position:
-                    continue
-
-                shelf_position = non_try_item.shelf_position
-
-            else:
-                raise NotFound(detail="Item Not Found")
-
-            location = get_location(session, shelf_position)
-
-            aisle_priority = (
-                location["aisle"].sort_priority or location["aisle_number"].number
-            )
-            ladder_priority = (
-                location["ladder"].sort_priority or location["ladder_number"].number
-            )
-            shelf_priority = (
-                location["shelf"].sort_priority or location["shelf_number"].number
-            )
-
-            request_data.append(
-                {
-                    "request": request,
-                    "aisle_priority": aisle_priority,
-                    "ladder_priority": ladder_priority,
-                    "shelf_priority": shelf_priority,
-                }
-            )
-
-            sorted_request_data = sorted(
-                request_data,
-                key=lambda x: (
-                    x["aisle_priority"],
-                    x["ladder_priority"],
-                    x["shelf_priority"],
-                ),
-            )
-
-            # Extract the sorted request objects
-            sorted_requests = [data["request"] for data in sorted_request_data]
+    """
+    Orders pick list requests in walk order (aisle, ladder, shelf).
+    Unfulfilled requests come first, then fulfilled ones, then requests
+    without a shelf location (e.g. withdrawn) in their original order.
 
-            # Separate fulfilled and unfulfilled
-            unfulfilled_requests = [req for req in sorted_requests if not req.fulfilled]
-            fulfilled_requests = [req for req in sorted_requests if req.fulfilled]
+    Sort keys for every request are fetched in one query.
+    """
+    if not requests:
+        return pick_list
+
+    for request in requests:
+        if not request.item_id and not request.non_tray_item_id:
+            raise NotFound(detail="Item Not Found")
+
+    item_keys, non_tray_item_keys = get_location_sort_keys(
+        session,
+        item_ids=[request.item_id for request in requests if request.item_id],
+        non_tray_item_ids=[
+            request.non_tray_item_id
+            for request in requests
+            if request.non_tray_item_id
+        ],
+    )
 
-            # Append requests not present in sorted_requests due to withdrawn
-            # requests (e.g. without shelf location) at the end
-            remaining_requests = [req for req in requests if req not in sorted_requests]
-            pick_list.requests = unfulfilled_requests + fulfilled_requests + remaining_requests
+    request_data = []
+    for request in requests:
+        if request.item_id:
+            sort_key = item_keys.get(request.item_id)
+        else:
+            sort_key = non_tray_item_keys.get(request.non_tray_item_id)
+
+        if sort_key:
+            request_data.append((sort_key, request))
+
+    # Stable sort keeps the original order between equal locations
+    request_data.sort(key=lambda data: data[0])
+    sorted_requests = [request for _, request in request_data]
+
+    if sorted_requests:
+        # Separate fulfilled and unfulfilled
+        unfulfilled_requests = [req for req in sorted_requests if not req.fulfilled]
+        fulfilled_requests = [req for req in sorted_requests if req.fulfilled]
+
+        # Append requests not present in sorted_requests due to withdrawn
+        # requests (e.g. without shelf location) at the end
+        sorted_ids = {req.id for req in sorted_requests}
+        remaining_requests = [req for req in requests if req.id not in sorted_ids]
+        pick_list.requests = (
+            unfulfilled_requests + fulfilled_requests + remaining_requests
+        )
 
     return pick_list
 
@@ -6,6 +6,7 @@ from fastapi_pagination.ext.sqlmodel import paginate
 from sqlmodel import Session, select
 from sqlalchemy import func, distinct, case, literal_column
 
+from app.batch_scans import batch_add_to_refile_job, batch_scan_output
 from app.database.session import get_session, commit_record
 from app.filter_params import SortParams, JobFilterParams
 from app.models.barcodes import Barcode
@@ -22,11 +23,12 @@ from app.schemas.refile_jobs import (
     RefileJobListOutput,
     RefileJobDetailOutput,
 )
+from app.schemas.batch_scans import BatchScanInput, BatchScanOutput
 from app.schemas.items import ItemUpdateInput
 from app.schemas.non_tray_items import NonTrayItemUpdateInput
 from app.config.exceptions import BadRequest, NotFound
 from app.sorting import RefileJobSorter
-from app.utilities import manage_transition, get_location
+from app.utilities import manage_transition, get_location_sort_keys
 
 router = APIRouter(
     prefix="/refile-jobs",
@@ -34,33 +36,7 @@ router = APIRouter(
 )
 
 
-def sort_order_priority(session, item_type, item):
-    if item_type == "item":
-        tray = session.get(Tray, item.tray_id)
-        location = get_location(session, tray.shelf_position)
-    else:
-        location = get_location(session, item.shelf_position)
-
-    aisle_priority = location["aisle"].sort_priority or location["aisle_number"].number
-
-    ladder_priority = (
-        location["ladder"].sort_priority or location["ladder_number"].number
-    )
-
-    shelf_priority = location["shelf"].sort_priority or location["shelf_number"].number
-
-    return {
-        item_type: item,
-        "aisle_priority": aisle_priority,
-        "ladder_priority": ladder_priority,
-        "shelf_priority": shelf_priority,
-    }
-
-
 def sorted_requests(session, refile_job):
-    request_data = []
-    withdrawn_items = []
-    withdrawn_non_tray_items = []
     assigned_user = None
     created_by = None
 
@@ -71,40 +47,30 @@ def sorted_requests(session, refile_job):
         assigned_user = refile_job.assigned_user
     if refile_job.created_by:
         created_by = refile_job.created_by
-    if items:
-        for item in items:
-            if item.tray:
-                if item.tray.shelf_position:
-                    request_data.append(sort_order_priority(session, "item", item))
-                else:
-                    withdrawn_items.append(item)
-            else:
-                withdrawn_items.append(item)
-
-    if non_tray_items:
-        for non_tray_item in non_tray_items:
-            if non_tray_item.shelf_position:
-                request_data.append(
-                    sort_order_priority(session, "non_tray_item", non_tray_item)
-                )
-            else:
-                withdrawn_non_tray_items.append(non_tray_item)
-
-    sort_requests = sorted(
-        request_data,
-        key=lambda x: (
-            x["aisle_priority"],
-            x["ladder_priority"],
-            x["shelf_priority"],
-        ),
+
+    item_keys, non_tray_item_keys = get_location_sort_keys(
+        session,
+        item_ids=[item.id for item in items],
+        non_tray_item_ids=[non_tray_item.id for non_tray_item in non_tray_items],
     )
 
-    sorted_list = []
-    for item in sort_requests:
-        if item.get("item"):
-            sorted_list.append(item["item"])
-        elif item.get("non_tray_item"):
-            sorted_list.append(item["non_tray_item"])
+    # Items without a tray or shelf position have no key, i.e. withdrawn
+    request_data = [
+        (item_keys[item.id], item) for item in items if item.id in item_keys
+    ] + [
+        (non_tray_item_keys[non_tray_item.id], non_tray_item)
+        for non_tray_item in non_tray_items
+        if non_tray_item.id in non_tray_item_keys
+    ]
+    withdrawn_items = [item for item in items if item.id not in item_keys]
+    withdrawn_non_tray_items = [
+        non_tray_item
+        for non_tray_item in non_tray_items
+        if non_tray_item.id not in non_tray_item_keys
+    ]
+
+    request_data.sort(key=lambda data: data[0])
+    sorted_list = [list_item for _, list_item in request_data]
 
     # Final sort of already location-prioritized items by update_dt
     unfulfilled_requests = [list_item for list_item in sorted_list if not list_item.scanned_for_refile]
@@ -473,7 +439,6 @@ def add_items_to_refile_job(
     - Not Found HTTPException: If the refile job or item is not found.
     """
     lookup_barcode_values = refile_job_input.barcode_values
-    update_dt = datetime.now(timezone.utc)
 
     if not lookup_barcode_values:
         raise BadRequest(detail="At least one barcode value must be provided")
@@ -488,104 +453,54 @@ def add_items_to_refile_job(
             detail=f"""Can not add to Refile Job ID {job_id} in '{refile_job.status}' status"""
         )
 
-    refile_items = []
-    refile_non_tray_items = []
-    errored_barcodes = []
-
-    barcodes = (
-        session.query(Barcode).filter(Barcode.value.in_(lookup_barcode_values)).all()
-    )
-    items_map = {
-        barcode.id: session.query(Item).filter(Item.barcode_id == barcode.id).first()
-        for barcode in barcodes
-    }
-    non_tray_items_map = {
-        barcode.id: session.query(NonTrayItem)
-        .filter(NonTrayItem.barcode_id == barcode.id)
-        .first()
-        for barcode in barcodes
-    }
-
-    for barcode in barcodes:
-        item = items_map.get(barcode.id)
-        non_tray_item = non_tray_items_map.get(barcode.id)
-
-        if item:
-            existing_refile_items = (
-                session.query(RefileItem).filter(RefileItem.item_id == item.id).all()
-            )
+    batch_add_to_refile_job(session, refile_job, lookup_barcode_values)
+    session.commit()
+    session.refresh(refile_job)
 
-            if existing_refile_items:
-                refile_job_ids = [
-                    refile.refile_job_id for refile in existing_refile_items
-                ]
-                requests = (
-                    session.query(RefileJob)
-                    .filter(
-                        RefileJob.id.in_(refile_job_ids),
-                        RefileJob.status != "Completed",
-                    )
-                    .all()
-                )
+    if not refile_job.items and not refile_job.non_tray_items:
+        return refile_job
+    return sorted_requests(session, refile_job)
 
-                if requests:
-                    errored_barcodes.append(barcode.value)
-                    continue
 
-            refile_items.append(
-                RefileItem(refile_job_id=refile_job.id, item_id=item.id)
-            )
+@router.post("/{job_id}/add_items/batch", response_model=BatchScanOutput)
+def batch_add_items_to_refile_job(
+    job_id: int,
+    batch_scan_input: BatchScanInput,
+    session: Session = Depends(get_session),
+):
+    """
+    Add a batch of scanned items and non tray items to a refile job, reporting
+    the result for each barcode value.
 
-            item.scanned_for_refile_queue = False
-            item.scanned_for_refile_queue_dt = None
-            item.scanned_for_refile = False
-            item.scanned_for_refile_dt = None
-            item.update_dt = update_dt
+    **Args:**
+    - job_id: The ID of the refile job to add the items to.
+    - Batch Scan Input: The scanned barcode values.
 
-        elif non_tray_item:
-            existing_refile_non_tray_items = (
-                session.query(RefileNonTrayItem)
-                .filter(RefileNonTrayItem.non_tray_item_id == non_tray_item.id)
-                .all()
-            )
+    **Returns:**
+    - Batch Scan Output: The result for each barcode value.
 
-            if existing_refile_non_tray_items:
-                refile_job_ids = [
-                    refile.refile_job_id for refile in existing_refile_non_tray_items
-                ]
-                requests = (
-                    session.query(RefileJob)
-                    .filter(
-                        RefileJob.id.in_(refile_job_ids),
-                        RefileJob.status != "Completed",
-                    )
-                    .all()
-                )
+    **Raises:**
+    - Not Found HTTPException: If the refile job is not found.
+    """
+    if not batch_scan_input.barcode_values:
+        raise BadRequest(detail="At least one barcode value must be provided")
 
-                if requests:
-                    errored_barcodes.append(barcode.value)
-                    continue
+    refile_job = session.get(RefileJob, job_id)
 
-            refile_non_tray_items.append(
-                RefileNonTrayItem(
-                    refile_job_id=refile_job.id, non_tray_item_id=non_tray_item.id
-                )
-            )
+    if not refile_job:
+        raise NotFound(detail=f"Refile Job ID {job_id} Not Found")
 
-            non_tray_item.scanned_for_refile_queue = False
-            non_tray_item.scanned_for_refile_queue_dt = None
-            non_tray_item.scanned_for_refile = False
-            non_tray_item.scanned_for_refile_dt = None
-            non_tray_item.update_dt = update_dt
+    if refile_job.status in ["Running", "Completed"]:
+        raise BadRequest(
+            detail=f"""Can not add to Refile Job ID {job_id} in '{refile_job.status}' status"""
+        )
 
-    session.bulk_save_objects(refile_items)
-    session.bulk_save_objects(refile_non_tray_items)
+    results = batch_add_to_refile_job(
+        session, refile_job, batch_scan_input.barcode_values
+    )
     session.commit()
-    session.refresh(refile_job)
 
-    if not refile_job.items and not refile_job.non_tray_items:
-        return refile_job
-    return sorted_requests(session, refile_job)
+    return batch_scan_output(results)
 
 
 @router.delete("/{job_id}/remove_items", response_model=RefileJobDetailOutput)
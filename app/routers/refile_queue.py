@@ -7,9 +7,10 @@ from fastapi_pagination.ext.sqlmodel import paginate
 from sqlmodel import Session, select
 from starlette import status
 
+from app.barcode_resolution import resolve_barcode
+from app.batch_scans import batch_add_to_refile_queue, batch_scan_output
 from app.database.session import get_session
 from app.logger import inventory_logger
-from app.models.barcodes import Barcode
 from app.models.items import Item
 from app.models.non_tray_items import NonTrayItem
 from app.models.pick_lists import PickList
@@ -18,6 +19,7 @@ from app.models.refile_jobs import RefileJob
 from app.models.refile_non_tray_items import RefileNonTrayItem
 from app.models.requests import Request
 
+from app.schemas.batch_scans import BatchScanInput, BatchScanOutput
 from app.schemas.refile_queue import (
     RefileQueueInput,
     RefileQueueListOutput,
@@ -84,26 +86,25 @@ def add_to_refile_queue(
     if not lookup_barcode_value:
         raise BadRequest(detail="No barcode value found in request")
 
-    barcode = (
-        session.query(Barcode).filter(Barcode.value == lookup_barcode_value).first()
-    )
+    barcode = resolve_barcode(session, lookup_barcode_value)
 
     if not barcode:
         raise NotFound(detail=f"Barcode value {lookup_barcode_value} not found")
     if barcode.withdrawn:
         raise ValidationException(detail="Item has already been withdrawn")
 
-    item = session.query(Item).filter(Item.barcode_id == barcode.id).first()
-    non_tray_item = (
-        session.query(NonTrayItem).filter(NonTrayItem.barcode_id == barcode.id).first()
-    )
+    item = None
+    non_tray_item = None
 
-    if item:
-        if item.status != "Out":
+    if barcode.entity_type in ["Item", "NonTrayItem"]:
+        if barcode.status != "Out":
             raise ValidationException(detail="Item must be in 'Out' status")
-        if item.scanned_for_refile_queue:
+        if barcode.scanned_for_refile_queue:
             raise ValidationException(detail="Item is already in the refile queue")
 
+    if barcode.entity_type == "Item":
+        item = session.get(Item, barcode.entity_id)
+
         existing_refile_items = (
             session.query(RefileItem).filter(RefileItem.item_id == item.id).all()
         )
@@ -139,8 +140,6 @@ def add_to_refile_queue(
                 detail=f"Item already exists in a uncompleted Pick List Job {existing_pick_list_items}"
             )
 
-        item = session.get(Item, item.id)
-
         item.scanned_for_refile_queue = True
         item.scanned_for_refile_queue_dt = update_dt
         item.scanned_for_refile = False
@@ -148,11 +147,8 @@ def add_to_refile_queue(
 
         session.add(item)
 
-    elif non_tray_item:
-        if non_tray_item.status != "Out":
-            raise ValidationException(detail="Item must be in 'Out' status")
-        if non_tray_item.scanned_for_refile_queue:
-            raise ValidationException(detail="Item is already in the refile queue")
+    elif barcode.entity_type == "NonTrayItem":
+        non_tray_item = session.get(NonTrayItem, barcode.entity_id)
 
         existing_refile_non_tray_items = (
             session.query(RefileNonTrayItem)
@@ -216,6 +212,28 @@ def add_to_refile_queue(
     return results
 
 
+@router.patch("/batch", response_model=BatchScanOutput)
+def batch_add_to_refile_queue_list(
+    batch_scan_input: BatchScanInput, session: Session = Depends(get_session)
+):
+    """
+    Add a batch of scanned items and non tray items to the refile queue
+
+    **Args:**
+    - Batch Scan Input: The scanned barcode values.
+
+    **Returns:**
+    - Batch Scan Output: The result for each barcode value.
+    """
+    if not batch_scan_input.barcode_values:
+        raise BadRequest(detail="No barcode values found in request")
+
+    results = batch_add_to_refile_queue(session, batch_scan_input.barcode_values)
+    session.commit()
+
+    return batch_scan_output(results)
+
+
 @router.delete("/")
 def remove_from_refile_queue(
     refile_input: RefileQueueInput, session: Session = Depends(get_session)
@@ -238,32 +256,30 @@ def remove_from_refile_queue(
     if not lookup_barcode_value:
         raise BadRequest(detail="No barcode values found in request")
 
-    barcode = (
-        session.query(Barcode).where(Barcode.value == lookup_barcode_value).first()
-    )
+    barcode = resolve_barcode(session, lookup_barcode_value)
 
     if not barcode:
         raise NotFound(detail=f"Barcode Value {lookup_barcode_value} not found")
 
-    item = session.query(Item).filter(Item.barcode_id == barcode.id).first()
-
-    if item:
-        if not item or not item.scanned_for_refile_queue:
+    if barcode.entity_type == "Item":
+        if not barcode.scanned_for_refile_queue:
             raise BadRequest(detail=f"Item not found or not in refile queue")
 
+        item = session.get(Item, barcode.entity_id)
         item.scanned_for_refile_queue = False
         item.scanned_for_refile_queue_dt = None
         item.scanned_for_refile = None
         item.update_dt = update_dt
 
     else:
-        non_tray_item = (
-            session.query(NonTrayItem).where(barcode.id == NonTrayItem.barcode_id)
-        ).first()
-
-        if not non_tray_item or not non_tray_item.scanned_for_refile_queue:
+        if (
+            barcode.entity_type != "NonTrayItem"
+            or not barcode.scanned_for_refile_queue
+        ):
             raise BadRequest(detail=f"Non Tray Item not found or not in refile queue")
 
+        non_tray_item = session.get(NonTrayItem, barcode.entity_id)
+
         non_tray_item.scanned_for_refile_queue = False
         non_tray_item.scanned_for_refile_queue_dt = None
         non_tray_item.scanned_for_refile = None
@@ -1,15 +1,16 @@
-import csv
-from io import StringIO
+from operator import attrgetter
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from fastapi_pagination import Page
 from fastapi_pagination.ext.sqlmodel import paginate
 from sqlalchemy import func, union_all, literal, and_, asc, distinct, desc
+from sqlalchemy.orm import aliased
 from sqlalchemy.types import String
 from sqlmodel import Session, select
 
 from app.database.session import get_session
+from app.exports import csv_response
 from app.logger import inventory_logger
 from app.filter_params import (
     SortParams,
@@ -27,6 +28,7 @@ from app.filter_params import (
 from app.models.accession_jobs import AccessionJob
 from app.models.aisle_numbers import AisleNumber
 from app.models.barcodes import Barcode
+from app.models.container_types import ContainerType
 from app.models.item_withdrawals import ItemWithdrawal
 from app.models.items import Item
 from app.models.media_types import MediaType
@@ -290,50 +292,21 @@ def get_accessioned_items_csv(
     """
 
     accession_query = get_accessioned_items_count_query(params)
+    header = [
+        "year",
+        "month",
+        "owner_name",
+        "size_class_name",
+        "media_type_name",
+        "count",
+    ]
 
-    # Define the generator to stream data
-    def generate_csv():
-        output = StringIO()
-        writer = csv.writer(output)
-
-        # Write header row
-        writer.writerow(
-            [
-                "year",
-                "month",
-                "owner_name",
-                "size_class_name",
-                "media_type_name",
-                "count",
-            ]
-        )
-        yield output.getvalue()
-        output.seek(0)
-        output.truncate(0)
-
-        # Write rows from query results
-        for row in session.execute(accession_query):
-            writer.writerow(
-                [
-                    row.year,
-                    row.month,
-                    row.owner_name,
-                    row.size_class_name,
-                    row.media_type_name,
-                    row.count,
-                ]
-            )
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
-
-    # Return the StreamingResponse
-    return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": "attachment; filename=accession_item_count.csv"
-        },
+    return csv_response(
+        session,
+        accession_query,
+        "accession_item_count.csv",
+        header=header,
+        row_values=attrgetter(*header),
     )
 
 
@@ -387,7 +360,37 @@ def get_shelving_job_report_csv(
     Translates list response of ShelvingJobDiscrepancy objects to csv,
     returns binary for download
     """
-    query = select(ShelvingJobDiscrepancy)
+    tray_barcode = aliased(Barcode)
+    non_tray_item_barcode = aliased(Barcode)
+
+    query = (
+        select(
+            ShelvingJobDiscrepancy.id,
+            ShelvingJobDiscrepancy.shelving_job_id,
+            tray_barcode.value,
+            non_tray_item_barcode.value,
+            func.concat(User.first_name, literal(" "), User.last_name),
+            Owner.name,
+            SizeClass.short_name,
+            ShelvingJobDiscrepancy.assigned_location,
+            ShelvingJobDiscrepancy.pre_assigned_location,
+            ShelvingJobDiscrepancy.error,
+            ShelvingJobDiscrepancy.create_dt,
+            ShelvingJobDiscrepancy.update_dt,
+        )
+        .outerjoin(Tray, Tray.id == ShelvingJobDiscrepancy.tray_id)
+        .outerjoin(tray_barcode, tray_barcode.id == Tray.barcode_id)
+        .outerjoin(
+            NonTrayItem, NonTrayItem.id == ShelvingJobDiscrepancy.non_tray_item_id
+        )
+        .outerjoin(
+            non_tray_item_barcode, non_tray_item_barcode.id == NonTrayItem.barcode_id
+        )
+        .outerjoin(User, User.id == ShelvingJobDiscrepancy.assigned_user_id)
+        .outerjoin(Owner, Owner.id == ShelvingJobDiscrepancy.owner_id)
+        .outerjoin(SizeClass, SizeClass.id == ShelvingJobDiscrepancy.size_class_id)
+        .order_by(ShelvingJobDiscrepancy.id)
+    )
 
     if params.shelving_job_id:
         query = query.where(
@@ -408,16 +411,11 @@ def get_shelving_job_report_csv(
     if params.to_dt:
         query = query.where(ShelvingJobDiscrepancy.create_dt <= params.to_dt)
 
-    result = session.execute(query)
-    rows = result.scalars().all()
-
-    # Create an in-memory CSV
-    output = StringIO()
-    writer = csv.writer(output)
-
-    # Write headers (optional: use column names dynamically)
-    writer.writerow(
-        [
+    return csv_response(
+        session,
+        query,
+        "shelving_discrepancies.csv",
+        header=[
             "discrepancy_id",
             "shelving_job_id",
             "tray",
@@ -430,54 +428,7 @@ def get_shelving_job_report_csv(
             "error",
             "create_dt",
             "update_dt",
-        ]
-    )
-
-    tray_barcode_value = None
-    non_tray_item_barcode_value = None
-    assigned_user_name = None
-    owner_name = None
-    size_class_shortname = None
-
-    # Write rows
-    for row in rows:
-        if row.non_tray_item:
-            non_tray_item_barcode_value = row.non_tray_item.barcode.value
-        if row.tray:
-            tray_barcode_value = row.tray.barcode.value
-        if row.assigned_user:
-            assigned_user_name = row.assigned_user.name
-        if row.owner:
-            owner_name = row.owner.name
-        if row.size_class:
-            size_class_shortname = row.size_class.short_name
-        writer.writerow(
-            [
-                row.id,
-                row.shelving_job_id,
-                tray_barcode_value,
-                non_tray_item_barcode_value,
-                assigned_user_name,
-                owner_name,
-                size_class_shortname,
-                row.assigned_location,
-                row.pre_assigned_location,
-                row.error,
-                row.create_dt,
-                row.update_dt,
-            ]
-        )
-
-    # Reset the buffer position
-    output.seek(0)
-
-    # Create a StreamingResponse
-    return StreamingResponse(
-        output,
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": "attachment; filename=shelving_discrepancies.csv"
-        },
+        ],
     )
 
 
@@ -499,19 +450,17 @@ def get_shelving_job_discrepancy_detail(
 
 
 # OPEN LOCATIONS REPORT
-@router.get("/open-locations/", response_model=Page[OpenLocationsOutput])
-def get_open_locations_list(
-    session: Session = Depends(get_session),
-    params: OpenLocationParams = Depends(),
-    sort_params: SortParams = Depends(),
-) -> list:
+def get_open_locations_query(params, columns=None):
     """
-    Returns a paginated list of shelf objects with
-    unoccupied nested shelf positions based on search criteria
+    Construct the query for shelves with open positions.
+
+    params:
+        - params: OpenLocationParams
+        - columns: what to select, defaults to the Shelf entity
     """
-    # try:
     shelf_query = (
-        select(Shelf)
+        select(*(columns or [Shelf]))
+        .select_from(Shelf)
         .join(ShelfType, Shelf.shelf_type_id == ShelfType.id)
         .join(SizeClass, ShelfType.size_class_id == SizeClass.id)
         .join(Barcode, Shelf.barcode_id == Barcode.id)
@@ -572,6 +521,21 @@ def get_open_locations_list(
             .filter(Building.id == params.building_id)
         )
 
+    return shelf_query
+
+
+@router.get("/open-locations/", response_model=Page[OpenLocationsOutput])
+def get_open_locations_list(
+    session: Session = Depends(get_session),
+    params: OpenLocationParams = Depends(),
+    sort_params: SortParams = Depends(),
+) -> list:
+    """
+    Returns a paginated list of shelf objects with
+    unoccupied nested shelf positions based on search criteria
+    """
+    shelf_query = get_open_locations_query(params)
+
     # Validate and Apply sorting based on sort_params
     if sort_params.sort_by:
         # Apply sorting using BaseSorter
@@ -579,9 +543,6 @@ def get_open_locations_list(
         shelf_query = sorter.apply_sorting(shelf_query, sort_params)
 
     return paginate(session, shelf_query)
-    # except Exception as e:
-    #     inventory_logger.error(e)
-    #     raise InternalServerError(detail=f"{e}")
 
 
 @router.get("/open-locations/download", response_class=StreamingResponse)
@@ -592,74 +553,25 @@ def get_open_locations_csv(
     Returns a csv report of shelf objects with
     unoccupied nested shelf positions based on search criteria
     """
-    shelf_query = (
-        select(Shelf)
-        .join(ShelfType, Shelf.shelf_type_id == ShelfType.id)
-        .join(SizeClass, ShelfType.size_class_id == SizeClass.id)
-        .join(Barcode, Shelf.barcode_id == Barcode.id)
-        .join(Owner, Shelf.owner_id == Owner.id)
-        .filter(Shelf.available_space > 0)
-    )
-
-    # Optimize filtering
-    if not params.show_partial:
-        shelf_query = shelf_query.where(Shelf.available_space == ShelfType.max_capacity)
-    else:
-        shelf_query = shelf_query.where(Shelf.available_space <= ShelfType.max_capacity)
-
-    # Optimize owner filter with direct join
-    if params.owner_id:
-        shelf_query = shelf_query.filter(Owner.id.in_(params.owner_id))
-
-    if params.size_class_id:
-        shelf_query = shelf_query.filter(SizeClass.id.in_(params.size_class_id))
-
-    # Optimize location filtering
-    if params.ladder_id:
-        shelf_query = shelf_query.join(Ladder, Shelf.ladder_id == Ladder.id).filter(
-            Shelf.ladder_id == params.ladder_id
-        )
-    elif params.side_id:
-        shelf_query = (
-            shelf_query.join(Ladder, Shelf.ladder_id == Ladder.id)
-            .join(Side, Ladder.side_id == Side.id)
-            .filter(Side.id == params.side_id)
-        )
-    elif params.aisle_id:
-        shelf_query = (
-            shelf_query.join(Ladder, Shelf.ladder_id == Ladder.id)
-            .join(Side, Ladder.side_id == Side.id)
-            .join(Aisle, Side.aisle_id == Aisle.id)
-            .filter(Aisle.id == params.aisle_id)
-        )
-    elif params.module_id:
-        shelf_query = (
-            shelf_query.join(Ladder, Shelf.ladder_id == Ladder.id)
-            .join(Side, Ladder.side_id == Side.id)
-            .join(Aisle, Side.aisle_id == Aisle.id)
-            .join(Module, Aisle.module_id == Module.id)
-            .filter(Module.id == params.module_id)
-        )
-    elif params.building_id:
-        shelf_query = (
-            shelf_query.join(Ladder, Shelf.ladder_id == Ladder.id)
-            .join(Side, Ladder.side_id == Side.id)
-            .join(Aisle, Side.aisle_id == Aisle.id)
-            .join(Module, Aisle.module_id == Module.id)
-            .join(Building, Module.building_id == Building.id)
-            .filter(Building.id == params.building_id)
-        )
-
-    result = session.execute(shelf_query)
-    rows = result.scalars().all()
-
-    # Create an in-memory CSV
-    output = StringIO()
-    writer = csv.writer(output)
-
-    # Write headers (optional: use column names dynamically)
-    writer.writerow(
+    shelf_query = get_open_locations_query(
+        params,
         [
+            Barcode.value,
+            Shelf.available_space,
+            Shelf.location,
+            Owner.name,
+            Shelf.height,
+            Shelf.width,
+            Shelf.depth,
+            SizeClass.short_name,
+        ],
+    ).order_by(Shelf.id)
+
+    return csv_response(
+        session,
+        shelf_query,
+        "open_locations.csv",
+        header=[
             "shelf_barcode",
             "available_space",
             "location",
@@ -668,32 +580,7 @@ def get_open_locations_csv(
             "width",
             "depth",
             "size_class",
-        ]
-    )
-
-    # Write rows
-    for row in rows:
-        writer.writerow(
-            [
-                row.barcode.value,
-                row.available_space,
-                row.location,
-                row.owner.name,
-                row.height,
-                row.width,
-                row.depth,
-                row.shelf_type.size_class.short_name,
-            ]
-        )
-
-    # Reset the buffer position
-    output.seek(0)
-
-    # Create a StreamingResponse
-    return StreamingResponse(
-        output,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=open_locations.csv"},
+        ],
     )
 
 
@@ -820,53 +707,21 @@ def get_aisles_items_count_csv(
         params
     )
 
-    # Define the generator to stream data
-    def generate_csv():
-        output = StringIO()
-        writer = csv.writer(output)
-        # Write header row
-        writer.writerow(
-            [
-                "aisle_number",
-                "shelf_count",
-                "tray_count",
-                "item_count",
-                "non_tray_item_count",
-                "total_item_count",
-            ]
-        )
-        yield output.getvalue()
-        output.seek(0)
-        output.truncate(0)
-
-        # Fetch results and write each row
-        for row in session.execute(aisles_query):
-            aisle_number = row.aisle_number
-            shelf_count = row.shelf_count
-            tray_count = row.tray_count
-            item_count = row.item_count
-            non_tray_item_count = row.non_tray_item_count
-            total_item_count = item_count + non_tray_item_count
-
-            writer.writerow(
-                [
-                    aisle_number,
-                    shelf_count,
-                    tray_count,
-                    item_count,
-                    non_tray_item_count,
-                    total_item_count,
-                ]
-            )
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
-
-    # Return the streaming response
-    return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=aisles_item_count.csv"},
+    header = [
+        "aisle_number",
+        "shelf_count",
+        "tray_count",
+        "item_count",
+        "non_tray_item_count",
+        "total_item_count",
+    ]
+
+    return csv_response(
+        session,
+        aisles_query,
+        "aisles_item_count.csv",
+        header=header,
+        row_values=attrgetter(*header),
     )
 
 
@@ -1016,44 +871,19 @@ def get_non_tray_item_count_csv(
 
     query = get_non_tray_item_counts_query(params)
 
-    def generate_csv():
-        output = StringIO()
-        writer = csv.writer(output)
-        # Write header row
-        writer.writerow(
-            [
-                "size_class_id",
-                "size_class_name",
-                "size_class_short_name",
-                "non_tray_item_count",
-            ]
-        )
-        yield output.getvalue()
-        output.seek(0)
-        output.truncate(0)
-
-        for row in session.execute(query):
-            size_class_id = row.size_class_id
-            size_class_name = row.size_class_name
-            size_class_short_nam = row.size_class_short_name
-            non_tray_item_count = row.non_tray_item_count
-
-            writer.writerow(
-                [
-                    size_class_id,
-                    size_class_name,
-                    size_class_short_nam,
-                    non_tray_item_count,
-                ]
-            )
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
-
-    return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=non_tray_item_count.csv"},
+    header = [
+        "size_class_id",
+        "size_class_name",
+        "size_class_short_name",
+        "non_tray_item_count",
+    ]
+
+    return csv_response(
+        session,
+        query,
+        "non_tray_item_count.csv",
+        header=header,
+        row_values=attrgetter(*header),
     )
 
 
@@ -1191,47 +1021,20 @@ def get_tray_item_count_csv(
 
     query = get_tray_item_counts_query(params)
 
-    def generate_csv():
-        output = StringIO()
-        writer = csv.writer(output)
-        # Write header row
-        writer.writerow(
-            [
-                "size_class_id",
-                "size_class_name",
-                "size_class_short_name",
-                "tray_count",
-                "tray_item_count",
-            ]
-        )
-        yield output.getvalue()
-        output.seek(0)
-        output.truncate(0)
-
-        for row in session.execute(query):
-            size_class_id = row.size_class_id
-            size_class_name = row.size_class_name
-            size_class_short_name = row.size_class_short_name
-            tray_count = row.tray_count
-            tray_item_count = row.tray_item_count
-
-            writer.writerow(
-                [
-                    size_class_id,
-                    size_class_name,
-                    size_class_short_name,
-                    tray_count,
-                    tray_item_count,
-                ]
-            )
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
-
-    return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=tray_item_count.csv"},
+    header = [
+        "size_class_id",
+        "size_class_name",
+        "size_class_short_name",
+        "tray_count",
+        "tray_item_count",
+    ]
+
+    return csv_response(
+        session,
+        query,
+        "tray_item_count.csv",
+        header=header,
+        row_values=attrgetter(*header),
     )
 
 
@@ -1610,29 +1413,18 @@ def get_user_job_summary_csv(
 ):
     query = get_user_job_summary_query(params)
 
-    def generate_csv():
-        output = StringIO()
-        writer = csv.writer(output)
-        # Write header row
-        writer.writerow(["user_name", "job_type", "total_items_processed"])
-        yield output.getvalue()
-        output.seek(0)
-        output.truncate(0)
-
-        for row in session.execute(query):
-            user_name = row.user_name
-            job_type = row.job_type
-            total_items_processed = row.total_items_processed
-
-            writer.writerow([user_name, job_type, total_items_processed])
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
-
-    return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=user_job_count.csv"},
+    header = [
+        "user_name",
+        "job_type",
+        "total_items_processed",
+    ]
+
+    return csv_response(
+        session,
+        query,
+        "user_job_count.csv",
+        header=header,
+        row_values=attrgetter(*header),
     )
 
 
@@ -1717,51 +1509,21 @@ def get_verification_change_summary_csv(
     query = get_verification_change_query(params)
     query = query.subquery()
 
-    def generate_csv():
-        output = StringIO()
-        writer = csv.writer(output)
-        # Write header row
-        writer.writerow(
-            [
-                "workflow_id",
-                "item_barcode",
-                "tray_barcode",
-                "completed_dt",
-                "completed_by",
-                "action",
-            ]
-        )
-        yield output.getvalue()
-        output.seek(0)
-        output.truncate(0)
-        for row in session.execute(select(query)):
-            workflow_id = row.workflow_id
-            item_barcode = row.item_barcode if row.item_barcode else None
-            tray_barcode = row.tray_barcode if row.tray_barcode else None
-            completed_dt = row.completed_dt
-            completed_by = row.completed_by
-            action = row.action
-
-            writer.writerow(
-                [
-                    workflow_id,
-                    item_barcode,
-                    tray_barcode,
-                    completed_dt,
-                    completed_by,
-                    action,
-                ]
-            )
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
-
-    return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": "attachment; filename=verification_change_summary.csv"
-        },
+    header = [
+        "workflow_id",
+        "item_barcode",
+        "tray_barcode",
+        "completed_dt",
+        "completed_by",
+        "action",
+    ]
+
+    return csv_response(
+        session,
+        select(query),
+        "verification_change_summary.csv",
+        header=header,
+        row_values=attrgetter(*header),
     )
 
 
@@ -1882,32 +1644,18 @@ def get_retrieval_count_csv(
 ):
     query = get_retrieval_item_count_query(params)
 
-    def generate_csv():
-        output = StringIO()
-        writer = csv.writer(output)
-        # Write header row
-        writer.writerow(
-            ["owner_name", "total_item_retrieved_count", "max_retrieved_count"]
-        )
-        yield output.getvalue()
-        output.seek(0)
-        output.truncate(0)
-        for row in session.execute(query):
-            owner_name = row.owner_name
-            total_item_retrieved_count = row.total_item_retrieved_count
-            max_retrieved_count = row.max_retrieved_count
-
-            writer.writerow(
-                [owner_name, total_item_retrieved_count, max_retrieved_count]
-            )
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
-
-    return StreamingResponse(
-        generate_csv(),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=retrieval_count.csv"},
+    header = [
+        "owner_name",
+        "total_item_retrieved_count",
+        "max_retrieved_count",
+    ]
+
+    return csv_response(
+        session,
+        query,
+        "retrieval_count.csv",
+        header=header,
+        row_values=attrgetter(*header),
     )
 
 
@@ -1962,7 +1710,36 @@ def get_move_report_csv(
     Translates list response of move Discrepancy objects to csv,
     returns binary for download
     """
-    query = select(MoveDiscrepancy)
+    tray_barcode = aliased(Barcode)
+    non_tray_item_barcode = aliased(Barcode)
+
+    query = (
+        select(
+            MoveDiscrepancy.id,
+            tray_barcode.value,
+            non_tray_item_barcode.value,
+            func.concat(User.first_name, literal(" "), User.last_name),
+            Owner.name,
+            SizeClass.short_name,
+            ContainerType.type,
+            MoveDiscrepancy.original_assigned_location,
+            MoveDiscrepancy.current_assigned_location,
+            MoveDiscrepancy.error,
+            MoveDiscrepancy.create_dt,
+            MoveDiscrepancy.update_dt,
+        )
+        .outerjoin(Tray, Tray.id == MoveDiscrepancy.tray_id)
+        .outerjoin(tray_barcode, tray_barcode.id == Tray.barcode_id)
+        .outerjoin(NonTrayItem, NonTrayItem.id == MoveDiscrepancy.non_tray_item_id)
+        .outerjoin(
+            non_tray_item_barcode, non_tray_item_barcode.id == NonTrayItem.barcode_id
+        )
+        .outerjoin(User, User.id == MoveDiscrepancy.assigned_user_id)
+        .outerjoin(Owner, Owner.id == MoveDiscrepancy.owner_id)
+        .outerjoin(SizeClass, SizeClass.id == MoveDiscrepancy.size_class_id)
+        .outerjoin(ContainerType, ContainerType.id == MoveDiscrepancy.container_type_id)
+        .order_by(MoveDiscrepancy.id)
+    )
 
     if params.assigned_user_id:
         query = query.where(
@@ -1983,16 +1760,11 @@ def get_move_report_csv(
     if params.to_dt:
         query = query.where(MoveDiscrepancy.create_dt <= params.to_dt)
 
-    result = session.execute(query)
-    rows = result.scalars().all()
-
-    # Create an in-memory CSV
-    output = StringIO()
-    writer = csv.writer(output)
-
-    # Write headers (optional: use column names dynamically)
-    writer.writerow(
-        [
+    return csv_response(
+        session,
+        query,
+        "shelving_discrepancies.csv",
+        header=[
             "discrepancy_id",
             "tray",
             "non_tray_item",
@@ -2005,55 +1777,5 @@ def get_move_report_csv(
             "error",
             "create_dt",
             "update_dt",
-        ]
-    )
-
-    tray_barcode_value = None
-    non_tray_item_barcode_value = None
-    assigned_user_name = None
-    owner_name = None
-    size_class_shortname = None
-    container_type_type = None
-
-    # Write rows
-    for row in rows:
-        if row.non_tray_item:
-            non_tray_item_barcode_value = row.non_tray_item.barcode.value
-        if row.tray:
-            tray_barcode_value = row.tray.barcode.value
-        if row.assigned_user:
-            assigned_user_name = row.assigned_user.name
-        if row.owner:
-            owner_name = row.owner.name
-        if row.size_class:
-            size_class_shortname = row.size_class.short_name
-        if row.container_type:
-            container_type_type = row.container_type.type
-        writer.writerow(
-            [
-                row.id,
-                tray_barcode_value,
-                non_tray_item_barcode_value,
-                assigned_user_name,
-                owner_name,
-                size_class_shortname,
-                container_type_type,
-                row.original_assigned_location,
-                row.current_assigned_location,
-                row.error,
-                row.create_dt,
-                row.update_dt,
-            ]
-        )
-
-    # Reset the buffer position
-    output.seek(0)
-
-    # Create a StreamingResponse
-    return StreamingResponse(
-        output,
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": "attachment; filename=shelving_discrepancies.csv"
-        },
+        ],
     )
@@ -36,7 +36,7 @@ from app.config.exceptions import (
     InternalServerError,
 )
 from app.sorting import RequestSorter
-from app.utilities import get_module_shelf_position
+from app.utilities import get_shelf_position_building_id
 
 router = APIRouter(
     prefix="/requests",
@@ -332,10 +332,7 @@ def create_request(
     if not shelf_position:
         raise NotFound(detail=f"Shelf Position Not Found")
 
-    module = get_module_shelf_position(session, shelf_position)
-
-    if module:
-        request_input.building_id = module.building_id
+    request_input.building_id = get_shelf_position_building_id(session, shelf_position)
 
     new_request = Request(**request_input.model_dump(exclude={"barcode_value"}))
 
@@ -57,16 +57,14 @@ def get_shelf_position_list(
         statement = (
             select(ShelfPosition)
             .where(ShelfPosition.shelf_id == shelf_id)
-            .where(ShelfPosition.tray == None)
-            .where(ShelfPosition.non_tray_item == None)
+            .where(ShelfPosition.occupied == False)
         )
     elif shelf_id:
         statement = select(ShelfPosition).where(ShelfPosition.shelf_id == shelf_id)
     elif empty:
         statement = (
             select(ShelfPosition)
-            .where(ShelfPosition.tray == None)
-            .where(ShelfPosition.non_tray_item == None)
+            .where(ShelfPosition.occupied == False)
         )
     else:
         statement = select(ShelfPosition)
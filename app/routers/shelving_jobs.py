@@ -13,8 +13,8 @@ from app.models.accession_jobs import AccessionJob, AccessionJobStatus
 from app.models.users import User
 from app.events import update_shelf_space_after_tray, update_shelf_space_after_non_tray
 from app.sorting import ShelvingJobSorter
+from app.allocation import allocate_shelf_positions
 from app.utilities import (
-    process_containers_for_shelving,
     manage_transition,
     start_session_with_audit_info,
 )
@@ -217,7 +217,8 @@ def create_shelving_job(
                 raise ValidationException(
                     detail="verification_jobs are required when origin is 'Verification'."
                 )
-            # Assign verification jobs to shelving_job
+            # Validate every verification job before placing any containers
+            verification_jobs = []
             for verification_job_id in shelving_job_input.verification_jobs:
                 verification_job = (
                     session.query(VerificationJob)
@@ -238,40 +239,35 @@ def create_shelving_job(
                         raise ValidationException(
                             detail=f"verification_job_id {verification_job_id} has already been shelved during shelving job {verification_job.shelving_job_id}"
                         )
+                verification_jobs.append(verification_job)
+
+            # Assign trays and NonTrayItems of all jobs to shelf positions at once
+            start_session_with_audit_info(audit_info, session)
+            allocate_shelf_positions(
+                session,
+                new_shelving_job.id,
+                new_shelving_job.building_id,
+                module_id,
+                aisle_id,
+                side_id,
+                ladder_id,
+                tray_ids=[
+                    tray.id
+                    for verification_job in verification_jobs
+                    for tray in verification_job.trays
+                ],
+                non_tray_item_ids=[
+                    non_tray_item.id
+                    for verification_job in verification_jobs
+                    for non_tray_item in verification_job.non_tray_items
+                ],
+            )
 
-                # Assign trays to shelving job and shelf positions
-                if verification_job.trays:
-                    process_containers_for_shelving(
-                        session,
-                        "Tray",
-                        verification_job.trays,
-                        new_shelving_job.id,
-                        new_shelving_job.building_id,
-                        module_id,
-                        aisle_id,
-                        side_id,
-                        ladder_id,
-                    )
-
-                # Assign NonTrayItems to shelving job and shelf positions
-                if verification_job.non_tray_items:
-                    process_containers_for_shelving(
-                        session,
-                        "Non-Tray",
-                        verification_job.non_tray_items,
-                        new_shelving_job.id,
-                        new_shelving_job.building_id,
-                        module_id,
-                        aisle_id,
-                        side_id,
-                        ladder_id,
-                    )
-
-                # set verification shelving job last, in case container errors
+            # set verification shelving job last, in case container errors
+            for verification_job in verification_jobs:
                 verification_job.shelving_job_id = new_shelving_job.id
                 session.add(verification_job)
-                start_session_with_audit_info(audit_info, session)
-                session.commit()
+            session.commit()
 
         # else, shelving_job.origin == "Direct", return shelving_job
         return get_shelving_position(session, new_shelving_job)
@@ -286,6 +282,7 @@ def create_shelving_job(
         # Pass through the original error
         raise ValidationException(detail=f"{e.detail}")
     except NotFound as e:
+        session.rollback()
         session.delete(new_shelving_job)
         session.commit()
         # Pass through the original error
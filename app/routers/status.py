@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
-from app.database.session import get_session
+from app.batch_upload_jobs import batch_upload_jobs
+from app.database.session import engine, get_session, pool_metrics
+from app.shelf_space import shelf_space_queue, shelf_space_reconciler
 from sqlmodel import Session
 
 
@@ -16,3 +18,34 @@ def get_api_status(session: Session = Depends(get_session)) -> list:
     Auth middleware allows consumption without a Bearer token
     """
     return JSONResponse(status_code=200, content={"detail": "OK"})
+
+
+@router.get("/pool")
+def get_pool_status():
+    """
+    Connection pool diagnostics for the request engine.
+    in_use and overflow are current counts, checkout waits are since startup.
+    Unlike the health check, requires a Bearer token
+    """
+    return pool_metrics.snapshot(engine.pool)
+
+
+@router.get("/shelf-space")
+def get_shelf_space_queue_status():
+    """
+    Shelf available_space recount queue and reconciliation diagnostics.
+    depth and oldest_pending_ms are current, batch counts and lag are since startup.
+    """
+    return {
+        **shelf_space_queue.snapshot(),
+        "reconciliation": shelf_space_reconciler.snapshot(),
+    }
+
+
+@router.get("/batch-uploads")
+def get_batch_upload_jobs_status():
+    """
+    Batch upload worker pool diagnostics.
+    queued and running are current, outcomes are since startup.
+    """
+    return batch_upload_jobs.snapshot()
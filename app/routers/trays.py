@@ -4,6 +4,7 @@ from fastapi_pagination.ext.sqlmodel import paginate
 from sqlmodel import Session, select
 from datetime import datetime, timezone
 
+from app.database.async_session import AsyncSession, get_async_session, to_response
 from app.database.session import get_session, commit_record
 from app.filter_params import SortParams, ItemFilterParams
 from app.events import update_shelf_space_after_tray
@@ -117,7 +118,9 @@ def get_tray_detail(id: int, session: Session = Depends(get_session)):
 
 
 @router.get("/barcode/{value}", response_model=TrayDetailReadOutput)
-def get_tray_by_barcode_value(value: str, session: Session = Depends(get_session)):
+async def get_tray_by_barcode_value(
+    value: str, session: AsyncSession = Depends(get_async_session)
+):
     """
     Retrieve a tray using a barcode value
 
@@ -128,14 +131,15 @@ def get_tray_by_barcode_value(value: str, session: Session = Depends(get_session
         raise ValidationException(detail="Tray barcode value is required")
 
     tray = (
-        session.query(Tray)
-        .join(Barcode, Tray.barcode_id == Barcode.id)
-        .filter(Barcode.value == value)
-        .first()
-    )
+        await session.exec(
+            select(Tray)
+            .join(Barcode, Tray.barcode_id == Barcode.id)
+            .where(Barcode.value == value)
+        )
+    ).first()
     if not tray:
         raise NotFound(detail=f"Tray barcode value {value} not found")
-    return tray
+    return await to_response(session, TrayDetailReadOutput, tray)
 
 
 @router.post("/", response_model=TrayDetailWriteOutput, status_code=201)
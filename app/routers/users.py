@@ -11,6 +11,7 @@ from datetime import datetime, timezone
 
 from app.database.session import get_session
 from app.filter_params import SortParams
+from app.middlware import user_auth_cache
 from app.models.groups import Group
 from app.models.users import User
 from app.config.exceptions import (
@@ -143,6 +144,7 @@ def update_user(
         raise NotFound(detail=f"User ID {id} Not Found")
 
     mutated_data = user.model_dump(exclude_unset=True)
+    previous_email = existing_user.email
 
     for key, value in mutated_data.items():
         setattr(existing_user, key, value)
@@ -153,6 +155,10 @@ def update_user(
     session.commit()
     session.refresh(existing_user)
 
+    # the middleware re-reads the user on its next request
+    user_auth_cache.invalidate(previous_email)
+    user_auth_cache.invalidate(existing_user.email)
+
     return existing_user
 
 
@@ -173,8 +179,10 @@ def delete_user(id: int, session: Session = Depends(get_session)):
     user = session.get(User, id)
 
     if user:
+        email = user.email
         session.delete(user)
         session.commit()
+        user_auth_cache.invalidate(email)
         return HTTPException(status_code=204)
 
     raise NotFound(detail=f"User ID {id} Not Found")
@@ -7,6 +7,8 @@ from sqlalchemy import func, distinct
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import aliased
 
+from app.barcode_resolution import resolve_barcode
+from app.batch_scans import batch_add_to_verification_job, batch_scan_output
 from app.database.session import get_session, commit_record
 from app.filter_params import SortParams, JobFilterParams
 from app.models.barcodes import Barcode
@@ -23,6 +25,7 @@ from app.tasks import (
 )
 from app.models.verification_jobs import VerificationJob
 from app.models.accession_jobs import AccessionJob
+from app.schemas.batch_scans import BatchScanInput, BatchScanOutput
 from app.schemas.verification_jobs import (
     VerificationJobInput,
     VerificationJobUpdateInput,
@@ -34,6 +37,7 @@ from app.schemas.verification_jobs import (
     VerificationJobAccCheckOutput
 )
 from app.config.exceptions import (
+    BadRequest,
     NotFound,
     ValidationException,
     InternalServerError,
@@ -442,42 +446,37 @@ def add_item_to_verification_job(
     if not verification_job:
         raise NotFound(detail=f"Verification Job ID {id} Not Found")
 
-    barcode = (
-        session.query(Barcode).filter(Barcode.value == input.barcode_value).first()
-    )
+    barcode = resolve_barcode(session, input.barcode_value, cached=True)
 
     if not barcode:
         raise NotFound(detail=f"Barcode with value {input.barcode_value} Not Found")
 
-    tray = session.query(Tray).filter(Tray.barcode_id == barcode.id).first()
-    item = session.query(Item).filter(Item.barcode_id == barcode.id).first()
-    non_tray_item = (
-        session.query(NonTrayItem).filter(NonTrayItem.barcode_id == barcode.id).first()
-    )
-
-    if not tray and not item and not non_tray_item:
+    if not barcode.entity_type:
         raise NotFound(detail=f"Item with barcode value {input.barcode_value} Not "
                               f"Found")
-    if tray:
-        new_verification_changes = []
-        items = tray.items
-        if items:
-            for item in items:
-                item_barcode = session.get(Barcode, item.barcode_id)
-                new_verification_changes.append(VerificationChange(
-                    workflow_id=verification_job.workflow_id,
-                    tray_barcode_value=barcode.value,
-                    item_barcode_value=item_barcode.value,
-                    change_type="Added",
-                    completed_by_id=verification_job.user_id
-                ))
+    if barcode.entity_type == "Tray":
+        item_barcode_values = session.execute(
+            select(Barcode.value)
+            .join(Item, Item.barcode_id == Barcode.id)
+            .where(Item.tray_id == barcode.entity_id)
+            .order_by(Item.id)
+        ).scalars().all()
+        new_verification_changes = [
+            VerificationChange(
+                workflow_id=verification_job.workflow_id,
+                tray_barcode_value=barcode.value,
+                item_barcode_value=item_barcode_value,
+                change_type="Added",
+                completed_by_id=verification_job.user_id
+            )
+            for item_barcode_value in item_barcode_values
+        ]
         session.bulk_save_objects(new_verification_changes)
         session.commit()
-    elif item:
-        tray_barcode = session.query(Barcode).join(Tray, Barcode.id == Tray.barcode_id).filter(Tray.id == item.tray_id).first()
+    elif barcode.entity_type == "Item":
         new_verification_change = VerificationChange(
             workflow_id=verification_job.workflow_id,
-            tray_barcode_value=tray_barcode.value,
+            tray_barcode_value=barcode.tray_barcode_value,
             item_barcode_value=barcode.value,
             change_type="Added",
             completed_by_id=verification_job.user_id
@@ -498,6 +497,44 @@ def add_item_to_verification_job(
     return verification_job
 
 
+@router.patch("/{id}/add/batch", response_model=BatchScanOutput)
+def batch_add_items_to_verification_job(
+    id: int,
+    input: BatchScanInput,
+    session: Session = Depends(get_session)
+):
+    """
+    Add a batch of scanned trays, items and non tray items to a verification job.
+
+    **Args:**
+    - id: The ID of the verification job.
+    - Batch Scan Input: The scanned barcode values.
+
+    **Returns:**
+    - Batch Scan Output: The result for each barcode value.
+
+    **Raises:**
+    - Bad Request HTTPException: If no barcode values are provided.
+    - Not Found HTTPException: If the verification job is not found.
+    """
+    if not input.barcode_values:
+        raise BadRequest(detail="At least one barcode value must be provided")
+
+    verification_job = session.get(VerificationJob, id)
+
+    if not verification_job:
+        raise NotFound(detail=f"Verification Job ID {id} Not Found")
+
+    results = batch_add_to_verification_job(
+        session, verification_job, input.barcode_values
+    )
+    verification_job.update_dt = datetime.now(timezone.utc)
+    session.add(verification_job)
+    session.commit()
+
+    return batch_scan_output(results)
+
+
 @router.patch("/{id}/remove", response_model=VerificationJobDetailOutput)
 def remove_item_from_verification_job(
     id: int,
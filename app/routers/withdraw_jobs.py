@@ -13,6 +13,8 @@ from app.config.exceptions import (
     BadRequest,
     ValidationException,
 )
+from app.barcode_resolution import resolve_barcode
+from app.batch_scans import batch_add_to_withdraw_job, batch_scan_output
 from app.database.session import get_session
 from app.filter_params import SortParams, JobFilterParams
 from app.events import update_shelf_space_after_tray, update_shelf_space_after_non_tray
@@ -34,10 +36,10 @@ from app.models.pick_lists import PickList
 from app.models.requests import Request
 from app.sorting import WithdrawJobSorter
 from app.utilities import (
-    validate_item_not_shelved,
     validate_container_not_shelved, start_session_with_audit_info,
 )
 from starlette import status
+from app.schemas.batch_scans import BatchScanInput, BatchScanOutput
 from app.schemas.withdraw_jobs import (
     WithdrawJobInput,
     WithdrawJobWriteOutput,
@@ -45,7 +47,7 @@ from app.schemas.withdraw_jobs import (
     WithdrawJobListOutput,
     WithdrawJobDetailOutput,
 )
-from app.utilities import manage_transition, get_module_shelf_position
+from app.utilities import manage_transition, get_shelf_position_building_id
 
 router = APIRouter(
     prefix="/withdraw-jobs",
@@ -246,8 +248,9 @@ def update_withdraw_job(
         for item in existing_withdraw_job.items:
             if not building_id:
                 tray = session.get(Tray, item.tray_id)
-                module = get_module_shelf_position(session, tray.shelf_position)
-                building_id = module.building_id
+                building_id = get_shelf_position_building_id(
+                    session, tray.shelf_position
+                )
 
                 pick_list.building_id = building_id
                 pick_list.status = "Created"
@@ -277,10 +280,9 @@ def update_withdraw_job(
 
         for non_tray_item in existing_withdraw_job.non_tray_items:
             if not building_id:
-                module = get_module_shelf_position(
+                building_id = get_shelf_position_building_id(
                     session, non_tray_item.shelf_position
                 )
-                building_id = module.building_id
                 pick_list.building_id = building_id
                 session.add(pick_list)
                 start_session_with_audit_info(audit_info, session)
@@ -664,42 +666,29 @@ def add_items_to_withdraw_job(
     errored_barcodes = []
     withdraw_items = []
 
-    barcode = (
-        session.query(Barcode).filter(Barcode.value == lookup_barcode_value).first()
-    )
+    barcode = resolve_barcode(session, lookup_barcode_value)
 
     if not barcode:
         raise NotFound(detail=f"Barcode {lookup_barcode_value} not found")
 
-    item = session.query(Item).filter(Item.barcode_id == barcode.id).first()
-    non_tray_item = (
-        session.query(NonTrayItem).filter(NonTrayItem.barcode_id == barcode.id).first()
-    )
-    tray = session.query(Tray).filter(Tray.barcode_id == barcode.id).first()
-
-    if item:
-        tray_id = item.tray_id
-        if item.status == "Requested" or item.status == "Withdrawn":
+    if barcode.entity_type == "Item":
+        tray_id = barcode.tray_id
+        if barcode.status == "Requested" or barcode.status == "Withdrawn":
             raise ValidationException(
                 detail="Item must be have status if ['In', 'Out']"
             )
 
+        # items are shelved through their tray
+        if validate_container_not_shelved(barcode):
+            raise ValidationException(detail="Item is not shelved")
+
+        item = session.get(Item, barcode.entity_id)
         existing_item_withdrawals = (
             session.query(ItemWithdrawal)
             .filter(ItemWithdrawal.item_id == item.id)
             .all()
         )
 
-        shelf_position = (
-            session.query(ShelfPosition)
-            .join(Tray)
-            .filter(Tray.id == tray_id)
-            .first()
-        )
-
-        if validate_item_not_shelved(shelf_position):
-            raise ValidationException(detail="Item is not shelved")
-
         if validate_withdraw_item(
             existing_item_withdrawals, job_id, "Completed", session
         ):
@@ -721,15 +710,17 @@ def add_items_to_withdraw_job(
         item.update_dt = update_dt
         session.add(item)
 
-    elif non_tray_item:
-        if validate_container_not_shelved(non_tray_item):
+    elif barcode.entity_type == "NonTrayItem":
+        if validate_container_not_shelved(barcode):
             raise ValidationException(detail="Non Tray Item is not shelved")
 
-        if non_tray_item.status == "Requested" or non_tray_item.status == "Withdrawn":
+        if barcode.status == "Requested" or barcode.status == "Withdrawn":
             raise ValidationException(
                 detail="Non Tray Item must have status of ['In', 'Out']"
             )
 
+        non_tray_item = session.get(NonTrayItem, barcode.entity_id)
+
         existing_non_tray_item_withdrawals = (
             session.query(NonTrayItemWithdrawal)
             .filter(NonTrayItemWithdrawal.non_tray_item_id == non_tray_item.id)
@@ -752,13 +743,14 @@ def add_items_to_withdraw_job(
         non_tray_item.update_dt = update_dt
         session.add(non_tray_item)
 
-    elif tray:
+    elif barcode.entity_type == "Tray":
         items_for_withdrawal = False
+        tray = session.get(Tray, barcode.entity_id)
 
         if not tray.items:
             raise ValidationException(detail="Tray is empty")
 
-        if validate_container_not_shelved(tray):
+        if validate_container_not_shelved(barcode):
             raise ValidationException(detail="Tray is not shelved")
 
         for item in tray.items:
@@ -858,6 +850,43 @@ def add_items_to_withdraw_job(
     return withdraw_job
 
 
+@router.post("/{job_id}/add_items/batch", response_model=BatchScanOutput)
+def batch_add_items_to_withdraw_job(
+    job_id: int,
+    batch_scan_input: BatchScanInput,
+    session: Session = Depends(get_session),
+):
+    """
+    Add a batch of scanned items, non tray items and trays to a withdraw job.
+
+    **Args:**
+    - job_id: The ID of the withdraw job.
+    - Batch Scan Input: The scanned barcode values.
+
+    **Returns:**
+    - Batch Scan Output: The result for each barcode value.
+
+    **Raises:**
+    - Not Found HTTPException: If the withdraw job is not found.
+    """
+    if not batch_scan_input.barcode_values:
+        raise BadRequest(detail="At least one barcode value must be provided")
+
+    withdraw_job = session.get(WithdrawJob, job_id)
+    if not withdraw_job:
+        raise NotFound(detail=f"Withdraw job id {job_id} not found")
+
+    if withdraw_job.status == "Completed":
+        raise BadRequest(detail="Withdraw job has already been completed")
+
+    results = batch_add_to_withdraw_job(
+        session, withdraw_job, batch_scan_input.barcode_values
+    )
+    session.commit()
+
+    return batch_scan_output(results)
+
+
 @router.delete("/{job_id}/remove_items", response_model=WithdrawJobDetailOutput)
 def remove_items_from_withdraw_job(
     job_id: int,
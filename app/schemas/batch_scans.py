@@ -0,0 +1,50 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class BatchScanInput(BaseModel):
+    user_id: Optional[int] = None
+    barcode_values: List[str]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "barcode_values": [
+                    "1234567890",
+                    "1234567891"
+                ]
+            }
+        }
+
+
+class BatchScanResult(BaseModel):
+    status: str
+    detail: Optional[str] = None
+    errors: Optional[List[dict]] = None
+
+
+class BatchScanOutput(BaseModel):
+    results: Dict[str, BatchScanResult]
+    added: int
+    errored: int
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "results": {
+                    "1234567890": {
+                        "status": "Added",
+                        "detail": None,
+                        "errors": None
+                    },
+                    "1234567891": {
+                        "status": "Error",
+                        "detail": "Barcode value 1234567891 not found",
+                        "errors": None
+                    }
+                },
+                "added": 1,
+                "errored": 1
+            }
+        }
@@ -60,6 +60,9 @@ class BatchUploadListOutput(BatchUploadBaseOutput):
     file_size: Optional[int] = None
     file_type: Optional[str] = None
     withdraw_job_id: Optional[int] = None
+    total_rows: int = 0
+    processed_rows: int = 0
+    errored_rows: int = 0
     requests: Optional[List[RequestListOutput]] = None
     user: Optional[UserDetailWriteOutput] = None
     create_dt: datetime
@@ -80,6 +83,9 @@ class BatchUploadListOutput(BatchUploadBaseOutput):
                 "file_size": 1000,
                 "file_type": "text/csv",
                 "withdraw_job_id": 1,
+                "total_rows": 1,
+                "processed_rows": 1,
+                "errored_rows": 0,
                 "requests": [{"...": "..."}],
                 "request_count": 1,
                 "create_dt": "2023-10-08T20:46:56.764426",
@@ -94,6 +100,10 @@ class BatchUploadDetailOutput(BatchUploadBaseOutput):
     file_size: Optional[int] = None
     file_type: Optional[str] = None
     withdraw_job_id: Optional[int] = None
+    total_rows: int = 0
+    processed_rows: int = 0
+    errored_rows: int = 0
+    errors: Optional[List[dict]] = None
     requests: Optional[List[RequestListOutput]] = None
     withdraw_job: Optional[WithdrawJobBaseOutput] = None
     user: Optional[object] = None
@@ -111,6 +121,16 @@ class BatchUploadDetailOutput(BatchUploadBaseOutput):
                 "file_type": "text/csv",
                 "request_id": 1,
                 "withdraw_job_id": 1,
+                "total_rows": 2,
+                "processed_rows": 2,
+                "errored_rows": 1,
+                "errors": [
+                    {
+                        "line": 2,
+                        "barcode_value": "12345",
+                        "error": "Item with Barcode 12345 not found"
+                    }
+                ],
                 "request": [
                     {
                         "id": 1,
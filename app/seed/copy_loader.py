@@ -0,0 +1,499 @@
+import csv, queue, threading, time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from datetime import datetime, timezone
+from io import StringIO
+
+import sqlalchemy as sa
+
+from sqlalchemy import delete, func, literal, update
+
+from app.config.config import get_settings
+from app.database.session import get_sqlalchemy_session_thread_safe
+from app.logger import migration_logger
+from app.models.barcodes import Barcode
+from app.models.shelf_position_numbers import ShelfPositionNumber
+from app.models.shelf_positions import ShelfPosition
+from app.models.shelves import Shelf
+
+"""
+COPY based bulk loading for the legacy migrations.
+
+The ORM loaders build a Barcode and an Item/Tray/etc instance per row on
+worker threads and flush them through the session. In COPY mode a chunk
+is parsed into plain tuples, streamed into a temporary staging table with
+COPY FROM STDIN, and then foreign keys are resolved and target rows are
+inserted with a handful of set based statements per chunk.
+
+Rows that can't be resolved are deleted from staging with DELETE ...
+RETURNING and reported the same way the ORM loaders report them.
+
+Parsing is CPU bound, so chunks are parsed on a process pool and handed
+to a few writer threads through a bounded queue. The load_*_copy scripts
+and the checkpointed migration_runner both load through run_copy_load.
+"""
+
+COPY_CHUNK_SIZE = 50000
+
+
+def legacy_date(value, pattern):
+    """
+    Parses a legacy LAS date, '?' and blanks are unknown.
+
+    in pattern "%m/%d/%y"
+        For two-digit years 00-68, Python assumes they are in the 21st century (2000-2068).
+        For two-digit years 69-99, Python assumes they are in the 20th century (1969-1999).
+    """
+    if value in ['?', '', None]:
+        return None
+    return datetime.strptime(value, pattern).replace(tzinfo=timezone.utc)
+
+
+def legacy_owner_name(owner_name):
+    """Fixes owner name casing and typos found in the LAS snapshot"""
+    if owner_name in ["lc", "Lc", "lC"]:
+        return "LC"
+    if owner_name == "Vertrans History Project":
+        return "Veterans History Project"
+    return owner_name
+
+
+def legacy_media_type(media_type):
+    if media_type.upper() == 'A':
+        return 'Book/Volume'
+    if media_type.upper() == 'M':
+        return 'Microfilm'
+    return media_type
+
+
+def staging_table(name, *columns):
+    """
+    Temporary table dropped when the chunk's transaction ends.
+    Every staging table leads with the legacy row number.
+    """
+    return sa.Table(
+        name,
+        sa.MetaData(),
+        sa.Column("row_num", sa.Integer, nullable=False),
+        *columns,
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP",
+    )
+
+
+def copy_rows(session, table, columns, rows):
+    """
+    Streams rows into table with COPY FROM STDIN.
+
+    params:
+        - session is the chunk's session
+        - table to copy into
+        - columns names, in the order of each row's values
+        - rows of tuples. None is written as NULL
+
+    returns:
+        - number of rows copied
+    """
+    buffer = StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def pop_unresolved(session, table, condition, reason, **error_columns):
+    """
+    Deletes staging rows matching condition and returns them as error
+    dicts shaped like the ORM loaders' error reports.
+
+    params:
+        - condition selects the rows to drop
+        - reason is a string or an sql expression over the staging row
+        - error_columns maps error report keys to staging columns
+
+    returns:
+        - list of {"row": ..., **error_columns, "reason": ...}
+    """
+    if isinstance(reason, str):
+        reason = literal(reason)
+
+    keys = list(error_columns)
+    result = session.execute(
+        delete(table)
+        .where(condition)
+        .returning(
+            table.c.row_num, *error_columns.values(), reason.label("reason")
+        )
+    )
+    return [
+        {
+            "row": row[0],
+            **dict(zip(keys, row[1:-1])),
+            "reason": row[-1],
+        }
+        for row in result
+    ]
+
+
+def later_duplicate(table, *columns):
+    """
+    Condition matching staging rows that repeat an earlier row's values
+    for columns in the same chunk.
+    """
+    earlier = table.alias(f"earlier_{table.name}")
+    return sa.exists().where(
+        earlier.c.row_num < table.c.row_num,
+        *[earlier.c[column.name] == column for column in columns],
+    )
+
+
+def pop_barcode_conflicts(session, table, **error_columns):
+    """
+    Drops staged rows whose barcode is already registered,
+    or repeats an earlier row's barcode in the chunk.
+    """
+    errors = pop_unresolved(
+        session,
+        table,
+        sa.exists().where(Barcode.value == table.c.barcode),
+        "Barcode already exists",
+        **error_columns
+    )
+    errors += pop_unresolved(
+        session,
+        table,
+        later_duplicate(table, table.c.barcode),
+        "Duplicate barcode in legacy snapshot",
+        **error_columns
+    )
+    return errors
+
+
+def resolve_staged_shelf_positions(session, table, **error_columns):
+    """
+    Sets shelf_position_id on staged containers from their shelf barcode
+    and legacy shelf position number, then drops rows whose position
+    doesn't exist, is occupied, or is claimed twice in the chunk.
+
+    returns:
+        - errors for the dropped rows
+    """
+    session.execute(
+        update(table)
+        .values(shelf_position_id=ShelfPosition.id)
+        .where(
+            Barcode.value == table.c.shelf_barcode,
+            Shelf.barcode_id == Barcode.id,
+            ShelfPosition.shelf_id == Shelf.id,
+            ShelfPositionNumber.id == ShelfPosition.shelf_position_number_id,
+            ShelfPositionNumber.number == table.c.shelf_position_number,
+        )
+    )
+
+    errors = pop_unresolved(
+        session,
+        table,
+        table.c.shelf_position_id.is_(None),
+        func.concat(
+            "Legacy shelf_position number ",
+            table.c.shelf_position_number,
+            " is outside the bounds for this shelf's shelf_type",
+        ),
+        **error_columns
+    )
+    errors += pop_unresolved(
+        session,
+        table,
+        sa.exists().where(
+            ShelfPosition.id == table.c.shelf_position_id, ShelfPosition.occupied
+        ),
+        func.concat("Shelf position already occupied sp_id: ", table.c.shelf_position_id),
+        **error_columns
+    )
+    errors += pop_unresolved(
+        session,
+        table,
+        later_duplicate(table, table.c.shelf_position_id),
+        func.concat("Duplicate shelf position assignment sp_id: ", table.c.shelf_position_id),
+        **error_columns
+    )
+    return errors
+
+
+def merge_results(results, chunk_results):
+    """Adds a chunk's section counts and errors into the running results"""
+    for section, chunk_section in chunk_results.items():
+        section_results = results.setdefault(section, {})
+        for key, value in chunk_section.items():
+            if isinstance(value, list):
+                section_results.setdefault(key, []).extend(value)
+            else:
+                section_results[key] = section_results.get(key, 0) + value
+
+
+class LoadThroughput:
+    """
+    Accumulates time and row counts per stage of a COPY load
+    and reports rows per second at the end.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, rows=0):
+        with self.lock:
+            total_seconds, count = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total_seconds + seconds, count + rows)
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, rows)
+
+    def report(self, title, rows):
+        elapsed = time.perf_counter() - self.started
+        migration_logger.info(f"===={title} THROUGHPUT====")
+        for name, (seconds, count) in self.stages.items():
+            rate = count / seconds if seconds else 0
+            migration_logger.info(
+                f"{name}: {count} rows in {seconds:.1f}s ({rate:,.0f} rows/s)"
+            )
+        rate = rows / elapsed if elapsed else 0
+        migration_logger.info(f"total: {rows} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+
+
+# parse_chunk for this parse process, set once by _init_parse_worker
+_parse_worker = {}
+
+
+def _init_parse_worker(parse_chunk):
+    _parse_worker["parse_chunk"] = parse_chunk
+
+
+def _timed_parse(parse_chunk, rows, first_row_num):
+    started = time.perf_counter()
+    parsed, chunk_results = parse_chunk(rows, first_row_num)
+    return parsed, chunk_results, time.perf_counter() - started
+
+
+def _parse_in_worker(rows, first_row_num):
+    return _timed_parse(_parse_worker["parse_chunk"], rows, first_row_num)
+
+
+def _load_chunk(load_chunk, parsed, first_row_num, session_factory, attempts=3):
+    """
+    Loads one parsed chunk in its own session and transaction.
+
+    With several writers, a chunk can collide with rows another writer
+    hasn't committed yet (a shared barcode, side, ladder...). The
+    chunk is retried so the conflict is reported like any existing row.
+    """
+    for attempt in range(1, attempts + 1):
+        session = session_factory()
+        try:
+            chunk_results = load_chunk(session, parsed)
+            session.commit()
+            return chunk_results
+        except (sa.exc.IntegrityError, sa.exc.OperationalError) as e:
+            session.rollback()
+            if attempt == attempts:
+                raise
+            migration_logger.info(
+                f"Chunk starting at row {first_row_num} conflicted with another writer, retrying: {e}"
+            )
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+def run_copy_load(
+    chunks,
+    parse_chunk,
+    load_chunk,
+    results,
+    title,
+    parse_workers=None,
+    write_workers=None,
+    queue_size=None,
+    on_chunk=None,
+    session_factory=get_sqlalchemy_session_thread_safe,
+):
+    """
+    Parses chunks on a process pool and loads them on writer threads.
+
+    Parsed chunks are handed to the writers through a bounded queue, so
+    reading and parsing pause while the database falls behind. Each
+    chunk is loaded in its own transaction.
+
+    By default the first chunk that fails stops the load: nothing more
+    is read, queued chunks are drained without loading and the error is
+    raised once the writers have stopped.
+
+    params:
+        - chunks iterable of (first_row_num, rows)
+        - parse_chunk(rows, first_row_num) returns (parsed, chunk_results),
+          must be picklable when parse_workers > 0
+        - load_chunk(session, parsed) returns chunk_results from the database
+        - results running results dict, updated in place
+        - title used in the throughput report
+        - parse_workers, write_workers, queue_size stage sizes,
+          defaulting to the MIGRATION_* settings
+        - on_chunk(first_row_num, rows, chunk_results, error) is called once
+          per chunk when it is loaded or fails. When given, a failed chunk
+          is reported to it and the load carries on with the other chunks.
+        - session_factory opens each chunk's session
+
+    returns:
+        - number of rows read
+    """
+    settings = get_settings()
+    if parse_workers is None:
+        parse_workers = settings.MIGRATION_PARSE_WORKERS
+    if write_workers is None:
+        write_workers = settings.MIGRATION_WRITE_WORKERS
+    if queue_size is None:
+        queue_size = settings.MIGRATION_QUEUE_SIZE
+
+    throughput = LoadThroughput()
+    results_lock = threading.Lock()
+    parsed_chunks = queue.Queue(maxsize=max(queue_size, 1))
+    failures = []
+    row_count = 0
+
+    def chunk_done(first_row_num, rows, chunk_results, error):
+        with results_lock:
+            if on_chunk:
+                on_chunk(first_row_num, rows, chunk_results, error)
+            elif error:
+                failures.append(error)
+            else:
+                migration_logger.info(
+                    f"Loaded {title} rows {first_row_num}-{first_row_num + rows - 1}"
+                )
+
+    def write():
+        while True:
+            chunk = parsed_chunks.get()
+            if chunk is None:
+                return
+            # after a failure keep draining so the reader never blocks
+            if failures:
+                continue
+            first_row_num, rows, parsed = chunk
+            chunk_results, error = None, None
+            try:
+                with throughput.stage("load", rows):
+                    chunk_results = _load_chunk(
+                        load_chunk, parsed, first_row_num, session_factory
+                    )
+                with results_lock:
+                    merge_results(results, chunk_results)
+            except Exception as e:
+                migration_logger.error(
+                    f"Chunk starting at row {first_row_num} failed to load: {e}"
+                )
+                error = e
+            try:
+                chunk_done(first_row_num, rows, chunk_results, error)
+            except Exception as e:
+                failures.append(e)
+
+    def hand_off(first_row_num, rows, parse):
+        try:
+            parsed, chunk_results, seconds = parse()
+        except Exception as e:
+            if not on_chunk:
+                raise
+            migration_logger.error(
+                f"Chunk starting at row {first_row_num} failed to parse: {e}"
+            )
+            chunk_done(first_row_num, rows, None, e)
+            return
+        throughput.record("parse", seconds, rows)
+        with results_lock:
+            merge_results(results, chunk_results)
+        # blocks while the writers are queue_size chunks behind
+        parsed_chunks.put((first_row_num, rows, parsed))
+
+    writers = [
+        threading.Thread(target=write, name=f"{title.lower()}-writer-{i}", daemon=True)
+        for i in range(max(write_workers, 1))
+    ]
+    for writer in writers:
+        writer.start()
+
+    try:
+        if parse_workers > 0:
+            with ProcessPoolExecutor(
+                max_workers=parse_workers,
+                initializer=_init_parse_worker,
+                initargs=(parse_chunk,),
+            ) as executor:
+                # raw chunks in flight, bounds what is read ahead of the parsers
+                parsing = deque()
+                for first_row_num, rows in chunks:
+                    if failures:
+                        break
+                    row_count += len(rows)
+                    parsing.append((
+                        first_row_num,
+                        len(rows),
+                        executor.submit(_parse_in_worker, rows, first_row_num),
+                    ))
+                    if len(parsing) >= parse_workers * 2:
+                        first_row_num, rows, future = parsing.popleft()
+                        hand_off(first_row_num, rows, future.result)
+                while parsing and not failures:
+                    first_row_num, rows, future = parsing.popleft()
+                    hand_off(first_row_num, rows, future.result)
+                for _, _, future in parsing:
+                    future.cancel()
+        else:
+            for first_row_num, rows in chunks:
+                if failures:
+                    break
+                row_count += len(rows)
+                hand_off(
+                    first_row_num,
+                    len(rows),
+                    partial(_timed_parse, parse_chunk, rows, first_row_num),
+                )
+    except BaseException as e:
+        # writers drain what is queued without loading it
+        failures.append(e)
+        raise
+    finally:
+        for _ in writers:
+            parsed_chunks.put(None)
+        for writer in writers:
+            writer.join()
+
+    if failures:
+        raise failures[0]
+
+    throughput.report(title, row_count)
+    return row_count
+
+
+def numbered_chunks(chunks, chunk_size):
+    """Pairs each chunk from a chunked_reader with its first 1-based row number"""
+    for index, chunk in enumerate(chunks):
+        yield index * chunk_size + 1, chunk
@@ -1,14 +1,10 @@
 import os, csv
 
-from collections import defaultdict
-from app.database.session import get_sqlalchemy_session, get_sqlalchemy_session_thread_safe
+from app.database.session import get_sqlalchemy_session_thread_safe
 from app.logger import migration_logger
-from concurrent.futures import as_completed, ThreadPoolExecutor
 
-from app.models.shelf_positions import ShelfPosition
 from app.models.shelves import Shelf
-from app.models.trays import Tray
-from app.models.non_tray_items import NonTrayItem
+from app.shelf_space import recalculate_available_space
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -47,40 +43,12 @@ def generate_seed_error_report(output_file, errors):
     return
 
 
-def worker_calc_shelf_space(shelf_id, index, total_shelves):
-    """Execution worker for parallel shelf space calc"""
-    # session = next(get_sqlalchemy_session())
-    session = get_sqlalchemy_session_thread_safe()
-    migration_logger.info(f"Calculating space: {index + 1}/{total_shelves}")
-
-    try:
-        shelf = session.get(Shelf, shelf_id)
-        shelf.calc_available_space(session=session)
-        session.add(shelf)
-        session.commit()
-        shelf_result = [1, 0, None]
-    except Exception as e:
-        migration_logger.info(f"ERROR on shelf_id {shelf_id} - {e}")
-        shelf_result = [
-            0,
-            1,
-            {
-                "row": shelf.id,
-                "reason": f"{e}"
-            }
-        ]
-        session.rollback()
-    session.close()
-
-    return shelf_result
-
-
 def load_available_space_calc():
     """
-    Parallel processing that updates the shelf.available_space
-    stored value on all Shelves in the database.
+    Recounts the shelf.available_space stored value on all Shelves
+    in the database, in one grouped statement.
     """
-    session = next(get_sqlalchemy_session())
+    session = get_sqlalchemy_session_thread_safe()
 
     results = {
         'shelves': {
@@ -90,32 +58,19 @@ def load_available_space_calc():
         }
     }
 
-    # query all shelves
-    shelf_queryset = (session.query(Shelf).all())
-    total_shelves = session.query(Shelf).count()
-    shelf_ids = [shelf.id for shelf in shelf_queryset]
+    try:
+        migration_logger.info("Calculating space for all shelves")
+        corrected = recalculate_available_space(session)
+        session.commit()
+        results["shelves"]["successful_rows"] = session.query(Shelf).count()
+        migration_logger.info(f"available_space changed on {corrected} shelves")
+    except Exception as e:
+        migration_logger.info(f"ERROR calculating shelf space - {e}")
+        session.rollback()
+        results["shelves"]["failed_rows"] = session.query(Shelf).count()
+        results["shelves"]["errors"].append({"row": None, "reason": f"{e}"})
     session.close()
 
-    with ThreadPoolExecutor(max_workers=40) as executor:
-        futures = [
-            executor.submit(
-                worker_calc_shelf_space,
-                shelf_id,
-                index,
-                total_shelves
-            )
-            for index, shelf_id in enumerate(shelf_ids)
-        ]
-
-        # Collect and unpack results
-        for future in as_completed(futures):
-            p_shelf_result = future.result()
-            if p_shelf_result:
-                results["shelves"]["successful_rows"] += p_shelf_result[0]
-                results["shelves"]["failed_rows"] += p_shelf_result[1]
-                if p_shelf_result[2]:
-                    results["shelves"]["errors"].append(p_shelf_result[2])
-
     # Gen error files
     generate_seed_error_report("available_space_errors.csv", results["shelves"]["errors"])
 
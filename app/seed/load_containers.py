@@ -1,11 +1,27 @@
-import os, csv
+import os, csv, re
+
+import sqlalchemy as sa
 
 from collections import defaultdict
 from concurrent.futures import as_completed, ThreadPoolExecutor
+from sqlalchemy import exists, false, func, insert, select, true
 
 from app.database.session import get_sqlalchemy_session
 from app.logger import migration_logger
 from app.seed.scripts.load_tray import load_tray
+from app.seed.copy_loader import (
+    COPY_CHUNK_SIZE,
+    copy_rows,
+    legacy_date,
+    legacy_media_type,
+    legacy_owner_name,
+    numbered_chunks,
+    pop_barcode_conflicts,
+    pop_unresolved,
+    resolve_staged_shelf_positions,
+    run_copy_load,
+    staging_table,
+)
 
 from app.models.container_types import ContainerType
 from app.models.shelf_position_numbers import ShelfPositionNumber
@@ -16,6 +32,7 @@ from app.models.barcodes import Barcode
 from app.models.barcode_types import BarcodeType
 from app.models.shelf_positions import ShelfPosition
 from app.models.shelves import Shelf
+from app.models.trays import Tray
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -206,17 +223,6 @@ def load_containers():
     with ThreadPoolExecutor(max_workers=16) as executor:
         for chunk_start, chunk in enumerate(chunked_reader(legacy_tray_path, chunk_size=80000), start=1):
 
-            # DO NOT REMOVE (until this is handled by params)
-            # 619k rows in 80k chunks,  8 chunks
-            # (1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 6), (7, 7), (8, 8)
-            # each run will overwrite previous error file
-            # so extract it between runs. also rebuild app between runs
-            # in order to capture chunk selection changes
-            # if chunk_start < 1:
-            #     continue
-            # if chunk_start > 1:
-            #     break
-
             futures = [
                 executor.submit(
                     process_container_row,
@@ -258,3 +264,211 @@ def load_containers():
         f"Failed to process {results['trays']['failed_rows']} rows"
     )
     migration_logger.info(f"Failed data output to tray_tray_errors.csv")
+
+
+TRAY_STAGE_COLUMNS = (
+    "row_num",
+    "barcode",
+    "owner_name",
+    "media_type",
+    "size_class_short_name",
+    "shelf_barcode",
+    "shelf_position_number",
+    "accession_dt",
+    "shelved_dt",
+)
+
+
+def parse_container_chunk(rows, first_row_num):
+    """
+    COPY mode parser for a tray.txt chunk. Applies the same row rules
+    as load_tray, leaving lookups to the database.
+
+    returns
+        (
+            tray tuples,
+            chunk results
+        )
+    """
+    tray_rows = []
+    results = {
+        'trays': {'failed_rows': 0, 'errors': []},
+        'skipped': {'rows': 0},
+    }
+
+    for row_num, row in enumerate(rows, start=first_row_num):
+        container_barcode = row[0]
+
+        # non trays are loaded from item.txt
+        if container_barcode[0] == 'T':
+            results['skipped']['rows'] += 1
+            continue
+
+        try:
+            if re.search(r'[^a-zA-Z0-9]', container_barcode):
+                raise ValueError("Non alphanumeric characters in barcode")
+
+            shelf_position_number = int(row[18])
+            if shelf_position_number == 0:
+                raise ValueError(f"Legacy shelf_position number is 0. Tray skipped.")
+
+            tray_rows.append((
+                row_num,
+                container_barcode,
+                legacy_owner_name(row[7]),
+                legacy_media_type(row[2]),
+                row[10],
+                row[4].zfill(5),
+                shelf_position_number,
+                legacy_date(row[8], "%m/%d/%Y"),
+                legacy_date(row[9], "%m/%d/%Y"),
+            ))
+        except Exception as e:
+            results['trays']['failed_rows'] += 1
+            results['trays']['errors'].append({
+                "row": row_num,
+                "tray_barcode": container_barcode,
+                "reason": f"{e}"
+            })
+
+    return tray_rows, results
+
+
+def load_container_chunk(session, tray_rows):
+    """
+    COPY mode loader for a parsed tray.txt chunk.
+
+    Stages rows with COPY, resolves shelf positions and size classes,
+    drops rows that don't resolve, then inserts barcodes and trays
+    with one INSERT ... SELECT each.
+    """
+    results = {
+        'trays': {'successful_rows': 0, 'failed_rows': 0, 'errors': []},
+    }
+    if not tray_rows:
+        return results
+
+    stage = staging_table(
+        "stage_trays",
+        sa.Column("barcode", sa.String),
+        sa.Column("owner_name", sa.String),
+        sa.Column("media_type", sa.String),
+        sa.Column("size_class_short_name", sa.String),
+        sa.Column("shelf_barcode", sa.String),
+        sa.Column("shelf_position_number", sa.Integer),
+        sa.Column("accession_dt", sa.TIMESTAMP(timezone=True)),
+        sa.Column("shelved_dt", sa.TIMESTAMP(timezone=True)),
+        sa.Column("shelf_position_id", sa.Integer),
+    )
+    stage.create(session.connection())
+    copy_rows(session, stage, TRAY_STAGE_COLUMNS, tray_rows)
+
+    errors = resolve_staged_shelf_positions(session, stage, tray_barcode=stage.c.barcode)
+    errors += pop_unresolved(
+        session,
+        stage,
+        ~exists().where(SizeClass.short_name == stage.c.size_class_short_name),
+        func.concat("Size class not found: ", stage.c.size_class_short_name),
+        tray_barcode=stage.c.barcode
+    )
+    errors += pop_barcode_conflicts(session, stage, tray_barcode=stage.c.barcode)
+
+    session.execute(
+        insert(Barcode).from_select(
+            ["value", "type_id", "withdrawn"],
+            select(
+                stage.c.barcode,
+                select(BarcodeType.id).where(BarcodeType.name == "Tray").scalar_subquery(),
+                false(),
+            )
+        )
+    )
+    inserted = session.execute(
+        insert(Tray).from_select(
+            [
+                "barcode_id",
+                "container_type_id",
+                "owner_id",
+                "size_class_id",
+                "media_type_id",
+                "shelf_position_id",
+                "shelf_position_proposed_id",
+                "shelved_dt",
+                "accession_dt",
+                "scanned_for_accession",
+                "scanned_for_verification",
+                "scanned_for_shelving",
+                "collection_accessioned",
+                "collection_verified",
+            ],
+            select(
+                Barcode.id,
+                select(ContainerType.id).where(ContainerType.type == "Tray").scalar_subquery(),
+                Owner.id,
+                SizeClass.id,
+                MediaType.id,
+                stage.c.shelf_position_id,
+                stage.c.shelf_position_id,
+                stage.c.shelved_dt,
+                stage.c.accession_dt,
+                true(),
+                true(),
+                true(),
+                true(),
+                true(),
+            )
+            .select_from(stage)
+            .join(Barcode, Barcode.value == stage.c.barcode)
+            .join(SizeClass, SizeClass.short_name == stage.c.size_class_short_name)
+            .outerjoin(Owner, Owner.name == stage.c.owner_name)
+            .outerjoin(MediaType, MediaType.name == stage.c.media_type)
+        )
+    ).rowcount
+
+    results['trays']['successful_rows'] += inserted
+    results['trays']['failed_rows'] += len(errors)
+    results['trays']['errors'] += errors
+    return results
+
+
+def load_containers_copy(chunk_size=COPY_CHUNK_SIZE):
+    """
+    COPY mode Migration Processing on LAS Container Data
+
+    Same rules and error reports as load_containers, loaded a chunk
+    at a time through staging tables instead of per row sessions.
+    """
+    legacy_tray_path = os.path.join(
+        current_dir, "legacy_snapshot", "tray.txt"
+    )
+
+    results = {
+        'trays': {
+            'successful_rows': 0,
+            'failed_rows': 0,
+            'errors': []
+        },
+        'skipped': {'rows': 0}
+    }
+
+    run_copy_load(
+        numbered_chunks(chunked_reader(legacy_tray_path, chunk_size=chunk_size), chunk_size),
+        parse_container_chunk,
+        load_container_chunk,
+        results,
+        "CONTAINER",
+    )
+
+    # Gen error files
+    generate_seed_error_report("tray_tray_errors.csv", results["trays"]["errors"])
+
+    migration_logger.info("======Container INGEST COMPLETE======")
+    migration_logger.info(f"rows skipped: {results['skipped']['rows']}")
+    migration_logger.info("====TRAY RESULTS====")
+    migration_logger.info(
+        f"Successfully processed {results['trays']['successful_rows']} rows"
+    )
+    migration_logger.info(
+        f"Failed to process {results['trays']['failed_rows']} rows"
+    )
+    migration_logger.info(f"Failed data output to tray_tray_errors.csv")
@@ -1,18 +1,37 @@
 import os, csv, re, gc
 
+import sqlalchemy as sa
+
 from collections import defaultdict
 from concurrent.futures import as_completed, ThreadPoolExecutor
+from functools import partial
+from sqlalchemy import false, func, insert, select, true, update
 from sqlalchemy.exc import IntegrityError
 
 from app.database.session import get_sqlalchemy_session, get_sqlalchemy_session_for_item_migration
 from app.logger import migration_logger
 from app.seed.scripts.load_item import load_item
 from app.seed.scripts.load_non_tray import load_non_tray
+from app.seed.copy_loader import (
+    COPY_CHUNK_SIZE,
+    copy_rows,
+    legacy_date,
+    legacy_media_type,
+    legacy_owner_name,
+    numbered_chunks,
+    pop_barcode_conflicts,
+    pop_unresolved,
+    resolve_staged_shelf_positions,
+    run_copy_load,
+    staging_table,
+)
 
 from app.models.barcode_types import BarcodeType
 from app.models.barcodes import Barcode
 from app.models.owners import Owner
 from app.models.container_types import ContainerType
+from app.models.items import Item
+from app.models.non_tray_items import NonTrayItem
 from app.models.trays import Tray
 from app.models.shelves import Shelf
 from app.models.shelf_position_numbers import ShelfPositionNumber
@@ -335,24 +354,6 @@ def load_items():
 
             # session = get_sqlalchemy_session_for_item_migration()
 
-            # DO NOT REMOVE (until this is handled by params)
-            # 9,960,447 rows in 100k chunks
-            #
-            # (1, 10), (11, 21), (22, 32), (33, 43), (44, 54), (55, 65), (66, 76)
-            # (77, 87), (88, 98), (99, 100)
-            #
-            # (1, 10), (11, 21), (22, 32), (33, 43), (44, 54) |, (55, 60), (61, 66)
-            # (67, 72), (73, 78), (79, 84), (85, 90), (91, 96), (97, 100)
-            #
-            # 
-            # each run will overwrite previous error file
-            # so extract it between runs. also rebuild app between runs
-            # in order to capture chunk selection changes
-            # if chunk_start < 1:
-            #     continue
-            # if chunk_start > 10:
-            #     break
-
             session = next(get_sqlalchemy_session())
 
             futures = [
@@ -572,3 +573,366 @@ def load_items():
         f"Failed to process {results['non_tray_items']['failed_rows']} rows"
     )
     migration_logger.info(f"Failed data output to non_tray_item_errors.csv")
+
+
+ITEM_STAGE_COLUMNS = (
+    "row_num",
+    "barcode",
+    "owner_name",
+    "container_barcode",
+    "status",
+    "accession_dt",
+    "create_dt",
+)
+
+NON_TRAY_ITEM_STAGE_COLUMNS = (
+    "row_num",
+    "barcode",
+    "owner_name",
+    "shelf_barcode",
+    "shelf_position_number",
+    "size_class_short_name",
+    "media_type",
+    "status",
+    "accession_dt",
+    "shelved_dt",
+    "create_dt",
+)
+
+
+def parse_item_chunk(rows, first_row_num, non_tray_missing_data_dict):
+    """
+    COPY mode parser for an item.txt chunk. Applies the same row rules as
+    load_item and load_non_tray, leaving lookups to the database.
+
+    returns
+        (
+            (item tuples, non_tray_item tuples),
+            chunk results
+        )
+    """
+    item_rows = []
+    non_tray_item_rows = []
+    results = {
+        'items': {'failed_rows': 0, 'errors': []},
+        'non_tray_items': {'failed_rows': 0, 'errors': []},
+        'skipped': {'rows': 0},
+    }
+
+    for row_num, row in enumerate(rows, start=first_row_num):
+        owner_name = legacy_owner_name(row[0])
+        item_barcode_value = row[1]
+        container_barcode_value = row[2]
+        item_accession_dt = row[3]
+        shelf_position_number = row[10]
+        create_dt = row[8] #legacy arrival date
+        status = row[16]
+
+        if not re.match(r"^T", container_barcode_value, flags=re.IGNORECASE):
+            try:
+                if re.search(r'[^a-zA-Z0-9]', item_barcode_value):
+                    raise ValueError("Non alphanumeric characters in barcode")
+                item_rows.append((
+                    row_num,
+                    item_barcode_value,
+                    owner_name,
+                    container_barcode_value,
+                    status,
+                    legacy_date(item_accession_dt, "%m/%d/%y"),
+                    legacy_date(create_dt, "%m/%d/%y"),
+                ))
+            except Exception as e:
+                results['items']['failed_rows'] += 1
+                results['items']['errors'].append({
+                    "row": row_num,
+                    "item_barcode": f":: {item_barcode_value}",
+                    "reason": f"{e}"
+                })
+            continue
+
+        # skip "T0000000", is a fake NT designation
+        if container_barcode_value == "T0000000":
+            results['skipped']['rows'] += 1
+            continue
+
+        try:
+            if len(container_barcode_value) < 8:
+                shelf_barcode_value = container_barcode_value[-5:]
+            else:
+                shelf_barcode_value = container_barcode_value[-6:]
+
+            if re.search(r'[^a-zA-Z0-9]', item_barcode_value):
+                raise ValueError("Non alphanumeric characters in barcode")
+
+            non_tray_missing_data = non_tray_missing_data_dict.get(shelf_barcode_value)
+            if not non_tray_missing_data:
+                raise ValueError(f"Missing shelved_dt and/or media_type data for non_trays on shelf {shelf_barcode_value}")
+            if len(non_tray_missing_data) > 1:
+                raise ValueError(f"Multiple shelved_dt and/or media_types to choose. Unable to reconcile between in {non_tray_missing_data}")
+            non_tray_missing_data = non_tray_missing_data[0]
+
+            shelf_position_number = int(shelf_position_number)
+            if shelf_position_number == 0:
+                raise ValueError(f"Legacy shelf_position number is 0. Non-Tray skipped.")
+
+            if item_accession_dt and len(item_accession_dt) < 10:
+                accession_dt = legacy_date(item_accession_dt, "%m/%d/%y")
+            else:
+                accession_dt = legacy_date(item_accession_dt, "%m/%d/%Y")
+
+            non_tray_item_rows.append((
+                row_num,
+                item_barcode_value,
+                owner_name,
+                shelf_barcode_value,
+                shelf_position_number,
+                non_tray_missing_data.get('size_class_short_name'),
+                legacy_media_type(non_tray_missing_data.get('media_type')),
+                status,
+                accession_dt,
+                legacy_date(non_tray_missing_data.get('shelved_dt'), "%m/%d/%Y"),
+                legacy_date(create_dt, "%m/%d/%y"),
+            ))
+        except Exception as e:
+            results['non_tray_items']['failed_rows'] += 1
+            results['non_tray_items']['errors'].append({
+                "row": row_num,
+                "non_tray_item_barcode": f":: {item_barcode_value}",
+                "reason": f"{e}"
+            })
+
+    return (item_rows, non_tray_item_rows), results
+
+
+def _insert_item_barcodes(session, stage):
+    session.execute(
+        insert(Barcode).from_select(
+            ["value", "type_id", "withdrawn"],
+            select(
+                stage.c.barcode,
+                select(BarcodeType.id).where(BarcodeType.name == "Item").scalar_subquery(),
+                false(),
+            )
+        )
+    )
+
+
+def load_item_chunk(session, parsed):
+    """
+    COPY mode loader for a parsed item.txt chunk.
+
+    Stages rows with COPY, resolves trays and shelf positions, drops
+    rows that don't resolve, then inserts barcodes and items/non_trays
+    with one INSERT ... SELECT each.
+    """
+    item_rows, non_tray_item_rows = parsed
+    results = {
+        'items': {'successful_rows': 0, 'failed_rows': 0, 'errors': []},
+        'non_tray_items': {'successful_rows': 0, 'failed_rows': 0, 'errors': []},
+    }
+
+    if item_rows:
+        stage = staging_table(
+            "stage_items",
+            sa.Column("barcode", sa.String),
+            sa.Column("owner_name", sa.String),
+            sa.Column("container_barcode", sa.String),
+            sa.Column("status", sa.String),
+            sa.Column("accession_dt", sa.TIMESTAMP(timezone=True)),
+            sa.Column("create_dt", sa.TIMESTAMP(timezone=True)),
+            sa.Column("tray_id", sa.Integer),
+        )
+        stage.create(session.connection())
+        copy_rows(session, stage, ITEM_STAGE_COLUMNS, item_rows)
+
+        session.execute(
+            update(stage)
+            .values(tray_id=Tray.id)
+            .where(
+                Barcode.value == stage.c.container_barcode,
+                Tray.barcode_id == Barcode.id,
+            )
+        )
+        errors = pop_unresolved(
+            session,
+            stage,
+            stage.c.tray_id.is_(None),
+            func.concat("Container not found for Tray barcode: ", stage.c.container_barcode),
+            item_barcode=func.concat(":: ", stage.c.barcode)
+        )
+        errors += pop_barcode_conflicts(
+            session, stage, item_barcode=func.concat(":: ", stage.c.barcode)
+        )
+
+        _insert_item_barcodes(session, stage)
+        inserted = session.execute(
+            insert(Item).from_select(
+                [
+                    "owner_id",
+                    "size_class_id",
+                    "barcode_id",
+                    "status",
+                    "container_type_id",
+                    "tray_id",
+                    "media_type_id",
+                    "accession_dt",
+                    "scanned_for_accession",
+                    "scanned_for_verification",
+                    "create_dt",
+                ],
+                select(
+                    Owner.id,
+                    Tray.size_class_id,
+                    Barcode.id,
+                    # staged as text, items.status is the item_status enum
+                    sa.cast(stage.c.status, Item.__table__.c.status.type),
+                    select(ContainerType.id).where(ContainerType.type == "Tray").scalar_subquery(),
+                    Tray.id,
+                    Tray.media_type_id,
+                    stage.c.accession_dt,
+                    true(),
+                    true(),
+                    func.coalesce(stage.c.create_dt, func.now()),
+                )
+                .select_from(stage)
+                .join(Barcode, Barcode.value == stage.c.barcode)
+                .join(Tray, Tray.id == stage.c.tray_id)
+                .outerjoin(Owner, Owner.name == stage.c.owner_name)
+            )
+        ).rowcount
+
+        results['items']['successful_rows'] += inserted
+        results['items']['failed_rows'] += len(errors)
+        results['items']['errors'] += errors
+
+    if non_tray_item_rows:
+        stage = staging_table(
+            "stage_non_tray_items",
+            sa.Column("barcode", sa.String),
+            sa.Column("owner_name", sa.String),
+            sa.Column("shelf_barcode", sa.String),
+            sa.Column("shelf_position_number", sa.Integer),
+            sa.Column("size_class_short_name", sa.String),
+            sa.Column("media_type", sa.String),
+            sa.Column("status", sa.String),
+            sa.Column("accession_dt", sa.TIMESTAMP(timezone=True)),
+            sa.Column("shelved_dt", sa.TIMESTAMP(timezone=True)),
+            sa.Column("create_dt", sa.TIMESTAMP(timezone=True)),
+            sa.Column("shelf_position_id", sa.Integer),
+        )
+        stage.create(session.connection())
+        copy_rows(session, stage, NON_TRAY_ITEM_STAGE_COLUMNS, non_tray_item_rows)
+
+        barcode = func.concat(":: ", stage.c.barcode)
+        errors = resolve_staged_shelf_positions(
+            session, stage, non_tray_item_barcode=barcode
+        )
+        errors += pop_barcode_conflicts(session, stage, non_tray_item_barcode=barcode)
+
+        _insert_item_barcodes(session, stage)
+        inserted = session.execute(
+            insert(NonTrayItem).from_select(
+                [
+                    "barcode_id",
+                    "container_type_id",
+                    "owner_id",
+                    "size_class_id",
+                    "media_type_id",
+                    "shelf_position_id",
+                    "shelf_position_proposed_id",
+                    "shelved_dt",
+                    "accession_dt",
+                    "scanned_for_accession",
+                    "scanned_for_verification",
+                    "scanned_for_shelving",
+                    "status",
+                    "create_dt",
+                ],
+                select(
+                    Barcode.id,
+                    select(ContainerType.id).where(ContainerType.type == "Non-Tray").scalar_subquery(),
+                    Owner.id,
+                    SizeClass.id,
+                    MediaType.id,
+                    stage.c.shelf_position_id,
+                    stage.c.shelf_position_id,
+                    stage.c.shelved_dt,
+                    stage.c.accession_dt,
+                    true(),
+                    true(),
+                    true(),
+                    sa.cast(stage.c.status, NonTrayItem.__table__.c.status.type),
+                    func.coalesce(stage.c.create_dt, func.now()),
+                )
+                .select_from(stage)
+                .join(Barcode, Barcode.value == stage.c.barcode)
+                .outerjoin(Owner, Owner.name == stage.c.owner_name)
+                .outerjoin(SizeClass, SizeClass.short_name == stage.c.size_class_short_name)
+                .outerjoin(MediaType, MediaType.name == stage.c.media_type)
+            )
+        ).rowcount
+
+        results['non_tray_items']['successful_rows'] += inserted
+        results['non_tray_items']['failed_rows'] += len(errors)
+        results['non_tray_items']['errors'] += errors
+
+    return results
+
+
+def load_items_copy(chunk_size=COPY_CHUNK_SIZE):
+    """
+    COPY mode Migration Processing on LAS Item Data
+
+    Same rules and error reports as load_items, loaded a chunk at
+    a time through staging tables instead of ORM instances.
+    """
+    legacy_item_path = os.path.join(
+        current_dir, "legacy_snapshot", "item.txt"
+    )
+
+    results = {
+        'items': {
+            'successful_rows': 0,
+            'failed_rows': 0,
+            'errors': []
+        },
+        'non_tray_items': {
+            'successful_rows': 0,
+            'failed_rows': 0,
+            'errors': []
+        },
+        'skipped': {'rows': 0}
+    }
+
+    non_tray_missing_data_dict = build_missing_non_tray_data()
+
+    run_copy_load(
+        numbered_chunks(chunked_reader(legacy_item_path, chunk_size=chunk_size), chunk_size),
+        partial(parse_item_chunk, non_tray_missing_data_dict=non_tray_missing_data_dict),
+        load_item_chunk,
+        results,
+        "ITEM",
+    )
+
+    # Gen error files
+    generate_seed_error_report("item_errors.csv", results["items"]["errors"])
+    generate_seed_error_report("non_tray_item_errors.csv", results["non_tray_items"]["errors"])
+
+    migration_logger.info("======ITEM INGEST COMPLETE======")
+    migration_logger.info(f"rows skipped: {results['skipped']['rows']}")
+    migration_logger.info("====ITEM RESULTS====")
+    migration_logger.info(
+        f"Successfully processed {results['items']['successful_rows']} rows"
+    )
+    migration_logger.info(
+        f"Failed to process {results['items']['failed_rows']} rows"
+    )
+    migration_logger.info(f"Failed data output to item_errors.csv")
+    migration_logger.info("====NON-TRAY ITEM RESULTS====")
+    migration_logger.info(
+        f"Successfully processed {results['non_tray_items']['successful_rows']} rows"
+    )
+    migration_logger.info(
+        f"Failed to process {results['non_tray_items']['failed_rows']} rows"
+    )
+    migration_logger.info(f"Failed data output to non_tray_item_errors.csv")
@@ -1,13 +1,28 @@
-import os, csv, gc
+import os, csv, gc, re
 
+import sqlalchemy as sa
+
+from collections import defaultdict
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from sqlalchemy import and_, delete, exists, false, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.database.session import get_sqlalchemy_session, get_sqlalchemy_session_for_storage_migration
 from app.logger import migration_logger
 from app.seed.scripts.load_side import load_side
-from app.seed.scripts.load_ladder import load_ladder
-from app.seed.scripts.load_shelf import load_shelf
+from app.seed.scripts.load_ladder import load_ladder, is_ladder_number_valid
+from app.seed.scripts.load_shelf import load_shelf, is_shelf_number_valid
 from app.seed.scripts.load_shelf_positions import load_shelf_positions
+from app.seed.copy_loader import (
+    COPY_CHUNK_SIZE,
+    copy_rows,
+    later_duplicate,
+    legacy_owner_name,
+    numbered_chunks,
+    pop_unresolved,
+    run_copy_load,
+    staging_table,
+)
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
@@ -368,15 +383,6 @@ def load_storage_locations():
     with ThreadPoolExecutor(max_workers=24) as executor:
     # with ProcessPoolExecutor(max_workers=8) as executor:
         for chunk_start, chunk in enumerate(chunked_reader(legacy_location_path, chunk_size=5000), start=1):
-            
-            # DO NOT REMOVE
-            # 102k rows in 5k chunks,  21 chunks
-            # (1, 6), (7, 12), (13, 18), (19, 24)
-            # couple this with commenting out fixtures on second run and up
-            # if chunk_start < 1:
-            #     continue
-            # if chunk_start > 6:
-            #     break
 
             # garbage cleanup every chunk
             gc.collect()
@@ -479,3 +485,520 @@ def load_storage_locations():
     migration_logger.info(f"{results['shelf_positions']['new_record_count']} new positions created")
     migration_logger.info(f"{results['shelf_positions']['failed_record_count']} positions failed creation")
     migration_logger.info(f"Failed data output to loc_shelf_position_errors.csv")
+
+
+LOCATION_STAGE_COLUMNS = (
+    "row_num",
+    "side_orientation",
+    "aisle_number",
+    "ladder_number",
+    "ladder_error",
+    "shelf_number",
+    "shelf_error",
+    "owner_name",
+    "height",
+    "width",
+    "depth",
+    "legacy_type",
+    "shelf_type",
+    "container_type",
+    "barcode",
+)
+
+
+def parse_location_chunk(rows, first_row_num):
+    """
+    COPY mode parser for a loc.txt chunk. Applies the row rules of
+    process_loc_row, load_side, load_ladder and load_shelf.
+
+    A row that fails ladder or shelf rules still creates its side (and
+    ladder), so those failures are staged as ladder_error / shelf_error
+    and raised when the chunk reaches that level.
+
+    returns
+        (
+            location tuples,
+            chunk results
+        )
+    """
+    location_rows = []
+    results = {'skipped': {'rows': 0}}
+
+    for row_num, row in enumerate(rows, start=first_row_num):
+        aisle_number = row[11]
+
+        # business logic
+        if aisle_number in {"99", "370"} or (499 < int(aisle_number) < 600):
+            results['skipped']['rows'] += 1
+            continue
+
+        side_orientation = row[1].upper()
+        if side_orientation in ["M", "W"]:
+            side_orientation = "R"
+        side_orientation = "Left" if side_orientation == "L" else "Right"
+
+        # ladders 96 and 81 only contribute their side
+        ladder_number = None
+        ladder_error = None
+        if row[2] not in {"96", "81"}:
+            ladder_number = int(row[2])
+            if ladder_number == 0:
+                ladder_number = 2
+            if not is_ladder_number_valid(ladder_number):
+                ladder_error = "ladder_number invalid"
+
+        shelf_number = int(row[7])
+        owner_name = legacy_owner_name(row[4])
+        shelf_legacy_type = row[6]
+        shelf_barcode_value = row[10]
+        shelf_error = None
+        dimensions = (None, None, None)
+
+        if not is_shelf_number_valid(shelf_number):
+            shelf_error = "shelf_number from 'position' is invalid"
+        elif not shelf_barcode_value:
+            shelf_error = "missing barcode"
+        elif not re.fullmatch(r'[A-Za-z0-9/-]+', shelf_legacy_type):
+            shelf_error = "type size class is not valid"
+        else:
+            try:
+                dimensions = (float(row[9]), float(row[13]), float(row[12]))
+            except ValueError:
+                shelf_error = "Invalid shelf height, width or depth"
+
+        if shelf_legacy_type == "Unassigned":
+            shelf_legacy_type = "UNA"
+
+        location_rows.append((
+            row_num,
+            side_orientation,
+            int(aisle_number),
+            ladder_number,
+            ladder_error,
+            shelf_number,
+            shelf_error,
+            owner_name,
+            *dimensions,
+            shelf_legacy_type,
+            row[24],
+            row[25],
+            shelf_barcode_value.zfill(5),
+        ))
+
+    return location_rows, results
+
+
+def load_location_chunk(session, location_rows):
+    """
+    COPY mode loader for a parsed loc.txt chunk.
+
+    Works down the hierarchy one level at a time: each level's rows are
+    resolved with UPDATE ... FROM, rows that can't be are dropped from
+    staging as that level's errors, and new records are inserted with one
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+    """
+    from app.models.side_orientations import SideOrientation
+    from app.models.sides import Side
+    from app.models.ladder_numbers import LadderNumber
+    from app.models.ladders import Ladder
+    from app.models.shelf_numbers import ShelfNumber
+    from app.models.shelves import Shelf
+    from app.models.shelf_positions import ShelfPosition
+    from app.models.container_types import ContainerType
+    from app.models.owners import Owner
+    from app.models.shelf_position_numbers import ShelfPositionNumber
+    from app.models.shelf_types import ShelfType
+    from app.models.barcodes import Barcode
+    from app.models.barcode_types import BarcodeType
+    from app.models.size_class import SizeClass
+    from app.models.aisles import Aisle
+    from app.models.aisle_numbers import AisleNumber
+
+    results = {
+        'sides': {'successful_rows': 0, 'failed_rows': 0, 'errors': [], 'new_record_count': 0},
+        'ladders': {'successful_rows': 0, 'failed_rows': 0, 'errors': [], 'new_record_count': 0},
+        'shelves': {'successful_rows': 0, 'failed_rows': 0, 'errors': [], 'new_record_count': 0},
+        'shelf_positions': {
+            'successful_rows': 0,
+            'failed_rows': 0,
+            'errors_list': [],
+            'new_record_count': 0,
+            'failed_record_count': 0
+        }
+    }
+    if not location_rows:
+        return results
+
+    stage = staging_table(
+        "stage_locations",
+        sa.Column("side_orientation", sa.String),
+        sa.Column("aisle_number", sa.Integer),
+        sa.Column("ladder_number", sa.Integer),
+        sa.Column("ladder_error", sa.String),
+        sa.Column("shelf_number", sa.Integer),
+        sa.Column("shelf_error", sa.String),
+        sa.Column("owner_name", sa.String),
+        sa.Column("height", sa.Numeric),
+        sa.Column("width", sa.Numeric),
+        sa.Column("depth", sa.Numeric),
+        sa.Column("legacy_type", sa.String),
+        sa.Column("shelf_type", sa.String),
+        sa.Column("container_type", sa.String),
+        sa.Column("barcode", sa.String),
+        sa.Column("aisle_id", sa.Integer),
+        sa.Column("side_orientation_id", sa.Integer),
+        sa.Column("side_id", sa.Integer),
+        sa.Column("ladder_number_id", sa.Integer),
+        sa.Column("ladder_id", sa.Integer),
+        sa.Column("shelf_number_id", sa.Integer),
+        sa.Column("owner_id", sa.Integer),
+        sa.Column("container_type_id", sa.Integer),
+        sa.Column("shelf_type_id", sa.Integer),
+        sa.Column("barcode_id", sa.Uuid),
+        sa.Column("shelf_id", sa.Integer),
+    )
+    stage.create(session.connection())
+    copy_rows(session, stage, LOCATION_STAGE_COLUMNS, location_rows)
+    staged = len(location_rows)
+
+    # SIDES
+    session.execute(
+        update(stage)
+        .values(aisle_id=Aisle.id)
+        .where(
+            AisleNumber.number == stage.c.aisle_number,
+            Aisle.aisle_number_id == AisleNumber.id,
+        )
+    )
+    session.execute(
+        update(stage)
+        .values(side_orientation_id=SideOrientation.id)
+        .where(SideOrientation.name == stage.c.side_orientation)
+    )
+    errors = pop_unresolved(
+        session,
+        stage,
+        or_(stage.c.aisle_id.is_(None), stage.c.side_orientation_id.is_(None)),
+        "aisle_number or side_orientation doesn't exist",
+        aisle_number=stage.c.aisle_number,
+        side_orientation=stage.c.side_orientation
+    )
+    results['sides']['new_record_count'] = session.execute(
+        pg_insert(Side)
+        .from_select(
+            ["aisle_id", "side_orientation_id"],
+            select(stage.c.aisle_id, stage.c.side_orientation_id).distinct()
+        )
+        .on_conflict_do_nothing(index_elements=["aisle_id", "side_orientation_id"])
+    ).rowcount
+    session.execute(
+        update(stage)
+        .values(side_id=Side.id)
+        .where(
+            Side.aisle_id == stage.c.aisle_id,
+            Side.side_orientation_id == stage.c.side_orientation_id,
+        )
+    )
+    results['sides']['successful_rows'] = staged - len(errors)
+    results['sides']['failed_rows'] = len(errors)
+    results['sides']['errors'] = errors
+    staged -= len(errors)
+
+    # LADDERS
+    staged -= session.execute(
+        delete(stage).where(stage.c.ladder_number.is_(None))
+    ).rowcount
+    session.execute(
+        update(stage)
+        .values(ladder_number_id=LadderNumber.id)
+        .where(LadderNumber.number == stage.c.ladder_number)
+    )
+    ladder_columns = dict(ladder_number=stage.c.ladder_number, side_id=stage.c.side_id)
+    errors = pop_unresolved(
+        session,
+        stage,
+        stage.c.ladder_error.isnot(None),
+        stage.c.ladder_error,
+        **ladder_columns
+    )
+    errors += pop_unresolved(
+        session,
+        stage,
+        stage.c.ladder_number_id.is_(None),
+        "Invalid ladder_number or missing side association",
+        **ladder_columns
+    )
+    results['ladders']['new_record_count'] = session.execute(
+        pg_insert(Ladder)
+        .from_select(
+            ["ladder_number_id", "side_id"],
+            select(stage.c.ladder_number_id, stage.c.side_id).distinct()
+        )
+        .on_conflict_do_nothing(index_elements=["ladder_number_id", "side_id"])
+    ).rowcount
+    session.execute(
+        update(stage)
+        .values(ladder_id=Ladder.id)
+        .where(
+            Ladder.ladder_number_id == stage.c.ladder_number_id,
+            Ladder.side_id == stage.c.side_id,
+        )
+    )
+    results['ladders']['successful_rows'] = staged - len(errors)
+    results['ladders']['failed_rows'] = len(errors)
+    results['ladders']['errors'] = errors
+    staged -= len(errors)
+
+    # SHELVES
+    shelf_columns = dict(
+        shelf_number=stage.c.shelf_number,
+        barcode=stage.c.barcode,
+        owner=stage.c.owner_name,
+        type=stage.c.legacy_type
+    )
+    errors = pop_unresolved(
+        session,
+        stage,
+        stage.c.shelf_error.isnot(None),
+        stage.c.shelf_error,
+        **shelf_columns
+    )
+    shelf_pattern = (
+        select(BarcodeType.allowed_pattern)
+        .where(BarcodeType.name == "Shelf")
+        .scalar_subquery()
+    )
+    errors += pop_unresolved(
+        session,
+        stage,
+        ~stage.c.barcode.op("~")(func.concat("^(?:", shelf_pattern, ")$")),
+        "Invalid barcode format for shelves",
+        **shelf_columns
+    )
+    session.execute(
+        update(stage)
+        .values(owner_id=Owner.id)
+        .where(Owner.name == stage.c.owner_name)
+    )
+    errors += pop_unresolved(
+        session,
+        stage,
+        and_(stage.c.owner_name.isnot(None), stage.c.owner_id.is_(None)),
+        "Unregistered owner",
+        **shelf_columns
+    )
+    session.execute(
+        update(stage)
+        .values(shelf_type_id=ShelfType.id)
+        .where(
+            SizeClass.short_name == stage.c.legacy_type,
+            ShelfType.size_class_id == SizeClass.id,
+            ShelfType.type == stage.c.shelf_type,
+        )
+    )
+    errors += pop_unresolved(
+        session,
+        stage,
+        stage.c.shelf_type_id.is_(None),
+        func.concat("shelf_type is unregistered for type: ", stage.c.shelf_type),
+        **shelf_columns
+    )
+    session.execute(
+        update(stage)
+        .values(container_type_id=ContainerType.id)
+        .where(ContainerType.type == stage.c.container_type)
+    )
+    errors += pop_unresolved(
+        session,
+        stage,
+        stage.c.container_type_id.is_(None),
+        func.concat("Unregistered container type: ", stage.c.container_type),
+        **shelf_columns
+    )
+
+    session.execute(
+        pg_insert(ShelfNumber)
+        .from_select(["number"], select(stage.c.shelf_number).distinct())
+        .on_conflict_do_nothing(index_elements=["number"])
+    )
+    session.execute(
+        update(stage)
+        .values(shelf_number_id=ShelfNumber.id)
+        .where(ShelfNumber.number == stage.c.shelf_number)
+    )
+    session.execute(
+        pg_insert(Barcode)
+        .from_select(
+            ["value", "type_id", "withdrawn"],
+            select(
+                stage.c.barcode,
+                select(BarcodeType.id).where(BarcodeType.name == "Shelf").scalar_subquery(),
+                false(),
+            ).distinct()
+        )
+        .on_conflict_do_nothing(index_elements=["value"])
+    )
+    session.execute(
+        update(stage)
+        .values(barcode_id=Barcode.id)
+        .where(Barcode.value == stage.c.barcode)
+    )
+
+    errors += pop_unresolved(
+        session,
+        stage,
+        exists().where(
+            or_(
+                Shelf.barcode_id == stage.c.barcode_id,
+                and_(
+                    Shelf.ladder_id == stage.c.ladder_id,
+                    Shelf.shelf_number_id == stage.c.shelf_number_id,
+                )
+            )
+        ),
+        "Shelf already exists for barcode or ladder position",
+        **shelf_columns
+    )
+    errors += pop_unresolved(
+        session,
+        stage,
+        or_(
+            later_duplicate(stage, stage.c.barcode_id),
+            later_duplicate(stage, stage.c.ladder_id, stage.c.shelf_number_id),
+        ),
+        "Duplicate shelf in legacy snapshot",
+        **shelf_columns
+    )
+
+    results['shelves']['new_record_count'] = session.execute(
+        insert(Shelf).from_select(
+            [
+                "barcode_id",
+                "ladder_id",
+                "shelf_number_id",
+                "owner_id",
+                "container_type_id",
+                "shelf_type_id",
+                "height",
+                "width",
+                "depth",
+            ],
+            select(
+                stage.c.barcode_id,
+                stage.c.ladder_id,
+                stage.c.shelf_number_id,
+                stage.c.owner_id,
+                stage.c.container_type_id,
+                stage.c.shelf_type_id,
+                stage.c.height,
+                stage.c.width,
+                stage.c.depth,
+            )
+        )
+    ).rowcount
+    session.execute(
+        update(stage)
+        .values(shelf_id=Shelf.id)
+        .where(Shelf.barcode_id == stage.c.barcode_id)
+    )
+    results['shelves']['successful_rows'] = staged - len(errors)
+    results['shelves']['failed_rows'] = len(errors)
+    results['shelves']['errors'] = errors
+
+    # SHELF POSITIONS
+    # one position per number up to the shelf type's max capacity
+    position_numbers = (
+        select(
+            stage.c.row_num,
+            stage.c.shelf_id,
+            func.generate_series(1, ShelfType.max_capacity).label("number"),
+        )
+        .join(ShelfType, ShelfType.id == stage.c.shelf_type_id)
+        .subquery()
+    )
+    created = session.execute(
+        insert(ShelfPosition).from_select(
+            ["shelf_id", "shelf_position_number_id"],
+            select(position_numbers.c.shelf_id, ShelfPositionNumber.id)
+            .join(
+                ShelfPositionNumber,
+                ShelfPositionNumber.number == position_numbers.c.number
+            )
+        )
+    ).rowcount
+
+    unregistered = defaultdict(list)
+    for row_num, shelf_id, number in session.execute(
+        select(position_numbers).where(
+            ~exists().where(ShelfPositionNumber.number == position_numbers.c.number)
+        )
+    ):
+        unregistered[row_num].append({
+            "row": row_num,
+            "shelf_id": shelf_id,
+            "shelf_position_number": number,
+            "reason": f"Unregistered shelf_position_number"
+        })
+
+    results['shelf_positions']['successful_rows'] = results['shelves']['successful_rows']
+    results['shelf_positions']['new_record_count'] = created
+    results['shelf_positions']['failed_record_count'] = sum(
+        len(position_errors) for position_errors in unregistered.values()
+    )
+    results['shelf_positions']['errors_list'] = list(unregistered.values())
+
+    return results
+
+
+def load_storage_locations_copy(chunk_size=COPY_CHUNK_SIZE):
+    """
+    COPY mode Migration Processing on LAS Location Data
+
+    Same rules and error reports as load_storage_locations, loaded a
+    chunk at a time through a staging table instead of per row sessions.
+    """
+    legacy_location_path = os.path.join(
+        current_dir, "legacy_snapshot", "loc.txt"
+    )
+
+    results = {
+        'sides': {'successful_rows': 0, 'failed_rows': 0, 'errors': [], 'new_record_count': 0},
+        'ladders': {'successful_rows': 0, 'failed_rows': 0, 'errors': [], 'new_record_count': 0},
+        'shelves': {'successful_rows': 0, 'failed_rows': 0, 'errors': [], 'new_record_count': 0},
+        'shelf_positions': {
+            'successful_rows': 0,
+            'failed_rows': 0,
+            'errors_list': [],
+            'new_record_count': 0,
+            'failed_record_count': 0
+        },
+        'skipped': {'rows': 0}
+    }
+
+    run_copy_load(
+        numbered_chunks(chunked_reader(legacy_location_path, chunk_size=chunk_size), chunk_size),
+        parse_location_chunk,
+        load_location_chunk,
+        results,
+        "LOCATION",
+    )
+
+    generate_seed_error_report("loc_side_errors.csv", results["sides"]["errors"])
+    generate_seed_error_report("loc_ladder_errors.csv", results["ladders"]["errors"])
+    generate_seed_error_report("loc_shelf_errors.csv", results["shelves"]["errors"])
+    generate_seed_error_report("loc_shelf_position_errors.csv", results["shelf_positions"]["errors_list"])
+
+    migration_logger.info("======LOCATION INGEST COMPLETE======")
+    migration_logger.info(f"rows skipped: {results['skipped']['rows']}")
+    for section in ('sides', 'ladders', 'shelves'):
+        migration_logger.info(f"===={section.upper()} RESULTS====")
+        migration_logger.info(
+            f"Successfully processed {results[section]['successful_rows']} rows"
+        )
+        migration_logger.info(
+            f"Failed to process {results[section]['failed_rows']} rows"
+        )
+        migration_logger.info(f"{results[section]['new_record_count']} new {section} created")
+    migration_logger.info("====Shelf Position RESULTS====")
+    migration_logger.info(f"{results['shelf_positions']['new_record_count']} new positions created")
+    migration_logger.info(f"{results['shelf_positions']['failed_record_count']} positions failed creation")
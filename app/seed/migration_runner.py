@@ -0,0 +1,426 @@
+import argparse, csv, hashlib, io, os, sys, time
+
+from functools import partial
+from itertools import chain
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy import delete, select
+
+from app.database.session import get_sqlalchemy_session_thread_safe
+from app.logger import migration_logger
+from app.models.migration_checkpoints import MigrationCheckpoint
+from app.seed.copy_loader import COPY_CHUNK_SIZE, merge_results, run_copy_load
+from app.seed.load_containers import load_container_chunk, parse_container_chunk
+from app.seed.load_items import (
+    build_missing_non_tray_data,
+    generate_seed_error_report,
+    load_item_chunk,
+    parse_item_chunk,
+)
+from app.seed.load_storage_locations import load_location_chunk, parse_location_chunk
+
+"""
+Resumable, checkpointed runner for the COPY mode legacy migrations.
+
+The snapshot file is split into chunks of whole lines. Chunks go through
+the same parse processes and writer threads as run_copy_load, and each
+one is loaded and recorded in migration_checkpoints (byte offset, row
+counts, checksum and its error report rows) in one transaction, so a
+chunk is either fully loaded and checkpointed or not at all.
+
+A rerun skips checkpointed chunks, after checking their checksums still
+match the file. A chunk that fails is logged and left for the next run
+instead of stopping the others. Error csvs are rebuilt from every
+checkpoint at the end of a run, so they cover chunks loaded by earlier
+runs too.
+
+    python -m app.seed.migration_runner items --parse-workers 4 --write-workers 2
+    python -m app.seed.migration_runner items --status
+"""
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+legacy_snapshot_dir = os.path.join(current_dir, "legacy_snapshot")
+
+
+class MigrationLoader(NamedTuple):
+    file_name: str
+    parse_chunk: Callable
+    load_chunk: Callable
+    # section -> error csv, in the load_* scripts' names
+    error_reports: dict
+    # builds extra keyword arguments for parse_chunk, once per run
+    prepare: Optional[Callable] = None
+
+
+def _prepare_items():
+    return {"non_tray_missing_data_dict": build_missing_non_tray_data()}
+
+
+LOADERS = {
+    "storage_locations": MigrationLoader(
+        file_name="loc.txt",
+        parse_chunk=parse_location_chunk,
+        load_chunk=load_location_chunk,
+        error_reports={
+            "sides": "loc_side_errors.csv",
+            "ladders": "loc_ladder_errors.csv",
+            "shelves": "loc_shelf_errors.csv",
+            "shelf_positions": "loc_shelf_position_errors.csv",
+        },
+    ),
+    "containers": MigrationLoader(
+        file_name="tray.txt",
+        parse_chunk=parse_container_chunk,
+        load_chunk=load_container_chunk,
+        error_reports={"trays": "tray_tray_errors.csv"},
+    ),
+    "items": MigrationLoader(
+        file_name="item.txt",
+        parse_chunk=parse_item_chunk,
+        load_chunk=load_item_chunk,
+        error_reports={
+            "items": "item_errors.csv",
+            "non_tray_items": "non_tray_item_errors.csv",
+        },
+        prepare=_prepare_items,
+    ),
+}
+
+
+class ChunkSpan(NamedTuple):
+    index: int
+    byte_offset: int
+    byte_length: int
+    first_row: int
+    row_count: int
+    checksum: str
+
+
+def index_chunks(path, chunk_size):
+    """
+    Splits a snapshot into chunks of chunk_size lines without parsing it.
+
+    Legacy snapshots have no quoted line breaks, so a line is a row.
+
+    returns:
+        - list of ChunkSpan, chunk indexes are 1-based
+    """
+    spans = []
+    with open(path, mode="rb") as file:
+        offset = 0
+        length = 0
+        rows = 0
+        digest = hashlib.sha256()
+        for line in file:
+            digest.update(line)
+            length += len(line)
+            rows += 1
+            if rows == chunk_size:
+                spans.append(ChunkSpan(
+                    len(spans) + 1, offset, length,
+                    len(spans) * chunk_size + 1, rows, digest.hexdigest()
+                ))
+                offset += length
+                length = 0
+                rows = 0
+                digest = hashlib.sha256()
+        if rows:
+            spans.append(ChunkSpan(
+                len(spans) + 1, offset, length,
+                len(spans) * chunk_size + 1, rows, digest.hexdigest()
+            ))
+    return spans
+
+
+def read_chunk(path, span):
+    """Reads and csv parses the rows of one chunk"""
+    with open(path, mode="rb") as file:
+        file.seek(span.byte_offset)
+        text = file.read(span.byte_length).decode("utf-8")
+    return list(csv.reader(io.StringIO(text, newline="")))
+
+
+def _section_total(results, key):
+    return sum(
+        section.get(key, 0) for name, section in results.items() if name != "skipped"
+    )
+
+
+def _parse_for_checkpoint(parse_chunk, rows, first_row_num):
+    """
+    Hands a chunk's parse results to its load instead of the running
+    results, so they are checkpointed in the same transaction.
+    """
+    parsed, parse_results = parse_chunk(rows, first_row_num)
+    return (first_row_num, parsed, parse_results), {}
+
+
+def _load_and_checkpoint(loader_name, load_chunk, chunk_size, spans, session, parsed):
+    """
+    Loads a parsed chunk and adds its checkpoint to the same session,
+    committed together by run_copy_load.
+
+    returns:
+        - the chunk's parse and load results
+    """
+    first_row, parsed, parse_results = parsed
+    span = spans[first_row]
+
+    results = {}
+    merge_results(results, parse_results)
+    merge_results(results, load_chunk(session, parsed))
+    session.add(MigrationCheckpoint(
+        loader=loader_name,
+        chunk_index=span.index,
+        chunk_size=chunk_size,
+        byte_offset=span.byte_offset,
+        first_row=span.first_row,
+        row_count=span.row_count,
+        checksum=span.checksum,
+        successful_rows=_section_total(results, "successful_rows"),
+        failed_rows=_section_total(results, "failed_rows"),
+        skipped_rows=results.get("skipped", {}).get("rows", 0),
+        results=results,
+    ))
+    return results
+
+
+class MigrationProgress:
+    """Logs chunk completion with a rows/s rate and an ETA"""
+
+    def __init__(self, loader_name, chunks, rows):
+        self.loader_name = loader_name
+        self.chunks = chunks
+        self.rows = rows
+        self.done_chunks = 0
+        self.done_rows = 0
+        self.started = time.perf_counter()
+
+    def chunk_done(self, span, results, error):
+        self.done_chunks += 1
+        self.done_rows += span.row_count
+        elapsed = time.perf_counter() - self.started
+        rate = self.done_rows / elapsed if elapsed else 0
+        eta = (self.rows - self.done_rows) / rate if rate else 0
+
+        if error:
+            status = f"FAILED, left for the next run: {error}"
+        else:
+            status = (
+                f"{_section_total(results, 'successful_rows')} ok, "
+                f"{_section_total(results, 'failed_rows')} failed"
+            )
+        migration_logger.info(
+            f"[{self.loader_name}] chunk {span.index} "
+            f"(rows {span.first_row}-{span.first_row + span.row_count - 1}) {status} | "
+            f"{self.done_chunks}/{self.chunks} chunks, {rate:,.0f} rows/s, "
+            f"eta {eta / 60:.1f} min"
+        )
+
+
+def _checkpoints(session, loader_name):
+    return session.execute(
+        select(MigrationCheckpoint).where(MigrationCheckpoint.loader == loader_name)
+    ).scalars().all()
+
+
+def _write_error_reports(loader, results):
+    for section, file_name in loader.error_reports.items():
+        section_results = results.get(section, {})
+        errors = section_results.get("errors", [])
+        # shelf positions report a list of errors per row
+        errors = errors + list(chain.from_iterable(section_results.get("errors_list", [])))
+        generate_seed_error_report(file_name, errors)
+
+
+def migration_status(
+    loader_name,
+    chunk_size=COPY_CHUNK_SIZE,
+    snapshot_dir=legacy_snapshot_dir,
+    session_factory=get_sqlalchemy_session_thread_safe,
+):
+    """Logs checkpointed vs pending chunks for a loader"""
+    loader = LOADERS[loader_name]
+    spans = index_chunks(os.path.join(snapshot_dir, loader.file_name), chunk_size)
+
+    session = session_factory()
+    try:
+        checkpoints = _checkpoints(session, loader_name)
+    finally:
+        session.close()
+
+    done = {checkpoint.chunk_index for checkpoint in checkpoints}
+    pending = [span.index for span in spans if span.index not in done]
+    migration_logger.info(
+        f"[{loader_name}] {len(done)}/{len(spans)} chunks checkpointed, "
+        f"{sum(c.successful_rows for c in checkpoints)} rows loaded, "
+        f"{sum(c.failed_rows for c in checkpoints)} failed"
+    )
+    if pending:
+        migration_logger.info(f"[{loader_name}] pending chunks: {pending}")
+    return pending
+
+
+def run_migration(
+    loader_name,
+    parse_workers=None,
+    write_workers=None,
+    chunk_size=COPY_CHUNK_SIZE,
+    from_chunk=None,
+    to_chunk=None,
+    restart=False,
+    snapshot_dir=legacy_snapshot_dir,
+    session_factory=get_sqlalchemy_session_thread_safe,
+):
+    """
+    Loads the chunks of a legacy snapshot that aren't checkpointed yet.
+
+    params:
+        - loader_name: storage_locations, containers or items
+        - parse_workers / write_workers: run_copy_load stage sizes,
+          defaulting to the MIGRATION_* settings
+        - chunk_size: rows per chunk, must match earlier runs unless restarting
+        - from_chunk / to_chunk: inclusive 1-based chunk range to run
+        - restart: forget the loader's checkpoints first. Loaded records
+          are not removed.
+        - snapshot_dir: directory holding the loader's snapshot file
+        - session_factory opens the checkpoint and chunk sessions
+
+    returns:
+        - list of chunk indexes that failed
+    """
+    loader = LOADERS[loader_name]
+    path = os.path.join(snapshot_dir, loader.file_name)
+    spans = index_chunks(path, chunk_size)
+
+    session = session_factory()
+    try:
+        if restart:
+            session.execute(
+                delete(MigrationCheckpoint).where(MigrationCheckpoint.loader == loader_name)
+            )
+            session.commit()
+        checkpoints = {c.chunk_index: c for c in _checkpoints(session, loader_name)}
+    finally:
+        session.close()
+
+    for span in spans:
+        checkpoint = checkpoints.get(span.index)
+        if not checkpoint:
+            continue
+        if checkpoint.chunk_size != chunk_size:
+            raise ValueError(
+                f"{loader_name} was checkpointed with chunk size {checkpoint.chunk_size}, "
+                f"rerun with --chunk-size {checkpoint.chunk_size} or --restart"
+            )
+        if checkpoint.checksum != span.checksum:
+            raise ValueError(
+                f"{loader.file_name} chunk {span.index} changed since it was loaded, "
+                f"rerun with --restart once the loaded records are cleared"
+            )
+
+    pending = [
+        span for span in spans
+        if span.index not in checkpoints
+        and (from_chunk is None or span.index >= from_chunk)
+        and (to_chunk is None or span.index <= to_chunk)
+    ]
+    migration_logger.info(
+        f"[{loader_name}] {len(spans)} chunks of {chunk_size} rows, "
+        f"{len(checkpoints)} checkpointed, {len(pending)} to run"
+    )
+
+    parse_kwargs = loader.prepare() if loader.prepare else {}
+    spans_by_row = {span.first_row: span for span in pending}
+    progress = MigrationProgress(
+        loader_name, len(pending), sum(span.row_count for span in pending)
+    )
+    failed = []
+
+    def finish(first_row, rows, results, error):
+        span = spans_by_row[first_row]
+        if error:
+            failed.append(span.index)
+        progress.chunk_done(span, results, f"{error}" if error else None)
+
+    run_copy_load(
+        ((span.first_row, read_chunk(path, span)) for span in pending),
+        partial(_parse_for_checkpoint, partial(loader.parse_chunk, **parse_kwargs)),
+        partial(
+            _load_and_checkpoint, loader_name, loader.load_chunk, chunk_size, spans_by_row
+        ),
+        {},
+        loader_name.upper(),
+        parse_workers=parse_workers,
+        write_workers=write_workers,
+        on_chunk=finish,
+        session_factory=session_factory,
+    )
+
+    # reports cover every checkpointed chunk, not only this run's
+    results = {}
+    session = session_factory()
+    try:
+        for checkpoint in sorted(_checkpoints(session, loader_name), key=lambda c: c.chunk_index):
+            merge_results(results, checkpoint.results or {})
+    finally:
+        session.close()
+    _write_error_reports(loader, results)
+
+    migration_logger.info(f"======{loader_name.upper()} MIGRATION RUN COMPLETE======")
+    migration_logger.info(f"rows skipped: {results.get('skipped', {}).get('rows', 0)}")
+    for section in loader.error_reports:
+        section_results = results.get(section, {})
+        migration_logger.info(
+            f"{section}: {section_results.get('successful_rows', 0)} rows processed, "
+            f"{section_results.get('failed_rows', 0)} failed"
+        )
+    if failed:
+        migration_logger.info(f"chunks left for the next run: {sorted(failed)}")
+
+    return sorted(failed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.seed.migration_runner",
+        description="Resumable COPY mode legacy migration",
+    )
+    parser.add_argument("loader", choices=sorted(LOADERS))
+    parser.add_argument("--parse-workers", type=int, default=None)
+    parser.add_argument("--write-workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=COPY_CHUNK_SIZE)
+    parser.add_argument("--from-chunk", type=int, default=None)
+    parser.add_argument("--to-chunk", type=int, default=None)
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="forget checkpoints for the loader, loaded records are kept",
+    )
+    parser.add_argument(
+        "--status", action="store_true", help="report checkpoint progress only"
+    )
+    args = parser.parse_args(argv)
+
+    migration_logger.disabled = False
+    if args.status:
+        migration_status(args.loader, args.chunk_size)
+        return 0
+
+    failed = run_migration(
+        args.loader,
+        parse_workers=args.parse_workers,
+        write_workers=args.write_workers,
+        chunk_size=args.chunk_size,
+        from_chunk=args.from_chunk,
+        to_chunk=args.to_chunk,
+        restart=args.restart,
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    # registers every model before the loaders' queries configure mappers
+    from app import main as _app  # noqa: F401
+
+    sys.exit(main())
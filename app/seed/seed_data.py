@@ -9,9 +9,9 @@ from app.models.shelf_positions import ShelfPosition
 from app.models.shelves import Shelf
 from app.seed.seeder_session import get_session
 from app.logger import migration_logger
-from app.seed.load_storage_locations import load_storage_locations
-from app.seed.load_containers import load_containers
-from app.seed.load_items import load_items
+from app.seed.load_storage_locations import load_storage_locations, load_storage_locations_copy
+from app.seed.load_containers import load_containers, load_containers_copy
+from app.seed.load_items import load_items, load_items_copy
 from app.seed.load_available_space_calc import load_available_space_calc
 from app.seed.load_addressing import load_addressing
 from app.seed.load_barcode_cleanup import load_barcode_cleanup
@@ -74,9 +74,12 @@ fixture_data = [
     ("types", "client_shelf_numbers.json"),#good
 ]
 
-def seed_data():
+def seed_data(use_copy=False):
     """
     Seed static types and load storage migration snapshot
+
+    use_copy loads the snapshot through COPY staging tables
+    instead of per row sessions
     """
     # below fixes logging problem here only
     migration_logger.disabled = False
@@ -96,26 +99,35 @@ def seed_data():
 
     # If this call ever gets moved, make sure to move location gen events
     # and turn on migration logger in new location
-    load_storage_locations()
+    if use_copy:
+        load_storage_locations_copy()
+    else:
+        load_storage_locations()
 
 
-def seed_containers():
+def seed_containers(use_copy=False):
     """Load tray & non-tray migration snapshot"""
     # below fixes logging problem here only
     migration_logger.disabled = False
     migration_logger.info(
         "Yo dawg I heard you like scanning, so we put a box in your box so you can scan while you scan!"
     )
-    load_containers()
+    if use_copy:
+        load_containers_copy()
+    else:
+        load_containers()
 
 
-def seed_items():
+def seed_items(use_copy=False):
     """Load item migration snapshot"""
     migration_logger.disabled = False
     migration_logger.info(
         "Starting Item ingest. There will be millions..."
     )
-    load_items()
+    if use_copy:
+        load_items_copy()
+    else:
+        load_items()
 
 
 def seed_initial_available_space_calc():
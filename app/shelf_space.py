@@ -0,0 +1,353 @@
+import threading
+import time
+
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select, text, update
+
+from app.config.config import get_settings
+from app.database.session import session_manager
+from app.logger import inventory_logger
+from app.models.shelf_positions import ShelfPosition
+from app.models.shelves import Shelf
+
+"""
+Shelf available_space recomputation.
+
+Container moves used to submit a thread pool job per move, each
+recounting one or two shelves with their own event loop and session.
+Moves now enqueue the affected shelf positions. A single worker waits
+out a short debounce window so a burst of moves is coalesced, then
+recounts every affected shelf in one grouped UPDATE.
+
+In "delta" mode (the default) shelf_positions triggers add or subtract
+free positions from available_space as occupancy changes, in the same
+transaction, and moves don't queue recounts. A periodic reconciliation
+corrects any drift. It reads shelves in id ordered batches without
+locking them, and only locks and recounts the drifted ones, one short
+transaction per batch, so moves aren't held up behind it.
+"""
+
+# namespace for pg_try_advisory_xact_lock, one reconciliation at a time
+# across app workers
+SHELF_SPACE_RECONCILE_LOCK = 1002
+# shelves checked for drift per reconciliation transaction
+SHELF_SPACE_RECONCILE_BATCH_SIZE = 1000
+
+
+def _available_space_query():
+    """available_space of each shelf counted from its positions"""
+    return (
+        select(
+            Shelf.id.label("shelf_id"),
+            (
+                func.count(ShelfPosition.id)
+                - func.count(ShelfPosition.id).filter(ShelfPosition.occupied)
+            ).label("available_space"),
+        )
+        .outerjoin(ShelfPosition, ShelfPosition.shelf_id == Shelf.id)
+        .group_by(Shelf.id)
+    )
+
+
+def recalculate_available_space(session, shelf_position_ids=None, shelf_ids=None):
+    """
+    Recounts available_space for the shelves of the given positions and
+    shelf ids, from shelf_positions.occupied. Recounts every shelf when
+    neither is given, which locks them all, so that is left to offline
+    scripts.
+
+    The shelves are locked before counting. A move that committed first
+    is counted, and one still running applies its delta after this
+    transaction commits, so a stale count can't overwrite a newer one
+    under READ COMMITTED.
+
+    returns:
+        - number of shelves whose available_space changed
+    """
+    locked = select(Shelf.id).order_by(Shelf.id).with_for_update()
+    space = _available_space_query()
+    if shelf_position_ids is not None or shelf_ids is not None:
+        shelf_ids = set(shelf_ids or [])
+        if shelf_position_ids:
+            shelf_ids.update(
+                session.execute(
+                    select(ShelfPosition.shelf_id)
+                    .where(ShelfPosition.id.in_(list(shelf_position_ids)))
+                    .distinct()
+                ).scalars()
+            )
+        if not shelf_ids:
+            return 0
+        locked = locked.where(Shelf.id.in_(list(shelf_ids)))
+        space = space.where(Shelf.id.in_(list(shelf_ids)))
+    # in id order, so concurrent recounts don't deadlock each other
+    session.execute(locked)
+    space = space.subquery("space")
+
+    result = session.execute(
+        update(Shelf)
+        .values(available_space=space.c.available_space)
+        .where(
+            Shelf.id == space.c.shelf_id,
+            Shelf.available_space.is_distinct_from(space.c.available_space),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+class ShelfSpaceQueue:
+    """
+    Debounced, deduplicating queue of shelf positions whose shelf needs
+    its available_space recounted. Depth and lag are surfaced on
+    /status/shelf-space. session_factory opens the session each batch
+    is recounted on.
+    """
+
+    def __init__(self, debounce_seconds, session_factory=session_manager):
+        self.debounce_seconds = debounce_seconds
+        self.session_factory = session_factory
+        self._condition = threading.Condition()
+        # shelf_position_id -> when it was first enqueued
+        self._pending = {}
+        self._worker = None
+        self._closed = threading.Event()
+        self.reset()
+
+    def reset(self):
+        with self._condition:
+            self.enqueued = 0
+            self.batches = 0
+            self.failures = 0
+            self.last_batch_size = 0
+            self.lag_total = 0.0
+            self.lag_max = 0.0
+
+    def enqueue(self, *shelf_position_ids):
+        """Schedules a recount for the shelves of these positions, None is ignored"""
+        shelf_position_ids = {
+            position_id for position_id in shelf_position_ids if position_id
+        }
+        if not shelf_position_ids:
+            return
+        now = time.perf_counter()
+        with self._condition:
+            self.enqueued += len(shelf_position_ids)
+            closed = self._closed.is_set()
+            if not closed:
+                for position_id in shelf_position_ids:
+                    self._pending.setdefault(position_id, now)
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(
+                        target=self._run, name="shelf_space", daemon=True
+                    )
+                    self._worker.start()
+                self._condition.notify()
+        if closed:
+            # no worker after shutdown, recount in the caller
+            self._recalculate(dict.fromkeys(shelf_position_ids, now))
+
+    def _take(self):
+        with self._condition:
+            batch, self._pending = self._pending, {}
+        return batch
+
+    def _run(self):
+        while not self._closed.is_set():
+            with self._condition:
+                while not self._pending and not self._closed.is_set():
+                    self._condition.wait()
+            # let a burst of moves on the same shelves land in one batch,
+            # cut short by close
+            self._closed.wait(self.debounce_seconds)
+            self._recalculate(self._take())
+
+    def _recalculate(self, batch):
+        if not batch:
+            return
+        try:
+            with self.session_factory() as session:
+                recalculate_available_space(session, shelf_position_ids=batch)
+                session.commit()
+            failed = False
+        except Exception as e:
+            inventory_logger.error(f"Shelf available_space recount failed: {e}")
+            failed = True
+
+        lag = time.perf_counter() - min(batch.values())
+        with self._condition:
+            self.batches += 1
+            self.failures += failed
+            self.last_batch_size = len(batch)
+            self.lag_total += lag
+            self.lag_max = max(self.lag_max, lag)
+
+    def flush(self):
+        """Recounts everything pending now"""
+        self._recalculate(self._take())
+
+    def close(self):
+        """
+        Stops the worker once its batch is recounted and recounts anything
+        still pending, used on shutdown. Later enqueues recount at once.
+        """
+        with self._condition:
+            self._closed.set()
+            worker = self._worker
+            self._condition.notify_all()
+        if worker is not None:
+            worker.join()
+        self.flush()
+
+    def snapshot(self):
+        with self._condition:
+            oldest = min(self._pending.values(), default=None)
+            return {
+                "depth": len(self._pending),
+                "oldest_pending_ms": (
+                    (time.perf_counter() - oldest) * 1000 if oldest else 0.0
+                ),
+                "enqueued": self.enqueued,
+                "batches": self.batches,
+                "failed_batches": self.failures,
+                "last_batch_size": self.last_batch_size,
+                "lag_avg_ms": (
+                    self.lag_total / self.batches * 1000 if self.batches else 0.0
+                ),
+                "lag_max_ms": self.lag_max * 1000,
+            }
+
+
+def _find_drifted_shelves(session, after_shelf_id, batch_size):
+    """
+    Reads the next batch_size shelves after after_shelf_id, without
+    locking them.
+
+    returns:
+        - (last shelf id read or None when there are none left, ids of
+          those shelves whose available_space is off)
+    """
+    shelf_ids = session.execute(
+        select(Shelf.id)
+        .where(Shelf.id > after_shelf_id)
+        .order_by(Shelf.id)
+        .limit(batch_size)
+    ).scalars().all()
+    if not shelf_ids:
+        return None, []
+
+    space = _available_space_query().where(Shelf.id.in_(shelf_ids)).subquery()
+    drifted = session.execute(
+        select(Shelf.id)
+        .join(space, space.c.shelf_id == Shelf.id)
+        .where(Shelf.available_space.is_distinct_from(space.c.available_space))
+        .order_by(Shelf.id)
+    ).scalars().all()
+    return shelf_ids[-1], drifted
+
+
+def reconcile_available_space(
+    session_factory=session_manager, batch_size=SHELF_SPACE_RECONCILE_BATCH_SIZE
+):
+    """
+    Recounts available_space on drifted shelves and logs any drift from
+    the delta triggers. Skipped when another worker is already reconciling.
+
+    The advisory lock is held by its own session for the whole run. Each
+    batch is checked without locks, then only its drifted shelves are
+    locked, recounted and committed.
+
+    returns:
+        - number of shelves corrected, None if skipped
+    """
+    corrected = 0
+    with session_factory() as lock_session:
+        locked = lock_session.execute(
+            text("SELECT pg_try_advisory_xact_lock(:namespace)"),
+            {"namespace": SHELF_SPACE_RECONCILE_LOCK},
+        ).scalar()
+        if not locked:
+            return None
+
+        last_shelf_id = 0
+        while last_shelf_id is not None:
+            with session_factory() as session:
+                last_shelf_id, drifted = _find_drifted_shelves(
+                    session, last_shelf_id, batch_size
+                )
+                if drifted:
+                    # rechecked under the lock, a move may have fixed it since
+                    corrected += recalculate_available_space(
+                        session, shelf_ids=drifted
+                    )
+                session.commit()
+        lock_session.commit()
+
+    if corrected:
+        inventory_logger.warning(
+            f"Shelf available_space reconciliation corrected {corrected} shelves"
+        )
+    return corrected
+
+
+class ShelfSpaceReconciler:
+    """Runs reconcile_available_space every interval_seconds on a daemon thread"""
+
+    def __init__(self, interval_seconds, session_factory=session_manager):
+        self.interval_seconds = interval_seconds
+        self.session_factory = session_factory
+        self._stopped = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.last_run = None
+        self.last_corrected = 0
+        self.total_corrected = 0
+
+    def start(self):
+        if not self.interval_seconds or (self._thread and self._thread.is_alive()):
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="shelf_space_reconcile", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            try:
+                corrected = reconcile_available_space(self.session_factory)
+            except Exception as e:
+                inventory_logger.error(f"Shelf available_space reconciliation failed: {e}")
+                continue
+            if corrected is None:
+                continue
+            self.runs += 1
+            self.last_run = datetime.now(timezone.utc)
+            self.last_corrected = corrected
+            self.total_corrected += corrected
+
+    def snapshot(self):
+        return {
+            "interval_seconds": self.interval_seconds,
+            "runs": self.runs,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_corrected": self.last_corrected,
+            "total_corrected": self.total_corrected,
+        }
+
+
+def shelf_positions_changed(*shelf_position_ids):
+    """
+    Called after containers move on or off these positions. The delta
+    triggers have already adjusted available_space unless in recount mode.
+    """
+    if get_settings().SHELF_SPACE_MODE == "recount":
+        shelf_space_queue.enqueue(*shelf_position_ids)
+
+
+shelf_space_queue = ShelfSpaceQueue(get_settings().SHELF_SPACE_DEBOUNCE_MS / 1000)
+shelf_space_reconciler = ShelfSpaceReconciler(get_settings().SHELF_SPACE_RECONCILE_SECONDS)
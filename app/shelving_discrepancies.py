@@ -0,0 +1,140 @@
+from sqlalchemy import insert, or_, select
+from sqlalchemy.orm import aliased
+
+from app.models.non_tray_items import NonTrayItem
+from app.models.shelf_positions import ShelfPosition
+from app.models.shelf_types import ShelfType
+from app.models.shelves import Shelf
+from app.models.shelving_job_discrepancies import ShelvingJobDiscrepancy
+from app.models.shelving_jobs import ShelvingJob
+from app.models.trays import Tray
+
+"""
+Set-based shelving discrepancy detection.
+
+Shelved containers used to be checked one row at a time by after_insert
+listeners, each opening a session, issuing a SELECT per related record
+and committing every discrepancy on its own. Here a batch of containers
+is checked with one joined query per container model, and the
+location, owner and size discrepancies are inserted in one statement.
+"""
+
+# The error text is stored and shown in reports, so it keeps the exact
+# wording and line breaks the per-row listeners wrote, for trays and non
+# tray items alike.
+LOCATION_ERROR_INDENT = " " * 28
+ERROR_INDENT = " " * 24
+
+
+def shelving_discrepancy_query(model, ids):
+    """
+    Shelved containers of model in ids with at least one discrepancy.
+
+    A container is checked when it belongs to a shelving job, isn't
+    withdrawn and has a shelf position.
+    """
+    proposed_position = aliased(ShelfPosition)
+
+    return (
+        select(
+            model.id,
+            model.shelving_job_id,
+            model.owner_id,
+            model.size_class_id,
+            model.shelf_position_proposed_id,
+            model.shelf_position_id,
+            ShelvingJob.user_id,
+            Shelf.owner_id.label("shelf_owner_id"),
+            ShelfType.size_class_id.label("shelf_size_class_id"),
+            ShelfPosition.location,
+            proposed_position.location.label("proposed_location"),
+        )
+        .join(ShelfPosition, ShelfPosition.id == model.shelf_position_id)
+        .join(Shelf, Shelf.id == ShelfPosition.shelf_id)
+        .join(ShelfType, ShelfType.id == Shelf.shelf_type_id)
+        .join(ShelvingJob, ShelvingJob.id == model.shelving_job_id)
+        .outerjoin(
+            proposed_position, proposed_position.id == model.shelf_position_proposed_id
+        )
+        .where(
+            model.id.in_(ids),
+            model.withdrawn_barcode_id.is_(None),
+            or_(
+                model.shelf_position_proposed_id != model.shelf_position_id,
+                model.owner_id.is_distinct_from(Shelf.owner_id),
+                model.size_class_id.is_distinct_from(ShelfType.size_class_id),
+            ),
+        )
+    )
+
+
+def build_shelving_discrepancies(row, container_key):
+    """
+    Discrepancy values for one row of shelving_discrepancy_query.
+
+    params:
+        - row from shelving_discrepancy_query
+        - container_key: tray_id or non_tray_item_id
+
+    returns:
+        - list of ShelvingJobDiscrepancy insert values
+    """
+    common = {
+        "shelving_job_id": row.shelving_job_id,
+        container_key: row.id,
+        "assigned_user_id": row.user_id,
+        "owner_id": row.shelf_owner_id,
+        "size_class_id": row.shelf_size_class_id,
+        "assigned_location": row.location,
+        "pre_assigned_location": row.proposed_location,
+    }
+    errors = []
+    if (
+        row.shelf_position_proposed_id
+        and row.shelf_position_proposed_id != row.shelf_position_id
+    ):
+        errors.append(
+            f"Location Discrepancy -\n"
+            f"{LOCATION_ERROR_INDENT}Proposed: {row.proposed_location} -\n"
+            f"{LOCATION_ERROR_INDENT}Actual: {row.location}"
+        )
+    if row.owner_id != row.shelf_owner_id:
+        errors.append(
+            f"Owner Discrepancy -\n"
+            f"{ERROR_INDENT}Tray owner_id: {row.owner_id} -\n"
+            f"{ERROR_INDENT}Shelf owner_id: {row.shelf_owner_id}"
+        )
+    if row.size_class_id != row.shelf_size_class_id:
+        errors.append(
+            f"Size Discrepancy -\n"
+            f"{ERROR_INDENT}Tray size_class_id: {row.size_class_id} -\n"
+            f"{ERROR_INDENT}Shelf size_class_id: {row.shelf_size_class_id}"
+        )
+    return [{**common, "error": error} for error in errors]
+
+
+def record_shelving_discrepancies(connection, tray_ids=(), non_tray_item_ids=()):
+    """
+    Checks shelved trays and non tray items for location, owner and size
+    discrepancies and inserts a ShelvingJobDiscrepancy for each one.
+
+    params:
+        - connection: runs in the caller's transaction
+        - tray_ids, non_tray_item_ids: containers to check
+
+    returns:
+        - number of discrepancies recorded
+    """
+    discrepancies = []
+    for model, ids, container_key in (
+        (Tray, tray_ids, "tray_id"),
+        (NonTrayItem, non_tray_item_ids, "non_tray_item_id"),
+    ):
+        if not ids:
+            continue
+        for row in connection.execute(shelving_discrepancy_query(model, list(ids))):
+            discrepancies.extend(build_shelving_discrepancies(row, container_key))
+
+    if discrepancies:
+        connection.execute(insert(ShelvingJobDiscrepancy), discrepancies)
+    return len(discrepancies)
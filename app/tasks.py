@@ -1,3 +1,17 @@
+from sqlalchemy import (
+    any_,
+    delete,
+    func,
+    insert,
+    literal,
+    null,
+    or_,
+    union_all,
+    update,
+    BigInteger,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import aliased
 from sqlmodel import Session, select
 from datetime import datetime, timezone
 
@@ -9,7 +23,7 @@ from app.models.shelf_positions import ShelfPosition
 from app.models.shelf_types import ShelfType
 from app.models.shelves import Shelf
 from app.models.size_class import SizeClass
-from app.models.verification_changes import VerificationChange
+from app.models.verification_changes import VerificationChange, VerificationChangeStatus
 from app.models.verification_jobs import VerificationJob
 from app.models.trays import Tray
 from app.models.non_tray_items import NonTrayItem
@@ -21,6 +35,40 @@ from app.schemas.verification_jobs import VerificationJobInput
 from app.utilities import start_session_with_audit_info
 
 
+def bulk_update_job_containers(session, job_column, job_id, values):
+    """
+    Sets values on every tray, non tray item and item of a job,
+    with one UPDATE per table.
+
+    Rows already holding these values are skipped, like an ORM flush
+    would skip them, so the audit trigger logs the same rows.
+
+    params:
+        - job_column: accession_job_id, verification_job_id...
+        - values: {column: value}
+
+    returns:
+        - {table name: rows updated}
+    """
+    updated = {}
+    for model in (Tray, NonTrayItem, Item):
+        result = session.execute(
+            update(model)
+            .where(
+                getattr(model, job_column) == job_id,
+                or_(*[
+                    getattr(model, column).is_distinct_from(value)
+                    for column, value in values.items()
+                ]),
+            )
+            .values(**values)
+            .returning(model.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated[model.__tablename__] = len(result.all())
+    return updated
+
+
 def complete_accession_job(accession_job: AccessionJob, original_status, audit_info):
     """
     Upon accession job completion:
@@ -61,48 +109,16 @@ def complete_accession_job(accession_job: AccessionJob, original_status, audit_i
         # Create a new verification job record
         new_verification_job = commit_record(session, new_verification_job)
 
-        # Update Tray Records
-        tray_query = select(Tray).where(Tray.accession_job_id == accession_job.id)
-        trays = session.exec(tray_query)
-        if trays:
-            updated_trays = []
-            new_verification_changes = []
-            for tray in trays:
-                tray.verification_job_id = new_verification_job.id
-                tray.owner_id = accession_job.owner_id
-                tray.scanned_for_accession = True
-                updated_trays.append(tray)
-
-            session.add_all(updated_trays)
-
-        # Update Non Tray Item Records
-        non_tray_query = select(NonTrayItem).where(
-            NonTrayItem.accession_job_id == accession_job.id
+        bulk_update_job_containers(
+            session,
+            "accession_job_id",
+            accession_job.id,
+            {
+                "verification_job_id": new_verification_job.id,
+                "owner_id": accession_job.owner_id,
+                "scanned_for_accession": True,
+            },
         )
-        non_trays_items = session.exec(non_tray_query)
-        if non_trays_items:
-            updated_non_trays_items = []
-            new_verification_changes = []
-            for non_tray_item in non_trays_items:
-                non_tray_item.verification_job_id = new_verification_job.id
-                non_tray_item.owner_id = accession_job.owner_id
-                non_tray_item.scanned_for_accession = True
-                updated_non_trays_items.append(non_tray_item)
-
-            session.add_all(updated_non_trays_items)
-
-        # Update Item Records
-        item_query = select(Item).where(Item.accession_job_id == accession_job.id)
-        items = session.exec(item_query)
-        if items:
-            updated_items = []
-            for item in items:
-                item.verification_job_id = new_verification_job.id
-                item.owner_id = accession_job.owner_id
-                item.scanned_for_accession = True
-                updated_items.append(item)
-
-            session.add_all(updated_items)
 
         session.commit()
 
@@ -125,35 +141,52 @@ def complete_verification_job(verification_job: VerificationJob, audit_info):
                 },
             synchronize_session=False,
             )
-        # Update Tray Records
-        tray_query = select(Tray).where(Tray.verification_job_id == verification_job.id)
-        trays = session.exec(tray_query)
-        if trays:
-            for tray in trays:
-                tray.owner_id = verification_job.owner_id
-                session.add(tray)
-
-        # Update Non Tray Item Records
-        non_tray_query = select(NonTrayItem).where(
-            NonTrayItem.verification_job_id == verification_job.id
+        bulk_update_job_containers(
+            session,
+            "verification_job_id",
+            verification_job.id,
+            {"owner_id": verification_job.owner_id},
         )
-        non_trays_items = session.exec(non_tray_query)
-        if non_trays_items:
-            for non_tray_item in non_trays_items:
-                non_tray_item.owner_id = verification_job.owner_id
-                session.add(non_tray_item)
-
-        # Update Item Records
-        item_query = select(Item).where(Item.verification_job_id == verification_job.id)
-        items = session.exec(item_query)
-        if items:
-            for item in items:
-                item.owner_id = verification_job.owner_id
-                session.add(item)
 
         session.commit()
 
 
+def bulk_cancel_accession_job(session, accession_job_id):
+    """
+    Deletes the items, trays and non tray items of a cancelled accession
+    job, one DELETE ... RETURNING barcode_id per table, then their
+    barcodes in one DELETE.
+
+    returns:
+        - {table name: rows deleted}
+    """
+    deleted = {}
+    defunct_barcodes = []
+    for model in (Item, Tray, NonTrayItem):
+        barcode_ids = session.execute(
+            delete(model)
+            .where(model.accession_job_id == accession_job_id)
+            .returning(model.barcode_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        deleted[model.__tablename__] = len(barcode_ids)
+        defunct_barcodes += barcode_ids
+
+    # clear unused barcodes
+    deleted[Barcode.__tablename__] = 0
+    if defunct_barcodes:
+        deleted[Barcode.__tablename__] = session.execute(
+            delete(Barcode)
+            .where(
+                Barcode.id == any_(
+                    literal(defunct_barcodes, ARRAY(Barcode.__table__.c.id.type))
+                )
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    return deleted
+
+
 def manage_accession_job_transition(
     accession_job: AccessionJob, original_status, audit_info
 ):
@@ -180,37 +213,9 @@ def manage_accession_job_transition(
         commit_record(session, accession_job)
 
         if accession_job.status == "Cancelled":
-            defunct_barcodes = []
-
-            # Delete Accessioned Items
-            item_query = select(Item).where(Item.accession_job_id == accession_job.id)
-            items = session.exec(item_query)
-            if items:
-                for item in items:
-                    defunct_barcodes.append(item.barcode_id)
-                    session.delete(item)
-            # Delete Accessioned Trays
-            tray_query = select(Tray).where(Tray.accession_job_id == accession_job.id)
-            trays = session.exec(tray_query)
-            if trays:
-                for tray in trays:
-                    defunct_barcodes.append(tray.barcode_id)
-                    session.delete(tray)
-            # Delete Accessioned Non-Trays
-            non_tray_query = select(NonTrayItem).where(
-                NonTrayItem.accession_job_id == accession_job.id
-            )
-            non_trays_items = session.exec(non_tray_query)
-            if non_trays_items:
-                for non_tray_item in non_trays_items:
-                    defunct_barcodes.append(non_tray_item.barcode_id)
-                    session.delete(non_tray_item)
-
-            # clear unused barcodes
-            for barcode_id in defunct_barcodes:
-                barcode_query = select(Barcode).where(Barcode.id == barcode_id)
-                barcode = session.exec(barcode_query).first()
-                session.delete(barcode)
+            # commit_record ends the transaction the audit info was set in
+            start_session_with_audit_info(audit_info, session)
+            bulk_cancel_accession_job(session, accession_job.id)
 
         session.commit()
         # session.refresh()
@@ -322,75 +327,85 @@ def process_non_tray_item_move(session: Session, non_tray_item: NonTrayItem, sou
     return non_tray_item
 
 
+def bulk_verification_change_action(session, verification_job: VerificationJob, update_input: str, value: int):
+    """
+    Applies a media type or size class change to a verification job's
+    trays, items (its own and those in its trays) and non tray items,
+    with one UPDATE per table. A VerificationChange is recorded per item
+    and non tray item from one INSERT ... SELECT of barcode values.
+
+    returns:
+        - number of verification changes recorded
+    """
+    change_type = (
+        VerificationChangeStatus.MediaTypeEdit
+        if update_input == "media_type_id"
+        else VerificationChangeStatus.SizeClassEdit
+    )
+    job_tray_ids = select(Tray.id).where(Tray.verification_job_id == verification_job.id)
+    changed_item = or_(
+        Item.verification_job_id == verification_job.id,
+        Item.tray_id.in_(job_tray_ids),
+    )
+
+    # build changes before the update, while item and tray membership is current
+    item_tray = aliased(Tray)
+    item_barcode = aliased(Barcode)
+    tray_barcode = aliased(Barcode)
+    change_values = [
+        literal(verification_job.workflow_id, BigInteger),
+        literal(change_type, VerificationChange.__table__.c.change_type.type),
+        literal(verification_job.user_id, BigInteger),
+        func.now(),
+        func.now(),
+    ]
+    changes = union_all(
+        select(tray_barcode.value, item_barcode.value, *change_values)
+        .select_from(Item)
+        .join(item_barcode, item_barcode.id == Item.barcode_id)
+        .outerjoin(item_tray, item_tray.id == Item.tray_id)
+        .outerjoin(tray_barcode, tray_barcode.id == item_tray.barcode_id)
+        .where(changed_item),
+        select(null(), item_barcode.value, *change_values)
+        .select_from(NonTrayItem)
+        .join(item_barcode, item_barcode.id == NonTrayItem.barcode_id)
+        .where(NonTrayItem.verification_job_id == verification_job.id),
+    )
+    recorded = session.execute(
+        insert(VerificationChange)
+        .from_select(
+            [
+                "tray_barcode_value",
+                "item_barcode_value",
+                "workflow_id",
+                "change_type",
+                "completed_by_id",
+                "create_dt",
+                "update_dt",
+            ],
+            changes,
+        )
+        .returning(VerificationChange.id)
+    ).all()
+
+    for model, condition in (
+        (Item, changed_item),
+        (Tray, Tray.verification_job_id == verification_job.id),
+        (NonTrayItem, NonTrayItem.verification_job_id == verification_job.id),
+    ):
+        session.execute(
+            update(model)
+            .where(condition)
+            .values({update_input: value})
+            .execution_options(synchronize_session=False)
+        )
+
+    return len(recorded)
+
+
 def manage_verification_job_change_action(verification_job: VerificationJob, update_input: str, value: int, audit_info):
     # audit_info = getattr(session, "audit_info", {"name": "System", "id": "0"})
     with session_manager() as session:
         start_session_with_audit_info(audit_info, session)
-        new_verification_changes = []
-
-        trays = verification_job.trays
-        items = verification_job.items
-        non_tray_items = verification_job.non_tray_items
-
-        if trays:
-            for tray in trays:
-                session.query(Tray).filter(Tray.id == tray.id).update({update_input: value})
-                tray_barcode = session.query(Barcode).filter(
-                    Barcode.id == tray.barcode_id
-                    ).first()
-                for item in tray.items:
-                    item_barcode = session.query(Barcode).filter(
-                        Barcode.id == item.barcode_id
-                        ).first()
-                    change_type = "MediaTypeEdit" if update_input == "media_type_id" else "SizeClassEdit"
-                    session.query(Item).filter(Item.id == item.id).update(
-                        {update_input: value}
-                        )
-                    new_verification_changes.append(
-                        VerificationChange(
-                            workflow_id=verification_job.workflow_id,
-                            tray_barcode_value=tray_barcode.value,
-                            item_barcode_value=item_barcode.value,
-                            change_type=change_type,
-                            completed_by_id=verification_job.user_id
-                        )
-                    )
-        if items:
-            for item in items:
-                item_barcode = session.query(Barcode).filter(
-                    Barcode.id == item.barcode_id
-                    ).first()
-                tray_barcode = session.query(Barcode).filter(
-                    Barcode.id == item.tray.barcode_id
-                    ).first()
-                change_type = "MediaTypeEdit" if update_input == "media_type_id" else "SizeClassEdit"
-                session.query(Item).filter(Item.id == item.id).update({update_input: value})
-                new_verification_changes.append(
-                    VerificationChange(
-                        workflow_id=verification_job.workflow_id,
-                        tray_barcode_value=tray_barcode.value,
-                        item_barcode_value=item_barcode.value,
-                        change_type=change_type,
-                        completed_by_id=verification_job.user_id
-                    )
-                )
-        if non_tray_items:
-            for non_tray_item in non_tray_items:
-                item_barcode = session.query(Barcode).filter(
-                    Barcode.id == non_tray_item.barcode_id
-                    ).first()
-                change_type = "MediaTypeEdit" if update_input == "media_type_id" else "SizeClassEdit"
-                session.query(NonTrayItem).filter(
-                    NonTrayItem.id == non_tray_item.id
-                    ).update({update_input: value})
-                new_verification_changes.append(
-                    VerificationChange(
-                        workflow_id=verification_job.workflow_id,
-                        item_barcode_value=item_barcode.value,
-                        change_type=change_type,
-                        completed_by_id=verification_job.user_id
-                    )
-                )
-
-        if new_verification_changes:
-            session.add_all(new_verification_changes)
+        bulk_verification_change_action(session, verification_job, update_input, value)
+        session.commit()
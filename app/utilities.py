@@ -5,10 +5,12 @@ from typing import List, Dict, Tuple, Any
 from typing_extensions import Annotated
 import logging
 
+import numpy as np
 import pandas as pd
 import pytz
 from datetime import timezone
-from sqlalchemy import and_, text, asc, desc, func, column, or_
+from sqlalchemy import and_, any_, cast, text, asc, desc, func, column, or_, literal, String
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import joinedload, aliased, RelationshipProperty
 from sqlalchemy.inspection import inspect
 from sqlalchemy.sql import not_
@@ -16,6 +18,7 @@ from sqlmodel import select, Session
 from fastapi import Header, Depends
 
 from app.database.session import get_session, session_manager
+from app.location_hierarchy import location_hierarchy_cache
 from app.config.exceptions import NotFound, BadRequest
 from app.logger import inventory_logger
 from app.models.aisle_numbers import AisleNumber
@@ -52,310 +55,89 @@ from app.models.withdraw_jobs import WithdrawJob
 LOGGER = logging.getLogger(__name__)
 
 
-def get_module_shelf_position(session, shelf_position):
+def get_shelf_position_building_id(session, shelf_position):
     """
-    Retrieves the module associated with a given shelf position.
+    Retrieves the building id of a given shelf position.
+    The shelf's location hierarchy is served from location_hierarchy_cache.
+
     **Args:**
     -  Shelf Position: The shelf position object containing the shelf ID.
 
     **Returns:**
-    - Module: The module associated with the shelf position.
+    - int: The ID of the building the shelf position is in.
 
     **Raises:**
-    - NotFound: If any of the related objects (shelf, ladder, side, aisle, module)
-    are not found.
+    - NotFound: If the shelf or any location above it is not found.
     """
-    shelf = (
-        session.query(Shelf)
-        .options(joinedload(Shelf.ladder))
-        .filter(Shelf.id == shelf_position.shelf_id)
-        .first()
-    )
+    hierarchy = location_hierarchy_cache.get(session, shelf_position.shelf_id)
 
-    if not shelf:
+    if not hierarchy:
         raise NotFound(detail=f"Shelf ID {shelf_position.shelf_id} Not Found")
 
-    ladder = shelf.ladder
-
-    if not ladder:
-        raise NotFound(detail=f"Ladder ID {shelf.ladder_id} Not Found")
-
-    side = ladder.side
-
-    if not side:
-        raise NotFound(detail=f"Side ID {ladder.side_id} Not Found")
-
-    aisle = side.aisle
-
-    if not aisle:
-        raise NotFound(detail=f"Aisle ID {side.aisle_id} Not Found")
+    return hierarchy.building_id
 
-    module = aisle.module
 
-    if not module:
-        raise NotFound(detail=f"Module ID {aisle.module_id} Not Found")
-
-    return module
-
-
-def get_location(session, shelf_position):
+def get_location_sort_keys(session, item_ids=(), non_tray_item_ids=()):
     """
-    Retrieves the related location data for a given shelf position.
+    Resolves walk order sort keys for many items and non tray items. Their
+    shelves are looked up in one query, items through their tray, and the
+    locations above each shelf are served from location_hierarchy_cache.
+
+    Each key is (aisle_priority, ladder_priority, shelf_priority), where a
+    priority is the location's sort_priority, falling back to its number.
 
     **Args:**
-    - shelf_position (ShelfPosition): The shelf position object containing the
-    shelf ID.
+    - item_ids (list): Item ID's to resolve.
+    - non_tray_item_ids (list): Non Tray Item ID's to resolve.
 
     **Returns:**
-    dict: A dictionary containing the related location data. The dictionary has the
-    following keys:
-    - "aisle" (Aisle): The aisle object associated with the shelf position.
-    - "ladder" (Ladder): The ladder object associated with the shelf position.
-    - "shelf" (Shelf): The shelf object associated with the shelf position.
-
-    **Raises:**
-    - NotFound: If any of the related objects (shelf, ladder, aisle) are not found.
+    tuple: (item_keys, non_tray_item_keys), each a dict of id -> sort key.
+    Containers without a shelf position (e.g. withdrawn) are left out.
     """
-    shelf_query = select(Shelf).filter(Shelf.id == shelf_position.shelf_id)
-
-    ladder_query = (
-        select(Ladder)
-        .join(Shelf)
-        .where(Ladder.id == shelf_query.subquery().c.ladder_id)
-    )
-
-    aisle_query = (
-        select(Aisle)
-        .join(Side)
-        .join(Ladder)
-        .where(Side.id == ladder_query.subquery().c.side_id)
-        .where(Aisle.id == Side.aisle_id)
-    )
-
-    shelf = session.exec(shelf_query).first()
-    ladder = session.exec(ladder_query).first()
-    aisle = session.exec(aisle_query).first()
-
-    if not shelf:
-        raise NotFound(detail=f"Shelf ID {shelf_position.shelf_id} Not Found")
-
-    if not ladder:
-        raise NotFound(detail=f"Ladder ID {shelf.ladder_id} Not Found")
-
-    if not aisle:
-        raise NotFound(detail=f"Aisle ID {ladder.aisle_id} Not Found")
-
-    shelf_number_query = select(ShelfNumber).where(
-        ShelfNumber.id == shelf.shelf_number_id
-    )
-
-    ladder_number_query = select(LadderNumber).where(
-        LadderNumber.id == ladder.ladder_number_id
-    )
-
-    aisle_number_query = select(AisleNumber).where(
-        AisleNumber.id == aisle.aisle_number_id
-    )
-
-    shelf_number = session.exec(shelf_number_query).first()
-    ladder_number = session.exec(ladder_number_query).first()
-    aisle_number = session.exec(aisle_number_query).first()
-
-    return {
-        "aisle": aisle,
-        "ladder": ladder,
-        "shelf": shelf,
-        "shelf_number": shelf_number,
-        "ladder_number": ladder_number,
-        "aisle_number": aisle_number,
-    }
-
-
-def process_containers_for_shelving(
-    session,
-    container_type,
-    containers,
-    shelving_job_id,
-    building_id,
-    module_id,
-    aisle_id,
-    side_id,
-    ladder_id,
-):
-    """
-    Given a container and location params,
-    assigns an available shelf position id
-    to both a container's proposed and actual shelf position.
-    Shelving Job completion later updates the actual shelf position
-    if needed.
-
-    Size classes among containers within the job can vary.
-
-    params:
-        - session is db session yielded in path operation
-        - container_type tracks 'Tray' or 'Non-Tray'
-        - Containers can either be tray or non-tray-item list
-        - location id's are integers
-
-    returns:
-        - Nothing
-        - Commits transactions
-    """
-
-    # Initial filter conditions
-    conditions = []
-
-    # Perform joins from most constrained to least, for efficiency
-    if ladder_id:
-        conditions.append(Shelf.ladder_id == ladder_id)
-    elif side_id:
-        conditions.append(Ladder.side_id == side_id)
-    elif aisle_id:
-        conditions.append(Side.aisle_id == aisle_id)
-    elif module_id:
-        conditions.append(Aisle.module_id == module_id)
-    else:
-        conditions.append(Module.building_id == building_id)
-
-    # Base query
-    shelf_position_query = (
-        select(
-            ShelfPosition.id.label("shelf_position_id"),
-            ShelfPosition.shelf_id,
-            ShelfPosition.location,
-            ShelfPositionNumber.number,
-            Shelf.owner_id,
-            Shelf.ladder_id,
-            Ladder.side_id,
-            Side.aisle_id,
-            Aisle.module_id,
-            Module.building_id,
-            ShelfType.size_class_id,
-        )
-        .join(
-            ShelfPositionNumber,
-            ShelfPositionNumber.id == ShelfPosition.shelf_position_number_id,
-        )
-        .join(Shelf, Shelf.id == ShelfPosition.shelf_id)
-        .join(ShelfType, ShelfType.id == Shelf.shelf_type_id)
-        .join(Ladder, Ladder.id == Shelf.ladder_id)
-        .join(Side, Side.id == Ladder.side_id)
-        .join(Aisle, Aisle.id == Side.aisle_id)
-        .join(Module, Module.id == Aisle.module_id)
-        .where(
-            not_(
-                select(1).where(Tray.shelf_position_id == ShelfPosition.id).exists()
-            )
-        )
-        .where(
-            not_(
-                select(1).where(Tray.shelf_position_proposed_id == ShelfPosition.id).exists()
-            )
-        )
-        .where(
-            not_(
-                select(1).where(NonTrayItem.shelf_position_id == ShelfPosition.id).exists()
-            )
-        )
-        .where(
-            not_(
-                select(1).where(NonTrayItem.shelf_position_proposed_id == ShelfPosition.id).exists()
+    item_ids = list(item_ids)
+    non_tray_item_ids = list(non_tray_item_ids)
+
+    selects = []
+    if item_ids:
+        selects.append(
+            select(
+                literal("item").label("container_type"),
+                Item.id.label("container_id"),
+                Tray.shelf_position_id.label("shelf_position_id"),
             )
+            .join(Tray, Tray.id == Item.tray_id)
+            .where(Item.id.in_(item_ids))
         )
-    )
-
-    # Group containers by (size_class_id, owner_id)
-    containers_by_group = {}
-    for container in containers:
-        key = (container.size_class_id, container.owner_id)
-        containers_by_group.setdefault(key, []).append(container)
-
-    # Process each group individually.
-    for (size_class_id, owner_id), container_group in containers_by_group.items():
-        num_to_assign = len(container_group)
-
-        # Build a query for available shelves  matching the container's size class and
-        # owner.
-        # and then by group the shelves ASC order.
-        available_shelf_query = (
-            shelf_position_query.where(
-                and_(
-                    ShelfType.size_class_id == size_class_id,
-                    Shelf.owner_id == owner_id,
-                    *conditions,
-                )
-            )
-            .order_by(asc(ShelfPosition.location))
-            .limit(num_to_assign)
-        )
-
-        # Execute the query.
-        fetched_available_shelf_query = session.exec(available_shelf_query).all()
-
-        if len(fetched_available_shelf_query) < num_to_assign:
-            raise NotFound(
-                detail="Not enough empty shelf positions for containers with "
-                "size class and owner."
-            )
-
-        shelf_ids = list({item.shelf_id for item in fetched_available_shelf_query})
-
-        # Build a query for available shelf positions matching the container's size class and owner.
-        available_positions_query = (
-            select(ShelfPosition)
-            .where(ShelfPosition.shelf_id.in_(shelf_ids))
-            .where(
-                not_(
-                    select(Tray)
-                    .where(
-                        or_(
-                            Tray.shelf_position_id == ShelfPosition.id,
-                            Tray.shelf_position_proposed_id == ShelfPosition.id,
-                        )
-                    )
-                    .exists()
-                )
-            )
-            .where(
-                not_(
-                    select(NonTrayItem)
-                    .where(
-                        or_(
-                            NonTrayItem.shelf_position_id == ShelfPosition.id,
-                            NonTrayItem.shelf_position_proposed_id == ShelfPosition.id,
-                        )
-                    )
-                    .exists()
-                )
-            )
-        )
-
-        # Execute the query.
-        shelf_positions = session.exec(available_positions_query).all()
-
-        if len(shelf_positions) < num_to_assign:
-            raise NotFound(
-                detail="Not enough empty shelf positions for containers with size "
-                "class and owner."
-            )
-
-        available_positions = sorted(
-            shelf_positions,
-            key=lambda pos: (
-                pos.location.split("-")[:6],
-                -int(pos.location.split("-")[-1]),
-            ),
+    if non_tray_item_ids:
+        selects.append(
+            select(
+                literal("non_tray_item").label("container_type"),
+                NonTrayItem.id.label("container_id"),
+                NonTrayItem.shelf_position_id.label("shelf_position_id"),
+            ).where(NonTrayItem.id.in_(non_tray_item_ids))
         )
+    if not selects:
+        return {}, {}
 
-        # Zip the container group with the available positions.
-        for container, position in zip(container_group, available_positions):
-            container.shelf_position_proposed_id = position.id
-            container.shelving_job_id = shelving_job_id
-            session.add(container)
+    containers = selects[0].union_all(*selects[1:]).subquery("containers")
+    shelves = session.execute(
+        select(
+            containers.c.container_type,
+            containers.c.container_id,
+            ShelfPosition.shelf_id,
+        ).join(ShelfPosition, ShelfPosition.id == containers.c.shelf_position_id)
+    ).all()
+    hierarchies = location_hierarchy_cache.get_many(
+        session, {row.shelf_id for row in shelves}
+    )
 
-        session.commit()
+    sort_keys = {"item": {}, "non_tray_item": {}}
+    for row in shelves:
+        hierarchy = hierarchies.get(row.shelf_id)
+        if hierarchy:
+            sort_keys[row.container_type][row.container_id] = hierarchy.sort_key
 
-    return
+    return sort_keys["item"], sort_keys["non_tray_item"]
 
 
 def make_aware(dt):
@@ -656,167 +438,137 @@ def _validate_field(
     return set()
 
 
-def _validate_items(session, items, request_data, errors):
-    errored_indices = set()
-    barcode_dict = _map_values_to_ids(items, "value", "id")
-    barcode_values = set(request_data["Item Barcode"].astype(str))
-    missing_barcodes = barcode_values - barcode_dict.keys()
-
-    if missing_barcodes:
-        for barcode in missing_barcodes:
-            index = request_data[
-                request_data["Item Barcode"].astype(str) == barcode
-            ].index[0]
-            errors.append(
-                {
-                    "line": int(index) + 2,
-                    "barcode_value": barcode,
-                    "error": f"""Item with Barcode {barcode} not found"""
-                }
-            )
-            errored_indices.add(index)
-
-    for barcode_value, barcode_id in barcode_dict.items():
-        row_index = request_data[
-            request_data["Item Barcode"].astype(str) == barcode_value
-        ].index[0]
-        item = session.query(Item).filter(Item.barcode_id == barcode_id).first()
-        non_tray_item = (
-            session.query(NonTrayItem)
-            .filter(NonTrayItem.barcode_id == barcode_id)
-            .first()
+def _fetch_request_candidates(session, barcode_values):
+    """
+    One row per known barcode value with the item or non tray item it
+    identifies, whether that container has an open request, and whether
+    it is shelved. Items are shelved through their tray.
+    """
+    def open_request(column, container_id):
+        return (
+            select(Request.id)
+            .where(column == container_id, Request.fulfilled == False)
+            .exists()
         )
 
-        if item:
-            _validate_item(
-                session,
-                item,
-                row_index,
-                barcode_value,
-                errors,
-                errored_indices,
-                "Items",
-            )
-        elif non_tray_item:
-            _validate_item(
-                session,
-                non_tray_item,
-                row_index,
-                barcode_value,
-                errors,
-                errored_indices,
-                "Non tray item",
-            )
-        else:
-            errors.append(
-                {
-                    "line": int(row_index) + 2,
-                    "barcode_value": barcode_value,
-                    "error": f"No items or non_trays found with barcode.",
-                }
-            )
-            errored_indices.add(row_index)
-
-    return errored_indices
-
-
-def _validate_item(
-    session, item, row_index, barcode_value, errors, errored_indices, item_type
-):
-    if item.status == "Out":
-        errors.append(
-            {
-                "line": int(row_index) + 2,
-                "barcode_value": barcode_value,
-                "error": f"{item_type} {barcode_value} status is not shelved",
-            }
-        )
-        errored_indices.add(row_index)
-        return
-    if item.status == "PickList":
-        errors.append(
-            {
-                "line": int(row_index) + 2,
-                "barcode_value": barcode_value,
-                "error": f"{item_type} {barcode_value} is already in pick list and cannot be requested",
-            }
-        )
-        errored_indices.add(row_index)
-        return
-    if item.status == "Withdrawn":
-        errors.append(
-            {
-                "line": int(row_index) + 2,
-                "barcode_value": barcode_value,
-                "error": f"{item_type} {barcode_value} has already been withdrawn",
-            }
-        )
-        errored_indices.add(row_index)
-        return
-
-    if item_type == "Items":
-        existing_request = (
-            session.query(Request)
-            .filter(Request.item_id == item.id, Request.fulfilled == False)
-            .first()
-        )
-    elif item_type == "Non tray item":
-        existing_request = (
-            session.query(Request)
-            .filter(Request.non_tray_item_id == item.id, Request.fulfilled == False)
-            .first()
+    return session.execute(
+        select(
+            Barcode.value.label("barcode_value"),
+            Item.id.label("item_id"),
+            Item.status.label("item_status"),
+            open_request(Request.item_id, Item.id).label("item_requested"),
+            and_(
+                Tray.shelf_position_id.isnot(None),
+                Tray.scanned_for_shelving == True,
+            ).label("item_shelved"),
+            NonTrayItem.id.label("non_tray_item_id"),
+            NonTrayItem.status.label("non_tray_item_status"),
+            open_request(Request.non_tray_item_id, NonTrayItem.id).label(
+                "non_tray_item_requested"
+            ),
+            and_(
+                NonTrayItem.shelf_position_id.isnot(None),
+                NonTrayItem.scanned_for_shelving == True,
+            ).label("non_tray_item_shelved"),
         )
+        .select_from(Barcode)
+        .outerjoin(Item, Item.barcode_id == Barcode.id)
+        .outerjoin(Tray, Tray.id == Item.tray_id)
+        .outerjoin(NonTrayItem, NonTrayItem.barcode_id == Barcode.id)
+        .where(Barcode.value == any_(cast(list(barcode_values), ARRAY(String))))
+    ).all()
 
-    if existing_request or item.status == "Requested":
-        errors.append(
-            {
-                "line": int(row_index) + 2,
-                "barcode_value": barcode_value,
-                "error": f"{item_type} {barcode_value} is already requested",
-            }
-        )
-        errored_indices.add(row_index)
-        return
 
-    if item_type == "Items":
-        tray_id = item.tray_id
-        shelf_position = _fetch_tray_shelf_position(session, tray_id)
+def _request_item_errors(candidates):
+    """
+    Error message per row of candidates, None when the row can be
+    requested. Checks run in the order _validate_item used to apply them.
+    """
+    is_item = candidates["item_id"].notna()
+    is_non_tray = ~is_item & candidates["non_tray_item_id"].notna()
+    prefix = np.where(is_item, "Items ", "Non tray item ") + candidates["barcode_value"]
 
-        if (
-            not shelf_position
-            or not shelf_position.tray.scanned_for_shelving
-            or not shelf_position.tray.shelf_position_id
-        ):
-            errors.append(
-                {
-                    "line": int(row_index) + 2,
-                    "barcode_value": barcode_value,
-                    "error": f"{item_type} {barcode_value} is not shelved",
-                }
-            )
-            errored_indices.add(row_index)
-    else:
-        if not item.scanned_for_shelving or not item.shelf_position_id:
-            errors.append(
-                {
-                    "line": int(row_index) + 2,
-                    "barcode_value": barcode_value,
-                    "error": f"{item_type} {barcode_value} is not shelved",
-                }
-            )
-            errored_indices.add(row_index)
+    def pick(item_column, non_tray_column):
+        return candidates[item_column].where(is_item, candidates[non_tray_column])
 
+    status = pick("item_status", "non_tray_item_status").map(
+        lambda value: getattr(value, "value", value)
+    )
+    requested = pick("item_requested", "non_tray_item_requested").fillna(False).astype(bool)
+    shelved = pick("item_shelved", "non_tray_item_shelved").fillna(False).astype(bool)
+
+    found = is_item | is_non_tray
+    conditions = [
+        candidates["barcode_id_missing"],
+        ~found,
+        status == "Out",
+        status == "PickList",
+        status == "Withdrawn",
+        requested | (status == "Requested"),
+        ~shelved,
+    ]
+    messages = [
+        "Item with Barcode " + candidates["barcode_value"] + " not found",
+        pd.Series("No items or non_trays found with barcode.", index=candidates.index),
+        prefix + " status is not shelved",
+        prefix + " is already in pick list and cannot be requested",
+        prefix + " has already been withdrawn",
+        prefix + " is already requested",
+        prefix + " is not shelved",
+    ]
+    return pd.Series(
+        np.select(conditions, messages, default=None), index=candidates.index
+    )
 
-def _fetch_tray_shelf_position(session, tray_id):
-    return session.query(ShelfPosition).join(Tray).filter(Tray.id == tray_id).first()
 
+def _validate_items(session, request_data, errors):
+    """
+    Validates the first row of every distinct Item Barcode with one
+    query, in place of per barcode item, request and shelf lookups.
+    Later rows repeating a barcode are reported as duplicates.
 
-def _fetch_non_tray_shelf_position(session, shelf_position_id):
-    return (
-        session.query(ShelfPosition)
-        .filter(ShelfPosition.id == shelf_position_id)
-        .first()
+    returns:
+        - set of errored request_data indices
+    """
+    barcode_values = request_data["Item Barcode"].astype(str)
+    first_rows = barcode_values[~barcode_values.duplicated()]
+
+    candidates = pd.DataFrame(
+        _fetch_request_candidates(session, first_rows.unique()),
+        columns=[
+            "barcode_value",
+            "item_id",
+            "item_status",
+            "item_requested",
+            "item_shelved",
+            "non_tray_item_id",
+            "non_tray_item_status",
+            "non_tray_item_requested",
+            "non_tray_item_shelved",
+        ],
+    ).drop_duplicates(subset="barcode_value")
+
+    candidates = (
+        first_rows.rename("barcode_value")
+        .rename_axis("row_index")
+        .reset_index()
+        .merge(candidates, on="barcode_value", how="left", indicator=True)
+    )
+    candidates["barcode_id_missing"] = candidates.pop("_merge") == "left_only"
+    candidates["error"] = _request_item_errors(candidates)
+
+    errored = candidates[candidates["error"].notna()].sort_values("row_index")
+    errors.extend(
+        {
+            "line": int(row_index) + 2,
+            "barcode_value": barcode_value,
+            "error": error,
+        }
+        for row_index, barcode_value, error in zip(
+            errored["row_index"], errored["barcode_value"], errored["error"]
+        )
     )
+    return set(errored["row_index"])
 
 
 def validate_request_data(session, request_data: pd.DataFrame):
@@ -911,16 +663,7 @@ def validate_request_data(session, request_data: pd.DataFrame):
         barcodes_errored_indices.add(index)
         errored_indices.add(index)
 
-    barcodes = _fetch_existing_data(
-        session,
-        Barcode,
-        request_data["Item Barcode"].astype(str).tolist(),
-        Barcode.value,
-    )
-
-    barcodes_errored_indices.update(
-        _validate_items(session, barcodes, request_data, errors)
-    )
+    barcodes_errored_indices.update(_validate_items(session, request_data, errors))
     errored_indices.update(barcodes_errored_indices)
 
     errored_indices = list(errored_indices)
@@ -1051,191 +794,198 @@ INVALID_STATUSES = {"Requested", "Withdrawn"}
 COMPLETED_STATUS = "Completed"
 
 
-def _get_shelf_position(session: Session, tray_id: int):
-    return session.query(ShelfPosition).join(Tray).filter(Tray.id == tray_id).first()
-
-
-def _get_existing_withdrawals(session: Session, item_ids, item_type):
-    model_map = {
-        "Item": ItemWithdrawal,
-        "NonTrayItem": NonTrayItemWithdrawal,
-    }
-    return (
-        session.query(model_map[item_type])
-        .filter(model_map[item_type].item_id.in_(item_ids))
-        .all()
-    )
-
-
-def _validate_withdraw_job_existing_item(existing_withdraws, job_id, status):
-    return any(
-        item.id != job_id and item.status != status for item in existing_withdraws
-    )
-
-
-def _validate_item_status(item, index, errors, error_message):
-    if item.status in INVALID_STATUSES:
-        errors.append({"line": int(index), "error": error_message})
-
-
-def validate_item_not_shelved(shelf_position):
-    if not shelf_position or not shelf_position.tray.scanned_for_shelving:
-        return True
-    return False
-
-
 def validate_container_not_shelved(item):
     if not item or not item.shelf_position_id or not item.scanned_for_shelving:
         return True
     return False
 
 
-def _validate_withdraw_item(session, item, withdraw_job_id, barcode, index, errors):
-    item_errors = []
+def _fetch_withdraw_candidates(session, withdraw_job_id, barcode_ids):
+    """
+    One row per item and non tray item with one of barcode_ids: its
+    status, whether it is shelved, and whether it is already in this
+    withdraw job or in any other job not yet completed. Items are shelved
+    through their tray, and carry whether their tray is in this job.
+    """
+    def in_open_job(withdrawal_model, column, container_id):
+        return (
+            select(withdrawal_model.id)
+            .join(WithdrawJob, WithdrawJob.id == withdrawal_model.withdraw_job_id)
+            .where(
+                column == container_id,
+                or_(
+                    WithdrawJob.id == withdraw_job_id,
+                    WithdrawJob.status != COMPLETED_STATUS,
+                ),
+            )
+            .exists()
+        )
 
-    _validate_item_status(
-        item, index, item_errors, "Item must have status of ['In', 'Out']"
+    barcode_ids = literal(list(barcode_ids), ARRAY(Barcode.__table__.c.id.type))
+    items = (
+        select(
+            literal("Item").label("kind"),
+            Item.id.label("id"),
+            Item.barcode_id.label("barcode_id"),
+            cast(Item.status, String).label("status"),
+            and_(
+                Tray.shelf_position_id.isnot(None),
+                Tray.scanned_for_shelving == True,
+            ).label("shelved"),
+            in_open_job(ItemWithdrawal, ItemWithdrawal.item_id, Item.id).label(
+                "in_open_job"
+            ),
+            Item.tray_id.label("tray_id"),
+            select(TrayWithdrawal.id)
+            .where(
+                TrayWithdrawal.tray_id == Item.tray_id,
+                TrayWithdrawal.withdraw_job_id == withdraw_job_id,
+            )
+            .exists()
+            .label("tray_in_job"),
+        )
+        .outerjoin(Tray, Tray.id == Item.tray_id)
+        .where(Item.barcode_id == any_(barcode_ids))
     )
-    shelf_position = (
-        session.query(ShelfPosition).join(Tray).filter(Tray.id == item.tray_id).first()
+    non_tray_items = select(
+        literal("NonTrayItem").label("kind"),
+        NonTrayItem.id,
+        NonTrayItem.barcode_id,
+        cast(NonTrayItem.status, String),
+        and_(
+            NonTrayItem.shelf_position_id.isnot(None),
+            NonTrayItem.scanned_for_shelving == True,
+        ),
+        in_open_job(
+            NonTrayItemWithdrawal, NonTrayItemWithdrawal.non_tray_item_id, NonTrayItem.id
+        ),
+        cast(None, Item.__table__.c.tray_id.type),
+        literal(False),
+    ).where(NonTrayItem.barcode_id == any_(barcode_ids))
+
+    return session.execute(items.union_all(non_tray_items)).all()
+
+
+def _withdraw_candidate_errors(candidates):
+    """
+    Error message per row of candidates, None when the row can be
+    withdrawn. A barcode with no item or non tray item is not found.
+    """
+    label = pd.Series(
+        np.where(candidates["kind"] == "Item", "Item", "Non Tray Item"),
+        index=candidates.index,
     )
-    if validate_item_not_shelved(shelf_position):
-        errors.append({"line": int(index), "error": "Item is not shelved"})
-    existing_withdrawals = (
-        session.query(WithdrawJob)
-        .join(ItemWithdrawal, WithdrawJob.id == ItemWithdrawal.withdraw_job_id)
-        .filter(ItemWithdrawal.item_id == item.id)
-        .all()
+    conditions = [
+        candidates["kind"].isna(),
+        candidates["status"].isin(INVALID_STATUSES),
+        candidates["in_open_job"].fillna(False).astype(bool),
+        ~candidates["shelved"].fillna(False).astype(bool),
+    ]
+    messages = [
+        pd.Series("Barcode not found", index=candidates.index),
+        label + " must have status of ['In', 'Out']",
+        label + " is in existing withdraw job",
+        label + " is not shelved",
+    ]
+    return pd.Series(
+        np.select(conditions, messages, default=None), index=candidates.index
     )
-    if _validate_withdraw_job_existing_item(
-        existing_withdrawals, withdraw_job_id, "Completed"
-    ):
-        item_errors.append(
-            {"line": int(index), "error": "Item is in existing withdraw job"}
-        )
-
-    if not item_errors:
-        return (
-            ItemWithdrawal(item_id=item.id, withdraw_job_id=withdraw_job_id),
-            item_errors,
-        )
-    else:
-        errors.extend(item_errors)
-        return None, item_errors
 
 
 def process_withdraw_job_data(
     session: Session, withdraw_job_id: int, barcodes: List, df: pd.DataFrame
 ) -> Tuple[List, List, List, Dict]:
+    """
+    Validates every barcode for withdraw_job_id with one query, in place
+    of per item shelf position and withdraw job lookups. Items bring
+    their tray into the job unless it is already there.
+
+    returns:
+        - item, non tray item and tray withdrawals to save, and row errors
+    """
     errors = []
-    withdraw_items = []
-    withdraw_non_tray_items = []
-    withdraw_trays = []
     update_dt = datetime.now(timezone.utc)
 
-    # Collect all barcode ids
-    barcode_ids = [barcode.id for barcode in barcodes]
-
-    # Fetch all necessary data in batch
-    items = {
-        item.barcode_id: item
-        for item in session.query(Item).filter(Item.barcode_id.in_(barcode_ids)).all()
-    }
-    non_tray_items = {
-        non_tray_item.barcode_id: non_tray_item
-        for non_tray_item in session.query(NonTrayItem)
-        .filter(NonTrayItem.barcode_id.in_(barcode_ids))
-        .all()
-    }
-
-    # Fetch existing withdrawals in one batch query
-    existing_withdrawals = {
-        non_tray_item_id: withdraw_job_id
-        for non_tray_item_id, withdraw_job_id in session.query(
-            NonTrayItemWithdrawal.non_tray_item_id,
-            NonTrayItemWithdrawal.withdraw_job_id,
-        )
-        .filter(
-            NonTrayItemWithdrawal.non_tray_item_id.in_(
-                [item.id for item in non_tray_items.values()]  # Extract `id` values
-            )
-        )
-        .all()
-    }
-
-    # Use a set for duplicate checks in withdraw_trays
-    withdraw_tray_set = {(tw.tray_id, tw.withdraw_job_id) for tw in withdraw_trays}
+    # spreadsheet row of each barcode, the last one when repeated
+    barcode_rows = df["Item Barcode"].astype(str)
+    barcode_rows = pd.Series(barcode_rows.index, index=barcode_rows.values)
+    barcode_rows = barcode_rows[~barcode_rows.index.duplicated(keep="last")]
 
-    # Create a lookup dictionary for barcodes in the DataFrame for retrieval
-    barcode_to_index = {
-        str(value): idx for idx, value in enumerate(df["Item Barcode"].astype(str))
-    }
-
-    for barcode in barcodes:
-        item = items.get(barcode.id)
-        non_tray_item = non_tray_items.get(barcode.id)
-
-        # Get the index from preprocessed barcode_to_index dictionary
-        index = barcode_to_index.get(str(barcode.value), None)
-        if index is None:
-            errors.append({"error": f"Barcode {barcode.value} not found"})
-            continue
+    barcode_frame = pd.DataFrame(
+        [(barcode.id, str(barcode.value)) for barcode in barcodes],
+        columns=["barcode_id", "barcode_value"],
+    )
+    barcode_frame["row_index"] = barcode_frame["barcode_value"].map(barcode_rows)
+
+    for barcode_value in barcode_frame.loc[
+        barcode_frame["row_index"].isna(), "barcode_value"
+    ]:
+        errors.append({"error": f"Barcode {barcode_value} not found"})
+    barcode_frame = barcode_frame[barcode_frame["row_index"].notna()]
+
+    candidates = pd.DataFrame(
+        _fetch_withdraw_candidates(
+            session, withdraw_job_id, barcode_frame["barcode_id"].tolist()
+        ),
+        columns=[
+            "kind",
+            "id",
+            "barcode_id",
+            "status",
+            "shelved",
+            "in_open_job",
+            "tray_id",
+            "tray_in_job",
+        ],
+    )
+    # a barcode on both is withdrawn as the item
+    candidates = candidates.sort_values("kind").drop_duplicates(subset="barcode_id")
+    candidates = barcode_frame.merge(candidates, on="barcode_id", how="left")
+    candidates["error"] = _withdraw_candidate_errors(candidates)
+
+    errored = candidates[candidates["error"].notna()].sort_values("row_index")
+    errors.extend(
+        {"line": int(row_index) + 2, "error": error}
+        for row_index, error in zip(errored["row_index"], errored["error"])
+    )
 
-        if item:
-            item_withdrawal, item_errors = _validate_withdraw_item(
-                session, item, withdraw_job_id, barcode, index + 1, errors
-            )
-            if item_withdrawal:
-                withdraw_items.append(item_withdrawal)
-                new_tray_withdrawal = TrayWithdrawal(
-                    tray_id=item.tray_id, withdraw_job_id=withdraw_job_id
-                )
+    valid = candidates[candidates["error"].isna()]
+    item_ids = valid.loc[valid["kind"] == "Item", "id"].astype(int).tolist()
+    non_tray_item_ids = (
+        valid.loc[valid["kind"] == "NonTrayItem", "id"].astype(int).tolist()
+    )
+    tray_ids = (
+        valid.loc[
+            (valid["kind"] == "Item")
+            & valid["tray_id"].notna()
+            & ~valid["tray_in_job"].fillna(False).astype(bool),
+            "tray_id",
+        ]
+        .astype(int)
+        .unique()
+        .tolist()
+    )
 
-                # Check if the tray_id and withdraw_job_id already exist in withdraw_trays
-                # Use a set for faster lookup instead of `any()`
-                if (
-                    new_tray_withdrawal.tray_id,
-                    new_tray_withdrawal.withdraw_job_id,
-                ) not in withdraw_tray_set:
-                    withdraw_tray_set.add(
-                        (
-                            new_tray_withdrawal.tray_id,
-                            new_tray_withdrawal.withdraw_job_id,
-                        )
-                    )
-                    withdraw_trays.append(new_tray_withdrawal)
-
-                item.update_dt = update_dt
-                session.add(item)
-        elif non_tray_item:
-            _validate_item_status(
-                non_tray_item,
-                index + 1,
-                errors,
-                "Non Tray Item must have status of ['In', 'Out']",
+    withdraw_items = [
+        ItemWithdrawal(item_id=item_id, withdraw_job_id=withdraw_job_id)
+        for item_id in item_ids
+    ]
+    withdraw_non_tray_items = [
+        NonTrayItemWithdrawal(
+            non_tray_item_id=non_tray_item_id, withdraw_job_id=withdraw_job_id
+        )
+        for non_tray_item_id in non_tray_item_ids
+    ]
+    withdraw_trays = [
+        TrayWithdrawal(tray_id=tray_id, withdraw_job_id=withdraw_job_id)
+        for tray_id in tray_ids
+    ]
+
+    for model, ids in ((Item, item_ids), (NonTrayItem, non_tray_item_ids)):
+        if ids:
+            session.query(model).filter(model.id.in_(ids)).update(
+                {"update_dt": update_dt}, synchronize_session=False
             )
-            if existing_withdrawals.get(non_tray_item.id) == withdraw_job_id:
-                errors.append(
-                    {
-                        "line": int(index) + 2,
-                        "error": "Non Tray Item is in existing withdraw job",
-                    }
-                )
-            elif validate_container_not_shelved(non_tray_item):
-                errors.append(
-                    {"line": int(index) + 2, "error": "Non Tray Item is not shelved"}
-                )
-            else:
-                withdraw_non_tray_items.append(
-                    NonTrayItemWithdrawal(
-                        non_tray_item_id=non_tray_item.id,
-                        withdraw_job_id=withdraw_job_id,
-                    )
-                )
-                non_tray_item.update_dt = update_dt
-                session.add(non_tray_item)
-        else:
-            errors.append({"line": int(index) + 2, "error": "Barcode not found"})
 
     return withdraw_items, withdraw_non_tray_items, withdraw_trays, {"errors": errors}
 
@@ -44,38 +44,59 @@ seed_fake_data()
 }
 
 run-storage-migration() {
+# pass "copy" to load through COPY staging tables
+USE_COPY=False
+if [[ "$1" == "copy" ]]; then
+  USE_COPY=True
+fi
 # do not indent on shell str
 RUN_DATA_MIGRATION="
 from app import main
 from app.seed.seed_data import seed_data
-seed_data()
+seed_data(use_copy=$USE_COPY)
 ";
 
   podman exec -it fetch-inventory-api python -c "$RUN_DATA_MIGRATION";
 }
 
 run-tray-migration() {
+# pass "copy" to load through COPY staging tables
+USE_COPY=False
+if [[ "$1" == "copy" ]]; then
+  USE_COPY=True
+fi
 # do not indent on shell str
 RUN_TRAY_MIGRATION="
 from app import main
 from app.seed.seed_data import seed_containers
-seed_containers()
+seed_containers(use_copy=$USE_COPY)
 ";
 
     podman exec -it fetch-inventory-api python -c "$RUN_TRAY_MIGRATION";
 }
 
 run-item-migration() {
+# pass "copy" to load through COPY staging tables
+USE_COPY=False
+if [[ "$1" == "copy" ]]; then
+  USE_COPY=True
+fi
 # do not indent on shell str
 RUN_ITEM_MIGRATION="
 from app import main
 from app.seed.seed_data import seed_items
-seed_items()
+seed_items(use_copy=$USE_COPY)
 ";
 
     podman exec -it fetch-inventory-api python -c "$RUN_ITEM_MIGRATION";
 }
 
+run-migration() {
+# resumable COPY mode migration, e.g. run-migration items --parse-workers 4
+# rerun the same command to pick up after a failure, --status reports progress
+    podman exec -it fetch-inventory-api python -m app.seed.migration_runner "$@";
+}
+
 run-available-space-migration() {
 # do not indent on shell str
 RUN_SPACE_MIGRATION="
@@ -53,3 +53,4 @@ from app.models.verification_changes import VerificationChange
 from app.models.item_retrieval_events import ItemRetrievalEvent
 from app.models.non_tray_item_retrieval_events import NonTrayItemRetrievalEvent
 from app.models.move_discrepancies import MoveDiscrepancy
+from app.models.migration_checkpoints import MigrationCheckpoint
@@ -0,0 +1,177 @@
+"""Shelf position occupancy
+
+Revision ID: 2026_10_16_09:12:40
+Revises: 2025_04_24_18:29:11
+Create Date: 2026-10-16 13:12:40.318220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2026_10_16_09:12:40'
+down_revision: Union[str, None] = '2025_04_24_18:29:11'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'shelf_positions',
+        sa.Column('occupied', sa.Boolean(), nullable=False, server_default=sa.false())
+    )
+    op.add_column(
+        'shelf_positions',
+        sa.Column('reserved', sa.Boolean(), nullable=False, server_default=sa.false())
+    )
+
+    sql = """
+        -- Occupancy recompute lookups by proposed position
+        CREATE INDEX IF NOT EXISTS idx_tray_shelf_position_proposed_id ON trays(shelf_position_proposed_id);
+        CREATE INDEX IF NOT EXISTS idx_non_tray_shelf_position_proposed_id ON non_tray_items(shelf_position_proposed_id);
+
+        -- Free positions of a shelf are a range scan
+        CREATE INDEX IF NOT EXISTS idx_shelf_positions_free
+            ON shelf_positions(shelf_id)
+            WHERE NOT occupied AND NOT reserved;
+
+        -- Shelves by owner and size class (via shelf type) under a ladder
+        CREATE INDEX IF NOT EXISTS idx_shelves_owner_shelf_type_ladder
+            ON shelves(owner_id, shelf_type_id, ladder_id);
+
+        -- Recomputes occupancy of the given positions from trays and non tray items.
+        -- Call with every position id to reconcile the whole table.
+        CREATE OR REPLACE FUNCTION refresh_shelf_position_occupancy(position_ids bigint[])
+        RETURNS void AS $$
+            UPDATE shelf_positions sp
+            SET occupied = state.occupied, reserved = state.reserved
+            FROM (
+                SELECT p.id,
+                    EXISTS (SELECT 1 FROM trays t WHERE t.shelf_position_id = p.id)
+                    OR EXISTS (SELECT 1 FROM non_tray_items n WHERE n.shelf_position_id = p.id)
+                    AS occupied,
+                    EXISTS (SELECT 1 FROM trays t WHERE t.shelf_position_proposed_id = p.id)
+                    OR EXISTS (SELECT 1 FROM non_tray_items n WHERE n.shelf_position_proposed_id = p.id)
+                    AS reserved
+                FROM shelf_positions p
+                WHERE p.id = ANY(position_ids)
+            ) state
+            WHERE sp.id = state.id
+            AND (sp.occupied, sp.reserved) IS DISTINCT FROM (state.occupied, state.reserved);
+        $$ LANGUAGE sql;
+
+        -- Statement level, so bulk updates recompute once per statement
+        CREATE OR REPLACE FUNCTION sync_shelf_position_occupancy() RETURNS TRIGGER AS $$
+            DECLARE
+                position_ids bigint[];
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    SELECT array_agg(position_id) INTO position_ids
+                    FROM new_rows
+                    CROSS JOIN unnest(ARRAY[
+                        new_rows.shelf_position_id,
+                        new_rows.shelf_position_proposed_id
+                    ]::bigint[]) position_id
+                    WHERE position_id IS NOT NULL;
+
+                ELSIF TG_OP = 'UPDATE' THEN
+                    SELECT array_agg(position_id) INTO position_ids
+                    FROM old_rows
+                    JOIN new_rows ON new_rows.id = old_rows.id
+                    CROSS JOIN unnest(ARRAY[
+                        old_rows.shelf_position_id,
+                        old_rows.shelf_position_proposed_id,
+                        new_rows.shelf_position_id,
+                        new_rows.shelf_position_proposed_id
+                    ]::bigint[]) position_id
+                    WHERE position_id IS NOT NULL
+                    AND (
+                        old_rows.shelf_position_id IS DISTINCT FROM new_rows.shelf_position_id
+                        OR old_rows.shelf_position_proposed_id IS DISTINCT FROM new_rows.shelf_position_proposed_id
+                    );
+
+                ELSIF TG_OP = 'DELETE' THEN
+                    SELECT array_agg(position_id) INTO position_ids
+                    FROM old_rows
+                    CROSS JOIN unnest(ARRAY[
+                        old_rows.shelf_position_id,
+                        old_rows.shelf_position_proposed_id
+                    ]::bigint[]) position_id
+                    WHERE position_id IS NOT NULL;
+                END IF;
+
+                IF position_ids IS NOT NULL THEN
+                    PERFORM refresh_shelf_position_occupancy(position_ids);
+                END IF;
+
+                RETURN NULL;
+            END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trays_occupancy_insert
+            AFTER INSERT ON public.trays
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION sync_shelf_position_occupancy();
+
+        CREATE TRIGGER trays_occupancy_update
+            AFTER UPDATE ON public.trays
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION sync_shelf_position_occupancy();
+
+        CREATE TRIGGER trays_occupancy_delete
+            AFTER DELETE ON public.trays
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION sync_shelf_position_occupancy();
+
+        CREATE TRIGGER non_tray_items_occupancy_insert
+            AFTER INSERT ON public.non_tray_items
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION sync_shelf_position_occupancy();
+
+        CREATE TRIGGER non_tray_items_occupancy_update
+            AFTER UPDATE ON public.non_tray_items
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION sync_shelf_position_occupancy();
+
+        CREATE TRIGGER non_tray_items_occupancy_delete
+            AFTER DELETE ON public.non_tray_items
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION sync_shelf_position_occupancy();
+
+        -- Backfill
+        UPDATE shelf_positions sp
+        SET occupied = true
+        WHERE EXISTS (SELECT 1 FROM trays t WHERE t.shelf_position_id = sp.id)
+        OR EXISTS (SELECT 1 FROM non_tray_items n WHERE n.shelf_position_id = sp.id);
+
+        UPDATE shelf_positions sp
+        SET reserved = true
+        WHERE EXISTS (SELECT 1 FROM trays t WHERE t.shelf_position_proposed_id = sp.id)
+        OR EXISTS (SELECT 1 FROM non_tray_items n WHERE n.shelf_position_proposed_id = sp.id);
+    """
+    op.execute(sql)
+
+
+def downgrade() -> None:
+    sql = """
+        DROP TRIGGER IF EXISTS trays_occupancy_insert ON trays;
+        DROP TRIGGER IF EXISTS trays_occupancy_update ON trays;
+        DROP TRIGGER IF EXISTS trays_occupancy_delete ON trays;
+        DROP TRIGGER IF EXISTS non_tray_items_occupancy_insert ON non_tray_items;
+        DROP TRIGGER IF EXISTS non_tray_items_occupancy_update ON non_tray_items;
+        DROP TRIGGER IF EXISTS non_tray_items_occupancy_delete ON non_tray_items;
+        DROP FUNCTION IF EXISTS sync_shelf_position_occupancy();
+        DROP FUNCTION IF EXISTS refresh_shelf_position_occupancy(bigint[]);
+        DROP INDEX IF EXISTS idx_shelves_owner_shelf_type_ladder;
+        DROP INDEX IF EXISTS idx_shelf_positions_free;
+        DROP INDEX IF EXISTS idx_tray_shelf_position_proposed_id;
+        DROP INDEX IF EXISTS idx_non_tray_shelf_position_proposed_id;
+    """
+    op.execute(sql)
+    op.drop_column('shelf_positions', 'reserved')
+    op.drop_column('shelf_positions', 'occupied')
@@ -0,0 +1,44 @@
+"""Add migration_checkpoints for resumable legacy migrations
+
+Revision ID: 2026_10_16_14:02:17
+Revises: 2026_10_16_09:12:40
+Create Date: 2026-10-16 14:02:17.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2026_10_16_14:02:17'
+down_revision: Union[str, None] = '2026_10_16_09:12:40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'migration_checkpoints',
+        sa.Column('loader', sa.VARCHAR(length=50), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('chunk_size', sa.Integer(), nullable=False),
+        sa.Column('byte_offset', sa.BigInteger(), nullable=False),
+        sa.Column('first_row', sa.Integer(), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.Column('checksum', sa.VARCHAR(length=64), nullable=False),
+        sa.Column('successful_rows', sa.Integer(), nullable=False),
+        sa.Column('failed_rows', sa.Integer(), nullable=False),
+        sa.Column('skipped_rows', sa.Integer(), nullable=False),
+        sa.Column('results', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('create_dt', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('loader', 'chunk_index')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('migration_checkpoints')
@@ -0,0 +1,119 @@
+"""Shelf available space deltas
+
+Revision ID: 2026_10_16_15:20:05
+Revises: 2026_10_16_14:02:17
+Create Date: 2026-10-16 19:20:05.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2026_10_16_15:20:05'
+down_revision: Union[str, None] = '2026_10_16_14:02:17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    sql = """
+        -- Adjusts shelves.available_space by the free positions each statement
+        -- adds or removes. Occupancy flips come from the trays and
+        -- non_tray_items occupancy triggers, so placement and removal are
+        -- counted in the same transaction as the move.
+        CREATE OR REPLACE FUNCTION apply_shelf_available_space_delta() RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE shelves s
+                    SET available_space = s.available_space + delta.free
+                    FROM (
+                        SELECT shelf_id, count(*) AS free
+                        FROM new_rows
+                        WHERE NOT occupied
+                        GROUP BY shelf_id
+                    ) delta
+                    WHERE s.id = delta.shelf_id;
+
+                ELSIF TG_OP = 'UPDATE' THEN
+                    UPDATE shelves s
+                    SET available_space = s.available_space + delta.free
+                    FROM (
+                        SELECT shelf_id, sum(free) AS free
+                        FROM (
+                            SELECT new_rows.shelf_id, CASE WHEN new_rows.occupied THEN 0 ELSE 1 END AS free
+                            FROM new_rows
+                            JOIN old_rows ON old_rows.id = new_rows.id
+                            WHERE (old_rows.occupied, old_rows.shelf_id)
+                                IS DISTINCT FROM (new_rows.occupied, new_rows.shelf_id)
+                            UNION ALL
+                            SELECT old_rows.shelf_id, CASE WHEN old_rows.occupied THEN 0 ELSE -1 END
+                            FROM old_rows
+                            JOIN new_rows ON new_rows.id = old_rows.id
+                            WHERE (old_rows.occupied, old_rows.shelf_id)
+                                IS DISTINCT FROM (new_rows.occupied, new_rows.shelf_id)
+                        ) changes
+                        GROUP BY shelf_id
+                        HAVING sum(free) <> 0
+                    ) delta
+                    WHERE s.id = delta.shelf_id;
+
+                ELSIF TG_OP = 'DELETE' THEN
+                    UPDATE shelves s
+                    SET available_space = s.available_space - delta.free
+                    FROM (
+                        SELECT shelf_id, count(*) AS free
+                        FROM old_rows
+                        WHERE NOT occupied
+                        GROUP BY shelf_id
+                    ) delta
+                    WHERE s.id = delta.shelf_id;
+                END IF;
+
+                RETURN NULL;
+            END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER shelf_positions_available_space_insert
+            AFTER INSERT ON public.shelf_positions
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION apply_shelf_available_space_delta();
+
+        CREATE TRIGGER shelf_positions_available_space_update
+            AFTER UPDATE ON public.shelf_positions
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION apply_shelf_available_space_delta();
+
+        CREATE TRIGGER shelf_positions_available_space_delete
+            AFTER DELETE ON public.shelf_positions
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION apply_shelf_available_space_delta();
+
+        -- Backfill, deltas assume a correct starting count
+        UPDATE shelves s
+        SET available_space = space.available_space
+        FROM (
+            SELECT shelves.id AS shelf_id,
+                count(sp.id) - count(sp.id) FILTER (WHERE sp.occupied) AS available_space
+            FROM shelves
+            LEFT JOIN shelf_positions sp ON sp.shelf_id = shelves.id
+            GROUP BY shelves.id
+        ) space
+        WHERE s.id = space.shelf_id
+        AND s.available_space IS DISTINCT FROM space.available_space;
+    """
+    op.execute(sql)
+
+
+def downgrade() -> None:
+    sql = """
+        DROP TRIGGER IF EXISTS shelf_positions_available_space_insert ON shelf_positions;
+        DROP TRIGGER IF EXISTS shelf_positions_available_space_update ON shelf_positions;
+        DROP TRIGGER IF EXISTS shelf_positions_available_space_delete ON shelf_positions;
+        DROP FUNCTION IF EXISTS apply_shelf_available_space_delta();
+    """
+    op.execute(sql)
@@ -0,0 +1,35 @@
+"""Add batch_uploads progress counters and row errors
+
+Revision ID: 2026_10_16_16:05:31
+Revises: 2026_10_16_15:20:05
+Create Date: 2026-10-16 16:05:31.270944
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2026_10_16_16:05:31'
+down_revision: Union[str, None] = '2026_10_16_15:20:05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('batch_uploads', sa.Column('total_rows', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('batch_uploads', sa.Column('processed_rows', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('batch_uploads', sa.Column('errored_rows', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('batch_uploads', sa.Column('errors', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('batch_uploads', 'errors')
+    op.drop_column('batch_uploads', 'errored_rows')
+    op.drop_column('batch_uploads', 'processed_rows')
+    op.drop_column('batch_uploads', 'total_rows')
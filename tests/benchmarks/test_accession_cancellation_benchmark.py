@@ -0,0 +1,58 @@
+import logging
+
+from sqlalchemy import text
+
+from app.tasks import bulk_cancel_accession_job
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_accession_job,
+    seed_building,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_accession_cancellation_benchmark")
+
+
+def test_cancel_10k_item_accession_job(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        accession_job = seed_accession_job(session, seed)
+
+        with count_queries(session) as queries, timed(
+            "cancel accession job with 500 trays, 10000 items, 200 non tray items"
+        ):
+            deleted = bulk_cancel_accession_job(session, accession_job.id)
+
+        assert deleted == {
+            "items": 10000,
+            "trays": 500,
+            "non_tray_items": 200,
+            "barcodes": 10700,
+        }
+        # one delete per container table and one for their barcodes
+        assert queries["count"] == 4
+
+        remaining_barcodes = session.execute(
+            text("SELECT count(*) FROM barcodes WHERE value LIKE :token"),
+            {"token": f"{seed['token']}-%"},
+        ).scalar()
+        assert remaining_barcodes == 0
+    finally:
+        session.rollback()
+
+
+def test_cancel_query_count_independent_of_job_size(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        small_job = seed_accession_job(session, seed, trays=2, items=10, non_tray_items=1)
+        large_job = seed_accession_job(session, seed, trays=50, items=2000, non_tray_items=20)
+
+        with count_queries(session) as small_queries:
+            bulk_cancel_accession_job(session, small_job.id)
+        with count_queries(session) as large_queries:
+            bulk_cancel_accession_job(session, large_job.id)
+
+        assert small_queries["count"] == large_queries["count"]
+    finally:
+        session.rollback()
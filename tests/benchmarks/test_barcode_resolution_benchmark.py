@@ -0,0 +1,152 @@
+import logging
+
+from sqlalchemy import text
+
+from app.barcode_resolution import (
+    ALL_BARCODES,
+    PENDING_BARCODE_CHANGES,
+    _apply_barcode_changes,
+    barcode_resolution_cache,
+    resolve_barcode,
+    resolve_barcodes,
+)
+from app.models.trays import Tray
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_building,
+    seed_items,
+    seed_non_tray_items,
+    seed_trays,
+    shelve_containers,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_barcode_resolution_benchmark")
+
+
+def _barcode_values(session, table, ids):
+    return list(
+        session.execute(
+            text(
+                f"SELECT b.value FROM {table} c JOIN barcodes b ON b.id = c.barcode_id "
+                "WHERE c.id = ANY(:ids) ORDER BY c.id"
+            ),
+            {"ids": ids},
+        ).scalars()
+    )
+
+
+def test_resolve_1000_scans_in_one_query(session):
+    try:
+        seed = seed_building(session)
+        tray_ids = seed_trays(session, seed, 100)
+        shelve_containers(session, "trays", tray_ids, seed)
+        item_ids = seed_items(session, seed, 800, tray_ids)
+        non_tray_item_ids = seed_non_tray_items(session, seed, 100)
+        values = (
+            _barcode_values(session, "items", item_ids)
+            + _barcode_values(session, "non_tray_items", non_tray_item_ids)
+            + _barcode_values(session, "trays", tray_ids)
+        )
+
+        with count_queries(session) as queries, timed(
+            f"resolve {len(values)} barcodes"
+        ):
+            resolved = resolve_barcodes(session, values)
+
+        assert queries["count"] == 1
+        assert len(resolved) == len(values)
+
+        item = resolved[values[0]]
+        tray_value = _barcode_values(session, "trays", [item.tray_id])[0]
+        assert item.entity_type == "Item"
+        assert item.entity_id == item_ids[0]
+        assert item.status == "In"
+        assert item.tray_barcode_value == tray_value
+        # items report their tray's shelving
+        assert item.shelf_position_id and item.scanned_for_shelving
+        assert resolved[tray_value].entity_type == "Tray"
+        assert resolved[values[800]].entity_type == "NonTrayItem"
+        assert not resolved[values[800]].shelf_position_id
+    finally:
+        session.rollback()
+
+
+def test_cached_resolution_reads_items(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        tray_ids = seed_trays(session, seed, 2)
+        item_ids = seed_items(session, seed, 1, tray_ids[:1])
+        value = _barcode_values(session, "items", item_ids)[0]
+        tray_values = _barcode_values(session, "trays", tray_ids)
+
+        assert resolve_barcode(session, value, cached=True).tray_barcode_value == (
+            tray_values[0]
+        )
+        # moved without the ORM, which the cache can't see
+        session.execute(
+            text("UPDATE items SET tray_id = :tray_id WHERE id = :id"),
+            {"tray_id": tray_ids[1], "id": item_ids[0]},
+        )
+        with count_queries(session) as queries:
+            item = resolve_barcode(session, value, cached=True)
+        assert queries["count"] == 1
+        assert item.tray_barcode_value == tray_values[1]
+        assert value not in barcode_resolution_cache._entries
+    finally:
+        session.rollback()
+        barcode_resolution_cache.clear()
+
+
+def test_cached_resolution_drops_updated_containers(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        tray_ids = seed_trays(session, seed, 1)
+        value = _barcode_values(session, "trays", tray_ids)[0]
+
+        original = resolve_barcode(session, value, cached=True)
+        with count_queries(session) as queries:
+            assert resolve_barcode(session, value, cached=True) == original
+        assert queries["count"] == 0
+
+        tray = session.get(Tray, tray_ids[0])
+        tray.withdrawn_barcode_id = tray.barcode_id
+        tray.barcode_id = None
+        session.add(tray)
+        session.flush()
+        assert session.info[PENDING_BARCODE_CHANGES] == {original.barcode_id}
+        # the changing session reads its own update, but doesn't cache it
+        assert resolve_barcode(session, value, cached=True).entity_type is None
+        assert barcode_resolution_cache._entries[value][1] == original
+        assert resolve_barcode(session, "missing") is None
+    finally:
+        session.rollback()
+
+    # rolled back changes were never cached, and the pending changes are gone
+    assert not session.info.get(PENDING_BARCODE_CHANGES)
+    assert resolve_barcode(session, value, cached=True) == original
+    barcode_resolution_cache.clear()
+
+
+def test_cached_resolution_applies_bulk_changes_on_commit(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        tray_ids = seed_trays(session, seed, 1)
+        value = _barcode_values(session, "trays", tray_ids)[0]
+        resolve_barcode(session, value, cached=True)
+
+        session.query(Tray).filter(Tray.id == tray_ids[0]).update(
+            {"scanned_for_shelving": True}, synchronize_session=False
+        )
+        # bulk updates don't say which barcodes they touched
+        assert session.info[PENDING_BARCODE_CHANGES] == {ALL_BARCODES}
+        assert value in barcode_resolution_cache._entries
+
+        # what after_commit runs once the transaction is durable
+        _apply_barcode_changes(session)
+        assert value not in barcode_resolution_cache._entries
+        assert resolve_barcode(session, value, cached=True).scanned_for_shelving
+    finally:
+        session.rollback()
+        barcode_resolution_cache.clear()
@@ -0,0 +1,283 @@
+import logging
+
+from sqlalchemy import text
+from sqlmodel import select
+
+from app.batch_scans import (
+    batch_add_to_refile_queue,
+    batch_add_to_verification_job,
+    batch_add_to_withdraw_job,
+)
+from app.models.accession_jobs import AccessionJob
+from app.models.item_withdrawals import ItemWithdrawal
+from app.models.tray_withdrawal import TrayWithdrawal
+from app.models.verification_changes import VerificationChange
+from app.models.verification_jobs import VerificationJob
+from app.models.withdraw_jobs import WithdrawJob
+from app.models.workflows import Workflow
+from app.routers.refile_queue import add_to_refile_queue
+from app.schemas.refile_queue import RefileQueueInput
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    commits_as_flush,
+    count_queries,
+    seed_barcodes,
+    seed_building,
+    seed_items,
+    seed_non_tray_items,
+    seed_trays,
+    shelve_containers,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_batch_scan_benchmark")
+
+
+def _barcode_values(session, item_ids, table="items"):
+    return list(
+        session.execute(
+            text(
+                f"SELECT b.value FROM {table} c JOIN barcodes b ON b.id = c.barcode_id "
+                "WHERE c.id = ANY(:ids) ORDER BY c.id"
+            ),
+            {"ids": item_ids},
+        ).scalars()
+    )
+
+
+def _queued(session, item_ids):
+    return session.execute(
+        text(
+            "SELECT count(*) FROM items "
+            "WHERE id = ANY(:ids) AND scanned_for_refile_queue"
+        ),
+        {"ids": item_ids},
+    ).scalar()
+
+
+def test_refile_queue_1000_scans_single_vs_batch(session):
+    try:
+        seed = seed_building(session)
+        tray_ids = seed_trays(session, seed, 100)
+        single_ids = seed_items(session, seed, 1000, tray_ids, status="Out")
+        batch_ids = seed_items(session, seed, 1000, tray_ids, status="Out")
+        single_values = _barcode_values(session, single_ids)
+        batch_values = _barcode_values(session, batch_ids)
+
+        with commits_as_flush(session), count_queries(session) as single_queries, timed(
+            f"refile queue {len(single_values)} single scans"
+        ) as single_timing:
+            for value in single_values:
+                add_to_refile_queue(RefileQueueInput(barcode_value=value), session)
+
+        with count_queries(session) as batch_queries, timed(
+            f"refile queue {len(batch_values)} scan batch"
+        ) as batch_timing:
+            results = batch_add_to_refile_queue(session, batch_values)
+            session.flush()
+
+        LOGGER.info(
+            f"[benchmark] single scans: {single_queries['count']} queries, "
+            f"batch: {batch_queries['count']} queries, "
+            f"{single_timing['seconds'] / batch_timing['seconds']:.1f}x faster"
+        )
+        assert _queued(session, single_ids) == 1000
+        assert _queued(session, batch_ids) == 1000
+        assert all(result["status"] == "Added" for result in results.values())
+        # resolve, two refile job checks, two pick list checks, one update
+        assert batch_queries["count"] <= 6
+        assert single_queries["count"] >= 4 * len(single_values)
+    finally:
+        session.rollback()
+
+
+def test_refile_queue_batch_reports_each_barcode(session):
+    try:
+        seed = seed_building(session)
+        tray_ids = seed_trays(session, seed, 1)
+        out_ids = seed_items(session, seed, 2, tray_ids, status="Out")
+        in_ids = seed_items(session, seed, 1, tray_ids)
+        out_values = _barcode_values(session, out_ids)
+        in_value = _barcode_values(session, in_ids)[0]
+
+        batch_add_to_refile_queue(session, out_values[:1])
+        results = batch_add_to_refile_queue(
+            session, [*out_values, in_value, "missing"]
+        )
+
+        assert {value: result["detail"] for value, result in results.items()} == {
+            out_values[0]: "Item is already in the refile queue",
+            out_values[1]: None,
+            in_value: "Item must be in 'Out' status",
+            "missing": "Barcode value missing not found",
+        }
+    finally:
+        session.rollback()
+
+
+def _results(results):
+    return {
+        value: (result["status"], result["detail"], result["errors"])
+        for value, result in results.items()
+    }
+
+
+def _withdrawn(session, model, column, withdraw_job_id):
+    return sorted(
+        session.execute(
+            select(column).where(model.withdraw_job_id == withdraw_job_id)
+        ).scalars()
+    )
+
+
+def test_withdraw_job_batch_reports_each_barcode(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        tray_ids = seed_trays(session, seed, 3)
+        shelved_tray, other_shelved_tray, unshelved_tray = tray_ids
+        shelve_containers(session, "trays", tray_ids[:2], seed)
+        item_ids = seed_items(session, seed, 2, [shelved_tray])
+        withdrawn_item_ids = seed_items(
+            session, seed, 1, [shelved_tray], status="Withdrawn"
+        )
+        other_item_ids = seed_items(session, seed, 2, [other_shelved_tray])
+        unshelved_item_ids = seed_items(session, seed, 1, [unshelved_tray])
+        item_values = _barcode_values(session, item_ids)
+        withdrawn_value = _barcode_values(session, withdrawn_item_ids)[0]
+        other_values = _barcode_values(session, other_item_ids)
+        unshelved_value = _barcode_values(session, unshelved_item_ids)[0]
+        tray_value = _barcode_values(session, [shelved_tray], "trays")[0]
+        withdraw_job = WithdrawJob()
+        session.add(withdraw_job)
+        session.flush()
+
+        results = batch_add_to_withdraw_job(
+            session,
+            withdraw_job,
+            [
+                item_values[0],
+                tray_value,
+                other_values[0],
+                withdrawn_value,
+                unshelved_value,
+                "missing",
+            ],
+        )
+        session.flush()
+
+        invalid_status = "Item must have status of ['In', 'Out']"
+        # the tray brings in its items, the item scanned alone too is added once
+        assert _results(results) == {
+            item_values[0]: ("Added", None, None),
+            tray_value: (
+                "Added",
+                None,
+                [{"barcode": withdrawn_value, "error": invalid_status}],
+            ),
+            other_values[0]: ("Added", None, None),
+            withdrawn_value: ("Error", invalid_status, None),
+            unshelved_value: ("Error", "Item is not shelved", None),
+            "missing": ("Error", "Barcode missing not found", None),
+        }
+        assert _withdrawn(
+            session, ItemWithdrawal, ItemWithdrawal.item_id, withdraw_job.id
+        ) == sorted([*item_ids, other_item_ids[0]])
+        assert _withdrawn(
+            session, TrayWithdrawal, TrayWithdrawal.tray_id, withdraw_job.id
+        ) == [shelved_tray, other_shelved_tray]
+
+        # the other tray is already in the job, so only its item is added
+        results = batch_add_to_withdraw_job(
+            session, withdraw_job, [other_values[1], tray_value]
+        )
+        session.flush()
+
+        in_job = "Item is in existing withdraw job"
+        assert _results(results) == {
+            other_values[1]: ("Added", None, None),
+            tray_value: (
+                "Error",
+                "No items in tray can be withdrawn",
+                [
+                    {"barcode": item_values[0], "error": in_job},
+                    {"barcode": item_values[1], "error": in_job},
+                    {"barcode": withdrawn_value, "error": invalid_status},
+                ],
+            ),
+        }
+        assert _withdrawn(
+            session, TrayWithdrawal, TrayWithdrawal.tray_id, withdraw_job.id
+        ) == [shelved_tray, other_shelved_tray]
+    finally:
+        session.rollback()
+
+
+def test_verification_job_batch_reports_each_barcode(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        tray_ids = seed_trays(session, seed, 2)
+        tray_item_ids = seed_items(session, seed, 2, tray_ids[:1])
+        item_ids = seed_items(session, seed, 1, tray_ids[1:])
+        non_tray_item_ids = seed_non_tray_items(session, seed, 1)
+        tray_value = _barcode_values(session, tray_ids[:1], "trays")[0]
+        other_tray_value = _barcode_values(session, tray_ids[1:], "trays")[0]
+        tray_item_values = _barcode_values(session, tray_item_ids)
+        item_value = _barcode_values(session, item_ids)[0]
+        non_tray_item_value = _barcode_values(
+            session, non_tray_item_ids, "non_tray_items"
+        )[0]
+        unassigned_value = session.execute(
+            text("SELECT value FROM barcodes WHERE id = :id"),
+            {"id": seed_barcodes(session, seed, "U", 1)[0]},
+        ).scalar()
+        workflow = Workflow()
+        accession_job = AccessionJob(
+            trayed=True, status="Completed", owner_id=seed["owner_ids"][0]
+        )
+        session.add_all([workflow, accession_job])
+        session.flush()
+        verification_job = VerificationJob(
+            workflow_id=workflow.id, accession_job_id=accession_job.id
+        )
+        session.add(verification_job)
+        session.flush()
+
+        results = batch_add_to_verification_job(
+            session,
+            verification_job,
+            [tray_value, item_value, non_tray_item_value, unassigned_value, "missing"],
+        )
+        session.flush()
+
+        assert _results(results) == {
+            tray_value: ("Added", None, None),
+            item_value: ("Added", None, None),
+            non_tray_item_value: ("Added", None, None),
+            unassigned_value: (
+                "Error",
+                f"Item with barcode value {unassigned_value} Not Found",
+                None,
+            ),
+            "missing": ("Error", "Barcode with value missing Not Found", None),
+        }
+        # a tray adds each of its items, an item carries its tray's barcode
+        assert sorted(
+            session.execute(
+                select(
+                    VerificationChange.tray_barcode_value,
+                    VerificationChange.item_barcode_value,
+                    VerificationChange.change_type,
+                ).where(VerificationChange.workflow_id == workflow.id)
+            ).all(),
+            key=lambda change: change.item_barcode_value,
+        ) == sorted(
+            [
+                (tray_value, tray_item_values[0], "Added"),
+                (tray_value, tray_item_values[1], "Added"),
+                (other_tray_value, item_value, "Added"),
+                (None, non_tray_item_value, "Added"),
+            ],
+            key=lambda change: change[1],
+        )
+    finally:
+        session.rollback()
@@ -0,0 +1,194 @@
+import threading
+
+import pytest
+
+from sqlmodel import Session
+
+from app.seed.copy_loader import run_copy_load
+
+"""
+run_copy_load stage tests. The loads here don't touch the database, so
+chunks are written through unbound sessions.
+"""
+
+CHUNK_SIZE = 3
+
+
+def _chunks(count, read=None):
+    """count chunks of CHUNK_SIZE rows, appending each first row to read"""
+    for index in range(count):
+        first_row_num = index * CHUNK_SIZE + 1
+        if read is not None:
+            read.append(first_row_num)
+        yield first_row_num, [[f"{first_row_num + row}"] for row in range(CHUNK_SIZE)]
+
+
+def _parse(rows, first_row_num):
+    return (first_row_num, [int(row[0]) for row in rows]), {
+        "rows": {"parsed": len(rows)}
+    }
+
+
+def _parse_failing_at_row_7(rows, first_row_num):
+    if first_row_num == 7:
+        raise ValueError("unparseable chunk")
+    return _parse(rows, first_row_num)
+
+
+def _writer_threads(title):
+    return [
+        thread for thread in threading.enumerate()
+        if thread.name.startswith(f"{title.lower()}-writer-")
+    ]
+
+
+@pytest.mark.parametrize("parse_workers", [0, 2])
+def test_chunks_are_loaded_in_order(parse_workers):
+    loaded = []
+
+    def load(session, parsed):
+        first_row_num, numbers = parsed
+        loaded.append(first_row_num)
+        return {"rows": {"loaded": len(numbers)}}
+
+    results = {}
+    row_count = run_copy_load(
+        _chunks(6),
+        _parse,
+        load,
+        results,
+        "ORDERED",
+        parse_workers=parse_workers,
+        write_workers=1,
+        queue_size=2,
+        session_factory=Session,
+    )
+
+    assert row_count == 18
+    assert loaded == [1, 4, 7, 10, 13, 16]
+    assert results == {"rows": {"parsed": 18, "loaded": 18}}
+
+
+def test_reading_pauses_while_the_writers_are_behind():
+    read = []
+    loading = threading.Event()
+    release = threading.Event()
+
+    def load(session, parsed):
+        loading.set()
+        release.wait(5)
+        return {}
+
+    load_thread = threading.Thread(
+        target=run_copy_load,
+        args=(_chunks(10, read), _parse, load, {}, "BACKPRESSURE"),
+        kwargs=dict(
+            parse_workers=0, write_workers=1, queue_size=1, session_factory=Session
+        ),
+    )
+    load_thread.start()
+    try:
+        assert loading.wait(5)
+        # one chunk loading, one queued and one waiting for room in the queue
+        release.wait(0.2)
+        assert read == [1, 4, 7]
+    finally:
+        release.set()
+        load_thread.join(5)
+
+    assert not load_thread.is_alive()
+    assert len(read) == 10
+
+
+def test_failed_load_stops_reading_and_drains_the_queue():
+    read = []
+    loaded = []
+
+    def load(session, parsed):
+        first_row_num, numbers = parsed
+        if first_row_num == 4:
+            raise ValueError("chunk rejected")
+        loaded.append(first_row_num)
+        return {}
+
+    with pytest.raises(ValueError, match="chunk rejected"):
+        run_copy_load(
+            _chunks(20, read),
+            _parse,
+            load,
+            {},
+            "FAILED-LOAD",
+            parse_workers=0,
+            write_workers=1,
+            queue_size=1,
+            session_factory=Session,
+        )
+
+    # queued chunks after the failure are drained without loading
+    assert loaded == [1]
+    assert len(read) < 20
+    assert _writer_threads("FAILED-LOAD") == []
+
+
+@pytest.mark.parametrize("parse_workers", [0, 2])
+def test_failed_parse_stops_the_load_and_its_writers(parse_workers):
+    read = []
+    loaded = []
+
+    def load(session, parsed):
+        first_row_num, numbers = parsed
+        loaded.append(first_row_num)
+        return {}
+
+    with pytest.raises(ValueError, match="unparseable chunk"):
+        run_copy_load(
+            _chunks(20, read),
+            _parse_failing_at_row_7,
+            load,
+            {},
+            "FAILED-PARSE",
+            parse_workers=parse_workers,
+            write_workers=2,
+            queue_size=1,
+            session_factory=Session,
+        )
+
+    assert 7 not in loaded
+    assert len(read) < 20
+    assert _writer_threads("FAILED-PARSE") == []
+
+
+def test_on_chunk_reports_failures_and_carries_on():
+    reported = {}
+
+    def load(session, parsed):
+        first_row_num, numbers = parsed
+        if first_row_num == 4:
+            raise ValueError("chunk rejected")
+        return {"rows": {"loaded": len(numbers)}}
+
+    def on_chunk(first_row_num, rows, chunk_results, error):
+        reported[first_row_num] = (rows, chunk_results, f"{error}" if error else None)
+
+    results = {}
+    run_copy_load(
+        _chunks(4),
+        _parse_failing_at_row_7,
+        load,
+        results,
+        "REPORTED",
+        parse_workers=0,
+        write_workers=2,
+        queue_size=1,
+        on_chunk=on_chunk,
+        session_factory=Session,
+    )
+
+    assert reported == {
+        1: (3, {"rows": {"loaded": 3}}, None),
+        4: (3, None, "chunk rejected"),
+        7: (3, None, "unparseable chunk"),
+        10: (3, {"rows": {"loaded": 3}}, None),
+    }
+    # parse results of chunks that never loaded are still counted
+    assert results == {"rows": {"parsed": 9, "loaded": 6}}
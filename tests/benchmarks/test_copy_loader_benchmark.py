@@ -0,0 +1,472 @@
+import logging
+
+from sqlalchemy import text
+
+from app.seed.load_containers import load_container_chunk, parse_container_chunk
+from app.seed.load_items import load_item_chunk, parse_item_chunk
+from app.seed.load_storage_locations import load_location_chunk, parse_location_chunk
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import seed_building, seed_trays, timed
+
+LOGGER = logging.getLogger("tests.benchmarks.test_copy_loader_benchmark")
+
+SMALL_BUILDING = {"modules": 1, "aisles": 1, "ladders": 1, "shelves": 1, "positions": 6}
+
+
+def _ensure_types(session):
+    """Barcode and container types the COPY loaders look up by name"""
+    for name in ("Item", "Tray", "Shelf"):
+        session.execute(
+            text(
+                "INSERT INTO barcode_types (name, allowed_pattern, create_dt, update_dt) "
+                "SELECT :name, '.*', now(), now() "
+                "WHERE NOT EXISTS (SELECT 1 FROM barcode_types WHERE name = :name)"
+            ),
+            {"name": name},
+        )
+    for container_type in ("Tray", "Non-Tray"):
+        session.execute(
+            text(
+                "INSERT INTO container_types (type, create_dt, update_dt) "
+                "SELECT :type, now(), now() "
+                "WHERE NOT EXISTS (SELECT 1 FROM container_types WHERE type = :type)"
+            ),
+            {"type": container_type},
+        )
+
+
+def _barcode(session, seed, value):
+    return session.execute(
+        text(
+            "INSERT INTO barcodes (value, type_id, withdrawn, create_dt, update_dt) "
+            "VALUES (:value, :type_id, false, now(), now()) RETURNING id"
+        ),
+        {"value": value, "type_id": seed["barcode_type_id"]},
+    ).scalar()
+
+
+def _shelf_barcode_value(seed, offset=0):
+    # legacy shelf barcodes are 5 or 6 digits
+    return f"{(int(seed['token'], 16) + offset) % 900000 + 100000}"
+
+
+def _barcoded_shelf(session, seed):
+    """Gives the seed's first shelf a legacy barcode, returns it and its positions"""
+    shelf_id = session.execute(
+        text("SELECT min(id) FROM shelves WHERE shelf_type_id = :shelf_type_id"),
+        {"shelf_type_id": seed["shelf_type_id"]},
+    ).scalar()
+    value = _shelf_barcode_value(seed)
+    session.execute(
+        text("UPDATE shelves SET barcode_id = :barcode_id WHERE id = :shelf_id"),
+        {"barcode_id": _barcode(session, seed, value), "shelf_id": shelf_id},
+    )
+    positions = dict(
+        session.execute(
+            text(
+                "SELECT spn.number, sp.id FROM shelf_positions sp "
+                "JOIN shelf_position_numbers spn ON spn.id = sp.shelf_position_number_id "
+                "WHERE sp.shelf_id = :shelf_id"
+            ),
+            {"shelf_id": shelf_id},
+        ).all()
+    )
+    return value, positions
+
+
+def _by_row(errors):
+    return sorted(errors, key=lambda error: error["row"])
+
+
+def _item_row(owner, barcode, container, position="0", status="In"):
+    row = [""] * 17
+    row[0] = owner
+    row[1] = barcode
+    row[2] = container
+    row[3] = "01/02/20"
+    row[8] = "01/02/20"
+    row[10] = position
+    row[16] = status
+    return row
+
+
+def _tray_row(barcode, shelf_barcode, position, owner, size_class):
+    row = [""] * 19
+    row[0] = barcode
+    row[2] = "A"
+    row[4] = shelf_barcode
+    row[7] = owner
+    row[8] = "01/02/2020"
+    row[9] = "01/03/2020"
+    row[10] = size_class
+    row[18] = position
+    return row
+
+
+def _location_row(
+    aisle, side, ladder, shelf, barcode, owner, legacy_type, shelf_type, container_type
+):
+    row = [""] * 26
+    row[1] = side
+    row[2] = ladder
+    row[4] = owner
+    row[6] = legacy_type
+    row[7] = shelf
+    row[9] = "10"
+    row[10] = barcode
+    row[11] = aisle
+    row[12] = "10"
+    row[13] = "10"
+    row[24] = shelf_type
+    row[25] = container_type
+    return row
+
+
+def test_item_chunk_loads_items_and_non_tray_items(session):
+    try:
+        _ensure_types(session)
+        seed = seed_building(session, **SMALL_BUILDING)
+        token = seed["token"]
+        owner = f"B{token}-0"
+        shelf_barcode, positions = _barcoded_shelf(session, seed)
+        tray_id = seed_trays(session, seed, 1)[0]
+        tray_barcode = session.execute(
+            text(
+                "SELECT b.value FROM trays t JOIN barcodes b ON b.id = t.barcode_id "
+                "WHERE t.id = :tray_id"
+            ),
+            {"tray_id": tray_id},
+        ).scalar()
+        _barcode(session, seed, f"X{token}")
+        non_tray_container = f"T0{shelf_barcode}"
+
+        rows = [
+            _item_row(owner, f"I{token}1", tray_barcode, status="Out"),
+            _item_row(owner, f"I{token}2", f"NOTRAY{token}"),
+            _item_row(owner, f"X{token}", tray_barcode),
+            _item_row(owner, f"I{token}1", tray_barcode),
+            _item_row(owner, f"I-{token}", tray_barcode),
+            _item_row(owner, f"N{token}1", non_tray_container, position="1"),
+            _item_row(owner, f"N{token}2", non_tray_container, position="9"),
+            _item_row(owner, f"N{token}3", non_tray_container, position="1"),
+            _item_row(owner, f"N{token}4", "T0000000", position="1"),
+            _item_row(owner, f"N{token}5", "T0999999", position="1"),
+        ]
+        missing_data = {
+            shelf_barcode: [{
+                "size_class_short_name": f"B{token}",
+                "media_type": "A",
+                "shelved_dt": "01/02/2020",
+            }]
+        }
+
+        with timed(f"copy load {len(rows)} item rows"):
+            parsed, parse_results = parse_item_chunk(rows, 1, missing_data)
+            results = load_item_chunk(session, parsed)
+
+        assert parse_results["skipped"] == {"rows": 1}
+        assert parse_results["items"]["errors"] == [{
+            "row": 5,
+            "item_barcode": f":: I-{token}",
+            "reason": "Non alphanumeric characters in barcode",
+        }]
+        assert parse_results["non_tray_items"]["errors"] == [{
+            "row": 10,
+            "non_tray_item_barcode": f":: N{token}5",
+            "reason": "Missing shelved_dt and/or media_type data for non_trays on shelf 999999",
+        }]
+
+        assert results["items"]["successful_rows"] == 1
+        assert results["items"]["failed_rows"] == 3
+        assert _by_row(results["items"]["errors"]) == [
+            {
+                "row": 2,
+                "item_barcode": f":: I{token}2",
+                "reason": f"Container not found for Tray barcode: NOTRAY{token}",
+            },
+            {
+                "row": 3,
+                "item_barcode": f":: X{token}",
+                "reason": "Barcode already exists",
+            },
+            {
+                "row": 4,
+                "item_barcode": f":: I{token}1",
+                "reason": "Duplicate barcode in legacy snapshot",
+            },
+        ]
+        assert results["non_tray_items"]["successful_rows"] == 1
+        assert results["non_tray_items"]["failed_rows"] == 2
+        assert _by_row(results["non_tray_items"]["errors"]) == [
+            {
+                "row": 7,
+                "non_tray_item_barcode": f":: N{token}2",
+                "reason": (
+                    "Legacy shelf_position number 9 is outside the bounds "
+                    "for this shelf's shelf_type"
+                ),
+            },
+            {
+                "row": 8,
+                "non_tray_item_barcode": f":: N{token}3",
+                "reason": f"Duplicate shelf position assignment sp_id: {positions[1]}",
+            },
+        ]
+
+        # legacy statuses are staged as text and cast to the status enums
+        item = session.execute(
+            text(
+                "SELECT i.status::text, i.tray_id, i.owner_id FROM items i "
+                "JOIN barcodes b ON b.id = i.barcode_id WHERE b.value = :value"
+            ),
+            {"value": f"I{token}1"},
+        ).one()
+        assert tuple(item) == ("Out", tray_id, seed["owner_ids"][0])
+        non_tray_item = session.execute(
+            text(
+                "SELECT n.status::text, n.shelf_position_id, n.size_class_id "
+                "FROM non_tray_items n "
+                "JOIN barcodes b ON b.id = n.barcode_id WHERE b.value = :value"
+            ),
+            {"value": f"N{token}1"},
+        ).one()
+        assert tuple(non_tray_item) == ("In", positions[1], seed["size_class_id"])
+    finally:
+        session.rollback()
+
+
+def test_container_chunk_loads_trays(session):
+    try:
+        _ensure_types(session)
+        seed = seed_building(session, **SMALL_BUILDING)
+        token = seed["token"]
+        owner = f"B{token}-0"
+        size_class = f"B{token}"
+        shelf_barcode, positions = _barcoded_shelf(session, seed)
+        session.execute(
+            text("UPDATE shelf_positions SET occupied = true WHERE id = :id"),
+            {"id": positions[2]},
+        )
+        _barcode(session, seed, f"X{token}")
+
+        rows = [
+            _tray_row(f"C{token}1", shelf_barcode, "1", owner, size_class),
+            _tray_row(f"C{token}2", shelf_barcode, "9", owner, size_class),
+            _tray_row(f"C{token}3", shelf_barcode, "2", owner, size_class),
+            _tray_row(f"C{token}4", shelf_barcode, "1", owner, size_class),
+            _tray_row(f"C{token}5", shelf_barcode, "3", owner, f"NOPE{token}"),
+            _tray_row(f"X{token}", shelf_barcode, "4", owner, size_class),
+            _tray_row(f"C{token}1", shelf_barcode, "5", owner, size_class),
+            _tray_row(f"T{token}", shelf_barcode, "6", owner, size_class),
+            _tray_row(f"C{token}9", shelf_barcode, "0", owner, size_class),
+        ]
+
+        with timed(f"copy load {len(rows)} tray rows"):
+            parsed, parse_results = parse_container_chunk(rows, 1)
+            results = load_container_chunk(session, parsed)
+
+        assert parse_results["skipped"] == {"rows": 1}
+        assert parse_results["trays"]["errors"] == [{
+            "row": 9,
+            "tray_barcode": f"C{token}9",
+            "reason": "Legacy shelf_position number is 0. Tray skipped.",
+        }]
+
+        assert results["trays"]["successful_rows"] == 1
+        assert results["trays"]["failed_rows"] == 6
+        assert _by_row(results["trays"]["errors"]) == [
+            {
+                "row": 2,
+                "tray_barcode": f"C{token}2",
+                "reason": (
+                    "Legacy shelf_position number 9 is outside the bounds "
+                    "for this shelf's shelf_type"
+                ),
+            },
+            {
+                "row": 3,
+                "tray_barcode": f"C{token}3",
+                "reason": f"Shelf position already occupied sp_id: {positions[2]}",
+            },
+            {
+                "row": 4,
+                "tray_barcode": f"C{token}4",
+                "reason": f"Duplicate shelf position assignment sp_id: {positions[1]}",
+            },
+            {
+                "row": 5,
+                "tray_barcode": f"C{token}5",
+                "reason": f"Size class not found: NOPE{token}",
+            },
+            {
+                "row": 6,
+                "tray_barcode": f"X{token}",
+                "reason": "Barcode already exists",
+            },
+            {
+                "row": 7,
+                "tray_barcode": f"C{token}1",
+                "reason": "Duplicate barcode in legacy snapshot",
+            },
+        ]
+
+        tray = session.execute(
+            text(
+                "SELECT t.shelf_position_id, t.owner_id, t.size_class_id FROM trays t "
+                "JOIN barcodes b ON b.id = t.barcode_id WHERE b.value = :value"
+            ),
+            {"value": f"C{token}1"},
+        ).one()
+        assert tuple(tray) == (positions[1], seed["owner_ids"][0], seed["size_class_id"])
+    finally:
+        session.rollback()
+
+
+def test_location_chunk_loads_sides_ladders_shelves_and_positions(session):
+    try:
+        _ensure_types(session)
+        # number lookups and types only, the chunk builds the tree
+        seed = seed_building(
+            session, modules=1, aisles=0, ladders=2, shelves=3, positions=4
+        )
+        token = seed["token"]
+        owner = f"B{token}-0"
+        legacy_type = f"B{token}"
+        shelf_type = f"B{token}"
+        container_type = f"B{token}"
+        aisle_number = 1000 + int(token, 16) % 8000
+        session.execute(
+            text(
+                "INSERT INTO aisle_numbers (number, create_dt, update_dt) "
+                "VALUES (:number, now(), now()) ON CONFLICT (number) DO NOTHING"
+            ),
+            {"number": aisle_number},
+        )
+        aisle_id = session.execute(
+            text(
+                "INSERT INTO aisles (module_id, aisle_number_id, sort_priority, "
+                "create_dt, update_dt) "
+                "SELECT m.id, an.id, 1, now(), now() FROM modules m, aisle_numbers an "
+                "WHERE m.building_id = :building_id AND an.number = :number "
+                "RETURNING id"
+            ),
+            {"building_id": seed["building_id"], "number": aisle_number},
+        ).scalar()
+        first_barcode = _shelf_barcode_value(seed)
+        second_barcode = _shelf_barcode_value(seed, 1)
+        aisle = str(aisle_number)
+        missing_aisle = str(aisle_number + 9000)
+        shelf = dict(
+            owner=owner,
+            legacy_type=legacy_type,
+            shelf_type=shelf_type,
+            container_type=container_type,
+        )
+
+        rows = [
+            _location_row(aisle, "L", "1", "1", first_barcode, **shelf),
+            _location_row(aisle, "R", "1", "1", second_barcode, **shelf),
+            _location_row(missing_aisle, "L", "1", "1", first_barcode, **shelf),
+            _location_row(aisle, "L", "96", "1", first_barcode, **shelf),
+            _location_row(aisle, "L", "80", "1", first_barcode, **shelf),
+            _location_row(
+                aisle, "L", "2", "1", _shelf_barcode_value(seed, 2),
+                **{**shelf, "owner": f"NOBODY{token}"}
+            ),
+            _location_row(aisle, "L", "2", "2", first_barcode, **shelf),
+            _location_row("99", "L", "1", "1", first_barcode, **shelf),
+            _location_row(
+                aisle, "L", "2", "3", _shelf_barcode_value(seed, 3),
+                **{**shelf, "shelf_type": f"NOPE{token}"}
+            ),
+        ]
+
+        with timed(f"copy load {len(rows)} location rows"):
+            parsed, parse_results = parse_location_chunk(rows, 1)
+            results = load_location_chunk(session, parsed)
+
+        assert parse_results["skipped"] == {"rows": 1}
+
+        assert results["sides"]["new_record_count"] == 2
+        assert results["sides"]["failed_rows"] == 1
+        assert results["sides"]["errors"] == [{
+            "row": 3,
+            "aisle_number": int(missing_aisle),
+            "side_orientation": "Left",
+            "reason": "aisle_number or side_orientation doesn't exist",
+        }]
+        left_side_id = session.execute(
+            text(
+                "SELECT s.id FROM sides s "
+                "JOIN side_orientations so ON so.id = s.side_orientation_id "
+                "WHERE s.aisle_id = :aisle_id AND so.name = 'Left'"
+            ),
+            {"aisle_id": aisle_id},
+        ).scalar()
+
+        # ladder 96 only contributes its side
+        assert results["ladders"]["new_record_count"] == 3
+        assert results["ladders"]["successful_rows"] == 5
+        assert results["ladders"]["errors"] == [{
+            "row": 5,
+            "ladder_number": 80,
+            "side_id": left_side_id,
+            "reason": "ladder_number invalid",
+        }]
+
+        assert results["shelves"]["new_record_count"] == 2
+        assert results["shelves"]["successful_rows"] == 2
+        assert results["shelves"]["failed_rows"] == 3
+        assert _by_row(results["shelves"]["errors"]) == [
+            {
+                "row": 6,
+                "shelf_number": 1,
+                "barcode": _shelf_barcode_value(seed, 2),
+                "owner": f"NOBODY{token}",
+                "type": legacy_type,
+                "reason": "Unregistered owner",
+            },
+            {
+                "row": 7,
+                "shelf_number": 2,
+                "barcode": first_barcode,
+                "owner": owner,
+                "type": legacy_type,
+                "reason": "Duplicate shelf in legacy snapshot",
+            },
+            {
+                "row": 9,
+                "shelf_number": 3,
+                "barcode": _shelf_barcode_value(seed, 3),
+                "owner": owner,
+                "type": legacy_type,
+                "reason": f"shelf_type is unregistered for type: NOPE{token}",
+            },
+        ]
+
+        assert results["shelf_positions"]["new_record_count"] == 8
+        assert results["shelf_positions"]["failed_record_count"] == 0
+        assert results["shelf_positions"]["errors_list"] == []
+
+        shelves = session.execute(
+            text(
+                """
+                SELECT b.value, count(sp.id), sh.owner_id
+                FROM shelves sh
+                JOIN barcodes b ON b.id = sh.barcode_id
+                JOIN ladders l ON l.id = sh.ladder_id
+                JOIN sides s ON s.id = l.side_id
+                LEFT JOIN shelf_positions sp ON sp.shelf_id = sh.id
+                WHERE s.aisle_id = :aisle_id
+                GROUP BY b.value, sh.owner_id
+                ORDER BY b.value
+                """
+            ),
+            {"aisle_id": aisle_id},
+        ).all()
+        assert [tuple(shelf) for shelf in shelves] == sorted([
+            (first_barcode, 4, seed["owner_ids"][0]),
+            (second_barcode, 4, seed["owner_ids"][0]),
+        ])
+    finally:
+        session.rollback()
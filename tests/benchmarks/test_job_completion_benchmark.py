@@ -0,0 +1,81 @@
+import logging
+
+from sqlalchemy import text
+
+from app.models.verification_jobs import VerificationJob
+from app.tasks import bulk_update_job_containers
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_accession_job,
+    seed_building,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_job_completion_benchmark")
+
+
+def test_complete_10k_item_accession_job(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1, owners=2)
+        accession_job = seed_accession_job(session, seed)
+        verification_job = VerificationJob(
+            accession_job_id=accession_job.id, trayed=True, status="Created"
+        )
+        session.add(verification_job)
+        session.flush()
+
+        with count_queries(session) as queries, timed(
+            "complete accession job with 500 trays, 10000 items, 200 non tray items"
+        ):
+            updated = bulk_update_job_containers(
+                session,
+                "accession_job_id",
+                accession_job.id,
+                {
+                    "verification_job_id": verification_job.id,
+                    "owner_id": accession_job.owner_id,
+                    "scanned_for_accession": True,
+                },
+            )
+
+        assert updated == {"trays": 500, "non_tray_items": 200, "items": 10000}
+        # one update per container table
+        assert queries["count"] == 3
+
+        unverified = session.execute(
+            text(
+                """
+                SELECT count(*) FROM items
+                WHERE accession_job_id = :id
+                AND (verification_job_id IS DISTINCT FROM :verification_job_id
+                    OR owner_id IS DISTINCT FROM :owner_id
+                    OR NOT scanned_for_accession)
+                """
+            ),
+            {
+                "id": accession_job.id,
+                "verification_job_id": verification_job.id,
+                "owner_id": accession_job.owner_id,
+            },
+        ).scalar()
+        assert unverified == 0
+    finally:
+        session.rollback()
+
+
+def test_completion_skips_rows_already_up_to_date(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1, owners=2)
+        accession_job = seed_accession_job(session, seed, trays=10, items=100, non_tray_items=5)
+        values = {"owner_id": accession_job.owner_id, "scanned_for_accession": True}
+
+        bulk_update_job_containers(session, "accession_job_id", accession_job.id, values)
+        updated = bulk_update_job_containers(
+            session, "accession_job_id", accession_job.id, values
+        )
+
+        # nothing for the audit trigger to log the second time
+        assert updated == {"trays": 0, "non_tray_items": 0, "items": 0}
+    finally:
+        session.rollback()
@@ -0,0 +1,99 @@
+import logging
+
+from sqlmodel import select
+
+from app.location_hierarchy import (
+    PENDING_LOCATION_CHANGES,
+    LocationHierarchyCache,
+    _apply_location_changes,
+    location_hierarchy_cache,
+)
+from app.models.ladders import Ladder
+from app.models.shelves import Shelf
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import count_queries, seed_building, timed
+
+LOGGER = logging.getLogger("tests.benchmarks.test_location_hierarchy_benchmark")
+
+
+def test_location_hierarchy_cache_serves_warm_lookups_without_queries(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=4)
+        shelf_ids = session.exec(
+            select(Shelf.id)
+            .join(Ladder, Ladder.id == Shelf.ladder_id)
+            .order_by(Shelf.id)
+            .limit(500)
+        ).all()
+        cache = LocationHierarchyCache()
+
+        with count_queries(session) as cold, timed(f"load {len(shelf_ids)} shelves"):
+            hierarchies = cache.get_many(session, shelf_ids)
+        with count_queries(session) as warm:
+            cache.get_many(session, shelf_ids)
+
+        assert len(hierarchies) == len(shelf_ids)
+        assert cold["count"] == 1
+        assert warm["count"] == 0
+
+        shelf = session.get(Shelf, shelf_ids[0])
+        assert hierarchies[shelf.id].building_id == seed["building_id"]
+        assert hierarchies[shelf.id].sort_key == (
+            shelf.ladder.side.aisle.sort_priority,
+            shelf.ladder.sort_priority,
+            shelf.sort_priority,
+        )
+    finally:
+        session.rollback()
+
+
+def test_location_hierarchy_cache_drops_updated_locations(session):
+    try:
+        seed_building(session, modules=1, aisles=1)
+        shelf = session.exec(select(Shelf)).first()
+        original = location_hierarchy_cache.get(session, shelf.id)
+
+        # space updates don't touch the hierarchy
+        shelf.available_space = 0
+        session.add(shelf)
+        session.flush()
+        with count_queries(session) as queries:
+            location_hierarchy_cache.get(session, shelf.id)
+        assert queries["count"] == 0
+
+        shelf.ladder.sort_priority = 99
+        session.add(shelf.ladder)
+        session.flush()
+        # the changing session reads its own update, but doesn't cache it
+        hierarchy = location_hierarchy_cache.get(session, shelf.id)
+        assert hierarchy.ladder_sort_priority == 99
+        assert location_hierarchy_cache._entries[shelf.id][1] == original
+    finally:
+        session.rollback()
+
+    # rolled back changes were never cached, and the pending changes are gone
+    assert location_hierarchy_cache.get(session, shelf.id) == original
+    assert not session.info.get(PENDING_LOCATION_CHANGES)
+    location_hierarchy_cache.clear()
+
+
+def test_location_hierarchy_cache_applies_changes_on_commit(session):
+    cache = location_hierarchy_cache
+    try:
+        seed_building(session, modules=1, aisles=1)
+        shelf = session.exec(select(Shelf)).first()
+        cache.get(session, shelf.id)
+
+        shelf.sort_priority = 99
+        session.add(shelf)
+        session.flush()
+        assert session.info[PENDING_LOCATION_CHANGES] == {shelf.id}
+        assert shelf.id in cache._entries
+
+        # what after_commit runs once the transaction is durable
+        _apply_location_changes(session)
+        assert shelf.id not in cache._entries
+        assert cache.get(session, shelf.id).shelf_sort_priority == 99
+    finally:
+        session.rollback()
+        cache.clear()
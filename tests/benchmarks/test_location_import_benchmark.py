@@ -0,0 +1,124 @@
+import logging
+
+import pandas as pd
+
+from sqlalchemy import text
+
+from app.location_import import import_location_management
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_building,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_location_import_benchmark")
+
+
+def _location_sheet(seed, ladders, shelves):
+    return pd.DataFrame(
+        [
+            {
+                "ladder_number": ladder,
+                "ladder_sort_priority": ladder,
+                "shelf_number": shelf,
+                "shelf_sort_priority": shelf,
+                "owner": f"B{seed['token']}-0",
+                "size_class": f"B{seed['token']}",
+                "container_type": f"B{seed['token']}",
+                "shelf_type": f"B{seed['token']}",
+                "width": 10.0,
+                "height": 10.0,
+                "depth": 10.0,
+                "shelf_barcode": None,
+            }
+            for ladder in range(1, ladders + 1)
+            for shelf in range(1, shelves + 1)
+        ]
+    )
+
+
+def _empty_side(session, seed):
+    # seeded without ladders, so the side has no shelves yet
+    return session.execute(
+        text(
+            "SELECT s.id FROM sides s JOIN aisles a ON a.id = s.aisle_id "
+            "JOIN modules m ON m.id = a.module_id "
+            "WHERE m.building_id = :building_id ORDER BY s.id LIMIT 1"
+        ),
+        {"building_id": seed["building_id"]},
+    ).scalar()
+
+
+def test_import_5000_shelf_location_sheet(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1, ladders=0)
+        side_id = _empty_side(session, seed)
+        sheet = _location_sheet(seed, ladders=250, shelves=20)
+
+        with count_queries(session) as queries, timed(
+            f"import {len(sheet)} shelf location sheet"
+        ):
+            errors = import_location_management(session, sheet, side_id)
+
+        assert errors == []
+        # lookups, upserts and chunked inserts, not per row queries
+        assert queries["count"] < 40
+
+        shelf_count, min_space, max_space = session.execute(
+            text(
+                """
+                SELECT count(*), min(sh.available_space), max(sh.available_space)
+                FROM shelves sh JOIN ladders l ON l.id = sh.ladder_id
+                WHERE l.side_id = :side_id
+                """
+            ),
+            {"side_id": side_id},
+        ).one()
+        assert shelf_count == 5000
+        # filled in by the shelf_positions insert trigger
+        assert min_space == max_space == seed["size"]["positions"]
+
+        position_count, misaddressed = session.execute(
+            text(
+                """
+                SELECT count(*), count(*) FILTER (
+                    WHERE sp.location <> sh.location || '-' || spn.number
+                    OR sp.internal_location <> sh.internal_location || '-' || sp.id
+                )
+                FROM shelf_positions sp
+                JOIN shelf_position_numbers spn ON spn.id = sp.shelf_position_number_id
+                JOIN shelves sh ON sh.id = sp.shelf_id
+                JOIN ladders l ON l.id = sh.ladder_id
+                WHERE l.side_id = :side_id
+                """
+            ),
+            {"side_id": side_id},
+        ).one()
+        assert position_count == 5000 * seed["size"]["positions"]
+        assert misaddressed == 0
+    finally:
+        session.rollback()
+
+
+def test_invalid_rows_write_nothing(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1, ladders=0)
+        side_id = _empty_side(session, seed)
+        sheet = _location_sheet(seed, ladders=2, shelves=2)
+        sheet.loc[3, "owner"] = f"B{seed['token']}-missing"
+        sheet.loc[4] = sheet.loc[0]
+
+        errors = import_location_management(session, sheet, side_id)
+
+        assert errors == [
+            {"line": 4, "error": f"Owner B{seed['token']}-missing not found"},
+            {"line": 5, "error": "Shelf number 1 at ladder number 1 already exists"},
+        ]
+        ladders = session.execute(
+            text("SELECT count(*) FROM ladders WHERE side_id = :side_id"),
+            {"side_id": side_id},
+        ).scalar()
+        assert ladders == 0
+    finally:
+        session.rollback()
@@ -0,0 +1,76 @@
+import logging
+
+from sqlmodel import select
+
+from app.location_hierarchy import location_hierarchy_cache
+from app.models.shelf_positions import ShelfPosition
+from app.models.shelves import Shelf
+from app.utilities import get_location_sort_keys, get_shelf_position_building_id
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_building,
+    seed_items,
+    seed_non_tray_items,
+    seed_trays,
+    shelve_containers,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_location_sort_keys_benchmark")
+
+
+def test_location_sort_keys_resolve_refile_sized_job_in_one_query(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=4)
+        tray_ids = seed_trays(session, seed, 100)
+        shelve_containers(session, "trays", tray_ids[:90], seed)
+        item_ids = seed_items(session, seed, 400, tray_ids)
+        non_tray_item_ids = seed_non_tray_items(session, seed, 200)
+        shelve_containers(session, "non_tray_items", non_tray_item_ids[:150], seed)
+
+        with count_queries(session) as cold, timed(
+            f"resolve {len(item_ids) + len(non_tray_item_ids)} sort keys"
+        ):
+            item_keys, non_tray_item_keys = get_location_sort_keys(
+                session, item_ids=item_ids, non_tray_item_ids=non_tray_item_ids
+            )
+        with count_queries(session) as warm, timed(
+            f"resolve {len(item_ids) + len(non_tray_item_ids)} cached sort keys"
+        ):
+            assert get_location_sort_keys(
+                session, item_ids=item_ids, non_tray_item_ids=non_tray_item_ids
+            ) == (item_keys, non_tray_item_keys)
+
+        # the shelves, then their hierarchies, which are cached after that
+        assert cold["count"] == 2
+        assert warm["count"] == 1
+        # items in the 10 unshelved trays and 50 unshelved non trays are left out
+        assert len(item_keys) == 360
+        assert len(non_tray_item_keys) == 150
+        assert all(None not in key for key in item_keys.values())
+    finally:
+        session.rollback()
+        location_hierarchy_cache.clear()
+
+
+def test_shelf_position_building_id_is_served_from_cache(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        shelf_position = session.exec(
+            select(ShelfPosition)
+            .join(Shelf, Shelf.id == ShelfPosition.shelf_id)
+            .where(Shelf.shelf_type_id == seed["shelf_type_id"])
+        ).first()
+
+        building_id = get_shelf_position_building_id(session, shelf_position)
+        with count_queries(session) as queries:
+            assert get_shelf_position_building_id(session, shelf_position) == (
+                building_id
+            )
+
+        assert building_id == seed["building_id"]
+        assert queries["count"] == 0
+    finally:
+        session.rollback()
+        location_hierarchy_cache.clear()
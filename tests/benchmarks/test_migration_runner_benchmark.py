@@ -0,0 +1,237 @@
+import csv
+import hashlib
+import os
+import uuid
+
+import pytest
+
+from functools import partial
+from sqlalchemy import text
+from sqlmodel import Session
+
+from app.seed import migration_runner
+from app.seed.migration_runner import (
+    MigrationLoader,
+    index_chunks,
+    migration_status,
+    read_chunk,
+    run_migration,
+)
+from tests.fixtures.configtest import engine
+
+"""
+migration_runner tests on a throwaway loader. Its chunks write barcode
+types named after their rows, so what each run committed can be read
+back. Runs commit, the fixture deletes the loader's rows afterwards.
+"""
+
+CHUNK_SIZE = 3
+
+# the test loader's state, shared with the writer threads
+_run = {"prefix": None, "loaded": [], "failing": set()}
+
+
+def _parse_rows(rows, first_row_num):
+    values = []
+    errors = []
+    for row_num, row in enumerate(rows, start=first_row_num):
+        if row[0] == "bad":
+            errors.append({"row": row_num, "value": row[0], "reason": "bad value"})
+        else:
+            values.append(row_num)
+    return (first_row_num, values), {
+        "rows": {"failed_rows": len(errors), "errors": errors},
+        "skipped": {"rows": 0},
+    }
+
+
+def _load_rows(session, parsed):
+    first_row_num, row_nums = parsed
+    session.execute(
+        text(
+            "INSERT INTO barcode_types (name, allowed_pattern, create_dt, update_dt) "
+            "SELECT unnest(CAST(:names AS varchar[])), '.*', now(), now() "
+            "ON CONFLICT (name) DO NOTHING"
+        ),
+        {"names": [f"{_run['prefix']}{row_num}" for row_num in row_nums]},
+    )
+    if first_row_num in _run["failing"]:
+        raise ValueError(f"chunk at row {first_row_num} rejected")
+    _run["loaded"].append(first_row_num)
+    return {"rows": {"successful_rows": len(row_nums)}}
+
+
+def _write_snapshot(path, values):
+    with open(path, mode="w", newline="") as file:
+        file.writelines(f"{value}\n" for value in values)
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    """Registers a test loader over a 7 row snapshot, 3 chunks of CHUNK_SIZE"""
+    token = uuid.uuid4().hex[:8]
+    name = f"test-{token}"
+    _run["prefix"] = f"M{token}-"
+    _run["loaded"] = []
+    _run["failing"] = set()
+
+    _write_snapshot(tmp_path / "snapshot.txt", ["v1", "bad", "v3", "v4", "v5", "v6", "bad"])
+    error_file = f"{name}_errors.csv"
+    monkeypatch.setitem(
+        migration_runner.LOADERS,
+        name,
+        MigrationLoader(
+            file_name="snapshot.txt",
+            parse_chunk=_parse_rows,
+            load_chunk=_load_rows,
+            error_reports={"rows": error_file},
+        ),
+    )
+    error_path = os.path.join(migration_runner.current_dir, "errors", error_file)
+
+    run = partial(
+        run_migration,
+        name,
+        parse_workers=0,
+        write_workers=2,
+        chunk_size=CHUNK_SIZE,
+        snapshot_dir=str(tmp_path),
+        session_factory=partial(Session, engine),
+    )
+    try:
+        yield {
+            "name": name,
+            "run": run,
+            "snapshot": tmp_path / "snapshot.txt",
+            "error_path": error_path,
+        }
+    finally:
+        with Session(engine) as session:
+            session.execute(
+                text("DELETE FROM migration_checkpoints WHERE loader = :name"),
+                {"name": name},
+            )
+            session.execute(
+                text("DELETE FROM barcode_types WHERE name LIKE :prefix"),
+                {"prefix": f"{_run['prefix']}%"},
+            )
+            session.commit()
+        if os.path.exists(error_path):
+            os.remove(error_path)
+
+
+def _checkpoints(name):
+    with Session(engine) as session:
+        return session.execute(
+            text(
+                "SELECT chunk_index, first_row, row_count, successful_rows, failed_rows "
+                "FROM migration_checkpoints WHERE loader = :name ORDER BY chunk_index"
+            ),
+            {"name": name},
+        ).all()
+
+
+def _loaded_rows():
+    with Session(engine) as session:
+        names = session.execute(
+            text("SELECT name FROM barcode_types WHERE name LIKE :prefix"),
+            {"prefix": f"{_run['prefix']}%"},
+        ).scalars()
+        return sorted(int(name[len(_run["prefix"]):]) for name in names)
+
+
+def _error_rows(error_path):
+    with open(error_path, newline="") as error_file:
+        return [int(error["row"]) for error in csv.DictReader(error_file)]
+
+
+def test_index_chunks_splits_whole_lines_with_a_partial_last_chunk(runner):
+    path = runner["snapshot"]
+    content = path.read_bytes()
+
+    spans = index_chunks(path, CHUNK_SIZE)
+
+    assert [(s.index, s.first_row, s.row_count) for s in spans] == [
+        (1, 1, 3), (2, 4, 3), (3, 7, 1)
+    ]
+    assert spans[0].byte_offset == 0
+    for span, next_span in zip(spans, spans[1:]):
+        assert next_span.byte_offset == span.byte_offset + span.byte_length
+    assert spans[-1].byte_offset + spans[-1].byte_length == len(content)
+    for span in spans:
+        chunk = content[span.byte_offset:span.byte_offset + span.byte_length]
+        assert span.checksum == hashlib.sha256(chunk).hexdigest()
+    assert [read_chunk(path, span) for span in spans] == [
+        [["v1"], ["bad"], ["v3"]], [["v4"], ["v5"], ["v6"]], [["bad"]]
+    ]
+
+
+def test_rerun_skips_checkpointed_chunks(runner):
+    assert runner["run"]() == []
+    assert sorted(_run["loaded"]) == [1, 4, 7]
+    assert [tuple(c) for c in _checkpoints(runner["name"])] == [
+        (1, 1, 3, 2, 1), (2, 4, 3, 3, 0), (3, 7, 1, 0, 1)
+    ]
+
+    assert runner["run"]() == []
+    assert sorted(_run["loaded"]) == [1, 4, 7]
+    assert migration_status(
+        runner["name"],
+        CHUNK_SIZE,
+        snapshot_dir=str(runner["snapshot"].parent),
+        session_factory=partial(Session, engine),
+    ) == []
+
+
+def test_checkpoints_must_match_chunk_size_and_snapshot(runner):
+    runner["run"]()
+
+    with pytest.raises(ValueError, match="checkpointed with chunk size 3"):
+        runner["run"](chunk_size=2)
+
+    _write_snapshot(runner["snapshot"], ["v1", "v2", "v3", "v4", "v5", "v6", "bad"])
+    with pytest.raises(ValueError, match="chunk 1 changed since it was loaded"):
+        runner["run"]()
+
+
+def test_chunk_range_and_restart(runner):
+    assert runner["run"](from_chunk=2, to_chunk=2) == []
+    assert [c.chunk_index for c in _checkpoints(runner["name"])] == [2]
+
+    assert runner["run"](to_chunk=1) == []
+    assert [c.chunk_index for c in _checkpoints(runner["name"])] == [1, 2]
+
+    assert runner["run"](from_chunk=3) == []
+    assert sorted(_run["loaded"]) == [1, 4, 7]
+
+    # restarting forgets the checkpoints, so a new chunk size is allowed
+    assert runner["run"](restart=True, chunk_size=4) == []
+    assert sorted(_run["loaded"]) == [1, 1, 4, 5, 7]
+    assert [
+        (c.chunk_index, c.first_row, c.row_count) for c in _checkpoints(runner["name"])
+    ] == [(1, 1, 4), (2, 5, 3)]
+
+
+def test_failed_chunk_is_rolled_back_and_left_for_the_next_run(runner):
+    _run["failing"] = {4}
+
+    assert runner["run"]() == [2]
+    assert [c.chunk_index for c in _checkpoints(runner["name"])] == [1, 3]
+    # the failed chunk's rows were rolled back with it
+    assert _loaded_rows() == [1, 3]
+
+    _run["failing"] = set()
+    _run["loaded"] = []
+    assert runner["run"]() == []
+    assert _run["loaded"] == [4]
+    assert [c.chunk_index for c in _checkpoints(runner["name"])] == [1, 2, 3]
+    assert _loaded_rows() == [1, 3, 4, 5, 6]
+
+
+def test_error_reports_are_rebuilt_from_every_checkpoint(runner):
+    runner["run"](to_chunk=1)
+    assert _error_rows(runner["error_path"]) == [2]
+
+    # the second run only parses chunks 2 and 3
+    runner["run"]()
+    assert _error_rows(runner["error_path"]) == [2, 7]
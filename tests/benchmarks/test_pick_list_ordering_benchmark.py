@@ -0,0 +1,92 @@
+import logging
+
+from sqlmodel import select
+
+from app.models.pick_lists import PickList
+from app.models.requests import Request
+from app.routers.pick_lists import sort_order_priority
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_building,
+    seed_items,
+    seed_non_tray_items,
+    seed_requests,
+    seed_trays,
+    shelve_containers,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_pick_list_ordering_benchmark")
+
+
+def _seed_pick_list(session, seed, size):
+    pick_list = PickList(building_id=seed["building_id"])
+    session.add(pick_list)
+    session.flush()
+
+    tray_ids = seed_trays(session, seed, size // 2)
+    shelve_containers(session, "trays", tray_ids, seed)
+    item_ids = seed_items(session, seed, size // 2, tray_ids)
+    non_tray_item_ids = seed_non_tray_items(session, seed, size - size // 2)
+    shelve_containers(session, "non_tray_items", non_tray_item_ids, seed)
+
+    # reversed so ordering has work to do
+    request_ids = seed_requests(
+        session,
+        seed,
+        item_ids=item_ids[::-1],
+        non_tray_item_ids=non_tray_item_ids[::-1],
+        pick_list_id=pick_list.id,
+    )
+    requests = session.exec(
+        select(Request).where(Request.id.in_(request_ids)).order_by(Request.id)
+    ).all()
+    return pick_list, requests
+
+
+def _ordered_query_count(session, pick_list, requests):
+    with count_queries(session) as queries, timed(
+        f"order pick list of {len(requests)} requests"
+    ):
+        sort_order_priority(session, pick_list, requests)
+    return queries["count"]
+
+
+def test_pick_list_ordering_query_count_is_constant(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=4)
+
+        small = _ordered_query_count(session, *_seed_pick_list(session, seed, 10))
+        large = _ordered_query_count(session, *_seed_pick_list(session, seed, 500))
+
+        assert large == small
+    finally:
+        session.rollback()
+
+
+def test_pick_list_ordering_follows_walk_order(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=4)
+        pick_list, requests = _seed_pick_list(session, seed, 40)
+
+        sort_order_priority(session, pick_list, requests)
+
+        shelves = [
+            request.item.tray.shelf_position.shelf
+            if request.item_id
+            else request.non_tray_item.shelf_position.shelf
+            for request in pick_list.requests
+        ]
+        walk_order = [
+            (
+                shelf.ladder.side.aisle.sort_priority,
+                shelf.ladder.sort_priority,
+                shelf.sort_priority,
+            )
+            for shelf in shelves
+        ]
+        assert len(pick_list.requests) == len(requests)
+        assert walk_order == sorted(walk_order)
+    finally:
+        session.rollback()
@@ -0,0 +1,65 @@
+import logging
+
+import pandas as pd
+
+from sqlalchemy import text
+
+from app.utilities import validate_request_data
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_building,
+    seed_items,
+    seed_trays,
+    shelve_containers,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_request_batch_validation_benchmark")
+
+
+def test_validate_50k_line_request_upload(session):
+    try:
+        seed = seed_building(session)
+        tray_ids = seed_trays(session, seed, 5000)
+        shelve_containers(session, "trays", tray_ids, seed)
+        item_ids = seed_items(session, seed, 50000, tray_ids)
+
+        barcode_values = session.execute(
+            text(
+                "SELECT b.value FROM items i JOIN barcodes b ON b.id = i.barcode_id "
+                "WHERE i.id = ANY(:item_ids) ORDER BY i.id"
+            ),
+            {"item_ids": item_ids},
+        ).scalars().all()
+        barcode_values[-2] = f"{seed['token']}-missing"
+        barcode_values[-1] = barcode_values[0]
+
+        request_data = pd.DataFrame(
+            {
+                "Item Barcode": barcode_values,
+                "External Request ID": [f"R{index}" for index in range(len(barcode_values))],
+                "Priority": "",
+                "Request Type": "",
+                "Delivery Location": "",
+                "Requestor Name": "",
+            }
+        )
+
+        with count_queries(session) as queries, timed(
+            f"validate {len(request_data)} line request upload"
+        ):
+            good_df, errored_df, errors = validate_request_data(session, request_data)
+
+        assert sorted(
+            (error["line"], error["error"]) for error in errors["errors"]
+        ) == [
+            (50000, f"Item with Barcode {seed['token']}-missing not found"),
+            (50001, "Duplicate Item Barcode found"),
+        ]
+        assert len(good_df) == 49998
+        assert len(errored_df) == 2
+        # item, request and shelving checks share one query
+        assert queries["count"] == 1
+    finally:
+        session.rollback()
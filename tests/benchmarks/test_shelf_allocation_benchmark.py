@@ -0,0 +1,132 @@
+import logging
+
+from sqlalchemy import text
+
+from app.allocation import allocate_shelf_positions
+from app.models.shelving_jobs import ShelvingJob
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_building,
+    seed_non_tray_items,
+    seed_trays,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_shelf_allocation_benchmark")
+
+
+def test_allocate_building_sized_shelving_job(session):
+    try:
+        seed = seed_building(session)
+        shelving_job = ShelvingJob(building_id=seed["building_id"])
+        session.add(shelving_job)
+        session.flush()
+
+        tray_ids = []
+        for owner_id in seed["owner_ids"]:
+            tray_ids += seed_trays(session, seed, 1500, owner_id=owner_id)
+        non_tray_item_ids = seed_non_tray_items(session, seed, 500)
+
+        with count_queries(session) as queries, timed(
+            f"allocate {len(tray_ids) + len(non_tray_item_ids)} containers over "
+            f"{seed['shelf_position_count']} positions"
+        ):
+            assigned = allocate_shelf_positions(
+                session,
+                shelving_job.id,
+                seed["building_id"],
+                tray_ids=tray_ids,
+                non_tray_item_ids=non_tray_item_ids,
+            )
+
+        assert assigned == len(tray_ids) + len(non_tray_item_ids)
+        # advisory lock, allocation select, one update per container table
+        assert queries["count"] <= 4
+
+        proposed = session.execute(
+            text(
+                """
+                SELECT shelf_position_proposed_id FROM trays WHERE shelving_job_id = :id
+                UNION ALL
+                SELECT shelf_position_proposed_id FROM non_tray_items
+                WHERE shelving_job_id = :id
+                """
+            ),
+            {"id": shelving_job.id},
+        ).scalars().all()
+        assert len(proposed) == assigned
+        assert len(set(proposed)) == assigned
+    finally:
+        session.rollback()
+
+
+def test_allocate_query_count_independent_of_group_count(session):
+    try:
+        seed = seed_building(session, owners=4)
+        shelving_job = ShelvingJob(building_id=seed["building_id"])
+        session.add(shelving_job)
+        session.flush()
+
+        tray_ids = []
+        for owner_id in seed["owner_ids"]:
+            tray_ids += seed_trays(session, seed, 50, owner_id=owner_id)
+
+        with count_queries(session) as queries:
+            allocate_shelf_positions(
+                session, shelving_job.id, seed["building_id"], tray_ids=tray_ids
+            )
+
+        assert queries["count"] <= 3
+    finally:
+        session.rollback()
+
+
+def test_allocation_maintains_occupancy_flags(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        shelving_job = ShelvingJob(building_id=seed["building_id"])
+        session.add(shelving_job)
+        session.flush()
+
+        tray_ids = seed_trays(session, seed, 20, owner_id=seed["owner_ids"][0])
+        allocate_shelf_positions(
+            session, shelving_job.id, seed["building_id"], tray_ids=tray_ids
+        )
+
+        reserved = session.execute(
+            text(
+                """
+                SELECT count(*) FROM shelf_positions sp
+                JOIN trays t ON t.shelf_position_proposed_id = sp.id
+                WHERE t.shelving_job_id = :id AND sp.reserved AND NOT sp.occupied
+                """
+            ),
+            {"id": shelving_job.id},
+        ).scalar()
+        assert reserved == len(tray_ids)
+
+        session.execute(
+            text(
+                """
+                UPDATE trays SET shelf_position_id = shelf_position_proposed_id,
+                shelf_position_proposed_id = NULL
+                WHERE shelving_job_id = :id
+                """
+            ),
+            {"id": shelving_job.id},
+        )
+        flags = session.execute(
+            text(
+                """
+                SELECT count(*) FILTER (WHERE sp.occupied AND NOT sp.reserved)
+                FROM shelf_positions sp
+                JOIN trays t ON t.shelf_position_id = sp.id
+                WHERE t.shelving_job_id = :id
+                """
+            ),
+            {"id": shelving_job.id},
+        ).scalar()
+        assert flags == len(tray_ids)
+    finally:
+        session.rollback()
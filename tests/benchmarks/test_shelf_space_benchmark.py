@@ -0,0 +1,323 @@
+import time
+import logging
+
+from contextlib import nullcontext
+
+from sqlalchemy import event, text
+
+from app.shelf_space import (
+    SHELF_SPACE_RECONCILE_LOCK,
+    ShelfSpaceQueue,
+    ShelfSpaceReconciler,
+    recalculate_available_space,
+    reconcile_available_space,
+)
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    commits_as_flush,
+    seed_building,
+    seed_trays,
+    shelve_containers,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_shelf_space_benchmark")
+
+SMALL_BUILDING = {"modules": 1, "aisles": 1, "ladders": 1, "shelves": 2, "positions": 4}
+
+
+def _shelves(session, seed):
+    """available_space and free position ids of each seeded shelf"""
+    return session.execute(
+        text(
+            """
+            SELECT sh.id, sh.available_space,
+                coalesce(
+                    array_agg(sp.id ORDER BY sp.id) FILTER (WHERE NOT sp.occupied),
+                    '{}'
+                ) AS free
+            FROM shelves sh
+            LEFT JOIN shelf_positions sp ON sp.shelf_id = sh.id
+            WHERE sh.shelf_type_id = :shelf_type_id
+            GROUP BY sh.id
+            ORDER BY sh.id
+            """
+        ),
+        {"shelf_type_id": seed["shelf_type_id"]},
+    ).all()
+
+
+def _available_space(session, *shelf_ids):
+    return list(
+        session.execute(
+            text(
+                "SELECT available_space FROM shelves WHERE id = ANY(:ids) ORDER BY id"
+            ),
+            {"ids": list(shelf_ids)},
+        ).scalars()
+    )
+
+
+def _move_tray(session, tray_id, shelf_position_id):
+    session.execute(
+        text("UPDATE trays SET shelf_position_id = :position_id WHERE id = :id"),
+        {"id": tray_id, "position_id": shelf_position_id},
+    )
+
+
+def _assert_counts_match(session, seed):
+    for shelf in _shelves(session, seed):
+        assert shelf.available_space == len(shelf.free), shelf
+
+
+def test_available_space_follows_shelf_positions(session):
+    try:
+        seed = seed_building(session, **SMALL_BUILDING)
+        first, second = _shelves(session, seed)[:2]
+        # inserted positions are counted as free
+        assert _available_space(session, first.id, second.id) == [4, 4]
+
+        tray_ids = seed_trays(session, seed, 2)
+        _move_tray(session, tray_ids[0], first.free[0])
+        _move_tray(session, tray_ids[1], first.free[1])
+        assert _available_space(session, first.id, second.id) == [2, 4]
+
+        # a move frees one shelf and fills the other
+        _move_tray(session, tray_ids[0], second.free[0])
+        assert _available_space(session, first.id, second.id) == [3, 3]
+
+        _move_tray(session, tray_ids[1], None)
+        assert _available_space(session, first.id, second.id) == [4, 3]
+
+        session.execute(
+            text("DELETE FROM shelf_positions WHERE id = :id"), {"id": second.free[1]}
+        )
+        assert _available_space(session, first.id, second.id) == [4, 2]
+
+        # one statement shelving across several shelves
+        shelve_containers(session, "trays", seed_trays(session, seed, 5), seed)
+        _assert_counts_match(session, seed)
+    finally:
+        session.rollback()
+
+
+def test_recalculate_available_space_locks_then_recounts_given_shelves(session):
+    try:
+        seed = seed_building(session, **SMALL_BUILDING)
+        first, second = _shelves(session, seed)[:2]
+        session.execute(
+            text("UPDATE shelves SET available_space = 0 WHERE id = ANY(:ids)"),
+            {"ids": [first.id, second.id]},
+        )
+
+        assert recalculate_available_space(session, shelf_position_ids=[]) == 0
+        recounted = recalculate_available_space(
+            session, shelf_position_ids=[first.free[0]]
+        )
+        assert recounted == 1
+        assert _available_space(session, first.id, second.id) == [4, 0]
+
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        bind = session.get_bind()
+        event.listen(bind, "before_cursor_execute", _record)
+        try:
+            assert recalculate_available_space(session, shelf_ids=[second.id]) == 1
+        finally:
+            event.remove(bind, "before_cursor_execute", _record)
+
+        # the shelves are locked before they're counted
+        assert len(statements) == 2
+        assert statements[0].rstrip().endswith("FOR UPDATE")
+        assert statements[1].startswith("UPDATE shelves")
+        assert _available_space(session, first.id, second.id) == [4, 4]
+    finally:
+        session.rollback()
+
+
+def test_reconcile_available_space_corrects_drift(session):
+    try:
+        seed = seed_building(session)
+        shelve_containers(session, "trays", seed_trays(session, seed, 500), seed)
+        first = _shelves(session, seed)[0]
+        session.execute(
+            text("UPDATE shelves SET available_space = 99 WHERE id = :id"),
+            {"id": first.id},
+        )
+
+        with commits_as_flush(session):
+            with timed("reconcile available_space on every shelf"):
+                corrected = reconcile_available_space(lambda: nullcontext(session))
+            assert corrected >= 1
+            _assert_counts_match(session, seed)
+            assert reconcile_available_space(lambda: nullcontext(session)) == 0
+    finally:
+        session.rollback()
+
+
+def test_reconcile_available_space_locks_only_drifted_shelves(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1, ladders=2, shelves=5)
+        shelves = _shelves(session, seed)
+        first, last = shelves[0], shelves[-1]
+
+        with commits_as_flush(session):
+            reconcile_available_space(lambda: nullcontext(session))
+            session.execute(
+                text("UPDATE shelves SET available_space = 0 WHERE id = ANY(:ids)"),
+                {"ids": [first.id, last.id]},
+            )
+
+            statements = []
+
+            def _record(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            bind = session.get_bind()
+            event.listen(bind, "before_cursor_execute", _record)
+            try:
+                # batches of 4, so the two drifted shelves are fixed apart
+                corrected = reconcile_available_space(
+                    lambda: nullcontext(session), batch_size=4
+                )
+            finally:
+                event.remove(bind, "before_cursor_execute", _record)
+
+        assert corrected == 2
+        assert len(shelves) > 4
+        # no batch locks shelves that weren't drifted
+        locks = [
+            statement
+            for statement in statements
+            if statement.rstrip().endswith("FOR UPDATE")
+        ]
+        assert len(locks) == 2
+        _assert_counts_match(session, seed)
+    finally:
+        session.rollback()
+
+
+def test_reconcile_available_space_skips_while_another_worker_reconciles(session):
+    try:
+        with session.get_bind().connect() as other:
+            other.execute(
+                text("SELECT pg_advisory_xact_lock(:namespace)"),
+                {"namespace": SHELF_SPACE_RECONCILE_LOCK},
+            )
+            with commits_as_flush(session):
+                assert reconcile_available_space(lambda: nullcontext(session)) is None
+            other.rollback()
+    finally:
+        session.rollback()
+
+
+def test_shelf_space_reconciler_reports_corrections(session):
+    try:
+        seed = seed_building(session, **SMALL_BUILDING)
+        first = _shelves(session, seed)[0]
+        session.execute(
+            text("UPDATE shelves SET available_space = 0 WHERE id = :id"),
+            {"id": first.id},
+        )
+
+        reconciler = ShelfSpaceReconciler(0.01, lambda: nullcontext(session))
+        with commits_as_flush(session):
+            reconciler.start()
+            deadline = time.monotonic() + 10
+            while not reconciler.runs and time.monotonic() < deadline:
+                time.sleep(0.01)
+            reconciler.stop()
+            # the session isn't shared with the test until the thread exits
+            reconciler._thread.join(10)
+
+        snapshot = reconciler.snapshot()
+        assert snapshot["runs"] >= 1
+        assert snapshot["total_corrected"] >= 1
+        assert snapshot["last_run"] is not None
+        assert _available_space(session, first.id) == [4]
+    finally:
+        session.rollback()
+
+
+def _drifted_shelves(session):
+    """Two seeded shelves whose available_space only a recount restores"""
+    seed = seed_building(session, **SMALL_BUILDING)
+    first, second = _shelves(session, seed)[:2]
+    session.execute(
+        text("UPDATE shelves SET available_space = 0 WHERE id = ANY(:ids)"),
+        {"ids": [first.id, second.id]},
+    )
+    return first, second
+
+
+def test_shelf_space_queue_flush_recounts_pending_shelves(session):
+    # the worker waits out the debounce, so only flush recounts
+    queue = ShelfSpaceQueue(60, lambda: nullcontext(session))
+    try:
+        first, second = _drifted_shelves(session)
+
+        with commits_as_flush(session):
+            queue.enqueue(first.free[0], first.free[1], second.free[0], None)
+            assert queue.snapshot()["depth"] == 3
+            assert _available_space(session, first.id, second.id) == [0, 0]
+
+            queue.flush()
+
+            assert _available_space(session, first.id, second.id) == [4, 4]
+            snapshot = queue.snapshot()
+            assert snapshot["depth"] == 0
+            assert snapshot["enqueued"] == 3
+            assert snapshot["batches"] == 1
+            assert snapshot["last_batch_size"] == 3
+            assert snapshot["failed_batches"] == 0
+    finally:
+        queue.close()
+        session.rollback()
+
+
+def test_shelf_space_queue_drains_after_debounce(session):
+    queue = ShelfSpaceQueue(0.05, lambda: nullcontext(session))
+    try:
+        first, second = _drifted_shelves(session)
+
+        with commits_as_flush(session):
+            # a burst lands in one batch
+            queue.enqueue(first.free[0])
+            queue.enqueue(second.free[0])
+            deadline = time.monotonic() + 10
+            while not queue.snapshot()["batches"] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # the session isn't shared with the test until the worker exits
+            queue.close()
+
+        assert queue.snapshot()["batches"] == 1
+        assert queue.snapshot()["last_batch_size"] == 2
+        assert _available_space(session, first.id, second.id) == [4, 4]
+    finally:
+        queue.close()
+        session.rollback()
+
+
+def test_shelf_space_queue_close_recounts_pending_shelves(session):
+    queue = ShelfSpaceQueue(60, lambda: nullcontext(session))
+    try:
+        first, second = _drifted_shelves(session)
+
+        with commits_as_flush(session):
+            queue.enqueue(first.free[0])
+            # close cuts the debounce short instead of dropping the batch
+            with timed("close shelf space queue with pending shelves"):
+                queue.close()
+            assert queue.snapshot()["depth"] == 0
+            assert _available_space(session, first.id, second.id) == [4, 0]
+
+            # no worker is left to pick this up, so it's recounted at once
+            queue.enqueue(second.free[0])
+            assert _available_space(session, first.id, second.id) == [4, 4]
+            assert queue.snapshot()["batches"] == 2
+    finally:
+        queue.close()
+        session.rollback()
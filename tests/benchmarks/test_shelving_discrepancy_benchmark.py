@@ -0,0 +1,290 @@
+import logging
+
+from sqlalchemy import event, orm, text
+
+from app.events import check_for_shelving_discrepancies
+from app.models.non_tray_items import NonTrayItem
+from app.models.shelving_jobs import ShelvingJob
+from app.models.trays import Tray
+from app.shelving_discrepancies import record_shelving_discrepancies
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_barcodes,
+    seed_building,
+    seed_non_tray_items,
+    seed_trays,
+    shelve_containers,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_shelving_discrepancy_benchmark")
+
+# one ladder, so every shelf belongs to the seed's second owner
+SMALL_BUILDING = {"modules": 1, "aisles": 1, "ladders": 1, "shelves": 2, "positions": 4}
+
+
+def _setup(session, **size):
+    """Seeds a building and shelving job, returns its ids and free positions"""
+    seed = seed_building(session, **{**SMALL_BUILDING, **size})
+    shelving_job = ShelvingJob(building_id=seed["building_id"])
+    session.add(shelving_job)
+    session.flush()
+    seed["shelving_job_id"] = shelving_job.id
+    seed["shelf_owner_id"] = seed["owner_ids"][1]
+    seed["other_size_class_id"] = session.execute(
+        text(
+            "INSERT INTO size_class (name, short_name, height, width, depth, "
+            "create_dt, update_dt) "
+            "VALUES (:name, :name, 5, 5, 5, now(), now()) RETURNING id"
+        ),
+        {"name": f"S{seed['token']}"},
+    ).scalar()
+    seed["positions"] = session.execute(
+        text(
+            """
+            SELECT sp.id, sp.location FROM shelf_positions sp
+            JOIN shelves sh ON sh.id = sp.shelf_id
+            WHERE sh.shelf_type_id = :shelf_type_id
+            ORDER BY sp.id
+            """
+        ),
+        {"shelf_type_id": seed["shelf_type_id"]},
+    ).all()
+    return seed
+
+
+def _shelved(seed, index, proposed_index=None, **columns):
+    """Columns of a container shelved by the seeded job on position index"""
+    proposed_index = index if proposed_index is None else proposed_index
+    return {
+        "shelving_job_id": seed["shelving_job_id"],
+        "shelf_position_id": seed["positions"][index].id,
+        "shelf_position_proposed_id": seed["positions"][proposed_index].id,
+        "scanned_for_shelving": True,
+        **columns,
+    }
+
+
+def _discrepancies(session, shelving_job_id):
+    return session.execute(
+        text(
+            """
+            SELECT tray_id, non_tray_item_id, owner_id, size_class_id,
+                assigned_location, pre_assigned_location, error
+            FROM shelving_job_discrepancies
+            WHERE shelving_job_id = :shelving_job_id
+            ORDER BY tray_id, non_tray_item_id, error
+            """
+        ),
+        {"shelving_job_id": shelving_job_id},
+    ).all()
+
+
+# the wording the per-row listeners stored, "Tray" for non tray items too
+def _owner_error(container_owner_id, shelf_owner_id):
+    return f"""Owner Discrepancy -
+                        Tray owner_id: {container_owner_id} -
+                        Shelf owner_id: {shelf_owner_id}"""
+
+
+def _size_error(container_size_class_id, shelf_size_class_id):
+    return f"""Size Discrepancy -
+                        Tray size_class_id: {container_size_class_id} -
+                        Shelf size_class_id: {shelf_size_class_id}"""
+
+
+def _location_error(proposed_location, actual_location):
+    return f"""Location Discrepancy -
+                            Proposed: {proposed_location} -
+                            Actual: {actual_location}"""
+
+
+def test_record_shelving_discrepancies(session):
+    try:
+        seed = _setup(session)
+        owner_id, other_owner_id = seed["shelf_owner_id"], seed["owner_ids"][0]
+        size_class_id = seed["size_class_id"]
+        other_size_class_id = seed["other_size_class_id"]
+        withdrawn_barcode_ids = seed_barcodes(session, seed, "W", 2)
+
+        def tray(owner_id, index, **columns):
+            return seed_trays(
+                session, seed, 1, owner_id, **_shelved(seed, index, **columns)
+            )[0]
+
+        def item(owner_id, index, **columns):
+            return seed_non_tray_items(
+                session, seed, 1, owner_id, **_shelved(seed, index, **columns)
+            )[0]
+
+        wrong_size_tray = tray(owner_id, 0, size_class_id=other_size_class_id)
+        wrong_owner_tray = tray(other_owner_id, 1)
+        matching_tray = tray(owner_id, 2)
+        withdrawn_tray = tray(
+            other_owner_id, 3, withdrawn_barcode_id=withdrawn_barcode_ids[0]
+        )
+        jobless_tray = tray(other_owner_id, 4, shelving_job_id=None)
+        wrong_size_item = item(owner_id, 5, size_class_id=other_size_class_id)
+        wrong_owner_item = item(other_owner_id, 6)
+        moved_item = item(owner_id, 7, proposed_index=8)
+        withdrawn_item = item(
+            other_owner_id, 9, withdrawn_barcode_id=withdrawn_barcode_ids[1]
+        )
+        jobless_item = item(other_owner_id, 10, shelving_job_id=None)
+
+        recorded = record_shelving_discrepancies(
+            session.connection(),
+            tray_ids=[
+                wrong_size_tray,
+                wrong_owner_tray,
+                matching_tray,
+                withdrawn_tray,
+                jobless_tray,
+            ],
+            non_tray_item_ids=[
+                wrong_size_item,
+                wrong_owner_item,
+                moved_item,
+                withdrawn_item,
+                jobless_item,
+            ],
+        )
+
+        location = [position.location for position in seed["positions"]]
+        # each row carries the shelf's owner and size class
+        assert _discrepancies(session, seed["shelving_job_id"]) == [
+            (
+                wrong_size_tray,
+                None,
+                owner_id,
+                size_class_id,
+                location[0],
+                location[0],
+                _size_error(other_size_class_id, size_class_id),
+            ),
+            (
+                wrong_owner_tray,
+                None,
+                owner_id,
+                size_class_id,
+                location[1],
+                location[1],
+                _owner_error(other_owner_id, owner_id),
+            ),
+            (
+                None,
+                wrong_size_item,
+                owner_id,
+                size_class_id,
+                location[5],
+                location[5],
+                _size_error(other_size_class_id, size_class_id),
+            ),
+            (
+                None,
+                wrong_owner_item,
+                owner_id,
+                size_class_id,
+                location[6],
+                location[6],
+                _owner_error(other_owner_id, owner_id),
+            ),
+            (
+                None,
+                moved_item,
+                owner_id,
+                size_class_id,
+                location[7],
+                location[8],
+                _location_error(location[8], location[7]),
+            ),
+        ]
+        assert recorded == 5
+    finally:
+        session.rollback()
+
+
+def test_flush_records_discrepancies_of_inserted_containers(session):
+    assert event.contains(orm.Session, "after_flush", check_for_shelving_discrepancies)
+    try:
+        seed = _setup(session)
+        owner_id, other_owner_id = seed["shelf_owner_id"], seed["owner_ids"][0]
+        barcode_ids = seed_barcodes(session, seed, "F", 5)
+
+        def container(model, barcode_id, index, **columns):
+            values = {
+                "owner_id": owner_id,
+                "size_class_id": seed["size_class_id"],
+                **_shelved(seed, index, **columns),
+            }
+            return model(
+                barcode_id=barcode_id,
+                container_type_id=seed["container_type_id"],
+                **values,
+            )
+
+        wrong_owner_tray = container(Tray, barcode_ids[0], 0, owner_id=other_owner_id)
+        withdrawn_tray = container(
+            Tray,
+            barcode_ids[1],
+            1,
+            owner_id=other_owner_id,
+            withdrawn_barcode_id=barcode_ids[2],
+        )
+        jobless_tray = container(
+            Tray, barcode_ids[3], 2, owner_id=other_owner_id, shelving_job_id=None
+        )
+        wrong_size_item = container(
+            NonTrayItem,
+            barcode_ids[4],
+            3,
+            status="In",
+            size_class_id=seed["other_size_class_id"],
+        )
+        session.add_all(
+            [wrong_owner_tray, withdrawn_tray, jobless_tray, wrong_size_item]
+        )
+        session.flush()
+
+        # recorded by the after_flush listener, withdrawn and jobless are skipped
+        assert [
+            (row.tray_id, row.non_tray_item_id, row.error)
+            for row in _discrepancies(session, seed["shelving_job_id"])
+        ] == [
+            (wrong_owner_tray.id, None, _owner_error(other_owner_id, owner_id)),
+            (
+                None,
+                wrong_size_item.id,
+                _size_error(seed["other_size_class_id"], seed["size_class_id"]),
+            ),
+        ]
+    finally:
+        session.rollback()
+
+
+def test_record_shelving_discrepancies_in_one_batch(session):
+    try:
+        seed = _setup(session, shelves=50, positions=6)
+        tray_ids = seed_trays(
+            session,
+            seed,
+            500,
+            seed["shelf_owner_id"],
+            shelving_job_id=seed["shelving_job_id"],
+            size_class_id=seed["other_size_class_id"],
+        )
+        shelve_containers(session, "trays", tray_ids, seed)
+
+        with count_queries(session) as queries, timed(
+            "record discrepancies for 500 shelved trays"
+        ):
+            recorded = record_shelving_discrepancies(
+                session.connection(), tray_ids=tray_ids
+            )
+
+        # one query to find them, one insert for all of them
+        assert queries["count"] == 2
+        assert recorded == 500
+    finally:
+        session.rollback()
@@ -0,0 +1,83 @@
+import logging
+
+from sqlalchemy import text
+
+from app.models.accession_jobs import AccessionJob
+from app.models.verification_jobs import VerificationJob
+from app.tasks import bulk_verification_change_action
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_building,
+    seed_items,
+    seed_non_tray_items,
+    seed_trays,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_verification_change_benchmark")
+
+
+def test_size_class_change_on_10k_item_verification_job(session):
+    try:
+        seed = seed_building(session, modules=1, aisles=1)
+        accession_job = AccessionJob(trayed=True, status="Completed")
+        session.add(accession_job)
+        session.flush()
+        verification_job = VerificationJob(
+            accession_job_id=accession_job.id, trayed=True, status="Running"
+        )
+        session.add(verification_job)
+        session.flush()
+
+        tray_ids = seed_trays(
+            session, seed, 500, verification_job_id=verification_job.id
+        )
+        # items reach the job through their trays only
+        seed_items(session, seed, 10000, tray_ids)
+        seed_non_tray_items(
+            session, seed, 200, verification_job_id=verification_job.id
+        )
+        new_size_class_id = session.execute(
+            text(
+                "INSERT INTO size_class (name, short_name, height, width, depth, "
+                "create_dt, update_dt) "
+                "VALUES (:name, :name, 5, 5, 5, now(), now()) RETURNING id"
+            ),
+            {"name": f"C{seed['token']}"},
+        ).scalar()
+
+        with count_queries(session) as queries, timed(
+            "size class change on 500 trays, 10000 items, 200 non tray items"
+        ):
+            recorded = bulk_verification_change_action(
+                session, verification_job, "size_class_id", new_size_class_id
+            )
+
+        assert recorded == 10200
+        # one insert of changes, one update per container table
+        assert queries["count"] == 4
+
+        unchanged = session.execute(
+            text(
+                """
+                SELECT count(*) FROM items
+                WHERE tray_id = ANY(:tray_ids) AND size_class_id <> :size_class_id
+                """
+            ),
+            {"tray_ids": tray_ids, "size_class_id": new_size_class_id},
+        ).scalar()
+        assert unchanged == 0
+
+        tray_changes = session.execute(
+            text(
+                """
+                SELECT count(*) FROM verification_changes
+                WHERE tray_barcode_value LIKE :token AND change_type = 'SizeClassEdit'
+                """
+            ),
+            {"token": f"{seed['token']}-%"},
+        ).scalar()
+        assert tray_changes == 10000
+    finally:
+        session.rollback()
@@ -0,0 +1,67 @@
+import logging
+
+import pandas as pd
+
+from sqlalchemy import text
+
+from app.models.barcodes import Barcode
+from app.models.withdraw_jobs import WithdrawJob
+from app.utilities import process_withdraw_job_data
+from tests.fixtures.configtest import session
+from tests.fixtures.benchmark_fixture import (
+    count_queries,
+    seed_building,
+    seed_items,
+    seed_non_tray_items,
+    seed_trays,
+    shelve_containers,
+    timed,
+)
+
+LOGGER = logging.getLogger("tests.benchmarks.test_withdraw_validation_benchmark")
+
+
+def test_validate_20k_barcode_withdraw_upload(session):
+    try:
+        seed = seed_building(session)
+        tray_ids = seed_trays(session, seed, 2000)
+        shelve_containers(session, "trays", tray_ids, seed)
+        item_ids = seed_items(session, seed, 20000, tray_ids)
+        non_tray_item_ids = seed_non_tray_items(session, seed, 500)
+        shelve_containers(session, "non_tray_items", non_tray_item_ids[:-1], seed)
+
+        withdraw_job = WithdrawJob()
+        session.add(withdraw_job)
+        session.flush()
+
+        barcode_values = [
+            value
+            for table, ids in (("items", item_ids), ("non_tray_items", non_tray_item_ids))
+            for value in session.execute(
+                text(
+                    f"SELECT b.value FROM {table} c JOIN barcodes b ON b.id = c.barcode_id "
+                    "WHERE c.id = ANY(:ids) ORDER BY c.id"
+                ),
+                {"ids": ids},
+            ).scalars()
+        ]
+        barcodes = session.query(Barcode).filter(Barcode.value.in_(barcode_values)).all()
+        df = pd.DataFrame({"Item Barcode": barcode_values})
+
+        with count_queries(session) as queries, timed(
+            f"validate {len(df)} barcode withdraw upload"
+        ):
+            withdraw_items, withdraw_non_tray_items, withdraw_trays, errors = (
+                process_withdraw_job_data(session, withdraw_job.id, barcodes, df)
+            )
+
+        assert errors == {
+            "errors": [{"line": len(df) + 1, "error": "Non Tray Item is not shelved"}]
+        }
+        assert len(withdraw_items) == 20000
+        assert len(withdraw_non_tray_items) == 499
+        assert len(withdraw_trays) == 2000
+        # one validation query, one update_dt update per container table
+        assert queries["count"] == 3
+    finally:
+        session.rollback()
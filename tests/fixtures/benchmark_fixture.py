@@ -0,0 +1,454 @@
+import time
+import uuid
+import logging
+
+from contextlib import contextmanager
+from sqlalchemy import event, text
+
+from app.models.accession_jobs import AccessionJob
+
+LOGGER = logging.getLogger(__name__)
+
+"""
+Benchmark helpers.
+Location trees and containers are seeded straight through SQL so that
+fixture setup doesn't drown the code path being measured. Nothing here
+commits; benchmarks roll the session back when they finish.
+"""
+
+# 2 modules x 10 aisles x 2 sides x 20 ladders x 8 shelves x 6 positions
+BUILDING_SIZE = {
+    "modules": 2,
+    "aisles": 10,
+    "ladders": 20,
+    "shelves": 8,
+    "positions": 6,
+    "owners": 2,
+}
+
+
+@contextmanager
+def count_queries(session):
+    """
+    Counts statements sent to the database while the block runs.
+    Yields a dict so the count can be read after the block exits.
+    """
+    counter = {"count": 0}
+    bind = session.get_bind()
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter["count"] += 1
+
+    event.listen(bind, "before_cursor_execute", _count)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", _count)
+
+
+@contextmanager
+def timed(label):
+    """Logs wall time of the block under label."""
+    start = time.perf_counter()
+    timing = {}
+    try:
+        yield timing
+    finally:
+        timing["seconds"] = time.perf_counter() - start
+        LOGGER.info(f"[benchmark] {label}: {timing['seconds']:.3f}s")
+
+
+@contextmanager
+def commits_as_flush(session):
+    """
+    Turns session.commit into a flush while the block runs, so endpoints
+    that commit can be benchmarked and still be rolled back.
+    """
+    session.commit = session.flush
+    try:
+        yield
+    finally:
+        del session.commit
+
+
+def _scalar(session, sql, **params):
+    return session.execute(text(sql), params).scalar()
+
+
+def seed_building(session, **size):
+    """
+    Seeds one building with a full location tree and returns the ids
+    needed to place containers in it.
+    """
+    size = {**BUILDING_SIZE, **size}
+    token = uuid.uuid4().hex[:8]
+    seed = {"token": token, "size": size}
+
+    seed["building_id"] = _scalar(
+        session,
+        "INSERT INTO buildings (name, create_dt, update_dt) "
+        "VALUES (:name, now(), now()) RETURNING id",
+        name=f"B{token}",
+    )
+    seed["building_name"] = f"B{token}"
+    seed["barcode_type_id"] = _scalar(
+        session,
+        "INSERT INTO barcode_types (name, allowed_pattern, create_dt, update_dt) "
+        "VALUES (:name, '.*', now(), now()) RETURNING id",
+        name=f"B{token}",
+    )
+    seed["size_class_id"] = _scalar(
+        session,
+        "INSERT INTO size_class (name, short_name, height, width, depth, "
+        "create_dt, update_dt) "
+        "VALUES (:name, :name, 10, 10, 10, now(), now()) RETURNING id",
+        name=f"B{token}",
+    )
+    seed["container_type_id"] = _scalar(
+        session,
+        "INSERT INTO container_types (type, create_dt, update_dt) "
+        "VALUES (:type, now(), now()) RETURNING id",
+        type=f"B{token}",
+    )
+    seed["shelf_type_id"] = _scalar(
+        session,
+        "INSERT INTO shelf_types (type, size_class_id, max_capacity, "
+        "create_dt, update_dt) "
+        "VALUES (:type, :size_class_id, :positions, now(), now()) RETURNING id",
+        type=f"B{token}",
+        size_class_id=seed["size_class_id"],
+        positions=size["positions"],
+    )
+    owner_tier_id = _scalar(
+        session,
+        "INSERT INTO owner_tiers (level, name, create_dt, update_dt) "
+        "SELECT coalesce(max(level), 0) + 1, :name, now(), now() FROM owner_tiers "
+        "RETURNING id",
+        name=f"B{token}",
+    )
+    seed["owner_ids"] = [
+        _scalar(
+            session,
+            "INSERT INTO owners (name, owner_tier_id, create_dt, update_dt) "
+            "VALUES (:name, :owner_tier_id, now(), now()) RETURNING id",
+            name=f"B{token}-{owner}",
+            owner_tier_id=owner_tier_id,
+        )
+        for owner in range(size["owners"])
+    ]
+
+    statements = [
+        # number lookups are shared across buildings
+        """
+        INSERT INTO aisle_numbers (number, create_dt, update_dt)
+        SELECT n, now(), now() FROM generate_series(1, :aisles) n
+        ON CONFLICT (number) DO NOTHING
+        """,
+        """
+        INSERT INTO ladder_numbers (number, create_dt, update_dt)
+        SELECT n, now(), now() FROM generate_series(1, :ladders) n
+        ON CONFLICT (number) DO NOTHING
+        """,
+        """
+        INSERT INTO shelf_numbers (number, create_dt, update_dt)
+        SELECT n, now(), now() FROM generate_series(1, :shelves) n
+        ON CONFLICT (number) DO NOTHING
+        """,
+        """
+        INSERT INTO shelf_position_numbers (number, create_dt, update_dt)
+        SELECT n, now(), now() FROM generate_series(1, :positions) n
+        ON CONFLICT (number) DO NOTHING
+        """,
+        """
+        INSERT INTO side_orientations (name, create_dt, update_dt)
+        SELECT o, now(), now() FROM unnest(ARRAY['Left', 'Right']) o
+        WHERE NOT EXISTS (SELECT 1 FROM side_orientations so WHERE so.name = o)
+        """,
+        """
+        INSERT INTO modules (building_id, module_number, create_dt, update_dt)
+        SELECT :building_id, :token || '-' || m, now(), now()
+        FROM generate_series(1, :modules) m
+        """,
+        """
+        INSERT INTO aisles (module_id, aisle_number_id, sort_priority,
+            create_dt, update_dt)
+        SELECT m.id, an.id, an.number, now(), now()
+        FROM modules m
+        JOIN aisle_numbers an ON an.number BETWEEN 1 AND :aisles
+        WHERE m.building_id = :building_id
+        """,
+        """
+        INSERT INTO sides (aisle_id, side_orientation_id, create_dt, update_dt)
+        SELECT a.id, so.id, now(), now()
+        FROM aisles a
+        JOIN modules m ON m.id = a.module_id
+        CROSS JOIN (
+            SELECT min(id) AS id FROM side_orientations
+            WHERE name IN ('Left', 'Right') GROUP BY name
+        ) so
+        WHERE m.building_id = :building_id
+        """,
+        """
+        INSERT INTO ladders (side_id, ladder_number_id, sort_priority,
+            create_dt, update_dt)
+        SELECT s.id, ln.id, ln.number, now(), now()
+        FROM sides s
+        JOIN aisles a ON a.id = s.aisle_id
+        JOIN modules m ON m.id = a.module_id
+        JOIN ladder_numbers ln ON ln.number BETWEEN 1 AND :ladders
+        WHERE m.building_id = :building_id
+        """,
+        """
+        INSERT INTO shelves (ladder_id, shelf_number_id, shelf_type_id, owner_id,
+            container_type_id, height, width, depth, available_space,
+            sort_priority, location, internal_location, create_dt, update_dt)
+        SELECT l.id, sn.id, :shelf_type_id,
+            (:owner_ids)[1 + (ln.number % cardinality(:owner_ids))],
+            :container_type_id, 10, 10, 10, 0, sn.number,
+            :building_name || '-' || m.module_number || '-' || an.number || '-'
+                || left(so.name, 1) || '-' || ln.number || '-' || sn.number,
+            :building_id || '-' || m.id || '-' || a.id || '-' || s.id || '-'
+                || l.id || '-' || sn.id,
+            now(), now()
+        FROM ladders l
+        JOIN ladder_numbers ln ON ln.id = l.ladder_number_id
+        JOIN sides s ON s.id = l.side_id
+        JOIN side_orientations so ON so.id = s.side_orientation_id
+        JOIN aisles a ON a.id = s.aisle_id
+        JOIN aisle_numbers an ON an.id = a.aisle_number_id
+        JOIN modules m ON m.id = a.module_id
+        JOIN shelf_numbers sn ON sn.number BETWEEN 1 AND :shelves
+        WHERE m.building_id = :building_id
+        """,
+        # the available_space triggers count the positions as they're inserted
+        """
+        INSERT INTO shelf_positions (shelf_id, shelf_position_number_id,
+            location, internal_location, create_dt, update_dt)
+        SELECT sh.id, spn.id, sh.location || '-' || spn.number,
+            sh.internal_location || '-' || spn.number, now(), now()
+        FROM shelves sh
+        JOIN shelf_position_numbers spn ON spn.number BETWEEN 1 AND :positions
+        WHERE sh.shelf_type_id = :shelf_type_id
+        """,
+    ]
+    params = {**size, **seed}
+    params.pop("size")
+    for statement in statements:
+        session.execute(text(statement), params)
+
+    seed["shelf_position_count"] = _scalar(
+        session,
+        "SELECT count(*) FROM shelf_positions sp "
+        "JOIN shelves sh ON sh.id = sp.shelf_id "
+        "WHERE sh.shelf_type_id = :shelf_type_id",
+        shelf_type_id=seed["shelf_type_id"],
+    )
+    return seed
+
+
+def seed_barcodes(session, seed, prefix, count):
+    """Inserts count barcodes and returns their ids in insertion order."""
+    return list(
+        session.execute(
+            text(
+                """
+                INSERT INTO barcodes (value, type_id, withdrawn, create_dt, update_dt)
+                SELECT :token || '-' || :prefix || '-' || n, :barcode_type_id,
+                    false, now(), now()
+                FROM generate_series(1, :count) n
+                ORDER BY n
+                RETURNING id
+                """
+            ),
+            {
+                "token": seed["token"],
+                "prefix": prefix,
+                "barcode_type_id": seed["barcode_type_id"],
+                "count": count,
+            },
+        ).scalars()
+    )
+
+
+def seed_trays(session, seed, count, owner_id=None, **columns):
+    """
+    Inserts count trays with fresh barcodes. Extra keyword arguments are
+    written as constant column values, e.g. verification_job_id=1.
+    """
+    return _seed_containers(
+        session,
+        seed,
+        "trays",
+        "T",
+        count,
+        {
+            "size_class_id": seed["size_class_id"],
+            "owner_id": owner_id or seed["owner_ids"][0],
+            "container_type_id": seed["container_type_id"],
+            "scanned_for_accession": True,
+            "scanned_for_verification": True,
+            "scanned_for_shelving": False,
+            "collection_accessioned": True,
+            "collection_verified": True,
+            **columns,
+        },
+    )
+
+
+def seed_non_tray_items(session, seed, count, owner_id=None, **columns):
+    """Inserts count non tray items with fresh barcodes."""
+    return _seed_containers(
+        session,
+        seed,
+        "non_tray_items",
+        "N",
+        count,
+        {
+            "status": "In",
+            "size_class_id": seed["size_class_id"],
+            "owner_id": owner_id or seed["owner_ids"][0],
+            "container_type_id": seed["container_type_id"],
+            "scanned_for_accession": True,
+            "scanned_for_verification": True,
+            "scanned_for_shelving": False,
+            "scanned_for_refile_queue": False,
+            **columns,
+        },
+    )
+
+
+def seed_items(session, seed, count, tray_ids, **columns):
+    """Inserts count items with fresh barcodes, spread evenly over tray_ids."""
+    barcode_ids = seed_barcodes(session, seed, f"I{uuid.uuid4().hex[:6]}", count)
+    rows = [
+        {
+            "barcode_id": barcode_id,
+            "tray_id": tray_ids[index % len(tray_ids)] if tray_ids else None,
+        }
+        for index, barcode_id in enumerate(barcode_ids)
+    ]
+    constants = {
+        "status": "In",
+        "size_class_id": seed["size_class_id"],
+        "owner_id": seed["owner_ids"][0],
+        "scanned_for_accession": True,
+        "scanned_for_verification": True,
+        "scanned_for_refile_queue": False,
+        **columns,
+    }
+    names = ["barcode_id", "tray_id", *constants.keys()]
+    placeholders = [":barcode_id", ":tray_id", *[f":{name}" for name in constants]]
+    session.execute(
+        text(
+            f"INSERT INTO items ({', '.join(names)}, create_dt, update_dt) "
+            f"VALUES ({', '.join(placeholders)}, now(), now())"
+        ),
+        [{**row, **constants} for row in rows],
+    )
+    return list(
+        session.execute(
+            text("SELECT id FROM items WHERE barcode_id = ANY(:barcode_ids) ORDER BY id"),
+            {"barcode_ids": barcode_ids},
+        ).scalars()
+    )
+
+
+def seed_accession_job(session, seed, trays=500, items=10000, non_tray_items=200):
+    """
+    Inserts a running accession job owned by the seed's second owner,
+    with unaccessioned trays, items spread over them and non tray items.
+    """
+    accession_job = AccessionJob(
+        trayed=True, status="Running", owner_id=seed["owner_ids"][-1]
+    )
+    session.add(accession_job)
+    session.flush()
+
+    unaccessioned = {"accession_job_id": accession_job.id, "scanned_for_accession": False}
+    tray_ids = seed_trays(session, seed, trays, **unaccessioned)
+    seed_items(session, seed, items, tray_ids, **unaccessioned)
+    seed_non_tray_items(session, seed, non_tray_items, **unaccessioned)
+    return accession_job
+
+
+def seed_requests(session, seed, item_ids=(), non_tray_item_ids=(), **columns):
+    """
+    Inserts one request per item and non tray item, in the order given.
+    Extra keyword arguments are written as constant column values.
+    """
+    item_ids, non_tray_item_ids = list(item_ids), list(non_tray_item_ids)
+    item_column = item_ids + [None] * len(non_tray_item_ids)
+    non_tray_column = [None] * len(item_ids) + non_tray_item_ids
+    constants = {"building_id": seed["building_id"], "fulfilled": False, **columns}
+    return list(
+        session.execute(
+            text(
+                f"""
+                INSERT INTO requests (
+                    item_id, non_tray_item_id, status, {', '.join(constants)},
+                    create_dt, update_dt
+                )
+                SELECT item_id, non_tray_item_id, 'New',
+                    {', '.join(f':{name}' for name in constants)}, now(), now()
+                FROM unnest(
+                    CAST(:item_ids AS bigint[]), CAST(:non_tray_item_ids AS bigint[])
+                ) WITH ORDINALITY AS r(item_id, non_tray_item_id, ordinal)
+                ORDER BY ordinal
+                RETURNING id
+                """
+            ),
+            {
+                "item_ids": item_column,
+                "non_tray_item_ids": non_tray_column,
+                **constants,
+            },
+        ).scalars()
+    )
+
+
+def _seed_containers(session, seed, table, prefix, count, constants):
+    barcode_ids = seed_barcodes(session, seed, f"{prefix}{uuid.uuid4().hex[:6]}", count)
+    names = ", ".join(constants.keys())
+    placeholders = ", ".join(f":{name}" for name in constants)
+    return list(
+        session.execute(
+            text(
+                f"""
+                INSERT INTO {table} (barcode_id, {names}, create_dt, update_dt)
+                SELECT barcode_id, {placeholders}, now(), now()
+                FROM unnest(CAST(:barcode_ids AS uuid[])) barcode_id
+                RETURNING id
+                """
+            ),
+            {"barcode_ids": [str(barcode_id) for barcode_id in barcode_ids], **constants},
+        ).scalars()
+    )
+
+
+def shelve_containers(session, table, container_ids, seed):
+    """Places containers on the first free positions of the seeded building."""
+    session.execute(
+        text(
+            f"""
+            UPDATE {table} c
+            SET shelf_position_id = placement.shelf_position_id,
+                scanned_for_shelving = true
+            FROM (
+                SELECT container.id AS container_id, position.id AS shelf_position_id
+                FROM (
+                    SELECT id, row_number() OVER (ORDER BY id) AS rank
+                    FROM unnest(CAST(:container_ids AS bigint[])) id
+                ) container
+                JOIN (
+                    SELECT sp.id, row_number() OVER (ORDER BY sp.location) AS rank
+                    FROM shelf_positions sp
+                    JOIN shelves sh ON sh.id = sp.shelf_id
+                    WHERE sh.shelf_type_id = :shelf_type_id
+                    AND NOT sp.occupied AND NOT sp.reserved
+                ) position ON position.rank = container.rank
+            ) placement
+            WHERE c.id = placement.container_id
+            """
+        ),
+        {"container_ids": list(container_ids), "shelf_type_id": seed["shelf_type_id"]},
+    )
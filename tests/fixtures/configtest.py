@@ -5,10 +5,15 @@ import pytest
 import subprocess
 import json
 
+from contextlib import contextmanager
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlalchemy_utils import database_exists, create_database, drop_database
 
+from app.database.async_session import get_async_session
 from app.database.session import get_session
 from app.main import app
 
@@ -46,10 +51,32 @@ DATA_SIZE_RESPONSE = f"{ROOT_FILE_PATH}/tests/fixtures/payloads/data_size_respon
 
 # Create a new database for testing
 engine = create_engine(TEST_DATABASE_URL)
+# TestClient may run each request on its own event loop, so async
+# connections aren't pooled across requests
+async_engine = create_async_engine(
+    TEST_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
+    poolclass=NullPool,
+)
 
 logger = logging.getLogger("tests.configtest")
 
 
+@contextmanager
+def worker_session_manager():
+    """
+    session_manager on the test database, for background workers that
+    open their own sessions instead of using the request's.
+    """
+    session = Session(engine, autoflush=False)
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
 @pytest.fixture(scope="session")
 def init_db():
     """
@@ -106,8 +133,13 @@ def client(session):
     def get_session_override():
         return session
 
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
+
     # Override the dependency with the test session
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
     client = TestClient(app)
     yield client
 
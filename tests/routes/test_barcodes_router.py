@@ -50,6 +50,25 @@ def test_get_barcode_by_id(client):
     assert response.json().get("id") == barcode_id
 
 
+def test_get_barcode_by_value(client):
+    response = client.post("/barcodes", json={"type_id": 1, "value": "5901234123510"})
+    assert response.status_code == status.HTTP_201_CREATED
+
+    barcode_id = response.json().get("id")
+
+    response = client.get("/barcodes/value/5901234123510")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json().get("id") == barcode_id
+    assert response.json().get("type").get("id") == 1
+
+
+def test_get_barcode_by_value_not_found(client):
+    response = client.get("/barcodes/value/0000000000000")
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
 def test_create_barcode_record(client):
     response = client.post("/barcodes", json={"type_id": 1, "value": "5901234123501"})
 
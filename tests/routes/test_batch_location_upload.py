@@ -13,8 +13,8 @@ def test_batch_upload_location_management(client, session):
     # Send a POST request to the endpoint
     response = client.post("/location-management", files={"file": file}, data={"building_id": 1, "module_id": 1, "aisle_id": 1, "side_id": 1})
 
-    # Assert that the response is successful
-    assert response.status_code == 200
+    # Assert that the upload was accepted for processing
+    assert response.status_code == 202
 
     # Assert that the batch upload was created successfully
     batch_upload = session.query(BatchUpload).first()
@@ -0,0 +1,327 @@
+import time
+import logging
+import threading
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from fastapi import status
+from sqlalchemy import delete, update
+
+from app.batch_upload_jobs import (
+    INTERRUPTED_ERROR,
+    BatchUploadJobs,
+    fail_interrupted_uploads,
+)
+from app.database.session import commit_record
+from app.models.barcodes import Barcode
+from app.models.batch_upload import BatchUpload
+from app.models.item_withdrawals import ItemWithdrawal
+from app.models.items import Item
+from app.models.tray_withdrawal import TrayWithdrawal
+from app.models.trays import Tray
+from app.models.withdraw_jobs import WithdrawJob
+from app.routers import batch_upload as batch_upload_router
+from tests.fixtures.configtest import client, session, worker_session_manager
+
+LOGGER = logging.getLogger("tests.routes.test_batch_upload_router")
+
+MISSING_BARCODE_ERROR = {
+    "line": 2,
+    "barcode_value": "missing",
+    "error": "Barcode value missing not found",
+}
+
+
+@pytest.fixture
+def batch_upload_jobs(monkeypatch):
+    """One worker on the test database, reporting progress every row"""
+    jobs = BatchUploadJobs(1, 1, session_factory=worker_session_manager)
+    monkeypatch.setattr(batch_upload_router, "batch_upload_jobs", jobs)
+    yield jobs
+    jobs.shutdown()
+
+
+def _new_batch_upload(session, file_name="test.csv"):
+    return commit_record(session, BatchUpload(file_name=file_name))
+
+
+def _wait_for_batch_upload(client, session, batch_upload_id, timeout=10):
+    """Polls the upload like a client would until it stops processing"""
+    deadline = time.monotonic() + timeout
+    while True:
+        # the request session would otherwise return its cached upload
+        session.expire_all()
+        response = client.get(f"/batch-upload/{batch_upload_id}")
+        assert response.status_code == status.HTTP_200_OK
+        if response.json()["status"] not in ("New", "Processing"):
+            return response.json()
+        assert time.monotonic() < deadline, response.json()
+        time.sleep(0.05)
+
+
+def test_batch_upload_completes_with_progress_and_row_errors(
+    client, session, batch_upload_jobs
+):
+    batch_upload = _new_batch_upload(session)
+    seen = {}
+
+    def processor(worker_session, upload, contents, file_format, progress):
+        seen["status"] = upload.status
+        progress.start(3)
+        for _ in range(3):
+            progress.advance()
+        with worker_session_manager() as reader:
+            # counters are committed while the upload is still processing
+            written = reader.get(BatchUpload, upload.id)
+            seen["rows"] = (written.total_rows, written.processed_rows)
+        return [MISSING_BARCODE_ERROR]
+
+    response = client.get(f"/batch-upload/{batch_upload.id}")
+    assert response.json()["status"] == "New"
+
+    batch_upload_jobs.submit(batch_upload.id, processor, b"", "csv")
+    detail = _wait_for_batch_upload(client, session, batch_upload.id)
+
+    assert seen == {"status": "Processing", "rows": (3, 3)}
+    assert detail["status"] == "Completed"
+    assert detail["total_rows"] == 3
+    assert detail["processed_rows"] == 3
+    assert detail["errored_rows"] == 1
+    assert detail["errors"] == [MISSING_BARCODE_ERROR]
+    assert batch_upload_jobs.snapshot()["completed"] == 1
+
+
+def test_batch_upload_errors_csv(client, session, batch_upload_jobs):
+    batch_upload = _new_batch_upload(session)
+
+    batch_upload_jobs.submit(
+        batch_upload.id,
+        lambda *args: [MISSING_BARCODE_ERROR, {"line": None, "error": "Row skipped"}],
+        b"",
+        "csv",
+    )
+    _wait_for_batch_upload(client, session, batch_upload.id)
+
+    response = client.get(f"/batch-upload/{batch_upload.id}/errors")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == [
+        "Line Item,Item Barcode,Error",
+        "2,missing,Barcode value missing not found",
+        ",,Row skipped",
+    ]
+
+
+def test_batch_upload_fails_on_processor_error(client, session, batch_upload_jobs):
+    batch_upload = _new_batch_upload(session)
+
+    def processor(*args):
+        raise RuntimeError("connection lost")
+
+    batch_upload_jobs.submit(batch_upload.id, processor, b"", "csv")
+    detail = _wait_for_batch_upload(client, session, batch_upload.id)
+
+    assert detail["status"] == "Failed"
+    assert detail["errored_rows"] == 0
+    assert detail["errors"] == [
+        {"line": None, "error": "Internal Server Error: connection lost"}
+    ]
+    assert batch_upload_jobs.snapshot()["failed"] == 1
+
+
+def test_batch_upload_request_without_barcode_column_fails(
+    client, session, batch_upload_jobs
+):
+    response = client.post(
+        "/batch-upload/request",
+        files={"file": ("requests.csv", b"Title\nLord of The Rings\n", "text/csv")},
+    )
+
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert response.json()["status"] == "New"
+
+    detail = _wait_for_batch_upload(client, session, response.json()["id"])
+
+    assert detail["status"] == "Failed"
+    assert detail["errors"] == [
+        {"line": None, "error": "Excel file must contain a 'Item Barcode' column."}
+    ]
+
+
+def test_batch_upload_unsupported_file_is_rejected(client, batch_upload_jobs):
+    response = client.post(
+        "/batch-upload/request",
+        files={"file": ("requests.txt", b"Item Barcode\n", "text/plain")},
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert batch_upload_jobs.snapshot()["queued"] == 0
+
+
+def test_batch_upload_shutdown_cancels_queued_uploads(
+    client, session, batch_upload_jobs
+):
+    running = _new_batch_upload(session, "running.csv")
+    queued = _new_batch_upload(session, "queued.csv")
+    started = threading.Event()
+    release = threading.Event()
+
+    def processor(*args):
+        started.set()
+        release.wait(10)
+        return []
+
+    batch_upload_jobs.submit(running.id, processor, b"", "csv")
+    assert started.wait(10)
+    batch_upload_jobs.submit(queued.id, processor, b"", "csv")
+    assert batch_upload_jobs.snapshot()["queued"] == 1
+
+    shutdown = threading.Thread(target=batch_upload_jobs.shutdown)
+    shutdown.start()
+    while not batch_upload_jobs._stopping:
+        time.sleep(0.01)
+    release.set()
+    shutdown.join(10)
+
+    # the running upload finishes, the queued one never starts
+    assert _wait_for_batch_upload(client, session, running.id)["status"] == "Completed"
+    assert _wait_for_batch_upload(client, session, queued.id)["status"] == "Cancelled"
+    assert batch_upload_jobs.snapshot() == {
+        "workers": 1,
+        "queued": 0,
+        "running": 0,
+        "completed": 1,
+        "failed": 0,
+        "cancelled": 1,
+    }
+
+
+def test_batch_upload_withdraw_job(client, session, batch_upload_jobs):
+    item = (
+        session.query(Item)
+        .join(Barcode, Item.barcode_id == Barcode.id)
+        .filter(Barcode.value == "5901234123460")
+        .one()
+    )
+    tray = session.get(Tray, item.tray_id)
+    scanned_for_shelving = tray.scanned_for_shelving
+    withdraw_job = commit_record(session, WithdrawJob())
+    try:
+        # items are withdrawn when their tray is shelved
+        session.execute(
+            update(Tray).where(Tray.id == tray.id).values(scanned_for_shelving=True)
+        )
+        session.commit()
+
+        response = client.post(
+            f"/batch-upload/withdraw-jobs/{withdraw_job.id}",
+            files={
+                "file": (
+                    "withdraw.csv",
+                    b"Item Barcode\n5901234123460\nmissing\n",
+                    "text/csv",
+                )
+            },
+        )
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json()["withdraw_job_id"] == withdraw_job.id
+
+        detail = _wait_for_batch_upload(client, session, response.json()["id"])
+
+        assert detail["status"] == "Completed"
+        assert detail["total_rows"] == 2
+        assert detail["processed_rows"] == 2
+        assert detail["errored_rows"] == 1
+        assert detail["errors"] == [
+            {"line": 2, "error": "Barcode value missing not found"}
+        ]
+        assert session.query(ItemWithdrawal).filter(
+            ItemWithdrawal.withdraw_job_id == withdraw_job.id
+        ).one().item_id == item.id
+        # the item brings its tray into the job
+        assert session.query(TrayWithdrawal).filter(
+            TrayWithdrawal.withdraw_job_id == withdraw_job.id
+        ).one().tray_id == tray.id
+    finally:
+        session.rollback()
+        for model in (ItemWithdrawal, TrayWithdrawal, BatchUpload):
+            session.execute(
+                delete(model).where(model.withdraw_job_id == withdraw_job.id)
+            )
+        session.execute(delete(WithdrawJob).where(WithdrawJob.id == withdraw_job.id))
+        session.execute(
+            update(Tray)
+            .where(Tray.id == tray.id)
+            .values(scanned_for_shelving=scanned_for_shelving)
+        )
+        session.commit()
+
+
+def _age_batch_uploads(session, *batch_upload_ids, seconds=600):
+    session.execute(
+        update(BatchUpload)
+        .where(BatchUpload.id.in_(batch_upload_ids))
+        .values(update_dt=datetime.now(timezone.utc) - timedelta(seconds=seconds))
+    )
+    session.commit()
+
+
+def test_interrupted_batch_uploads_are_failed(client, session):
+    queued = _new_batch_upload(session, "queued.csv")
+    processing = _new_batch_upload(session, "processing.csv")
+    recent = _new_batch_upload(session, "recent.csv")
+    completed = _new_batch_upload(session, "completed.csv")
+    for batch_upload, upload_status in (
+        (processing, "Processing"),
+        (completed, "Completed"),
+    ):
+        session.execute(
+            update(BatchUpload)
+            .where(BatchUpload.id == batch_upload.id)
+            .values(status=upload_status)
+        )
+    _age_batch_uploads(session, queued.id, processing.id, completed.id)
+
+    assert fail_interrupted_uploads(300, worker_session_manager) >= 2
+
+    session.expire_all()
+    for batch_upload in (queued, processing):
+        detail = client.get(f"/batch-upload/{batch_upload.id}").json()
+        assert detail["status"] == "Failed"
+        assert detail["errors"] == [{"line": None, "error": INTERRUPTED_ERROR}]
+    # touched within the timeout, or already finished
+    assert client.get(f"/batch-upload/{recent.id}").json()["status"] == "New"
+    assert client.get(f"/batch-upload/{completed.id}").json()["status"] == "Completed"
+
+
+def test_heartbeat_keeps_held_batch_uploads_alive(client, session, batch_upload_jobs):
+    batch_upload_jobs.stale_seconds = 300
+    running = _new_batch_upload(session, "running.csv")
+    started = threading.Event()
+    release = threading.Event()
+
+    def processor(*args):
+        started.set()
+        release.wait(10)
+        return []
+
+    batch_upload_jobs.submit(running.id, processor, b"", "csv")
+    try:
+        assert started.wait(10)
+        _age_batch_uploads(session, running.id)
+
+        # another process would find it stale without the heartbeat
+        batch_upload_jobs.heartbeat()
+
+        session.expire_all()
+        assert client.get(f"/batch-upload/{running.id}").json()["status"] == (
+            "Processing"
+        )
+    finally:
+        release.set()
+    assert _wait_for_batch_upload(client, session, running.id)["status"] == (
+        "Completed"
+    )
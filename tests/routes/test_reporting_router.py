@@ -244,3 +244,26 @@ def test_get_non_tray_item_count_pagination(client):
     assert "total" in response.json()
     assert "page" in response.json()
     assert "size" in response.json()
+
+
+def test_get_shelving_job_discrepancies_csv(client):
+    response = client.get("/reporting/shelving-job-discrepancies/download")
+
+    assert response.status_code == 200
+    assert (
+        response.headers["Content-Disposition"]
+        == "attachment; filename=shelving_discrepancies.csv"
+    )
+    assert response.text.splitlines()[0] == (
+        "discrepancy_id,shelving_job_id,tray,non_tray_item,assigned_user,owner,"
+        "size_class,assigned_location,pre_assigned_location,error,create_dt,update_dt"
+    )
+
+
+def test_get_open_locations_csv(client):
+    response = client.get("/reporting/open-locations/download")
+
+    assert response.status_code == 200
+    assert response.text.splitlines()[0] == (
+        "shelf_barcode,available_space,location,owner,height,width,depth,size_class"
+    )
@@ -119,3 +119,14 @@ def test_delete_verification_job_record_not_found(client):
 
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert response.json().get("detail") == "Verification Job ID 999 Not Found"
+
+
+def test_batch_add_to_verification_job_requires_barcode_values(client):
+    response = client.patch(
+        "/verification-jobs/999/add/batch", json={"barcode_values": []}
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json().get("detail") == (
+        "At least one barcode value must be provided"
+    )